@@ -0,0 +1,133 @@
+"""
+比较 ElementQuery 的三种求值方式: 朴素线性扫描 (按字段顺序检查、每次调用重新编译
+正则，适配器常见的实现)、编译后的查询计划 (core.element_query)，以及在其之上
+使用等值/空间索引的 SnapshotIndex。
+
+用法:
+    python -m benchmarks.bench_element_query --elements 100000 --number 20
+"""
+
+import argparse
+import re
+import timeit
+from typing import List, Optional
+
+from benchmarks.common import build_snapshot
+from core.element_query import compile_query
+from core.snapshot_index import SnapshotIndex, bbox_intersects
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+
+def naive_find(
+    elements, query: pb2.ElementQuery, limit: Optional[int] = None
+) -> List[pb2.UIElement]:
+    """按字段声明顺序检查全部条件的线性扫描，每次调用都编译正则 (经过 re 模块缓存)。"""
+    pattern = (
+        re.compile(query.text_content_regex)
+        if query.HasField("text_content_regex")
+        else None
+    )
+    matches = []
+    for element in elements:
+        if (
+            query.HasField("framework_id")
+            and element.framework_id != query.framework_id
+        ):
+            continue
+        if (
+            query.HasField("element_type")
+            and element.element_type != query.element_type
+        ):
+            continue
+        if query.HasField("name") and not (
+            element.HasField("name") and element.name == query.name
+        ):
+            continue
+        if pattern is not None and not (
+            element.HasField("text_content") and pattern.search(element.text_content)
+        ):
+            continue
+        if query.HasField("exact_text") and not (
+            element.HasField("text_content")
+            and element.text_content == query.exact_text
+        ):
+            continue
+        if query.HasField("bbox") and not (
+            element.HasField("bbox") and bbox_intersects(element.bbox, query.bbox)
+        ):
+            continue
+        if query.HasField("parent_framework_id_constraint") and not (
+            element.parent_framework_id == query.parent_framework_id_constraint
+        ):
+            continue
+        if element.confidence < query.min_confidence:
+            continue
+        matches.append(element)
+    if query.HasField("index"):
+        return matches[query.index : query.index + 1]
+    return matches[:limit] if limit is not None else matches
+
+
+def build_queries(element_count: int) -> dict:
+    last = element_count - 1
+    return {
+        "name (last)": pb2.ElementQuery(name=f"Element {last}"),
+        "type+regex": pb2.ElementQuery(
+            element_type="pane", text_content_regex=r"Label \d*77$"
+        ),
+        "regex+parent": pb2.ElementQuery(
+            text_content_regex=r"^Label 5\d$",
+            parent_framework_id_constraint="element-50",
+        ),
+        "type index=5": pb2.ElementQuery(element_type="button", index=5),
+        "bbox+type": pb2.ElementQuery(
+            element_type="button",
+            bbox=pb2.BBox(x_min=400, y_min=400, x_max=500, y_max=500),
+        ),
+    }
+
+
+def _bench(fn, number: int) -> float:
+    """返回每次调用的平均耗时 (毫秒)，取 3 轮中的最小值。"""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--elements", type=int, default=100000, help="Snapshot size.")
+    parser.add_argument("--number", type=int, default=20, help="Calls per round.")
+    args = parser.parse_args()
+
+    snapshot = build_snapshot(args.elements)
+    elements = list(snapshot.elements)
+    index = SnapshotIndex(snapshot)
+
+    header = f"{'query':<16}{'naive':>12}{'compiled':>12}{'indexed':>12}{'speedup':>10}"
+    print(f"ElementQuery evaluation on {args.elements} elements (ms per call)")
+    print(header)
+    print("-" * len(header))
+    for name, query in build_queries(args.elements).items():
+        expected = naive_find(elements, query)
+        assert compile_query(query).find(elements) == expected, name
+        assert index.find(query) == expected, name
+        naive_ms = _bench(lambda: naive_find(elements, query), args.number)
+        compiled_ms = _bench(lambda: compile_query(query).find(elements), args.number)
+        indexed_ms = _bench(lambda: index.find(query), args.number)
+        print(
+            f"{name:<16}{naive_ms:>12.3f}{compiled_ms:>12.3f}{indexed_ms:>12.3f}"
+            f"{naive_ms / compiled_ms:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+测量每个 RPC 的日志开销: 直接调用服务实现 (不经过网络)，比较不同日志级别下
+同步写文件与 QueueHandler 异步写文件的耗时，减去关闭日志时的基线。
+
+用法:
+    python -m benchmarks.bench_logging --number 20000
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import timeit
+
+from benchmarks.common import StandInActionAdapter, StandInPerceptionAdapter
+from core import grpc_server
+from utils.logging_config import setup_logging, stop_logging
+from utils.proto_utils import python_dict_to_proto_struct
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+# (名称, 日志级别, 是否异步)；第一项为基线
+CONFIGS = [
+    ("disabled", logging.CRITICAL, False),
+    ("info-sync", logging.INFO, False),
+    ("info-async", logging.INFO, True),
+    ("debug-sync", logging.DEBUG, False),
+    ("debug-async", logging.DEBUG, True),
+]
+
+
+def _bench(fn, number: int) -> float:
+    """返回每次调用的平均耗时 (微秒)，取 3 轮中的最小值。"""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Calls per round.")
+    args = parser.parse_args()
+
+    grpc_server.global_mock_perception_adapter = StandInPerceptionAdapter()
+    grpc_server.global_mock_action_adapter = StandInActionAdapter()
+    perception = grpc_server.PerceptionServiceImpl()
+    action = grpc_server.ActionServiceImpl()
+    options = python_dict_to_proto_struct({"button": "left", "click_count": 1})
+    rpcs = {
+        "FindElement": lambda: perception.FindElement(
+            pb2.ElementQuery(name="Button 1"), None
+        ),
+        "Click": lambda: action.Click(
+            pb2.ClickRequest(adapter_specific_id=b"e1", options=options), None
+        ),
+    }
+
+    log_dir = tempfile.mkdtemp(prefix="argus-bench-logging-")
+    header = f"{'rpc':<14}" + "".join(f"{name:>14}" for name, _, _ in CONFIGS[1:])
+    print("Logging overhead per RPC (us, relative to logging disabled)")
+    print(header)
+    print("-" * len(header))
+    try:
+        for rpc_name, call in rpcs.items():
+            row = f"{rpc_name:<14}"
+            baseline_us = None
+            for name, level, async_logging in CONFIGS:
+                setup_logging(
+                    log_level=level,
+                    log_dir=log_dir,
+                    log_file=os.path.join(log_dir, f"{name}.log"),
+                    console_logging=False,
+                    file_logging=True,
+                    async_logging=async_logging,
+                    rate_limits={},  # 测量完整开销，不限流
+                )
+                elapsed_us = _bench(call, args.number)
+                stop_logging()
+                if baseline_us is None:
+                    baseline_us = elapsed_us
+                    continue
+                row += f"{elapsed_us - baseline_us:>12.2f}us"
+            print(row)
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
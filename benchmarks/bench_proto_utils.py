@@ -0,0 +1,106 @@
+"""
+比较 utils.proto_utils 的直接 Struct/Value 转换与 json_format (ParseDict/MessageToDict)。
+
+用法:
+    python -m benchmarks.bench_proto_utils --number 20000
+"""
+
+import argparse
+import timeit
+
+from google.protobuf.json_format import MessageToDict, ParseDict
+from google.protobuf.struct_pb2 import Struct
+
+from utils.proto_utils import (
+    proto_struct_to_python_dict,
+    proto_value_map_to_python_dict,
+    python_dict_to_proto_struct,
+    python_dict_to_proto_value_map,
+)
+
+# 典型的 RPC 负载: 空 options、点击选项、元素状态、较大的嵌套配置
+PAYLOADS = {
+    "empty": {},
+    "click_options": {"button": "left", "click_count": 1},
+    "element_state": {
+        "enabled": True,
+        "visible": True,
+        "focused": False,
+        "checked": None,
+        "value": "hello",
+        "selection": [0, 5],
+    },
+    "nested_config": {
+        "perception": {
+            "max_depth": 12,
+            "include_invisible": False,
+            "roles": ["button", "edit", "list", "menu", "tab"],
+        },
+        "action": {"typing_delay_ms": 5, "retries": 3, "keys": {"submit": "Enter"}},
+        "tags": [{"id": i, "name": f"tag-{i}"} for i in range(20)],
+    },
+}
+
+
+def _json_format_to_struct(py_dict: dict) -> Struct:
+    proto_struct = Struct()
+    ParseDict(py_dict, proto_struct)
+    return proto_struct
+
+
+def _json_format_to_dict(proto_struct: Struct) -> dict:
+    return MessageToDict(proto_struct, preserving_proto_field_name=True)
+
+
+def _bench(fn, number: int) -> float:
+    """返回每次调用的平均耗时 (微秒)，取 3 轮中的最小值。"""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Calls per round.")
+    args = parser.parse_args()
+
+    header = (
+        f"{'payload':<16}{'operation':<14}{'json_format':>13}"
+        f"{'direct':>10}{'speedup':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, payload in PAYLOADS.items():
+        proto_struct = python_dict_to_proto_struct(payload)
+        cases = [
+            (
+                "dict->struct",
+                lambda: _json_format_to_struct(payload),
+                lambda: python_dict_to_proto_struct(payload),
+            ),
+            (
+                "struct->dict",
+                lambda: _json_format_to_dict(proto_struct),
+                lambda: proto_struct_to_python_dict(proto_struct),
+            ),
+            (
+                "dict->map",
+                # 旧做法: 先转换为 Struct 再复制其 fields 到 map 字段
+                lambda: Struct(fields=_json_format_to_struct(payload).fields),
+                lambda: python_dict_to_proto_value_map(payload, Struct().fields),
+            ),
+            (
+                "map->dict",
+                lambda: _json_format_to_dict(proto_struct),
+                lambda: proto_value_map_to_python_dict(proto_struct.fields),
+            ),
+        ]
+        for operation, baseline, direct in cases:
+            baseline_us = _bench(baseline, args.number)
+            direct_us = _bench(direct, args.number)
+            print(
+                f"{name:<16}{operation:<14}{baseline_us:>11.2f}us{direct_us:>8.2f}us"
+                f"{baseline_us / direct_us:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+比较线程池 (threaded) 与 grpc.aio 两种服务器模式在慢速适配器调用下的并发能力和尾延迟。
+
+负载: slow_clients 个并发客户端循环调用 GetUISnapshot (适配器阻塞 snapshot_latency_ms)，
+同时一个探测客户端串行调用廉价的 GetFocusedElement 并记录延迟。
+
+用法:
+    python -m benchmarks.bench_server_modes --duration 5 --slow-clients 40
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import grpc
+
+from benchmarks.common import (
+    StandInActionAdapter,
+    StandInPerceptionAdapter,
+    start_in_process_server,
+    summarize_latencies,
+)
+from core import grpc_server
+from utils.proto_utils import python_dict_to_proto_struct
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+    import generated_protobuf.core_services_pb2_grpc as pb2_grpc
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+
+async def _slow_client(
+    stub, client_id: int, deadline: float, latencies: List[float], errors: List[str]
+) -> None:
+    call_index = 0
+    while time.perf_counter() < deadline:
+        call_index += 1
+        # 每次请求使用不同的选项，绕过服务端快照缓存和并发合并
+        options = python_dict_to_proto_struct({"client": client_id, "call": call_index})
+        started = time.perf_counter()
+        try:
+            await stub.GetUISnapshot(pb2.GetUISnapshotRequest(options=options))
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        except grpc.aio.AioRpcError as e:
+            errors.append(e.code().name)
+
+
+async def _probe_client(
+    stub, deadline: float, latencies: List[float], errors: List[str]
+) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await stub.GetFocusedElement(pb2.GetFocusedElementRequest())
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        except grpc.aio.AioRpcError as e:
+            errors.append(e.code().name)
+        await asyncio.sleep(0.005)
+
+
+async def _drive_load(port: int, slow_clients: int, duration: float) -> Dict:
+    slow_latencies: List[float] = []
+    probe_latencies: List[float] = []
+    errors: List[str] = []
+    async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+        stub = pb2_grpc.PerceptionServiceStub(channel)
+        await channel.channel_ready()
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            _probe_client(stub, deadline, probe_latencies, errors),
+            *(
+                _slow_client(stub, i, deadline, slow_latencies, errors)
+                for i in range(slow_clients)
+            ),
+        )
+    return {
+        "slow_throughput": len(slow_latencies) / duration,
+        "slow": summarize_latencies(slow_latencies),
+        "probe": summarize_latencies(probe_latencies),
+        "errors": len(errors),
+    }
+
+
+def run_mode(
+    mode: str,
+    slow_clients: int,
+    duration: float,
+    threaded_workers: int,
+    aio_workers: int,
+    aio_max_concurrent_rpcs: Optional[int],
+) -> Dict:
+    """启动指定模式的服务器，施加负载并返回统计结果。"""
+    workers = threaded_workers if mode == "threaded" else aio_workers
+    port, stop_server = start_in_process_server(
+        mode, workers, max_concurrent_rpcs=aio_max_concurrent_rpcs
+    )
+    try:
+        return asyncio.run(_drive_load(port, slow_clients, duration))
+    finally:
+        stop_server()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per mode.")
+    parser.add_argument("--slow-clients", type=int, default=40)
+    parser.add_argument("--snapshot-latency-ms", type=float, default=200.0)
+    parser.add_argument("--threaded-workers", type=int, default=10)
+    parser.add_argument("--aio-workers", type=int, default=32)
+    parser.add_argument("--aio-max-concurrent-rpcs", type=int, default=None)
+    parser.add_argument(
+        "--modes", nargs="+", choices=["threaded", "aio"], default=["threaded", "aio"]
+    )
+    args = parser.parse_args()
+
+    grpc_server.global_mock_perception_adapter = StandInPerceptionAdapter(
+        snapshot_latency=args.snapshot_latency_ms / 1000.0
+    )
+    grpc_server.global_mock_action_adapter = StandInActionAdapter()
+
+    print(
+        f"slow_clients={args.slow_clients} "
+        f"snapshot_latency={args.snapshot_latency_ms:.0f}ms "
+        f"duration={args.duration:.1f}s"
+    )
+    header = (
+        f"{'mode':<10}{'limit':>7}{'slow/s':>9}{'slow p99':>10}"
+        f"{'probe p50':>11}{'probe p99':>11}{'probe max':>11}{'errors':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for mode in args.modes:
+        result = run_mode(
+            mode,
+            args.slow_clients,
+            args.duration,
+            args.threaded_workers,
+            args.aio_workers,
+            args.aio_max_concurrent_rpcs,
+        )
+        limit = args.threaded_workers if mode == "threaded" else args.aio_workers
+        print(
+            f"{mode:<10}{limit:>7}{result['slow_throughput']:>9.1f}"
+            f"{result['slow']['p99']:>10.1f}{result['probe']['p50']:>11.1f}"
+            f"{result['probe']['p99']:>11.1f}{result['probe']['max']:>11.1f}"
+            f"{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
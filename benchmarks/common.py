@@ -0,0 +1,190 @@
+"""基准测试共用的替身适配器和统计工具。"""
+
+import asyncio
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+
+class StandInPerceptionAdapter:
+    """
+    模拟感知适配器: 快照在构造时生成一次，get_ui_snapshot 阻塞 snapshot_latency 秒
+    (模拟慢速的无障碍树遍历) 后返回它，其余调用立即返回。
+    """
+
+    def __init__(self, snapshot_latency: float = 0.0, element_count: int = 50):
+        self.snapshot_latency = snapshot_latency
+        self.element_count = element_count
+        self.snapshot = build_snapshot(element_count)
+
+    def initialize(self, config: dict) -> None:
+        pass
+
+    def get_ui_snapshot(self, options: dict) -> pb2.UISnapshot:
+        if self.snapshot_latency:
+            time.sleep(self.snapshot_latency)
+        return self.snapshot
+
+    def find_element(self, query: pb2.ElementQuery) -> pb2.FindElementResponse:
+        return pb2.FindElementResponse(element=self.snapshot.elements[0])
+
+    def find_elements(self, query: pb2.ElementQuery) -> pb2.FindElementsResponse:
+        return pb2.FindElementsResponse(elements=self.snapshot.elements[:10])
+
+    def get_element_state(self, element_id: bytes) -> dict:
+        return {"enabled": True, "visible": True, "focused": False, "value": "text"}
+
+    def get_element_text(self, element_id: bytes) -> str:
+        return "element text"
+
+    def get_focused_element(self) -> pb2.UIElement:
+        return pb2.UIElement(framework_id="focused", element_type="edit")
+
+
+class StandInActionAdapter:
+    """模拟动作适配器: 所有动作立即成功。"""
+
+    def initialize(self, config: dict) -> None:
+        pass
+
+    def click(self, element_id, options):
+        return pb2.ActionResult(success=True)
+
+    def type_text(self, text, element_id, options):
+        return pb2.ActionResult(success=True)
+
+    def scroll(self, direction, magnitude, element_id, options):
+        return pb2.ActionResult(success=True)
+
+    def press_key(self, key_combination, options):
+        return pb2.ActionResult(success=True)
+
+    def drag_and_drop(
+        self, source_element_id, target_element_id, target_coords, options
+    ):
+        return pb2.ActionResult(success=True)
+
+    def execute_native_command(self, command_name, params):
+        return pb2.ActionResult(success=True)
+
+
+def build_snapshot(element_count: int) -> pb2.UISnapshot:
+    """生成包含 element_count 个元素的快照 (每 10 个元素挂在一个容器下)。"""
+    elements = []
+    for i in range(element_count):
+        element = pb2.UIElement(
+            framework_id=f"element-{i}",
+            adapter_specific_id=i.to_bytes(4, "little"),
+            element_type="pane" if i % 10 == 0 else "button",
+            name=f"Element {i}",
+            text_content=f"Label {i}",
+            bbox=pb2.BBox(
+                x_min=(i % 100) * 20,
+                y_min=(i // 100) * 20,
+                x_max=(i % 100) * 20 + 18,
+                y_max=(i // 100) * 20 + 18,
+            ),
+            confidence=1.0,
+        )
+        if i % 10:
+            element.parent_framework_id = f"element-{i - i % 10}"
+        element.state["enabled"].bool_value = True
+        elements.append(element)
+    return pb2.UISnapshot(snapshot_id=f"snapshot-{element_count}", elements=elements)
+
+
+class AioServerThread:
+    """在独立线程的事件循环中运行 aio 服务器，使基准客户端可以在主线程运行。"""
+
+    def __init__(
+        self, executor_workers: int, max_concurrent_rpcs: Optional[int] = None
+    ):
+        self._executor_workers = executor_workers
+        self._max_concurrent_rpcs = max_concurrent_rpcs
+        self._ready = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.port = 0
+
+    def _run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        # 延迟导入，只有 aio 模式才需要
+        from core.grpc_aio_server import BlockingCallDispatcher, create_aio_server
+
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        server, self.port, dispatcher = create_aio_server(
+            port=0,
+            dispatcher=BlockingCallDispatcher(self._executor_workers),
+            max_concurrent_rpcs=self._max_concurrent_rpcs,
+        )
+        await server.start()
+        self._ready.set()
+        await self._stop_event.wait()
+        await server.stop(grace=None)
+        dispatcher.shutdown()
+
+    def start(self) -> int:
+        self._thread.start()
+        self._ready.wait()
+        return self.port
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._stop_event.set)
+        self._thread.join()
+
+
+def start_in_process_server(
+    mode: str, workers: int, max_concurrent_rpcs: Optional[int] = None
+) -> Tuple[int, Callable[[], None]]:
+    """
+    在当前进程中启动服务器 (绑定系统分配的端口)。
+    :param mode: "threaded" 或 "aio"。
+    :param workers: 线程池模式的线程数，或 aio 模式执行阻塞调用的线程数。
+    :return: (端口, 停止服务器的函数)。
+    """
+    if mode == "threaded":
+        from core.grpc_server import create_server
+
+        server, port = create_server(port=0, workers=workers)
+        server.start()
+        return port, lambda: server.stop(grace=None)
+    aio_server = AioServerThread(workers, max_concurrent_rpcs)
+    return aio_server.start(), aio_server.stop
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """对已排序的样本取分位数 (最近秩法)。"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    """返回样本数、平均值及 p50/p95/p99/p999/max 延迟 (毫秒)。"""
+    ordered = sorted(latencies_ms)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else float("nan"),
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "p999": percentile(ordered, 0.999),
+        "max": ordered[-1] if ordered else float("nan"),
+    }
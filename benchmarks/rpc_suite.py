@@ -0,0 +1,434 @@
+"""
+PerceptionService / ActionService / AdapterControlService 的 RPC 延迟与吞吐基准套件。
+
+在进程内启动 core.grpc_server (替身适配器)，对每个 RPC 在不同并发客户端数和快照规模下
+测量 p50/p99/p999 延迟与吞吐，结果写入 JSON；compare 子命令对比两次运行并标记回退。
+
+用法:
+    python -m benchmarks.rpc_suite run --output results.json
+    python -m benchmarks.rpc_suite run --rpcs GetUISnapshot Click --concurrency 1 8
+    python -m benchmarks.rpc_suite compare baseline.json results.json --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import grpc
+
+from benchmarks.common import (
+    StandInActionAdapter,
+    StandInPerceptionAdapter,
+    start_in_process_server,
+    summarize_latencies,
+)
+from core import grpc_server
+from core.grpc_aio_client import build_channel_options
+from utils.proto_utils import python_dict_to_proto_struct
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+    import generated_protobuf.core_services_pb2_grpc as pb2_grpc
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+RESULT_FORMAT_VERSION = 1
+DEFAULT_CONCURRENCY = [1, 4, 16]
+DEFAULT_SNAPSHOT_SIZES = [100, 1000, 10000, 100000]
+
+
+@dataclass(frozen=True)
+class RpcCase:
+    """一个被测 RPC: 服务、方法名和请求构造函数。"""
+
+    service: str  # "perception" | "action" | "adapter_control"
+    method: str
+    make_request: Callable[[], object]
+    # 响应大小随快照规模变化的 RPC 会在每个快照规模下各测一次
+    snapshot_sized: bool = False
+    server_streaming: bool = False
+
+
+def _click_request() -> pb2.ClickRequest:
+    return pb2.ClickRequest(
+        adapter_specific_id=b"\x01\x00\x00\x00",
+        options=python_dict_to_proto_struct({"button": "left", "click_count": 1}),
+    )
+
+
+RPC_CASES: List[RpcCase] = [
+    RpcCase(
+        "perception",
+        "GetUISnapshot",
+        lambda: pb2.GetUISnapshotRequest(
+            options=python_dict_to_proto_struct({"max_depth": 10})
+        ),
+        snapshot_sized=True,
+    ),
+    RpcCase(
+        "perception",
+        "StreamUISnapshotDiffs",
+        lambda: pb2.StreamUISnapshotDiffsRequest(interval_ms=1, max_updates=1),
+        snapshot_sized=True,
+        server_streaming=True,
+    ),
+    RpcCase(
+        "perception",
+        "FindElement",
+        lambda: pb2.ElementQuery(element_type="button", name="Element 1"),
+    ),
+    RpcCase(
+        "perception", "FindElements", lambda: pb2.ElementQuery(element_type="button")
+    ),
+    RpcCase(
+        "perception",
+        "GetElementState",
+        lambda: pb2.GetElementStateRequest(adapter_specific_id=b"\x01"),
+    ),
+    RpcCase(
+        "perception",
+        "GetElementText",
+        lambda: pb2.GetElementTextRequest(adapter_specific_id=b"\x01"),
+    ),
+    RpcCase("perception", "GetFocusedElement", pb2.GetFocusedElementRequest),
+    RpcCase("action", "Click", _click_request),
+    RpcCase(
+        "action",
+        "TypeText",
+        lambda: pb2.TypeTextRequest(text="hello world", adapter_specific_id=b"\x01"),
+    ),
+    RpcCase(
+        "action", "Scroll", lambda: pb2.ScrollRequest(direction="down", magnitude=3)
+    ),
+    RpcCase("action", "PressKey", lambda: pb2.PressKeyRequest(key_combination="Enter")),
+    RpcCase(
+        "action",
+        "DragAndDrop",
+        lambda: pb2.DragAndDropRequest(
+            source_adapter_specific_id=b"\x01",
+            target_coords=pb2.Coordinates(x=10, y=20),
+        ),
+    ),
+    RpcCase(
+        "action",
+        "ExecuteNativeCommand",
+        lambda: pb2.ExecuteNativeCommandRequest(
+            command_name="noop", params=python_dict_to_proto_struct({"arg": "value"})
+        ),
+    ),
+    RpcCase(
+        "action",
+        "ExecuteActionBatch",
+        lambda: pb2.ExecuteActionBatchRequest(
+            steps=[pb2.ActionStep(click=_click_request()) for _ in range(5)]
+        ),
+    ),
+    RpcCase(
+        "adapter_control",
+        "Initialize",
+        lambda: pb2.InitializeRequest(adapter_name="mock_adapter"),
+    ),
+]
+
+
+def _make_stubs(channel: grpc.aio.Channel) -> Dict[str, object]:
+    return {
+        "perception": pb2_grpc.PerceptionServiceStub(channel),
+        "action": pb2_grpc.ActionServiceStub(channel),
+        "adapter_control": pb2_grpc.AdapterControlServiceStub(channel),
+    }
+
+
+async def _client_loop(
+    call: Callable, request, deadline: float, latencies: List[float], errors: List[str]
+) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await call(request)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        except grpc.aio.AioRpcError as e:
+            errors.append(e.code().name)
+
+
+async def _measure(
+    port: int, case: RpcCase, concurrency: int, duration: float, warmup: float
+) -> Dict:
+    """用 concurrency 个并发客户端持续调用 duration 秒 (预热期间的样本丢弃)。"""
+    async with grpc.aio.insecure_channel(
+        f"localhost:{port}", options=build_channel_options(max_message_length=-1)
+    ) as channel:
+        await channel.channel_ready()
+        stub_method = getattr(_make_stubs(channel)[case.service], case.method)
+        if case.server_streaming:
+
+            async def call(request):
+                async for _ in stub_method(request):
+                    pass
+
+        else:
+            call = stub_method
+        request = case.make_request()
+
+        if warmup > 0:
+            await asyncio.gather(
+                *(
+                    _client_loop(call, request, time.perf_counter() + warmup, [], [])
+                    for _ in range(concurrency)
+                )
+            )
+
+        latencies: List[float] = []
+        errors: List[str] = []
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                _client_loop(call, request, started + duration, latencies, errors)
+                for _ in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    summary = summarize_latencies(latencies)
+    return {
+        "count": summary["count"],
+        "errors": len(errors),
+        "throughput_rps": summary["count"] / elapsed,
+        "latency_ms": {
+            key: summary[key] for key in ("mean", "p50", "p99", "p999", "max")
+        },
+    }
+
+
+def _install_adapters(element_count: int) -> None:
+    grpc_server.global_mock_perception_adapter = StandInPerceptionAdapter(
+        element_count=element_count
+    )
+    grpc_server.global_mock_action_adapter = StandInActionAdapter()
+
+
+def run_suite(args: argparse.Namespace) -> Dict:
+    """按 RPC × 快照规模 × 并发数运行所有用例并返回结果文档。"""
+    cases = [c for c in RPC_CASES if not args.rpcs or c.method in args.rpcs]
+    unknown = set(args.rpcs or ()) - {c.method for c in RPC_CASES}
+    if unknown:
+        raise SystemExit(f"Unknown RPC(s): {', '.join(sorted(unknown))}")
+    if not args.snapshot_cache:
+        # 测量适配器到客户端的完整路径，而不是缓存命中
+        grpc_server.snapshot_cache.ttl = 0
+
+    port, stop_server = start_in_process_server(args.server_mode, args.workers)
+    results = []
+    try:
+        # 先测与快照规模无关的 RPC (使用最小规模的替身快照)
+        plan: List[Tuple[RpcCase, Optional[int]]] = [
+            (case, None) for case in cases if not case.snapshot_sized
+        ]
+        plan += [
+            (case, size) for size in args.sizes for case in cases if case.snapshot_sized
+        ]
+        current_size = None
+        for case, size in plan:
+            element_count = size if size is not None else min(args.sizes)
+            if element_count != current_size:
+                _install_adapters(element_count)
+                current_size = element_count
+            for concurrency in args.concurrency:
+                measured = asyncio.run(
+                    _measure(port, case, concurrency, args.duration, args.warmup)
+                )
+                result = {
+                    "rpc": case.method,
+                    "elements": size,
+                    "concurrency": concurrency,
+                    **measured,
+                }
+                results.append(result)
+                _print_result(result)
+    finally:
+        stop_server()
+
+    return {
+        "version": RESULT_FORMAT_VERSION,
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "grpc": grpc.__version__,
+            "platform": platform.platform(),
+            "server_mode": args.server_mode,
+            "workers": args.workers,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "snapshot_cache": args.snapshot_cache,
+        },
+        "results": results,
+    }
+
+
+def _case_label(result: Dict) -> str:
+    size = f"[{result['elements']}]" if result.get("elements") is not None else ""
+    return f"{result['rpc']}{size} c={result['concurrency']}"
+
+
+def _print_result(result: Dict) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{_case_label(result):<40}{result['throughput_rps']:>10.1f} rps"
+        f"{latency['p50']:>10.2f}{latency['p99']:>10.2f}{latency['p999']:>10.2f} ms"
+        f"{result['errors']:>6} err"
+    )
+
+
+def _result_key(result: Dict) -> Tuple:
+    return (result["rpc"], result.get("elements"), result["concurrency"])
+
+
+def compare_results(
+    baseline: Dict, candidate: Dict, threshold: float, metrics: List[str]
+) -> List[Dict]:
+    """
+    对比两次运行中相同 (rpc, elements, concurrency) 的用例。
+    延迟指标变大超过 threshold 比例、或吞吐下降超过 threshold 比例时视为回退。
+    :return: 每个共同用例的对比结果 (含 regressions 列表)。
+    """
+    baseline_by_key = {_result_key(r): r for r in baseline["results"]}
+    comparisons = []
+    for result in candidate["results"]:
+        base = baseline_by_key.get(_result_key(result))
+        if base is None:
+            continue
+        changes = {}
+        regressions = []
+        for metric in metrics:
+            if metric == "throughput":
+                old, new = base["throughput_rps"], result["throughput_rps"]
+                regressed = new < old * (1 - threshold)
+            else:
+                old, new = base["latency_ms"][metric], result["latency_ms"][metric]
+                regressed = new > old * (1 + threshold)
+            changes[metric] = (new - old) / old if old else 0.0
+            if regressed:
+                regressions.append(metric)
+        if result["errors"] > base["errors"]:
+            regressions.append("errors")
+        comparisons.append(
+            {
+                "key": _case_label(result),
+                "changes": changes,
+                "regressions": regressions,
+            }
+        )
+    return comparisons
+
+
+def _run_command(args: argparse.Namespace) -> int:
+    print(
+        f"server_mode={args.server_mode} workers={args.workers} "
+        f"duration={args.duration}s warmup={args.warmup}s"
+    )
+    print(
+        f"{'case':<40}{'throughput':>14}{'p50':>10}{'p99':>10}{'p999':>10}"
+        f"{'':>3}{'errors':>10}"
+    )
+    document = run_suite(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+def _compare_command(args: argparse.Namespace) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    comparisons = compare_results(baseline, candidate, args.threshold, args.metrics)
+    if not comparisons:
+        print("No common cases between the two runs.")
+        return 0
+
+    print(f"{'case':<40}" + "".join(f"{metric:>12}" for metric in args.metrics))
+    regressed = 0
+    for comparison in comparisons:
+        cells = "".join(
+            f"{comparison['changes'][metric]:>+11.1%} " for metric in args.metrics
+        )
+        flag = ""
+        if comparison["regressions"]:
+            regressed += 1
+            flag = "  REGRESSION: " + ", ".join(comparison["regressions"])
+        print(f"{comparison['key']:<40}{cells}{flag}")
+    print(
+        f"{regressed} of {len(comparisons)} cases regressed "
+        f"(threshold {args.threshold:.0%})."
+    )
+    return 1 if regressed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark suite.")
+    run_parser.add_argument("--output", default="rpc_benchmark.json")
+    run_parser.add_argument("--rpcs", nargs="+", help="Only run these RPCs.")
+    run_parser.add_argument(
+        "--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY
+    )
+    run_parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SNAPSHOT_SIZES,
+        help="Snapshot sizes (element counts) for snapshot-sized RPCs.",
+    )
+    run_parser.add_argument("--duration", type=float, default=2.0, help="Seconds/case.")
+    run_parser.add_argument("--warmup", type=float, default=0.2, help="Seconds/case.")
+    run_parser.add_argument(
+        "--server-mode", choices=["threaded", "aio"], default="threaded"
+    )
+    run_parser.add_argument("--workers", type=int, default=10)
+    run_parser.add_argument(
+        "--snapshot-cache",
+        action="store_true",
+        help="Keep the server-side GetUISnapshot cache enabled.",
+    )
+    run_parser.set_defaults(func=_run_command)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare two result files and flag regressions."
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative change treated as a regression (default 0.10 = 10%%).",
+    )
+    compare_parser.add_argument(
+        "--metrics",
+        nargs="+",
+        choices=["mean", "p50", "p99", "p999", "max", "throughput"],
+        default=["p50", "p99", "throughput"],
+    )
+    compare_parser.set_defaults(func=_compare_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
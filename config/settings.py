@@ -11,6 +11,46 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 GRPC_SERVER_ADDRESS = "[::]"  # 监听所有接口
 GRPC_PORT = 50051
 GRPC_MAX_WORKERS = 10
+# 服务器模式: "threaded" (grpc.server + 线程池) 或 "aio" (grpc.aio 事件循环)
+GRPC_SERVER_MODE = "threaded"
+# aio 模式下执行阻塞适配器调用的线程数 (不限制事件循环上并发的 RPC 数)
+GRPC_AIO_EXECUTOR_WORKERS = 32
+# aio 模式下执行 AdapterControlService RPC (指标、就绪检查等) 的独立线程数
+GRPC_AIO_CONTROL_EXECUTOR_WORKERS = 2
+# aio 模式下同时处理的 RPC 上限，超过时返回 RESOURCE_EXHAUSTED；None 表示不限制
+GRPC_AIO_MAX_CONCURRENT_RPCS = None
+
+# --- gRPC Client Settings ---
+# 异步客户端使用的通道数，>1 时请求轮询分布到多个独立 TCP 连接
+GRPC_CLIENT_CHANNEL_POOL_SIZE = 1
+GRPC_CLIENT_KEEPALIVE_TIME_MS = 30000  # 空闲连接发送 keepalive ping 的间隔
+GRPC_CLIENT_KEEPALIVE_TIMEOUT_MS = 10000  # 等待 ping 响应的超时
+# 收发消息的最大字节数 (gRPC 默认接收上限 4 MB，大型 UISnapshot 可能超过)
+GRPC_MAX_MESSAGE_LENGTH = 64 * 1024 * 1024
+SNAPSHOT_DIFF_INTERVAL_MS = 500  # StreamUISnapshotDiffs 默认采集间隔
+# FindElement(s) 使用服务端快照索引时允许的最大快照年龄，超过则直接查询适配器
+SNAPSHOT_INDEX_MAX_AGE_MS = 1000
+# 带 xpath / css_selector 的 FindElement(s) 在没有足够新的快照时先采集快照并在服务端
+# 求值 (不依赖适配器的原生支持)；本地无匹配或选择器超出支持子集时仍回退到适配器
+SNAPSHOT_SELECTOR_CAPTURE = True
+# GetUISnapshot 服务端缓存有效期，动作执行后立即失效；0 表示禁用缓存
+SNAPSHOT_CACHE_TTL_MS = 250
+# WaitForCondition 客户端未指定时的超时和轮询策略。等待期间占用一个工作线程
+# (threaded 模式的 GRPC_MAX_WORKERS / aio 模式的 GRPC_AIO_EXECUTOR_WORKERS)，
+# 因此超时有上限
+WAIT_CONDITION_DEFAULT_TIMEOUT_MS = 10000
+WAIT_CONDITION_MAX_TIMEOUT_MS = 300000
+WAIT_CONDITION_INITIAL_INTERVAL_MS = 50
+WAIT_CONDITION_MAX_INTERVAL_MS = 1000
+WAIT_CONDITION_BACKOFF_MULTIPLIER = 1.5
+# StreamUISnapshot 每条元素消息的默认字节上限 (客户端未指定 max_chunk_bytes 时)
+SNAPSHOT_STREAM_CHUNK_BYTES = 1024 * 1024
+# 同主机客户端请求快照时，不小于该大小的 accessibility_tree_raw 放入共享内存 blob 存储
+BLOB_STORE_MIN_BYTES = 256 * 1024
+# blob 总大小上限 (超出时内联发送原始树) 和句柄的租期 (客户端收到句柄后映射的宽限期)
+BLOB_STORE_MAX_BYTES = 512 * 1024 * 1024
+BLOB_STORE_TTL_MS = 30000
+BLOB_STORE_DIR = None  # None 表示 /dev/shm (存在时) 或系统临时目录
 
 # --- Logging Settings ---
 # LOG_LEVEL = logging.DEBUG # 更详细的日志
@@ -19,12 +59,75 @@ LOG_DIR = os.path.join(BASE_DIR, "logs")
 LOG_FILE = os.path.join(LOG_DIR, "argus_pilot.log")
 LOG_CONSOLE_ENABLED = True
 LOG_FILE_ENABLED = True
-# LOG_ROTATING_FILE = False # 是否启用日志滚动
-# LOG_MAX_BYTES = 10 * 1024 * 1024 # 10 MB
-# LOG_BACKUP_COUNT = 5
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # 日志文件滚动大小 (10 MB)
+LOG_FILE_BACKUP_COUNT = 5
+# 通过 QueueHandler/QueueListener 在后台线程中写日志，文件 I/O 不阻塞请求线程
+LOG_ASYNC_ENABLED = True
+# 热路径 logger 的限流: logger 名称 -> 每秒最多记录数 (WARNING 及以上不受限)
+LOG_RATE_LIMITS = {
+    "core.grpc_server": 100.0,
+    "core.grpc_aio_server": 100.0,
+}
 
 # --- Adapter Settings ---
 # ADAPTER_DISCOVERY_ENTRY_POINT = "argus_adapters"
+ADAPTER_LAZY_DISCOVERY = True  # 仅登记类路径，首次 get_adapter 时才导入适配器类
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+# 适配器发现结果缓存，已安装发行包元数据变化时自动失效
+ADAPTER_DISCOVERY_CACHE_FILE = os.path.join(CACHE_DIR, "adapter_manifest.json")
+# 适配器默认运行方式: "in_process" (在服务端进程内) 或 "worker" (每个适配器实例
+# 运行在受监督的子进程中，崩溃后自动重启)；可在适配器配置中用 process_mode 单独指定
+ADAPTER_PROCESS_MODE = "in_process"
+ADAPTER_WORKER_STARTUP_TIMEOUT = 30.0  # 等待工作进程启动并完成初始化的秒数
+ADAPTER_WORKER_CALL_TIMEOUT = 60.0  # 单次适配器调用的超时 (秒)
+# ADAPTER_WORKER_RESTART_WINDOW 秒内最多自动重启的次数，超过后该工作进程不再可用
+ADAPTER_WORKER_MAX_RESTARTS = 5
+ADAPTER_WORKER_RESTART_WINDOW = 60.0
+ADAPTER_WORKER_RPC_THREADS = 4  # 工作进程中处理 RPC 的线程数
+# serve() / CoreEngine.start() 时在后台预加载的应用适配器 (首个请求不再承担导入和
+# 初始化的开销)；预热进度通过 AdapterControlService.GetReadiness 报告。
+# serve() 总是预加载 SERVER_ADAPTER_APP
+ADAPTER_PRELOAD_APPS = []
+ADAPTER_PRELOAD_MAX_WORKERS = 4  # 并行预热的适配器数
+# 适配器实例池: 引擎任务和服务端 RPC 从池中借出实例 (AdapterManager.pooled_adapter)
+ADAPTER_POOL_MIN_SIZE = 1  # 预加载时创建、空闲回收时保留的实例数
+ADAPTER_POOL_MAX_SIZE = 4  # 单个应用的最大实例数 (含已借出)
+ADAPTER_POOL_IDLE_TIMEOUT = 300.0  # 空闲超过该秒数的实例被关闭，None 表示不回收
+# 所有应用的实例总数 / 内存估算总和上限 (超过时按 LRU 关闭空闲实例)，None 表示不限制。
+# 内存估算来自适配器的 memory_usage_bytes() (worker 模式报告工作进程的 RSS)；
+# 未报告的实例按 ADAPTER_POOL_INSTANCE_MEMORY_BYTES (或适配器配置中的
+# memory_estimate_bytes) 计，两者都没有时按 0 计，内存上限对其不起作用
+ADAPTER_POOL_MAX_TOTAL_INSTANCES = None
+ADAPTER_POOL_MAX_TOTAL_MEMORY_BYTES = None
+ADAPTER_POOL_INSTANCE_MEMORY_BYTES = None
+ADAPTER_POOL_CHECKOUT_TIMEOUT = 30.0  # 池已满时等待实例归还的秒数
+# PerceptionService / ActionService 使用的应用适配器: 每个 RPC 从 serve() 创建的
+# AdapterManager 实例池借出一对实例；None 表示使用内置的模拟适配器
+SERVER_ADAPTER_APP = None
+SERVER_ADAPTER_CONFIG = {}  # 传递给该应用适配器 initialize 的配置
+
+# --- Engine Settings ---
+ENGINE_TASK_MAX_WORKERS = 4  # 同时执行的任务数 (不同目标应用之间并行)
+ENGINE_TASK_MAX_PENDING = 100  # 已提交但未完成的任务上限，超过时拒绝新任务
+# 任务循环模式: "sequential" (感知 -> 规划 -> 行动 严格串行) 或
+# "pipelined" (动作下发后立即采集下一个快照，并在确认动作效果时并行规划下一步)
+ENGINE_TASK_LOOP_MODE = "sequential"
+ENGINE_TASK_LOOP_MAX_ITERATIONS = 50  # 单个任务最多执行的动作数
+ENGINE_TASK_LOOP_MAX_STALE_RETRIES = 3  # 快照未反映动作效果时最多重新采集的次数
+
+# --- Metrics Settings ---
+# Prometheus 文本格式的 HTTP 端点 (GET /metrics)，None 表示不启动；
+# 指标也可以通过 AdapterControlService.GetMetrics RPC 读取
+METRICS_HTTP_HOST = "127.0.0.1"  # 默认只监听本机
+METRICS_HTTP_PORT = None
+
+# --- Tracing Settings ---
+# 每个 RPC 都分配请求 ID (x-request-id 元数据)；按该比例采样记录各阶段 span
+# (conversion / adapter / serialize)，以 OTLP-JSON 追加写入 TRACE_SPAN_FILE。
+# 客户端已采样的请求 (traceparent) 服务端总是记录
+TRACE_SAMPLE_RATE = 0.0  # 0 到 1，0 表示只分配请求 ID
+TRACE_SPAN_FILE = os.path.join(LOG_DIR, "spans.otlp.jsonl")  # None 表示不导出
+TRACE_SERVICE_NAME = "argus"
 
 # --- Environment Specific Settings (Example) ---
 # ENVIRONMENT = os.environ.get('ARGUS_ENV', 'development')
@@ -1,7 +1,34 @@
+import hashlib
 import importlib
 import importlib.metadata as metadata
+import json
 import logging
-from typing import Dict, Optional, Tuple, Type
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent import futures
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+
+from core.adapter_pool import AdapterPool, AdapterPoolConfig
+from utils.metrics import default_registry
+
+if TYPE_CHECKING:
+    from core.remote_adapter import AdapterWorkerConfig
 
 # 假设接口定义在 interfaces 模块中 (实际应从那里导入)
 # from interfaces.perception import PerceptionAdapterInterface
@@ -41,6 +68,54 @@ AdapterPair = Tuple[
 AdapterClassPair = Tuple[
     Optional[Type[PerceptionAdapterInterface]], Optional[Type[ActionAdapterInterface]]
 ]
+# 适配器清单: (perception 类路径, action 类路径)，不涉及任何导入
+AdapterManifest = Tuple[Optional[str], Optional[str]]
+
+ADAPTER_ENTRY_POINT_GROUP = "argus_adapters"
+_MANIFEST_CACHE_VERSION = 1
+DEFAULT_INIT_MAX_WORKERS = 4
+DEFAULT_PRELOAD_MAX_WORKERS = 4
+PROCESS_MODES = ("in_process", "worker")
+
+_DISCOVERY_SECONDS = default_registry.histogram(
+    "argus_adapter_discovery_seconds",
+    "Adapter discovery duration in seconds.",
+    ("source",),
+)
+_GET_ADAPTER_SECONDS = default_registry.histogram(
+    "argus_adapter_get_seconds",
+    "AdapterManager.get_adapter() latency in seconds.",
+    ("app", "result"),
+)
+_INIT_SECONDS = default_registry.histogram(
+    "argus_adapter_init_seconds",
+    "Adapter initialize() duration in seconds.",
+    ("app", "adapter"),
+)
+_WARMUP_SECONDS = default_registry.histogram(
+    "argus_adapter_warmup_seconds",
+    "Adapter preload (import and initialize) duration in seconds.",
+    ("app", "result"),
+)
+_WARMUP_READY = default_registry.gauge(
+    "argus_adapter_warmup_ready",
+    "1 once a preloaded adapter is ready, 0 while pending or after a failure.",
+    ("app",),
+)
+
+
+@dataclass(frozen=True)
+class AdapterWarmupStatus:
+    """预加载的适配器的状态。"""
+
+    state: str = "pending"  # "pending"、"ready" 或 "failed"
+    seconds: Optional[float] = None  # 预热耗时，完成 (或失败) 后设置
+    error: Optional[str] = None
+
+
+def _class_path(cls: type) -> str:
+    """返回可由 importlib 在其他进程中重新导入的类路径 ('module:QualName')。"""
+    return f"{cls.__module__}:{cls.__qualname__}"
 
 
 class AdapterManager:
@@ -49,12 +124,51 @@ class AdapterManager:
     使用 Python Entry Points (`argus_adapters`) 进行发现。
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        lazy_discovery: bool = False,
+        cache_file: Optional[str] = None,
+        init_max_workers: int = DEFAULT_INIT_MAX_WORKERS,
+        pool_config: Optional[AdapterPoolConfig] = None,
+        default_process_mode: str = "in_process",
+        worker_config: Optional["AdapterWorkerConfig"] = None,
+    ):
+        """
+        :param lazy_discovery: 为 True 时仅登记适配器名称和类路径 (清单模式)，
+            适配器类在首次 get_adapter() 时才导入。
+        :param cache_file: 发现结果的磁盘缓存文件路径。为 None 时不使用缓存。
+            已安装发行包的元数据变化时缓存自动失效。
+        :param init_max_workers: 并行执行适配器 initialize() 的线程池大小。
+        :param pool_config: checkout_adapter() 使用的实例池配置 (含全局 LRU 上限)。
+        :param default_process_mode: 适配器默认运行方式，"in_process" 或 "worker"
+            (运行在受监督的子进程中)。适配器配置中的 process_mode 优先。
+        :param worker_config: worker 模式下工作进程的配置。
+        """
+        if default_process_mode not in PROCESS_MODES:
+            raise ValueError(f"Unknown adapter process mode: {default_process_mode}")
+        self._lazy_discovery = lazy_discovery
+        self._cache_file = cache_file
+        self._init_max_workers = init_max_workers
+        self._default_process_mode = default_process_mode
+        self._worker_config = worker_config
+        self._adapter_manifests: Dict[str, AdapterManifest] = {}
         self._registered_adapters: Dict[str, AdapterClassPair] = {}
         self._loaded_instances: Dict[str, AdapterPair] = {}
+        # 保护上述字典；_in_flight_loads 记录正在加载的应用 (single-flight)
+        self._lock = threading.RLock()
+        self._in_flight_loads: Dict[str, futures.Future] = {}
+        self._init_executor: Optional[futures.ThreadPoolExecutor] = None
+        # 按应用划分的实例池，按最近 checkout 顺序排列 (用于全局 LRU 淘汰)
+        self._pool_config = pool_config or AdapterPoolConfig()
+        self._pools: "OrderedDict[str, AdapterPool]" = OrderedDict()
+        self._reaper_thread: Optional[threading.Thread] = None
+        self._reaper_stop = threading.Event()
+        self._warned_no_memory_estimates = False
+        # 预加载的应用 -> 预热状态 (供就绪检查使用)
+        self._warmup: Dict[str, AdapterWarmupStatus] = {}
         self._discover_adapters()
 
-    def _discover_adapters(self) -> None:
+    def _discover_adapters(self, use_cache: bool = True) -> None:
         """
         发现系统中所有可用的适配器。
         通过查找 `argus_adapters` entry point group 实现。
@@ -63,110 +177,243 @@ class AdapterManager:
             'perception': 'my_adapter.perception:MyPerceptionAdapter',
             'action': 'my_adapter.action:MyActionAdapter'
         }
+        发现分两步: 先构建只含类路径的清单 (可命中磁盘缓存，不导入任何模块)，
+        非惰性模式下再立即解析所有适配器类。
+        :param use_cache: 为 False 时忽略已有缓存并强制重新加载 entry points。
         """
         logger.info(
             "Discovering available adapters via 'argus_adapters' entry points..."
         )
+        started = time.perf_counter()
+        source = "error"
+        self._adapter_manifests = {}
         self._registered_adapters = {}
         try:
-            entry_points = metadata.entry_points(group="argus_adapters")
-            for entry_point in entry_points:
-                adapter_name = entry_point.name
-                logger.debug(f"Processing entry point: {adapter_name}")
-                try:
-                    adapter_config_dict = entry_point.load()
-                    if not isinstance(adapter_config_dict, dict):
-                        logger.warning(
-                            f"Skipping adapter '{adapter_name}': Entry point "
-                            f"value is not a dict ({type(adapter_config_dict)})."
-                        )
-                        continue
-
-                    perception_cls_path = adapter_config_dict.get("perception")
-                    action_cls_path = adapter_config_dict.get("action")
-
-                    perception_cls: Optional[Type[PerceptionAdapterInterface]] = None
-                    action_cls: Optional[Type[ActionAdapterInterface]] = None
-
-                    if perception_cls_path:
-                        logger.debug(
-                            "Attempting to load Perception class from: %s",
-                            perception_cls_path,
-                        )
-                        perception_cls = self._load_class_from_path(
-                            perception_cls_path, PerceptionAdapterInterface
-                        )
-                        if not perception_cls:
-                            logger.warning(
-                                "Failed to load Perception class for adapter '%s' "
-                                "from '%s'.",
-                                adapter_name,
-                                perception_cls_path,
-                            )
-                            # Decide if loading should continue without perception
-
-                    if action_cls_path:
-                        logger.debug(
-                            "Attempting to load Action class from: %s", action_cls_path
-                        )
-                        action_cls = self._load_class_from_path(
-                            action_cls_path, ActionAdapterInterface
-                        )
-                        if not action_cls:
-                            logger.warning(
-                                "Failed to load Action class for adapter '%s' "
-                                "from '%s'.",
-                                adapter_name,
-                                action_cls_path,
-                            )
-                            # Decide if loading should continue without action
-
-                    # 必须至少有一个适配器类被成功加载
-                    if perception_cls or action_cls:
-                        if adapter_name in self._registered_adapters:
-                            logger.warning(
-                                "Overwriting previously registered adapter: %s",
-                                adapter_name,
-                            )
-                        self._registered_adapters[adapter_name] = (
-                            perception_cls,
-                            action_cls,
-                        )
-                        logger.info(
-                            "Successfully registered adapter: '%s' "
-                            "(Perception: %s, Action: %s)",
-                            adapter_name,
-                            bool(perception_cls),
-                            bool(action_cls),
-                        )
-                    else:
-                        logger.warning(
-                            "Failed to load any class for adapter '%s'. "
-                            "Skipping registration.",
-                            adapter_name,
-                        )
-
-                except Exception as e:
-                    logger.error(
-                        "Failed to load or register adapter '%s' due to error: %s",
-                        adapter_name,
-                        e,
-                        exc_info=True,
-                    )
-
+            entry_points = list(metadata.entry_points(group=ADAPTER_ENTRY_POINT_GROUP))
+            fingerprint = self._compute_entry_points_fingerprint(entry_points)
+            manifests = self._read_manifest_cache(fingerprint) if use_cache else None
+            source = "cache"
+            if manifests is None:
+                source = "entry_points"
+                manifests = self._load_adapter_manifests(entry_points)
+                self._write_manifest_cache(fingerprint, manifests)
+            self._adapter_manifests = manifests
         except Exception as e:
             logger.error(
                 "Error discovering adapters via entry points: %s", e, exc_info=True
             )
 
-        if not self._registered_adapters:
+        if not self._lazy_discovery:
+            for adapter_name in list(self._adapter_manifests.keys()):
+                self._resolve_adapter_classes(adapter_name)
+        _DISCOVERY_SECONDS.observe(time.perf_counter() - started, source=source)
+
+        if not self._adapter_manifests:
             logger.warning(
                 "No valid adapters discovered via 'argus_adapters' entry points."
             )
         else:
             logger.info(
                 "Adapter discovery finished. Registered adapters: %s",
-                list(self._registered_adapters.keys()),
+                list(self._adapter_manifests.keys()),
+            )
+
+    def refresh_adapters(self) -> None:
+        """忽略磁盘缓存，重新发现所有适配器 (例如在可编辑安装的插件变更后)。"""
+        with self._lock:
+            self._discover_adapters(use_cache=False)
+
+    def _load_adapter_manifests(
+        self, entry_points: List[Any]
+    ) -> Dict[str, AdapterManifest]:
+        """
+        加载每个 entry point 指向的字典，仅提取类路径，不导入适配器类本身。
+        :param entry_points: `argus_adapters` 组的 entry point 列表。
+        :return: 适配器名称到 (perception 类路径, action 类路径) 的映射。
+        """
+        manifests: Dict[str, AdapterManifest] = {}
+        for entry_point in entry_points:
+            adapter_name = entry_point.name
+            logger.debug("Processing entry point: %s", adapter_name)
+            try:
+                adapter_config_dict = entry_point.load()
+                if not isinstance(adapter_config_dict, dict):
+                    logger.warning(
+                        "Skipping adapter '%s': Entry point value is not a dict (%s).",
+                        adapter_name,
+                        type(adapter_config_dict),
+                    )
+                    continue
+
+                perception_cls_path = adapter_config_dict.get("perception")
+                action_cls_path = adapter_config_dict.get("action")
+                if not perception_cls_path and not action_cls_path:
+                    logger.warning(
+                        "Adapter '%s' declares neither a perception nor an action "
+                        "class. Skipping registration.",
+                        adapter_name,
+                    )
+                    continue
+
+                if adapter_name in manifests:
+                    logger.warning(
+                        "Overwriting previously registered adapter: %s",
+                        adapter_name,
+                    )
+                manifests[adapter_name] = (perception_cls_path, action_cls_path)
+            except Exception as e:
+                logger.error(
+                    "Failed to load or register adapter '%s' due to error: %s",
+                    adapter_name,
+                    e,
+                    exc_info=True,
+                )
+        return manifests
+
+    def _resolve_adapter_classes(self, adapter_name: str) -> AdapterClassPair:
+        """
+        根据清单中的类路径导入适配器类 (结果会被缓存)。
+        若两个类都无法加载，则从清单中移除该适配器。
+        :param adapter_name: 适配器名称。
+        :return: (Perception 类, Action 类)，加载失败时均为 None。
+        """
+        if adapter_name in self._registered_adapters:
+            return self._registered_adapters[adapter_name]
+        if adapter_name not in self._adapter_manifests:
+            return None, None
+
+        perception_cls_path, action_cls_path = self._adapter_manifests[adapter_name]
+        perception_cls: Optional[Type[PerceptionAdapterInterface]] = None
+        action_cls: Optional[Type[ActionAdapterInterface]] = None
+
+        if perception_cls_path:
+            logger.debug(
+                "Attempting to load Perception class from: %s",
+                perception_cls_path,
+            )
+            perception_cls = self._load_class_from_path(
+                perception_cls_path, PerceptionAdapterInterface
+            )
+            if not perception_cls:
+                logger.warning(
+                    "Failed to load Perception class for adapter '%s' from '%s'.",
+                    adapter_name,
+                    perception_cls_path,
+                )
+
+        if action_cls_path:
+            logger.debug("Attempting to load Action class from: %s", action_cls_path)
+            action_cls = self._load_class_from_path(
+                action_cls_path, ActionAdapterInterface
+            )
+            if not action_cls:
+                logger.warning(
+                    "Failed to load Action class for adapter '%s' from '%s'.",
+                    adapter_name,
+                    action_cls_path,
+                )
+
+        # 必须至少有一个适配器类被成功加载
+        if not perception_cls and not action_cls:
+            logger.warning(
+                "Failed to load any class for adapter '%s'. Skipping registration.",
+                adapter_name,
+            )
+            del self._adapter_manifests[adapter_name]
+            return None, None
+
+        self._registered_adapters[adapter_name] = (perception_cls, action_cls)
+        logger.info(
+            "Successfully registered adapter: '%s' (Perception: %s, Action: %s)",
+            adapter_name,
+            bool(perception_cls),
+            bool(action_cls),
+        )
+        return perception_cls, action_cls
+
+    @staticmethod
+    def _compute_entry_points_fingerprint(entry_points: List[Any]) -> str:
+        """
+        根据 entry point 及其所属发行包的名称和版本计算指纹。
+        读取这些信息只访问安装元数据，不会导入任何插件模块。
+        """
+        entries = []
+        for entry_point in entry_points:
+            dist = getattr(entry_point, "dist", None)
+            dist_name = dist_version = ""
+            if dist is not None:
+                try:
+                    dist_name = str(dist.metadata["Name"])
+                    dist_version = str(dist.version)
+                except Exception:
+                    pass
+            entries.append(
+                [
+                    str(entry_point.name),
+                    str(getattr(entry_point, "value", "")),
+                    dist_name,
+                    dist_version,
+                ]
+            )
+        entries.sort()
+        payload = json.dumps(
+            {"version": _MANIFEST_CACHE_VERSION, "entries": entries},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read_manifest_cache(
+        self, fingerprint: str
+    ) -> Optional[Dict[str, AdapterManifest]]:
+        """读取磁盘缓存，指纹不匹配或缓存损坏时返回 None。"""
+        if not self._cache_file or not os.path.exists(self._cache_file):
+            return None
+        try:
+            with open(self._cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") != fingerprint:
+                logger.debug("Adapter manifest cache is stale, rediscovering.")
+                return None
+            manifests = {
+                name: (entry.get("perception"), entry.get("action"))
+                for name, entry in cached.get("adapters", {}).items()
+            }
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(
+                "Ignoring unreadable adapter manifest cache '%s': %s",
+                self._cache_file,
+                e,
+            )
+            return None
+        logger.debug("Loaded adapter manifests from cache: %s", self._cache_file)
+        return manifests
+
+    def _write_manifest_cache(
+        self, fingerprint: str, manifests: Dict[str, AdapterManifest]
+    ) -> None:
+        """原子地写入磁盘缓存。写入失败只记录警告。"""
+        if not self._cache_file:
+            return
+        payload = {
+            "fingerprint": fingerprint,
+            "adapters": {
+                name: {"perception": perception_path, "action": action_path}
+                for name, (perception_path, action_path) in manifests.items()
+            },
+        }
+        tmp_file = f"{self._cache_file}.{os.getpid()}.tmp"
+        try:
+            cache_dir = os.path.dirname(self._cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=2, sort_keys=True)
+            os.replace(tmp_file, self._cache_file)
+        except OSError as e:
+            logger.warning(
+                "Failed to write adapter manifest cache '%s': %s",
+                self._cache_file,
+                e,
             )
 
     def _load_class_from_path(
@@ -174,12 +421,14 @@ class AdapterManager:
     ) -> Optional[Type]:
         """
         辅助函数：根据字符串路径加载类，并检查其是否实现了预期接口。
-        :param class_path: 类的路径字符串 (例如 'module.submodule:ClassName').
+        :param class_path: 类的路径字符串 (例如 'module.submodule:ClassName'，
+            也接受 'module.submodule.ClassName').
         :param expected_interface: 期望该类实现的 ABC 接口。
         :return: 加载的类，如果失败或类型不匹配则返回 None。
         """
         try:
-            module_path, class_name = class_path.rsplit(":", 1)
+            separator = ":" if ":" in class_path else "."
+            module_path, class_name = class_path.rsplit(separator, 1)
             module = importlib.import_module(module_path)
             loaded_class = getattr(module, class_name)
 
@@ -217,50 +466,111 @@ class AdapterManager:
         """
         获取指定应用程序的适配器实例。
         如果尚未加载，则尝试加载和初始化。
+        返回的是共享实例，在 unload_adapter() 之前一直保留 (不会因空闲而被回收)；
+        引擎任务和服务端 RPC 使用 pooled_adapter() 借出池实例。
+        线程安全: 同一应用的并发调用只会触发一次加载 (single-flight)，
+        其余调用者等待该次加载的结果 (或异常)。
         :param app_name: 应用程序的名称 (应与适配器注册的名称匹配)。
         :param config: 传递给适配器 initialize 方法的配置字典。
         :return: 一个包含 Perception 和 Action 适配器实例的元组 (可能为 None)。
         :raises ValueError: 如果找不到已注册的适配器。
         :raises InitializationError: 如果适配器初始化失败。
         """
-        if app_name in self._loaded_instances:
-            logger.debug("Returning cached adapter instance for '%s'.", app_name)
-            return self._loaded_instances[app_name]
+        started = time.perf_counter()
+        with self._lock:
+            if app_name in self._loaded_instances:
+                logger.debug("Returning cached adapter instance for '%s'.", app_name)
+                adapter_pair = self._loaded_instances[app_name]
+                _GET_ADAPTER_SECONDS.observe(
+                    time.perf_counter() - started, app=app_name, result="cached"
+                )
+                return adapter_pair
+            in_flight = self._in_flight_loads.get(app_name)
+            is_loader = in_flight is None
+            if is_loader:
+                in_flight = futures.Future()
+                self._in_flight_loads[app_name] = in_flight
+
+        if not is_loader:
+            logger.debug("Waiting for in-flight initialization of '%s'...", app_name)
+            with _GET_ADAPTER_SECONDS.time(app=app_name, result="waited"):
+                return in_flight.result()
+
+        try:
+            adapter_pair = self._create_adapter_pair(app_name, config)
+        except BaseException as e:
+            with self._lock:
+                self._in_flight_loads.pop(app_name, None)
+            in_flight.set_exception(e)
+            _GET_ADAPTER_SECONDS.observe(
+                time.perf_counter() - started, app=app_name, result="error"
+            )
+            raise
+
+        with self._lock:
+            # Store the pair (even if one is None)
+            self._loaded_instances[app_name] = adapter_pair
+            self._in_flight_loads.pop(app_name, None)
+        in_flight.set_result(adapter_pair)
+        _GET_ADAPTER_SECONDS.observe(
+            time.perf_counter() - started, app=app_name, result="loaded"
+        )
+        return adapter_pair
 
-        if app_name not in self._registered_adapters:
+    def _create_adapter_pair(
+        self, app_name: str, config: Optional[Dict] = None
+    ) -> AdapterPair:
+        """
+        实例化并初始化一对新的适配器实例 (不写入缓存)。
+        Perception 和 Action 的 initialize() 在线程池中并行执行。
+        :raises ValueError: 如果找不到已注册的适配器。
+        :raises InitializationError: 如果适配器初始化失败。
+        """
+        # 惰性发现模式下，适配器类在这里首次导入
+        with self._lock:
+            perception_cls, action_cls = self._resolve_adapter_classes(app_name)
+        if not perception_cls and not action_cls:
             logger.error("No registered adapter found for application: %s", app_name)
             # Consider fallback mechanisms or raising a more specific error
             raise ValueError(
                 f"Adapter for '{app_name}' not registered or failed to load."
             )
 
-        logger.info("Loading and initializing adapter for '%s'...", app_name)
-        perception_cls, action_cls = self._registered_adapters[app_name]
+        adapter_config = config or {}
+        process_mode = adapter_config.get("process_mode", self._default_process_mode)
+        if process_mode not in PROCESS_MODES:
+            raise ValueError(
+                f"Unknown process_mode '{process_mode}' for adapter '{app_name}'."
+            )
+
+        logger.info(
+            "Loading and initializing adapter for '%s' (%s)...", app_name, process_mode
+        )
         perception_instance: Optional[PerceptionAdapterInterface] = None
         action_instance: Optional[ActionAdapterInterface] = None
-        adapter_config = config or {}
 
         try:
-            # Initialize perception adapter if class exists
+            if process_mode == "worker":
+                return self._start_adapter_worker(
+                    app_name, perception_cls, action_cls, adapter_config
+                )
             if perception_cls:
                 perception_instance = perception_cls()
-                perception_config = adapter_config.get("perception", {})
-                perception_instance.initialize(perception_config)
-                logger.debug("Initialized PerceptionAdapter for %s", app_name)
             else:
                 logger.debug("No PerceptionAdapter class registered for %s", app_name)
-
-            # Initialize action adapter if class exists
             if action_cls:
                 action_instance = action_cls()
-                action_config = adapter_config.get("action", {})
-                action_instance.initialize(action_config)
-                logger.debug("Initialized ActionAdapter for %s", app_name)
             else:
                 logger.debug("No ActionAdapter class registered for %s", app_name)
 
-            # Store the pair (even if one is None)
-            self._loaded_instances[app_name] = (perception_instance, action_instance)
+            self._initialize_adapter_instances(
+                app_name,
+                [
+                    ("PerceptionAdapter", perception_instance, "perception"),
+                    ("ActionAdapter", action_instance, "action"),
+                ],
+                adapter_config,
+            )
             logger.info("Successfully loaded adapter pair for '%s'.", app_name)
             return perception_instance, action_instance
 
@@ -271,8 +581,6 @@ class AdapterManager:
                 e,
                 exc_info=True,
             )
-            if app_name in self._loaded_instances:
-                del self._loaded_instances[app_name]
             raise  # Re-raise specific InitializationError
         except Exception as e:
             logger.error(
@@ -281,25 +589,428 @@ class AdapterManager:
                 e,
                 exc_info=True,
             )
-            if app_name in self._loaded_instances:
-                del self._loaded_instances[app_name]
             # Consider raising a more generic error or returning None pair
             raise InitializationError(
                 f"Unexpected error during adapter initialization for {app_name}"
             ) from e
 
+    def _start_adapter_worker(
+        self,
+        app_name: str,
+        perception_cls: Optional[Type[PerceptionAdapterInterface]],
+        action_cls: Optional[Type[ActionAdapterInterface]],
+        adapter_config: Dict,
+    ) -> AdapterPair:
+        """
+        在受监督的子进程中实例化并初始化适配器，返回转发到该进程的代理对。
+        两个代理共享同一个工作进程；关闭任一代理都会停止该进程。
+        """
+        # 按需导入: 进程内模式不依赖生成的 protobuf 代码
+        from core.remote_adapter import (
+            AdapterWorkerProcess,
+            RemoteActionAdapter,
+            RemotePerceptionAdapter,
+        )
+
+        worker = AdapterWorkerProcess(
+            app_name,
+            _class_path(perception_cls) if perception_cls else None,
+            _class_path(action_cls) if action_cls else None,
+            adapter_config,
+            self._worker_config,
+        )
+        with _INIT_SECONDS.time(app=app_name, adapter="worker"):
+            worker.start()
+        logger.info(
+            "Successfully started adapter worker for '%s' (pid %s).",
+            app_name,
+            worker.pid,
+        )
+        return (
+            RemotePerceptionAdapter(worker) if perception_cls else None,
+            RemoteActionAdapter(worker) if action_cls else None,
+        )
+
+    def _initialize_adapter_instances(
+        self,
+        app_name: str,
+        adapters: List[Tuple[str, Any, str]],
+        adapter_config: Dict,
+    ) -> None:
+        """
+        并行调用各适配器实例的 initialize()。
+        任一初始化失败时，关闭已成功初始化的实例，并重新抛出第一个异常。
+        :param adapters: (日志名称, 实例或 None, 配置键) 列表。
+        :param adapter_config: 适配器配置，按配置键取出各自的子配置。
+        """
+        pending = [
+            (label, instance, adapter_config.get(config_key, {}))
+            for label, instance, config_key in adapters
+            if instance is not None
+        ]
+        if len(pending) <= 1:
+            # 单个实例无需线程池，直接在调用线程中初始化
+            for label, instance, instance_config in pending:
+                self._timed_initialize(app_name, label, instance, instance_config)
+                logger.debug("Initialized %s for %s", label, app_name)
+            return
+
+        executor = self._get_init_executor()
+        init_futures = [
+            (
+                label,
+                instance,
+                executor.submit(
+                    self._timed_initialize, app_name, label, instance, instance_config
+                ),
+            )
+            for label, instance, instance_config in pending
+        ]
+        first_error: Optional[BaseException] = None
+        initialized = []
+        for label, instance, init_future in init_futures:
+            try:
+                init_future.result()
+                initialized.append((label, instance))
+                logger.debug("Initialized %s for %s", label, app_name)
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+
+        if first_error is not None:
+            for label, instance in initialized:
+                self._close_adapter_instance(app_name, label, instance)
+            raise first_error
+
+    @staticmethod
+    def _timed_initialize(
+        app_name: str, label: str, instance: Any, instance_config: Dict
+    ) -> None:
+        with _INIT_SECONDS.time(app=app_name, adapter=label):
+            instance.initialize(instance_config)
+
+    def _get_init_executor(self) -> futures.ThreadPoolExecutor:
+        """返回 (按需创建) 用于并行初始化适配器的线程池。"""
+        with self._lock:
+            if self._init_executor is None:
+                self._init_executor = futures.ThreadPoolExecutor(
+                    max_workers=self._init_max_workers,
+                    thread_name_prefix="adapter-init",
+                )
+            return self._init_executor
+
+    # --- 预加载 ---
+
+    def preload_adapters(
+        self,
+        apps: Union[Iterable[str], Mapping[str, Optional[Dict]]],
+        max_workers: int = DEFAULT_PRELOAD_MAX_WORKERS,
+    ) -> futures.Future:
+        """
+        在后台线程池中并行预热 apps 的实例池 (见 prewarm_pool())，不阻塞调用方。
+        预热期间到达的 checkout 不会等待预热: 池中还没有空闲实例时按需创建。
+        单个适配器失败只记录在它的预热状态中，不影响其他适配器。
+        :param apps: 应用名称列表，或 应用名称 -> 适配器配置 的映射。
+        :param max_workers: 同时加载的适配器数。
+        :return: 所有适配器处理完成时完成的 Future，结果为 应用名称 -> 预热状态。
+        """
+        configs = dict(apps) if isinstance(apps, Mapping) else dict.fromkeys(apps)
+        all_done: futures.Future = futures.Future()
+        if not configs:
+            all_done.set_result({})
+            return all_done
+        with self._lock:
+            for app_name in configs:
+                self._warmup[app_name] = AdapterWarmupStatus()
+                _WARMUP_READY.set(0, app=app_name)
+        logger.info("Preloading %d adapters: %s", len(configs), ", ".join(configs))
+
+        started = time.perf_counter()
+        remaining = [len(configs)]
+
+        def on_done(_future: futures.Future) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+                statuses = {name: self._warmup.get(name) for name in configs}
+            failed = [name for name, s in statuses.items() if s.state != "ready"]
+            logger.info(
+                "Adapter preload finished in %.3fs (%d ready, %d failed)",
+                time.perf_counter() - started,
+                len(configs) - len(failed),
+                len(failed),
+            )
+            all_done.set_result(statuses)
+
+        executor = futures.ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(configs))),
+            thread_name_prefix="adapter-preload",
+        )
+        for app_name, config in configs.items():
+            executor.submit(self._warm_up_adapter, app_name, config).add_done_callback(
+                on_done
+            )
+        # 已提交的任务仍会执行完，线程随后退出
+        executor.shutdown(wait=False)
+        return all_done
+
+    def _warm_up_adapter(self, app_name: str, config: Optional[Dict]) -> None:
+        """加载单个预加载的适配器并记录耗时和结果。"""
+        started = time.perf_counter()
+        try:
+            self.prewarm_pool(
+                app_name, config, count=max(self._pool_config.min_size, 1)
+            )
+        except Exception as e:
+            seconds = time.perf_counter() - started
+            # _create_adapter_pair() 已记录了详细的异常信息
+            logger.warning(
+                "Failed to preload adapter '%s' after %.3fs: %s", app_name, seconds, e
+            )
+            status = AdapterWarmupStatus("failed", seconds, str(e) or type(e).__name__)
+            _WARMUP_SECONDS.observe(seconds, app=app_name, result="failed")
+        else:
+            seconds = time.perf_counter() - started
+            logger.info("Adapter '%s' warmed up in %.3fs", app_name, seconds)
+            status = AdapterWarmupStatus("ready", seconds)
+            _WARMUP_SECONDS.observe(seconds, app=app_name, result="ready")
+            _WARMUP_READY.set(1, app=app_name)
+        with self._lock:
+            self._warmup[app_name] = status
+
+    def get_warmup_status(self) -> Dict[str, AdapterWarmupStatus]:
+        """返回预加载的应用及其预热状态。"""
+        with self._lock:
+            return dict(self._warmup)
+
+    def is_ready(self) -> bool:
+        """所有预加载的适配器都已就绪时返回 True (没有预加载任何适配器时也为 True)。"""
+        with self._lock:
+            return all(status.state == "ready" for status in self._warmup.values())
+
+    # --- 实例池 (checkout/checkin) ---
+
+    def checkout_adapter(
+        self,
+        app_name: str,
+        config: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+    ) -> AdapterPair:
+        """
+        从应用的实例池中借出一对适配器实例 (与 get_adapter 的共享实例相互独立)。
+        池在首次借出时创建，之后创建的实例都使用首次传入的配置。
+        :param app_name: 应用程序的名称。
+        :param config: 传递给适配器 initialize 方法的配置字典。
+        :param timeout: 池已满时等待归还的最长秒数，None 表示一直等待。
+        :return: 借出的实例对，使用完毕后必须调用 checkin_adapter()。
+        :raises ValueError: 如果找不到已注册的适配器。
+        :raises InitializationError: 如果新实例初始化失败。
+        :raises TimeoutError: 如果超时仍没有可用实例。
+        """
+        if not self.is_adapter_registered(app_name):
+            logger.error("No registered adapter found for application: %s", app_name)
+            raise ValueError(
+                f"Adapter for '{app_name}' not registered or failed to load."
+            )
+        pool = self._get_or_create_pool(app_name, config)
+        adapter_pair = pool.checkout(timeout=timeout)
+        self._enforce_pool_limits()
+        return adapter_pair
+
+    def prewarm_pool(
+        self, app_name: str, config: Optional[Dict] = None, count: Optional[int] = None
+    ) -> int:
+        """
+        在应用的实例池中创建空闲实例，直到实例数达到 count，之后的 checkout 直接借出。
+        :param app_name: 应用程序的名称。
+        :param config: 传递给适配器 initialize 方法的配置字典 (池已存在时忽略)。
+        :param count: 目标实例数，None 表示池配置的 min_size。
+        :return: 新创建的实例对数量。
+        :raises ValueError: 如果找不到已注册的适配器。
+        :raises InitializationError: 如果新实例初始化失败。
+        """
+        if not self.is_adapter_registered(app_name):
+            logger.error("No registered adapter found for application: %s", app_name)
+            raise ValueError(
+                f"Adapter for '{app_name}' not registered or failed to load."
+            )
+        created = self._get_or_create_pool(app_name, config).prewarm(count)
+        self._enforce_pool_limits()
+        return created
+
+    def checkin_adapter(
+        self, app_name: str, adapter_pair: AdapterPair, discard: bool = False
+    ) -> None:
+        """
+        归还借出的实例对。
+        :param app_name: 应用程序的名称。
+        :param adapter_pair: checkout_adapter() 返回的实例对。
+        :param discard: 为 True 时关闭该实例而不是放回池中 (例如实例已损坏)。
+        """
+        with self._lock:
+            pool = self._pools.get(app_name)
+        if pool is None:
+            # 池已被卸载，直接关闭归还的实例
+            self._close_adapter_pair(app_name, adapter_pair)
+            return
+        if discard:
+            pool.discard(adapter_pair)
+        else:
+            pool.checkin(adapter_pair)
+        self._enforce_pool_limits()
+
+    @contextmanager
+    def pooled_adapter(
+        self,
+        app_name: str,
+        config: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[AdapterPair]:
+        """checkout_adapter()/checkin_adapter() 的上下文管理器形式。"""
+        adapter_pair = self.checkout_adapter(app_name, config=config, timeout=timeout)
+        try:
+            yield adapter_pair
+        finally:
+            self.checkin_adapter(app_name, adapter_pair)
+
+    def evict_idle_adapters(self) -> int:
+        """
+        关闭所有池中空闲超时的实例，并执行全局 LRU 上限检查。
+        :return: 被关闭的实例对数量。
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+        now = time.monotonic()
+        evicted = sum(pool.evict_idle(now) for pool in pools)
+        return evicted + self._enforce_pool_limits()
+
+    def get_pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """返回各应用实例池的统计信息。"""
+        with self._lock:
+            pools = list(self._pools.items())
+        return {app_name: pool.stats() for app_name, pool in pools}
+
+    def _get_or_create_pool(self, app_name: str, config: Optional[Dict]) -> AdapterPool:
+        """返回应用的实例池 (按需创建)，并将其标记为最近使用。"""
+        with self._lock:
+            pool = self._pools.get(app_name)
+            if pool is None:
+                pool_config = dict(config or {})
+                config_for_pool = self._pool_config
+                if pool_config.get("memory_estimate_bytes") is not None:
+                    # 应用配置的单实例内存估算优先于全局默认值
+                    config_for_pool = replace(
+                        config_for_pool,
+                        instance_memory_bytes=pool_config["memory_estimate_bytes"],
+                    )
+                pool = AdapterPool(
+                    app_name,
+                    factory=lambda: self._create_adapter_pair(app_name, pool_config),
+                    closer=lambda pair: self._close_adapter_pair(app_name, pair),
+                    config=config_for_pool,
+                )
+                self._pools[app_name] = pool
+                self._start_pool_reaper()
+            self._pools.move_to_end(app_name)
+            return pool
+
+    def _enforce_pool_limits(self) -> int:
+        """
+        全局 LRU: 超出实例数或内存上限时，从最久未使用的应用开始关闭空闲实例。
+        已借出的实例不会被淘汰，因此上限是软上限。
+        :return: 被关闭的实例对数量。
+        """
+        max_instances = self._pool_config.max_total_instances
+        max_memory = self._pool_config.max_total_memory_bytes
+        if max_instances is None and max_memory is None:
+            return 0
+
+        evicted = 0
+        while True:
+            with self._lock:
+                pools = list(self._pools.values())  # LRU 在前
+            total_instances = sum(pool.size for pool in pools)
+            total_memory = sum(pool.memory_bytes for pool in pools)
+            if (
+                max_memory is not None
+                and total_memory == 0
+                and total_instances > 0
+                and not self._warned_no_memory_estimates
+            ):
+                self._warned_no_memory_estimates = True
+                logger.warning(
+                    "max_total_memory_bytes is set but no pooled adapter reports its "
+                    "memory usage; the memory limit has no effect. Implement "
+                    "memory_usage_bytes(), use worker mode, or configure "
+                    "instance_memory_bytes / memory_estimate_bytes."
+                )
+            over_count = max_instances is not None and total_instances > max_instances
+            over_memory = max_memory is not None and total_memory > max_memory
+            if not over_count and not over_memory:
+                return evicted
+            if not any(pool.evict_oldest_idle() for pool in pools):
+                logger.debug(
+                    "Adapter pool limits exceeded but no idle instance to evict "
+                    "(instances=%d, memory=%d).",
+                    total_instances,
+                    total_memory,
+                )
+                return evicted
+            evicted += 1
+
+    def _start_pool_reaper(self) -> None:
+        """启动后台空闲回收线程 (仅在配置了 idle_timeout 时)。调用方需持有锁。"""
+        if self._pool_config.idle_timeout is None:
+            return
+        if self._reaper_thread is not None and self._reaper_thread.is_alive():
+            return
+        self._reaper_stop.clear()
+        self._reaper_thread = threading.Thread(
+            target=self._run_pool_reaper, name="adapter-pool-reaper", daemon=True
+        )
+        self._reaper_thread.start()
+
+    def _run_pool_reaper(self) -> None:
+        """后台线程: 定期淘汰空闲超时的池实例。"""
+        while not self._reaper_stop.wait(self._pool_config.reaper_interval):
+            try:
+                self.evict_idle_adapters()
+            except Exception as e:
+                logger.error("Adapter pool reaper failed: %s", e, exc_info=True)
+
+    def _close_adapter_pair(self, app_name: str, adapter_pair: AdapterPair) -> None:
+        """关闭一对适配器实例 (Perception 和 Action)。"""
+        perception_instance, action_instance = adapter_pair
+        self._close_adapter_instance(app_name, "PerceptionAdapter", perception_instance)
+        self._close_adapter_instance(app_name, "ActionAdapter", action_instance)
+
     def list_available_adapters(self) -> list[str]:
-        """返回所有已发现并成功注册的适配器名称列表。"""
-        return list(self._registered_adapters.keys())
+        """
+        返回所有已发现并成功注册的适配器名称列表。
+        惰性模式下只读取清单，不会导入适配器类。
+        """
+        return list(self._adapter_manifests.keys())
 
     def unload_adapter(self, app_name: str) -> None:
         """
-        卸载指定应用程序的适配器实例。
-        会调用适配器的 close 方法（如果存在）。
+        卸载指定应用程序的适配器实例 (共享实例和实例池)。
+        会调用适配器的 close 方法（如果存在）；已借出的池实例在归还时关闭。
         :param app_name: 要卸载的适配器名称。
         :raises ValueError: 如果适配器未加载。
         """
-        if app_name not in self._loaded_instances:
+        with self._lock:
+            adapter_pair = self._loaded_instances.pop(app_name, None)
+            pool = self._pools.pop(app_name, None)
+            # 卸载后不再计入就绪检查
+            if self._warmup.pop(app_name, None) is not None:
+                _WARMUP_READY.set(0, app=app_name)
+        if pool is not None:
+            logger.info("Closing adapter pool for '%s'...", app_name)
+            pool.close()
+        if adapter_pair is None:
+            if pool is not None:
+                return
             logger.warning(
                 "Attempted to unload adapter '%s', but it was not loaded.", app_name
             )
@@ -307,58 +1018,69 @@ class AdapterManager:
             # Or raise ValueError(f"Adapter '{app_name}' is not currently loaded.")
 
         logger.info("Unloading adapter for '%s'...", app_name)
-        perception_instance, action_instance = self._loaded_instances.pop(app_name)
+        self._close_adapter_pair(app_name, adapter_pair)
 
-        try:
-            if perception_instance and hasattr(perception_instance, "close"):
-                logger.debug("Closing PerceptionAdapter for %s...", app_name)
-                perception_instance.close()
-        except Exception as e:
-            logger.error(
-                "Error closing PerceptionAdapter for '%s': %s",
-                app_name,
-                e,
-                exc_info=True,
-            )
+        logger.info("Successfully unloaded adapter for '%s'.", app_name)
 
+    @staticmethod
+    def _close_adapter_instance(app_name: str, label: str, instance: Any) -> None:
+        """调用单个适配器实例的 close 方法 (如果存在)，异常只记录日志。"""
         try:
-            if action_instance and hasattr(action_instance, "close"):
-                logger.debug("Closing ActionAdapter for %s...", app_name)
-                action_instance.close()
+            if instance and hasattr(instance, "close"):
+                logger.debug("Closing %s for %s...", label, app_name)
+                instance.close()
         except Exception as e:
             logger.error(
-                "Error closing ActionAdapter for '%s': %s",
+                "Error closing %s for '%s': %s",
+                label,
                 app_name,
                 e,
                 exc_info=True,
             )
 
-        logger.info("Successfully unloaded adapter for '%s'.", app_name)
-
     def unload_all_adapters(self) -> None:
-        """卸载所有当前加载的适配器实例。"""
+        """卸载所有当前加载的适配器实例和实例池，并关闭初始化线程池。"""
         logger.info("Unloading all loaded adapters...")
         # Create a copy of keys to avoid RuntimeError during iteration
-        loaded_adapter_names = list(self._loaded_instances.keys())
+        with self._lock:
+            loaded_adapter_names = list(self._loaded_instances.keys())
         for app_name in loaded_adapter_names:
             self.unload_adapter(app_name)
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            self._reaper_stop.set()
+            self._warmup.clear()
+            init_executor, self._init_executor = self._init_executor, None
+        for pool in pools:
+            pool.close()
+        if init_executor is not None:
+            init_executor.shutdown(wait=False)
         logger.info("Finished unloading all adapters.")
 
     def get_loaded_adapters(self) -> Dict[str, AdapterPair]:
         """返回当前加载的适配器实例字典。"""
-        return self._loaded_instances.copy()
+        with self._lock:
+            return self._loaded_instances.copy()
 
     def get_registered_adapters(self) -> Dict[str, AdapterClassPair]:
-        """返回已注册的适配器类字典。"""
+        """
+        返回已注册的适配器类字典。
+        惰性模式下只包含已经解析 (导入) 过的适配器。
+        """
         return self._registered_adapters.copy()
 
+    def get_adapter_manifests(self) -> Dict[str, AdapterManifest]:
+        """返回已发现适配器的类路径清单 (不导入任何类)。"""
+        return self._adapter_manifests.copy()
+
     def is_adapter_loaded(self, app_name: str) -> bool:
         """检查指定名称的适配器当前是否已加载。"""
         return app_name in self._loaded_instances
 
     def is_adapter_registered(self, app_name: str) -> bool:
         """检查指定名称的适配器是否已被发现和注册。"""
-        return app_name in self._registered_adapters
+        return app_name in self._adapter_manifests
 
     # Potential enhancements:
     # - Add configuration validation logic (e.g., using Pydantic)
@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 与 core.adapter_manager.AdapterPair 相同: (Perception 实例, Action 实例)
+PooledPair = Tuple[Optional[Any], Optional[Any]]
+
+
+@dataclass
+class AdapterPoolConfig:
+    """适配器实例池配置。"""
+
+    # 预热 (prewarm) 时创建、空闲淘汰时至少保留的实例数；未预热的池按需创建实例
+    min_size: int = 0
+    max_size: int = 4  # 单个应用的最大实例数 (含已借出)
+    idle_timeout: Optional[float] = 300.0  # 空闲超过该秒数的实例会被关闭
+    # 全局 LRU 上限 (跨所有应用)，None 表示不限制
+    max_total_instances: Optional[int] = None
+    max_total_memory_bytes: Optional[int] = None
+    # 适配器未报告内存 (memory_usage_bytes() 缺失或为 0) 时每对实例的内存估算，
+    # 可被适配器配置中的 memory_estimate_bytes 覆盖；None 表示按 0 计
+    instance_memory_bytes: Optional[int] = None
+    reaper_interval: float = 30.0  # 后台空闲回收的检查间隔 (秒)
+
+
+def estimate_pair_memory(adapter_pair: PooledPair, default: int = 0) -> int:
+    """
+    估算一对适配器实例占用的内存 (字节)。
+    适配器可以实现可选的 memory_usage_bytes() 方法；绑定到同一对象的方法 (例如
+    共享同一工作进程的 Remote 代理) 只计一次。
+    :param default: 两个实例都没有报告内存时返回的估算值。
+    """
+    total = 0
+    counted = set()
+    for instance in adapter_pair:
+        memory_usage = getattr(instance, "memory_usage_bytes", None)
+        if callable(memory_usage):
+            owner = id(getattr(memory_usage, "__self__", memory_usage))
+            if owner in counted:
+                continue
+            counted.add(owner)
+            try:
+                total += int(memory_usage())
+            except Exception as e:
+                logger.debug("memory_usage_bytes() failed for %r: %s", instance, e)
+    return total or default
+
+
+class AdapterPool:
+    """
+    单个应用的有界适配器实例池，提供 checkout/checkin 语义。
+    空闲实例按 LIFO 借出 (保持最近使用的实例温热)，从最旧的一端淘汰。
+    """
+
+    def __init__(
+        self,
+        app_name: str,
+        factory: Callable[[], PooledPair],
+        closer: Callable[[PooledPair], None],
+        config: Optional[AdapterPoolConfig] = None,
+    ):
+        """
+        :param app_name: 应用名称 (仅用于日志)。
+        :param factory: 创建并初始化一对新实例的函数。
+        :param closer: 关闭一对实例的函数。
+        :param config: 池配置。
+        """
+        self.app_name = app_name
+        self._factory = factory
+        self._closer = closer
+        self.config = config or AdapterPoolConfig()
+        self._condition = threading.Condition()
+        # (实例对, 归还时间, 内存估算)
+        self._idle: Deque[Tuple[PooledPair, float, int]] = deque()
+        self._in_use: Dict[int, int] = {}  # id(实例对) -> 内存估算
+        self._creating = 0
+        self._closed = False
+        self.last_used = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        """池中实例总数 (空闲 + 已借出 + 创建中)。"""
+        with self._condition:
+            return len(self._idle) + len(self._in_use) + self._creating
+
+    @property
+    def memory_bytes(self) -> int:
+        """池中所有实例的内存估算之和。"""
+        with self._condition:
+            idle_memory = sum(memory for _, _, memory in self._idle)
+            return idle_memory + sum(self._in_use.values())
+
+    def _estimate_memory(self, adapter_pair: PooledPair) -> int:
+        return estimate_pair_memory(
+            adapter_pair, default=self.config.instance_memory_bytes or 0
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """返回池的当前统计信息。"""
+        with self._condition:
+            return {
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "creating": self._creating,
+                "max_size": self.config.max_size,
+            }
+
+    def checkout(self, timeout: Optional[float] = None) -> PooledPair:
+        """
+        借出一对实例: 优先复用空闲实例，未达上限时创建新实例，否则等待归还。
+        :param timeout: 等待可用实例的最长秒数，None 表示一直等待。
+        :return: 借出的实例对，使用完毕后必须调用 checkin() 或 discard()。
+        :raises TimeoutError: 超时仍没有可用实例。
+        :raises RuntimeError: 池已关闭。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError(f"Adapter pool for '{self.app_name}' is closed.")
+                self.last_used = time.monotonic()
+                if self._idle:
+                    adapter_pair, _, memory = self._idle.pop()
+                    self._in_use[id(adapter_pair)] = memory
+                    return adapter_pair
+                total = len(self._in_use) + self._creating
+                if total < self.config.max_size:
+                    self._creating += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(
+                        f"Timed out waiting for an adapter instance of "
+                        f"'{self.app_name}' (max_size={self.config.max_size})."
+                    )
+                self._condition.wait(remaining)
+
+        # 在锁外创建实例，初始化可能耗时数百毫秒
+        logger.debug("Creating new pooled adapter instance for '%s'.", self.app_name)
+        try:
+            adapter_pair = self._factory()
+        except BaseException:
+            with self._condition:
+                self._creating -= 1
+                self._condition.notify()
+            raise
+        memory = self._estimate_memory(adapter_pair)
+        with self._condition:
+            self._creating -= 1
+            self._in_use[id(adapter_pair)] = memory
+        return adapter_pair
+
+    def prewarm(self, count: Optional[int] = None) -> int:
+        """
+        创建空闲实例，直到池中实例数达到 count (不超过 max_size)。
+        :param count: 目标实例数，None 表示 config.min_size。
+        :return: 新创建的实例对数量。
+        :raises Exception: 创建实例失败时抛出工厂函数的异常 (已创建的实例保留在池中)。
+        """
+        target = min(
+            self.config.min_size if count is None else count, self.config.max_size
+        )
+        created = 0
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError(f"Adapter pool for '{self.app_name}' is closed.")
+                if len(self._idle) + len(self._in_use) + self._creating >= target:
+                    return created
+                self._creating += 1
+            try:
+                adapter_pair = self._factory()
+            except BaseException:
+                with self._condition:
+                    self._creating -= 1
+                    self._condition.notify()
+                raise
+            memory = self._estimate_memory(adapter_pair)
+            with self._condition:
+                self._creating -= 1
+                self._idle.append((adapter_pair, time.monotonic(), memory))
+                self._condition.notify()
+            created += 1
+
+    def checkin(self, adapter_pair: PooledPair) -> None:
+        """
+        归还借出的实例对。池已关闭时直接关闭该实例。
+        :raises ValueError: 实例对不是从本池借出的。
+        """
+        with self._condition:
+            memory = self._in_use.pop(id(adapter_pair), None)
+            if memory is None:
+                raise ValueError(
+                    f"Adapter instance was not checked out from pool '{self.app_name}'."
+                )
+            closed = self._closed
+            if not closed:
+                now = time.monotonic()
+                self._idle.append((adapter_pair, now, memory))
+                self.last_used = now
+                self._condition.notify()
+        if closed:
+            self._closer(adapter_pair)
+
+    def discard(self, adapter_pair: PooledPair) -> None:
+        """丢弃一对已损坏的借出实例: 关闭它并释放其名额。"""
+        with self._condition:
+            if self._in_use.pop(id(adapter_pair), None) is None:
+                raise ValueError(
+                    f"Adapter instance was not checked out from pool '{self.app_name}'."
+                )
+            self._condition.notify()
+        self._closer(adapter_pair)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        关闭空闲超时的实例，但保留至少 min_size 个实例。
+        :return: 被关闭的实例对数量。
+        """
+        idle_timeout = self.config.idle_timeout
+        if idle_timeout is None:
+            return 0
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._condition:
+            while self._idle:
+                total = len(self._idle) + len(self._in_use) + self._creating
+                adapter_pair, idle_since, _ = self._idle[0]
+                if total <= self.config.min_size or now - idle_since < idle_timeout:
+                    break
+                self._idle.popleft()
+                evicted.append(adapter_pair)
+        for adapter_pair in evicted:
+            self._closer(adapter_pair)
+        if evicted:
+            logger.info(
+                "Evicted %d idle adapter instance(s) of '%s'.",
+                len(evicted),
+                self.app_name,
+            )
+        return len(evicted)
+
+    def evict_oldest_idle(self) -> bool:
+        """关闭最久未使用的一个空闲实例 (用于全局 LRU 淘汰)，无空闲实例时返回 False。"""
+        with self._condition:
+            if not self._idle:
+                return False
+            adapter_pair, _, _ = self._idle.popleft()
+        self._closer(adapter_pair)
+        return True
+
+    def close(self) -> None:
+        """关闭池: 立即关闭所有空闲实例，已借出的实例在归还时关闭。"""
+        with self._condition:
+            self._closed = True
+            idle_pairs = [adapter_pair for adapter_pair, _, _ in self._idle]
+            self._idle.clear()
+            self._condition.notify_all()
+        for adapter_pair in idle_pairs:
+            self._closer(adapter_pair)
@@ -0,0 +1,186 @@
+"""
+适配器工作进程: 在独立进程中托管一个应用的适配器实例，通过 Unix socket 提供
+PerceptionService / ActionService / AdapterControlService。
+由 core.remote_adapter.AdapterWorkerProcess 启动和监督，不应直接运行。
+
+用法:
+    python -m core.adapter_worker --app NAME --socket PATH \
+        [--perception module:Class] [--action module:Class]
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent import futures
+from typing import Any, Optional
+
+import grpc
+
+from config import settings
+from core import grpc_server
+from utils.proto_utils import proto_struct_to_python_dict
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+    import generated_protobuf.core_services_pb2_grpc as pb2_grpc
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+# 父进程退出后工作进程自行结束的检查间隔 (秒)
+_ORPHAN_CHECK_INTERVAL = 1.0
+
+
+def load_class(class_path: str) -> type:
+    """按 'module.submodule:ClassName' (或 'module.submodule.ClassName') 导入类。"""
+    separator = ":" if ":" in class_path else "."
+    module_path, class_name = class_path.rsplit(separator, 1)
+    return getattr(importlib.import_module(module_path), class_name)
+
+
+class WorkerControlServiceImpl(grpc_server.AdapterControlServiceImpl):
+    """
+    工作进程的 AdapterControlService: Initialize 创建并初始化本进程托管的适配器实例，
+    并将其设为 PerceptionService / ActionService 使用的适配器。
+    Shutdown 沿用服务端实现 (停止 grpc_server.server_instance)。
+    """
+
+    def __init__(
+        self,
+        app_name: str,
+        perception_class_path: Optional[str],
+        action_class_path: Optional[str],
+    ):
+        self.app_name = app_name
+        self.perception_class_path = perception_class_path
+        self.action_class_path = action_class_path
+        self.perception_instance: Optional[Any] = None
+        self.action_instance: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    def Initialize(
+        self, request: pb2.InitializeRequest, context
+    ) -> pb2.InitializeResponse:
+        logger.info("Worker '%s': Initialize received", self.app_name)
+        config = proto_struct_to_python_dict(request.config)
+        with self._lock:
+            try:
+                self.close_adapters()
+                if self.perception_class_path:
+                    instance = load_class(self.perception_class_path)()
+                    instance.initialize(config.get("perception", {}))
+                    self.perception_instance = instance
+                if self.action_class_path:
+                    instance = load_class(self.action_class_path)()
+                    instance.initialize(config.get("action", {}))
+                    self.action_instance = instance
+            except Exception as e:
+                logger.error(
+                    "Worker '%s' failed to initialize adapters: %s",
+                    self.app_name,
+                    e,
+                    exc_info=True,
+                )
+                self.close_adapters()
+                return pb2.InitializeResponse(
+                    success=False, message=f"{type(e).__name__}: {e}"
+                )
+            grpc_server.global_mock_perception_adapter = self.perception_instance
+            grpc_server.global_mock_action_adapter = self.action_instance
+        return pb2.InitializeResponse(success=True, message="Initialized")
+
+    def close_adapters(self) -> None:
+        for instance in (self.perception_instance, self.action_instance):
+            if instance is None:
+                continue
+            try:
+                instance.close()
+            except Exception as e:
+                logger.error(
+                    "Worker '%s' failed to close adapter: %s", self.app_name, e
+                )
+        self.perception_instance = None
+        self.action_instance = None
+
+
+def _stop_when_orphaned(server: grpc.Server, parent_pid: int) -> None:
+    # 父进程 (服务端) 退出后父 PID 会改变，此时工作进程也应结束
+    while os.getppid() == parent_pid:
+        time.sleep(_ORPHAN_CHECK_INTERVAL)
+    logger.warning("Adapter worker parent exited; stopping worker.")
+    server.stop(0)
+
+
+def serve_worker(
+    app_name: str,
+    socket_path: str,
+    perception_class_path: Optional[str],
+    action_class_path: Optional[str],
+    workers: int,
+) -> None:
+    """在 Unix socket 上提供适配器服务，阻塞直到 Shutdown 或父进程退出。"""
+    control = WorkerControlServiceImpl(
+        app_name, perception_class_path, action_class_path
+    )
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=workers),
+        options=[
+            ("grpc.max_send_message_length", settings.GRPC_MAX_MESSAGE_LENGTH),
+            ("grpc.max_receive_message_length", settings.GRPC_MAX_MESSAGE_LENGTH),
+        ],
+    )
+    pb2_grpc.add_PerceptionServiceServicer_to_server(
+        grpc_server.PerceptionServiceImpl(), server
+    )
+    pb2_grpc.add_ActionServiceServicer_to_server(
+        grpc_server.ActionServiceImpl(), server
+    )
+    pb2_grpc.add_AdapterControlServiceServicer_to_server(control, server)
+    server.add_insecure_port(f"unix:{socket_path}")
+    # Shutdown RPC 通过该全局变量停止服务器
+    grpc_server.server_instance = server
+    server.start()
+    logger.info("Adapter worker for '%s' listening on %s", app_name, socket_path)
+    threading.Thread(
+        target=_stop_when_orphaned, args=(server, os.getppid()), daemon=True
+    ).start()
+    try:
+        server.wait_for_termination()
+    finally:
+        control.close_adapters()
+        grpc_server.blob_store.close()
+        logger.info("Adapter worker for '%s' stopped", app_name)
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Argus adapter worker process.")
+    parser.add_argument("--app", required=True, help="Application name.")
+    parser.add_argument("--socket", required=True, help="Unix socket path.")
+    parser.add_argument("--perception", help="Perception adapter class path.")
+    parser.add_argument("--action", help="Action adapter class path.")
+    parser.add_argument("--workers", type=int, default=4, help="RPC threads.")
+    args = parser.parse_args(argv)
+
+    # 日志写到 stderr (由父进程继承)，避免多个进程写同一个滚动日志文件
+    logging.basicConfig(
+        level=settings.LOG_LEVEL,
+        format=f"%(asctime)s - worker[{args.app}] - %(name)s - "
+        "%(levelname)s - %(message)s",
+    )
+    serve_worker(args.app, args.socket, args.perception, args.action, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import functools
+import logging
+import mmap
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+# Linux 上的 tmpfs，blob 文件只占用内存，映射时不经过磁盘
+_SHARED_MEMORY_DIR = "/dev/shm"
+
+
+@functools.lru_cache(maxsize=None)
+def get_host_id() -> str:
+    """
+    返回当前主机的标识 (主机名 + 本次启动的 boot_id)。
+    客户端与服务端标识相同时，才可以直接映射服务端的 blob 文件。
+    """
+    host_id = socket.gethostname()
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            host_id = f"{host_id}:{f.read().strip()}"
+    except OSError:
+        pass
+    return host_id
+
+
+def open_blob(handle: pb2.BlobHandle) -> memoryview:
+    """
+    以只读方式映射同一主机上的 blob，返回的 memoryview 直接引用共享内存 (不复制)。
+    映射建立后即使服务端淘汰了该 blob，已映射的数据仍然有效。
+    :raises ValueError: blob 来自其他主机，或文件大小与句柄不符。
+    :raises FileNotFoundError: blob 已被服务端淘汰。
+    """
+    if handle.host_id != get_host_id():
+        raise ValueError(
+            f"Blob {handle.blob_id} belongs to host {handle.host_id!r} "
+            "and cannot be mapped locally."
+        )
+    if handle.size == 0:
+        return memoryview(b"")
+    with open(handle.path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapped) != handle.size:
+        mapped.close()
+        raise ValueError(
+            f"Blob {handle.blob_id} has {len(mapped)} bytes, expected {handle.size}."
+        )
+    return memoryview(mapped)
+
+
+class BlobStoreFullError(RuntimeError):
+    """blob 存储中被引用或仍在租期内的 blob 已占满容量，无法写入新的 blob。"""
+
+
+class _BlobEntry:
+    __slots__ = ("path", "size", "refcount", "lease_until")
+
+    def __init__(self, path: str, size: int, lease_until: float):
+        self.path = path
+        self.size = size
+        self.refcount = 0
+        self.lease_until = lease_until
+
+
+class BlobStore:
+    """
+    服务端本地 blob 存储: 每个 blob 是共享内存目录 (/dev/shm，不存在时为临时目录)
+    中的一个文件，同一主机上的客户端通过 BlobHandle 直接映射。
+    每次交出句柄 (put / renew) 都给 blob 一个 ttl 秒的租期，客户端在租期内映射文件。
+    被引用 (refcount > 0，例如仍在快照缓存中) 或仍在租期内的 blob 不会被淘汰，
+    容量不足时 put() 抛出 BlobStoreFullError，而不是淘汰已交出的 blob。
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, directory: Optional[str] = None):
+        """
+        :param max_bytes: blob 总字节数上限。
+        :param ttl: 句柄的租期 (秒)，也是未被引用的 blob 自最后一次交出起的保留时间。
+        :param directory: blob 文件所在的父目录，None 表示自动选择。
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.host_id = get_host_id()
+        self._parent_directory = directory
+        self._directory: Optional[str] = None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _BlobEntry] = {}
+        self._total_bytes = 0
+        self._evictions = 0
+        self._rejections = 0
+
+    def _ensure_directory(self) -> str:
+        # 第一次写入时才创建目录，未使用 blob 的进程不会留下空目录
+        if self._directory is None:
+            parent = self._parent_directory
+            if parent is None and os.path.isdir(_SHARED_MEMORY_DIR):
+                parent = _SHARED_MEMORY_DIR
+            self._directory = tempfile.mkdtemp(prefix="argus-blobs-", dir=parent)
+            logger.info("Blob store directory: %s", self._directory)
+        return self._directory
+
+    def put(self, data: bytes, pin: bool = False) -> pb2.BlobHandle:
+        """
+        写入一个 blob，租期从现在开始。写入前淘汰未被引用且租期已过的 blob。
+        :param pin: 为 True 时 blob 创建时即被引用 (refcount 为 1)，由调用方 release()。
+        :return: 指向该 blob 的句柄。
+        :raises BlobStoreFullError: 淘汰之后剩余容量仍不足。
+        """
+        blob_id = uuid.uuid4().hex
+        size = len(data)
+        with self._lock:
+            self._evict_locked()
+            if self._total_bytes + size > self.max_bytes:
+                self._rejections += 1
+                raise BlobStoreFullError(
+                    f"Blob store is full ({self._total_bytes} of {self.max_bytes} "
+                    f"bytes referenced or leased), cannot store {size} bytes."
+                )
+            # 先占用容量，避免并发写入共同超出上限
+            entry = _BlobEntry("", size, time.monotonic() + self.ttl)
+            entry.refcount = 1
+            self._entries[blob_id] = entry
+            self._total_bytes += size
+            directory = self._ensure_directory()
+        path = os.path.join(directory, blob_id)
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+        except BaseException:
+            with self._lock:
+                self._remove_locked(blob_id)
+            raise
+        with self._lock:
+            entry.path = path
+            entry.lease_until = time.monotonic() + self.ttl
+            if not pin:
+                entry.refcount -= 1
+        return pb2.BlobHandle(
+            blob_id=blob_id, size=size, host_id=self.host_id, path=path
+        )
+
+    def renew(self, blob_id: str) -> bool:
+        """再次交出句柄时续租 ttl 秒。blob 已不存在时返回 False。"""
+        with self._lock:
+            entry = self._entries.get(blob_id)
+            if entry is None:
+                return False
+            entry.lease_until = max(entry.lease_until, time.monotonic() + self.ttl)
+            return True
+
+    def acquire(self, blob_id: str) -> bool:
+        """增加引用计数，被引用的 blob 不会被淘汰。blob 已不存在时返回 False。"""
+        with self._lock:
+            entry = self._entries.get(blob_id)
+            if entry is None:
+                return False
+            entry.refcount += 1
+            return True
+
+    def release(self, blob_id: str) -> None:
+        """减少引用计数。引用归零后 blob 在租期结束时淘汰 (已交出的句柄仍然有效)。"""
+        with self._lock:
+            entry = self._entries.get(blob_id)
+            if entry is None or entry.refcount == 0:
+                logger.warning("Release of unreferenced blob %s ignored", blob_id)
+                return
+            entry.refcount -= 1
+
+    def read(self, blob_id: str) -> bytes:
+        """
+        读取 blob 内容 (复制)，用于向其他主机上的客户端内联发送。
+        :raises KeyError: blob 不存在或已被淘汰。
+        """
+        with self._lock:
+            entry = self._entries.get(blob_id)
+            if entry is None or not entry.path:
+                raise KeyError(blob_id)
+            path = entry.path
+        with open(path, "rb") as f:
+            return f.read()
+
+    def evict(self) -> int:
+        """立即淘汰未被引用且租期已过的 blob，返回淘汰数量。"""
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        now = time.monotonic()
+        expired = [
+            blob_id
+            for blob_id, entry in self._entries.items()
+            if not entry.refcount and now >= entry.lease_until
+        ]
+        for blob_id in expired:
+            self._remove_locked(blob_id)
+        self._evictions += len(expired)
+        return len(expired)
+
+    def _remove_locked(self, blob_id: str) -> None:
+        entry = self._entries.pop(blob_id)
+        self._total_bytes -= entry.size
+        if not entry.path:
+            return
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Failed to remove blob file %s: %s", entry.path, e)
+
+    def close(self) -> None:
+        """删除所有 blob 及其目录。"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            directory, self._directory = self._directory, None
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回当前 blob 数量、总字节数、累计淘汰次数和因容量不足拒绝的写入次数。"""
+        with self._lock:
+            return {
+                "blobs": len(self._entries),
+                "bytes": self._total_bytes,
+                "evictions": self._evictions,
+                "rejections": self._rejections,
+            }
+
+
+def has_offloadable_blobs(snapshot: pb2.UISnapshot, min_bytes: int) -> bool:
+    """快照中是否有不小于 min_bytes、应该放入 blob 存储的 accessibility_tree_raw。"""
+    return (
+        snapshot.HasField("accessibility_tree_raw")
+        and len(snapshot.accessibility_tree_raw) >= min_bytes
+    )
+
+
+def offload_snapshot_blobs(
+    snapshot: pb2.UISnapshot, store: BlobStore, min_bytes: int, pin: bool = False
+) -> None:
+    """
+    把快照中不小于 min_bytes 的 accessibility_tree_raw 移入 blob 存储 (原地修改)。
+    :param pin: 为 True 时 blob 保持被引用，直到调用 release_snapshot_blobs()。
+    :raises BlobStoreFullError: blob 存储容量不足，此时快照不被修改。
+    """
+    if has_offloadable_blobs(snapshot, min_bytes):
+        snapshot.accessibility_tree_blob.CopyFrom(
+            store.put(snapshot.accessibility_tree_raw, pin=pin)
+        )
+        snapshot.ClearField("accessibility_tree_raw")
+
+
+def release_snapshot_blobs(snapshot: pb2.UISnapshot, store: BlobStore) -> None:
+    """释放 offload_snapshot_blobs(pin=True) 对快照 blob 的引用。"""
+    if snapshot.HasField("accessibility_tree_blob"):
+        store.release(snapshot.accessibility_tree_blob.blob_id)
+
+
+def inline_snapshot_blobs(snapshot: pb2.UISnapshot, store: BlobStore) -> pb2.UISnapshot:
+    """
+    为无法映射 blob 的客户端 (其他主机) 把 blob 内容写回 accessibility_tree_raw。
+    快照不引用 blob 时原样返回，否则返回修改后的副本 (不修改可能被缓存的原快照)。
+    :raises KeyError: blob 已被淘汰 (不会返回缺少原始树的快照)。
+    """
+    if not snapshot.HasField("accessibility_tree_blob"):
+        return snapshot
+    inlined = pb2.UISnapshot()
+    inlined.CopyFrom(snapshot)
+    inlined.ClearField("accessibility_tree_blob")
+    inlined.accessibility_tree_raw = store.read(
+        snapshot.accessibility_tree_blob.blob_id
+    )
+    return inlined
@@ -0,0 +1,407 @@
+"""
+跨快照的元素身份跟踪。
+
+framework_id 只在单个快照内唯一，客户端每拿到新快照都要重新 FindElement。
+ElementIdentityTracker 把相邻两个快照中的元素配对，并为每个元素维护一个持久句柄:
+句柄在元素存续期间保持不变，始终映射到最新快照中的 framework_id。
+
+配对顺序:
+1. adapter_specific_id 在快照中唯一且非空的元素只按它配对 (适配器 ID 视为稳定)。
+2. 其余元素按结构签名 (element_type、name、树深度) 分组，组内先按完全相同的 BBox
+   配对，剩下的按 BBox IoU 从高到低贪心配对 (IoU 不低于 min_iou)。
+   安装了 numpy 时 IoU 矩阵向量化计算；否则退回纯 Python 实现，只对落在同一
+   网格单元 (可能相交) 的框对计算 IoU。
+"""
+
+import itertools
+import logging
+import math
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖
+    np = None
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_IOU = 0.5
+# 超过以下上限时该签名组只做完全相同 BBox 的配对:
+# numpy 实现计算完整 IoU 矩阵，上限是矩阵大小
+MAX_IOU_PAIRS = 4_000_000
+# 纯 Python 实现只计算共享网格单元的候选对，上限是候选对数
+MAX_PYTHON_IOU_CANDIDATES = 200_000
+# 纯 Python 实现中覆盖更多网格单元的框不放入网格，直接与所有框比较
+_MAX_CELLS_PER_BOX = 64
+
+Box = Tuple[float, float, float, float]
+Signature = Tuple[str, Optional[str], int]
+
+
+@dataclass
+class IdentityUpdate:
+    """一次 update() 的配对结果 (均为句柄列表)。"""
+
+    matched_by_id: List[str] = field(default_factory=list)
+    matched_by_geometry: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+
+def _box(element: pb2.UIElement) -> Optional[Box]:
+    if not element.HasField("bbox"):
+        return None
+    b = element.bbox
+    return (b.x_min, b.y_min, b.x_max, b.y_max)
+
+
+def _depths(elements: Sequence[pb2.UIElement]) -> List[int]:
+    """计算每个元素到根的深度 (父链出现环时在环处截断)。"""
+    position_of = {element.framework_id: i for i, element in enumerate(elements)}
+    depths: List[Optional[int]] = [None] * len(elements)
+    for start in range(len(elements)):
+        chain = []
+        on_chain = set()
+        position: Optional[int] = start
+        while position is not None and depths[position] is None:
+            if position in on_chain:
+                break
+            chain.append(position)
+            on_chain.add(position)
+            element = elements[position]
+            parent_id = (
+                element.parent_framework_id
+                if element.HasField("parent_framework_id")
+                else None
+            )
+            position = position_of.get(parent_id) if parent_id else None
+        depth = -1 if position is None or position in on_chain else depths[position]
+        for position in reversed(chain):
+            depth += 1
+            depths[position] = depth
+    return depths
+
+
+def _grid_cells(box: Box, cell: float) -> Optional[List[Tuple[int, int]]]:
+    """返回框覆盖的网格单元，超过 _MAX_CELLS_PER_BOX 个时返回 None。"""
+    x0, y0, x1, y1 = box
+    columns = range(math.floor(x0 / cell), math.floor(x1 / cell) + 1)
+    rows = range(math.floor(y0 / cell), math.floor(y1 / cell) + 1)
+    if len(rows) * len(columns) > _MAX_CELLS_PER_BOX:
+        return None
+    return [(row, column) for row in rows for column in columns]
+
+
+def _ranked_overlaps_python(
+    previous: Sequence[Box], current: Sequence[Box], min_iou: float
+) -> List[Tuple[int, int]]:
+    # 网格单元取 current 中框边长的中位数: 相交的框至少共享一个单元，
+    # 典型的 UI 元素只覆盖少数几个单元
+    sides = sorted(
+        max(x1 - x0, y1 - y0) for x0, y0, x1, y1 in current if x1 > x0 and y1 > y0
+    )
+    if not sides:
+        return []
+    cell = sides[len(sides) // 2]
+    grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    oversized: List[int] = []  # 相对网格很大的框，作为所有框的候选
+    for j, box in enumerate(current):
+        if box[2] <= box[0] or box[3] <= box[1]:
+            continue
+        cells = _grid_cells(box, cell)
+        if cells is None:
+            oversized.append(j)
+            continue
+        for key in cells:
+            grid[key].append(j)
+
+    scored = []
+    candidate_count = 0
+    for i, box in enumerate(previous):
+        ax0, ay0, ax1, ay1 = box
+        if ax1 <= ax0 or ay1 <= ay0:
+            continue
+        cells = _grid_cells(box, cell)
+        if cells is None:
+            candidates = set(range(len(current)))
+        else:
+            candidates = set(oversized)
+            for key in cells:
+                candidates.update(grid.get(key, ()))
+        candidate_count += len(candidates)
+        if candidate_count > MAX_PYTHON_IOU_CANDIDATES:
+            logger.debug(
+                "Skipping IoU matching: more than %d candidate pairs",
+                MAX_PYTHON_IOU_CANDIDATES,
+            )
+            return []
+        area_a = (ax1 - ax0) * (ay1 - ay0)
+        for j in candidates:
+            bx0, by0, bx1, by1 = current[j]
+            width = min(ax1, bx1) - max(ax0, bx0)
+            height = min(ay1, by1) - max(ay0, by0)
+            if width <= 0 or height <= 0:
+                continue
+            intersection = width * height
+            union = area_a + (bx1 - bx0) * (by1 - by0) - intersection
+            iou = intersection / union
+            if iou >= min_iou:
+                scored.append((-iou, i, j))
+    scored.sort()
+    return [(i, j) for _, i, j in scored]
+
+
+def _ranked_overlaps_numpy(
+    previous: Sequence[Box], current: Sequence[Box], min_iou: float
+) -> List[Tuple[int, int]]:
+    a = np.asarray(previous, dtype=np.float64)
+    b = np.asarray(current, dtype=np.float64)
+    width = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(
+        a[:, None, 0], b[None, :, 0]
+    )
+    height = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(
+        a[:, None, 1], b[None, :, 1]
+    )
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    iou = np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=intersection > 0
+    )
+    rows, cols = np.nonzero(iou >= min_iou)
+    # 按 IoU 降序，相同 IoU 时按 (i, j) 升序，与纯 Python 实现的顺序一致
+    order = np.lexsort((cols, rows, -iou[rows, cols]))
+    return list(zip(rows[order].tolist(), cols[order].tolist()))
+
+
+def ranked_overlaps(
+    previous: Sequence[Box], current: Sequence[Box], min_iou: float
+) -> List[Tuple[int, int]]:
+    """返回 IoU 不低于 min_iou 的 (previous 下标, current 下标) 对，按 IoU 降序排列。
+
+    计算量超过 MAX_IOU_PAIRS (numpy) 或 MAX_PYTHON_IOU_CANDIDATES (纯 Python)
+    时返回空列表。
+
+    Args:
+        previous: (x_min, y_min, x_max, y_max) 序列。
+        current: (x_min, y_min, x_max, y_max) 序列。
+        min_iou: 最小 IoU，必须大于 0 (不相交的框不会成对)。
+    """
+    if not previous or not current:
+        return []
+    if np is None:
+        return _ranked_overlaps_python(previous, current, min_iou)
+    if len(previous) * len(current) > MAX_IOU_PAIRS:
+        logger.debug(
+            "Skipping IoU matching for %d x %d elements", len(previous), len(current)
+        )
+        return []
+    return _ranked_overlaps_numpy(previous, current, min_iou)
+
+
+class ElementIdentityTracker:
+    """
+    为连续快照中的元素维护持久句柄。
+    update() 之后，handle -> framework_id / 元素、framework_id -> handle 都是字典查询。
+    不是线程安全的，多个线程共用时需要调用方加锁。
+    """
+
+    def __init__(self, min_iou: float = DEFAULT_MIN_IOU):
+        """
+        Args:
+            min_iou: 按几何位置配对所需的最小 BBox IoU，取值 (0, 1]。
+
+        Raises:
+            ValueError: min_iou 不在 (0, 1] 范围内。
+        """
+        if not 0 < min_iou <= 1:
+            raise ValueError(f"min_iou must be in (0, 1], got {min_iou}")
+        self.min_iou = min_iou
+        self._prefix = uuid.uuid4().hex[:8] + "-"
+        self._counter = itertools.count()
+        self._elements_by_handle: Dict[str, pb2.UIElement] = {}
+        self._handle_by_framework_id: Dict[str, str] = {}
+        self._handle_by_adapter_id: Dict[bytes, str] = {}
+        self._signature_by_handle: Dict[str, Signature] = {}
+
+    def __len__(self) -> int:
+        return len(self._elements_by_handle)
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._elements_by_handle
+
+    def _new_handle(self) -> str:
+        return f"{self._prefix}{next(self._counter):x}"
+
+    def framework_id_for(self, handle: str) -> Optional[str]:
+        """返回句柄在最新快照中的 framework_id，元素已消失时返回 None。"""
+        element = self._elements_by_handle.get(handle)
+        return element.framework_id if element is not None else None
+
+    def element_for(self, handle: str) -> Optional[pb2.UIElement]:
+        """返回句柄在最新快照中对应的元素，元素已消失时返回 None。"""
+        return self._elements_by_handle.get(handle)
+
+    def handle_for(self, framework_id: str) -> Optional[str]:
+        """返回最新快照中 framework_id 对应元素的句柄。"""
+        return self._handle_by_framework_id.get(framework_id)
+
+    def handles(self) -> Iterable[str]:
+        return self._elements_by_handle.keys()
+
+    def update(self, snapshot: pb2.UISnapshot) -> IdentityUpdate:
+        """
+        用新快照更新句柄映射。
+
+        Args:
+            snapshot: 最新采集的快照 (需要普通的 elements，而不是列式编码)。
+
+        Returns:
+            本次的配对结果。第一次调用时所有元素都在 added 中。
+        """
+        elements = list(snapshot.elements)
+        depths = _depths(elements)
+        signatures: List[Signature] = [
+            (
+                element.element_type,
+                element.name if element.HasField("name") else None,
+                depth,
+            )
+            for element, depth in zip(elements, depths)
+        ]
+        handles: List[Optional[str]] = [None] * len(elements)
+        unclaimed = set(self._elements_by_handle)
+        result = IdentityUpdate()
+
+        # 1. adapter_specific_id 在新快照中唯一时直接配对
+        adapter_id_counts: Dict[bytes, int] = defaultdict(int)
+        for element in elements:
+            if element.adapter_specific_id:
+                adapter_id_counts[element.adapter_specific_id] += 1
+        for position, element in enumerate(elements):
+            adapter_id = element.adapter_specific_id
+            if not adapter_id or adapter_id_counts[adapter_id] != 1:
+                continue
+            handle = self._handle_by_adapter_id.get(adapter_id)
+            if handle is not None and handle in unclaimed:
+                unclaimed.discard(handle)
+                handles[position] = handle
+                result.matched_by_id.append(handle)
+
+        # 2. 没有唯一 adapter_specific_id 的元素按结构签名分组后按几何位置配对
+        if unclaimed:
+            id_tracked = set(self._handle_by_adapter_id.values())
+            previous_groups: Dict[Signature, List[str]] = defaultdict(list)
+            for handle in self._elements_by_handle:
+                if handle in unclaimed and handle not in id_tracked:
+                    previous_groups[self._signature_by_handle[handle]].append(handle)
+            current_groups: Dict[Signature, List[int]] = defaultdict(list)
+            for position, handle in enumerate(handles):
+                element = elements[position]
+                if (
+                    handle is None
+                    and adapter_id_counts.get(element.adapter_specific_id) != 1
+                    and signatures[position] in previous_groups
+                ):
+                    current_groups[signatures[position]].append(position)
+            for signature, positions in current_groups.items():
+                for handle, position in self._match_group(
+                    previous_groups[signature], positions, elements
+                ):
+                    unclaimed.discard(handle)
+                    handles[position] = handle
+                    result.matched_by_geometry.append(handle)
+
+        # 3. 没有配对的元素获得新句柄，并重建映射
+        elements_by_handle: Dict[str, pb2.UIElement] = {}
+        handle_by_framework_id: Dict[str, str] = {}
+        handle_by_adapter_id: Dict[bytes, str] = {}
+        signature_by_handle: Dict[str, Signature] = {}
+        for position, element in enumerate(elements):
+            handle = handles[position]
+            if handle is None:
+                handle = self._new_handle()
+                result.added.append(handle)
+            elements_by_handle[handle] = element
+            handle_by_framework_id[element.framework_id] = handle
+            signature_by_handle[handle] = signatures[position]
+            adapter_id = element.adapter_specific_id
+            if adapter_id and adapter_id_counts[adapter_id] == 1:
+                handle_by_adapter_id[adapter_id] = handle
+        result.removed = [h for h in self._elements_by_handle if h in unclaimed]
+
+        self._elements_by_handle = elements_by_handle
+        self._handle_by_framework_id = handle_by_framework_id
+        self._handle_by_adapter_id = handle_by_adapter_id
+        self._signature_by_handle = signature_by_handle
+        logger.debug(
+            "Tracked snapshot %s: %d by id, %d by geometry, %d added, %d removed",
+            snapshot.snapshot_id,
+            len(result.matched_by_id),
+            len(result.matched_by_geometry),
+            len(result.added),
+            len(result.removed),
+        )
+        return result
+
+    def _match_group(
+        self,
+        previous_handles: List[str],
+        positions: List[int],
+        elements: Sequence[pb2.UIElement],
+    ) -> List[Tuple[str, int]]:
+        """在一个签名组内配对: 相同 BBox、IoU 贪心，最后是组内唯一的无 BBox 元素。"""
+        matches: List[Tuple[str, int]] = []
+        previous_by_box: Dict[Optional[Box], "deque[str]"] = defaultdict(deque)
+        for handle in previous_handles:
+            previous_by_box[_box(self._elements_by_handle[handle])].append(handle)
+        rest_previous: List[Tuple[str, Box]] = []
+        rest_current: List[Tuple[int, Box]] = []
+        boxless_current: List[int] = []
+        for position in positions:
+            box = _box(elements[position])
+            if box is None:
+                boxless_current.append(position)
+                continue
+            same_box = previous_by_box.get(box)
+            if same_box:
+                matches.append((same_box.popleft(), position))
+            else:
+                rest_current.append((position, box))
+        boxless_previous = previous_by_box.pop(None, [])
+        for box, handles in previous_by_box.items():
+            rest_previous.extend((handle, box) for handle in handles)
+
+        if rest_previous and rest_current:
+            taken_previous = set()
+            taken_current = set()
+            for i, j in ranked_overlaps(
+                [box for _, box in rest_previous],
+                [box for _, box in rest_current],
+                self.min_iou,
+            ):
+                if i in taken_previous or j in taken_current:
+                    continue
+                taken_previous.add(i)
+                taken_current.add(j)
+                matches.append((rest_previous[i][0], rest_current[j][0]))
+
+        # 没有 BBox 的元素只有在组内一对一时才能确定配对
+        if len(boxless_previous) == 1 and len(boxless_current) == 1:
+            matches.append((boxless_previous[0], boxless_current[0]))
+        return matches
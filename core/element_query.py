@@ -0,0 +1,241 @@
+"""
+ElementQuery 求值引擎: 把查询编译为按代价排序的谓词计划，在 UIElement 序列上求值。
+供服务端快照索引和适配器共用，适配器可以把 find_element / find_elements 委托给
+find_element() / find_elements()，而不必各自实现匹配逻辑。
+xpath / css_selector 需要快照的树结构，由 SnapshotIndex (core.snapshot_selectors)
+求值，不在这里的谓词计划中。
+"""
+
+import functools
+import itertools
+import operator
+import re
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+# 这些查询字段需要适配器的原生能力，无法在快照元素上本地求值
+UNSUPPORTED_QUERY_FIELDS = ("description",)
+# 这些查询字段需要快照的树结构 (见 core.snapshot_selectors)
+SELECTOR_QUERY_FIELDS = ("xpath", "css_selector")
+
+REGEX_CACHE_SIZE = 256
+COMPILED_QUERY_CACHE_SIZE = 512
+
+Predicate = Callable[[pb2.UIElement], bool]
+
+# 谓词检查顺序 (越小越先检查): 选择性高、代价低的等值比较在前，
+# 区域相交次之，选择性低的类型和置信度再次之，正则匹配最后
+_RANK_FRAMEWORK_ID = 0
+_RANK_ADAPTER_ID = 1
+_RANK_PARENT = 2
+_RANK_EXACT_TEXT = 3
+_RANK_NAME = 4
+_RANK_BBOX = 5
+_RANK_ELEMENT_TYPE = 6
+_RANK_CONFIDENCE = 7
+_RANK_REGEX = 8
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_regex(pattern: str) -> "re.Pattern[str]":
+    """编译 text_content_regex 并缓存结果 (不受 re 模块全局缓存的淘汰影响)。"""
+    return re.compile(pattern)
+
+
+def can_evaluate(query: pb2.ElementQuery) -> bool:
+    """判断查询是否只包含可以在快照上本地求值的字段 (选择器字段需要树结构)。"""
+    return not any(query.HasField(field) for field in UNSUPPORTED_QUERY_FIELDS)
+
+
+def has_selector(query: pb2.ElementQuery) -> bool:
+    """判断查询是否包含 xpath / css_selector。"""
+    return any(query.HasField(field) for field in SELECTOR_QUERY_FIELDS)
+
+
+def _optional_string_equals(field: str, value: str) -> Predicate:
+    get = operator.attrgetter(field)
+    if value:
+        # 未设置的 optional 字段读出 ""，与非空值比较即可，无需 HasField
+        return lambda e: get(e) == value
+    return lambda e: e.HasField(field) and get(e) == ""
+
+
+def _bbox_predicate(bbox: pb2.BBox) -> Predicate:
+    x_min, y_min, x_max, y_max = bbox.x_min, bbox.y_min, bbox.x_max, bbox.y_max
+
+    def intersects(e: pb2.UIElement) -> bool:
+        if not e.HasField("bbox"):
+            return False
+        b = e.bbox
+        return (
+            b.x_min <= x_max
+            and x_min <= b.x_max
+            and b.y_min <= y_max
+            and y_min <= b.y_max
+        )
+
+    return intersects
+
+
+def _regex_predicate(pattern: str) -> Predicate:
+    search = compile_regex(pattern).search
+    if search("") is None:
+        # 不匹配空串的正则不会匹配未设置的 text_content
+        return lambda e: search(e.text_content) is not None
+    return lambda e: e.HasField("text_content") and search(e.text_content) is not None
+
+
+def _plan_predicates(query: pb2.ElementQuery) -> List[Predicate]:
+    """把查询条件转换为按检查顺序排列的谓词列表。"""
+    ranked: List[Tuple[int, Predicate]] = []
+    if query.HasField("framework_id"):
+        framework_id = query.framework_id
+        ranked.append((_RANK_FRAMEWORK_ID, lambda e: e.framework_id == framework_id))
+    if query.HasField("adapter_specific_id"):
+        adapter_id = query.adapter_specific_id
+        ranked.append((_RANK_ADAPTER_ID, lambda e: e.adapter_specific_id == adapter_id))
+    if query.HasField("parent_framework_id_constraint"):
+        ranked.append(
+            (
+                _RANK_PARENT,
+                _optional_string_equals(
+                    "parent_framework_id", query.parent_framework_id_constraint
+                ),
+            )
+        )
+    if query.HasField("exact_text"):
+        ranked.append(
+            (
+                _RANK_EXACT_TEXT,
+                _optional_string_equals("text_content", query.exact_text),
+            )
+        )
+    if query.HasField("name"):
+        ranked.append((_RANK_NAME, _optional_string_equals("name", query.name)))
+    if query.HasField("bbox"):
+        ranked.append((_RANK_BBOX, _bbox_predicate(query.bbox)))
+    if query.HasField("element_type"):
+        element_type = query.element_type
+        ranked.append((_RANK_ELEMENT_TYPE, lambda e: e.element_type == element_type))
+    if query.min_confidence > 0:
+        min_confidence = query.min_confidence
+        ranked.append((_RANK_CONFIDENCE, lambda e: e.confidence >= min_confidence))
+    if query.HasField("text_content_regex"):
+        ranked.append((_RANK_REGEX, _regex_predicate(query.text_content_regex)))
+    ranked.sort(key=lambda item: item[0])
+    return [predicate for _, predicate in ranked]
+
+
+def _combine(predicates: List[Predicate]) -> Optional[Predicate]:
+    """合并为单个谓词 (按顺序短路)；没有条件时返回 None 表示匹配所有元素。"""
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda e: first(e) and second(e)
+    if len(predicates) == 3:
+        first, second, third = predicates
+        return lambda e: first(e) and second(e) and third(e)
+    return lambda e: all(predicate(e) for predicate in predicates)
+
+
+class CompiledQuery:
+    """编译后的 ElementQuery: 有序谓词计划和 index 选择。不可变，可跨线程共享。"""
+
+    __slots__ = ("predicates", "index", "_match")
+
+    def __init__(self, predicates: List[Predicate], index: Optional[int] = None):
+        """
+        :param predicates: 按检查顺序排列的谓词。
+        :param index: 只选择第 index 个匹配 (从 0 开始)，None 表示选择所有匹配。
+        """
+        self.predicates = tuple(predicates)
+        self.index = index
+        self._match = _combine(predicates)
+
+    def matches(self, element: pb2.UIElement) -> bool:
+        return self._match is None or self._match(element)
+
+    def find(
+        self, elements: Iterable[pb2.UIElement], limit: Optional[int] = None
+    ) -> List[pb2.UIElement]:
+        """
+        按顺序返回匹配的元素，达到所需数量后立即停止扫描。
+        :param elements: 待检查的元素 (例如快照的 elements 或候选子集)。
+        :param limit: 最多返回的元素个数，None 表示不限。
+        :return: 匹配的元素列表。设置了 index 时最多只有第 index 个匹配。
+        """
+        matching = elements if self._match is None else filter(self._match, elements)
+        if self.index is not None:
+            if self.index < 0 or limit == 0:
+                return []
+            return list(itertools.islice(matching, self.index, self.index + 1))
+        if limit is not None:
+            return list(itertools.islice(matching, limit))
+        return list(matching)
+
+    def find_first(self, elements: Iterable[pb2.UIElement]) -> Optional[pb2.UIElement]:
+        """返回第一个被选中的元素 (FindElement 语义)，没有时返回 None。"""
+        found = self.find(elements, limit=1)
+        return found[0] if found else None
+
+
+@functools.lru_cache(maxsize=COMPILED_QUERY_CACHE_SIZE)
+def _compile_serialized(serialized_query: bytes) -> CompiledQuery:
+    query = pb2.ElementQuery.FromString(serialized_query)
+    return CompiledQuery(
+        _plan_predicates(query), query.index if query.HasField("index") else None
+    )
+
+
+def compile_query(query: pb2.ElementQuery) -> CompiledQuery:
+    """
+    编译查询 (按查询内容缓存，重复的查询不会重新构建计划或编译正则)。
+    计划不包含 xpath / css_selector，调用方需要先用选择器求出候选元素。
+    :raises ValueError: 查询包含无法本地求值的字段 (见 UNSUPPORTED_QUERY_FIELDS)。
+    :raises re.error: text_content_regex 不是有效的正则表达式。
+    """
+    if not can_evaluate(query):
+        fields = [f for f in UNSUPPORTED_QUERY_FIELDS if query.HasField(f)]
+        raise ValueError(f"ElementQuery fields cannot be evaluated locally: {fields}")
+    return _compile_serialized(query.SerializeToString(deterministic=True))
+
+
+def find_elements(
+    elements: Iterable[pb2.UIElement],
+    query: pb2.ElementQuery,
+    limit: Optional[int] = None,
+) -> List[pb2.UIElement]:
+    """
+    在元素序列中查找匹配 query 的元素 (FindElements 语义)。
+    :raises ValueError: 查询包含选择器字段 (需要通过 SnapshotIndex 在快照上求值)。
+    """
+    _reject_selectors(query)
+    return compile_query(query).find(elements, limit)
+
+
+def find_element(
+    elements: Iterable[pb2.UIElement], query: pb2.ElementQuery
+) -> Optional[pb2.UIElement]:
+    """在元素序列中查找匹配 query 的第一个元素 (FindElement 语义)。"""
+    _reject_selectors(query)
+    return compile_query(query).find_first(elements)
+
+
+def _reject_selectors(query: pb2.ElementQuery) -> None:
+    if has_selector(query):
+        raise ValueError(
+            "xpath / css_selector need the snapshot tree; use SnapshotIndex.find()"
+        )
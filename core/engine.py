@@ -1,16 +1,46 @@
 import logging
-
-# import time  # For simulating work in stop - Unused
+import time
+from concurrent import futures
+from contextlib import contextmanager
 from enum import Enum, auto
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
+
+from config import settings
 
 # 假设 AdapterManager 定义在 core.adapter_manager
 # ActionAdapterInterface, - Unused in this file;
 # PerceptionAdapterInterface, - Unused in this file
-from core.adapter_manager import AdapterManager, AdapterPair
+from core.adapter_manager import AdapterManager, AdapterPair, AdapterWarmupStatus
+from core.adapter_pool import AdapterPoolConfig
+from core.task_loop import LoopReport, PlannedAction, TaskLoop
+from core.task_scheduler import (
+    TaskCancelledError,
+    TaskContext,
+    TaskDeadlineExceeded,
+    TaskFuture,
+    TaskRejectedError,
+    TaskScheduler,
+)
+from utils.metrics import default_registry
 
 logger = logging.getLogger(__name__)
 
+_STATE_TRANSITIONS = default_registry.counter(
+    "argus_engine_state_transitions_total",
+    "Core engine state transitions.",
+    ("from_state", "to_state"),
+)
+_TASKS = default_registry.counter(
+    "argus_engine_tasks_total",
+    "Engine tasks by outcome.",
+    ("result",),
+)
+_TASK_SECONDS = default_registry.histogram(
+    "argus_engine_task_seconds",
+    "End-to-end engine task duration in seconds.",
+    ("result",),
+)
+
 
 class EngineState(Enum):
     """引擎运行状态"""
@@ -34,44 +64,130 @@ class CoreEngine:
         self._state = EngineState.IDLE
         self.config = config or {}
         try:
-            # 初始化适配器管理器
-            self.adapter_manager = AdapterManager()
+            # 初始化适配器管理器 (默认惰性发现，并使用磁盘缓存)
+            self.adapter_manager = AdapterManager(
+                lazy_discovery=self.config.get(
+                    "lazy_adapter_discovery", settings.ADAPTER_LAZY_DISCOVERY
+                ),
+                cache_file=self.config.get(
+                    "adapter_discovery_cache_file",
+                    settings.ADAPTER_DISCOVERY_CACHE_FILE,
+                ),
+                default_process_mode=self.config.get(
+                    "adapter_process_mode", settings.ADAPTER_PROCESS_MODE
+                ),
+                # 任务从实例池借出适配器，空闲实例按 idle_timeout 回收
+                pool_config=AdapterPoolConfig(
+                    min_size=self.config.get(
+                        "adapter_pool_min_size", settings.ADAPTER_POOL_MIN_SIZE
+                    ),
+                    max_size=self.config.get(
+                        "adapter_pool_max_size", settings.ADAPTER_POOL_MAX_SIZE
+                    ),
+                    idle_timeout=self.config.get(
+                        "adapter_pool_idle_timeout", settings.ADAPTER_POOL_IDLE_TIMEOUT
+                    ),
+                    max_total_instances=self.config.get(
+                        "adapter_pool_max_total_instances",
+                        settings.ADAPTER_POOL_MAX_TOTAL_INSTANCES,
+                    ),
+                    max_total_memory_bytes=self.config.get(
+                        "adapter_pool_max_total_memory_bytes",
+                        settings.ADAPTER_POOL_MAX_TOTAL_MEMORY_BYTES,
+                    ),
+                    instance_memory_bytes=self.config.get(
+                        "adapter_pool_instance_memory_bytes",
+                        settings.ADAPTER_POOL_INSTANCE_MEMORY_BYTES,
+                    ),
+                ),
+            )
             # 其他组件将在后续任务中初始化 (认知模块, 记忆模块, DKG 管理器等)
             self.cognitive_module = None  # Placeholder
             self.memory_module = None  # Placeholder
             self.dkg_manager = None  # Placeholder
-            self._active_adapters: Dict[str, AdapterPair] = {}
+            # 任务调度器在 start() 时创建，stop() 时排空
+            self._scheduler: Optional[TaskScheduler] = None
+            # start() 时开始的适配器预加载，全部完成时完成
+            self._preload_future: Optional[futures.Future] = None
             logger.info("Core Engine initialized successfully. State: IDLE")
         except Exception as e:
-            logger.error(f"Core Engine initialization failed: {e}", exc_info=True)
-            self._state = EngineState.ERROR
+            logger.error("Core Engine initialization failed: %s", e, exc_info=True)
+            self._set_state(EngineState.ERROR)
             # Propagate the error or handle it based on policy
             raise
 
+    def _set_state(self, state: EngineState) -> None:
+        """切换引擎状态并记录状态转换指标。"""
+        previous, self._state = self._state, state
+        if previous != state:
+            _STATE_TRANSITIONS.inc(from_state=previous.name, to_state=state.name)
+
     def get_status(self) -> EngineState:
         """获取当前引擎状态"""
         return self._state
 
     def start(self) -> None:
         """
-        启动引擎。
-        目前仅改变状态，为未来启动后台任务循环做准备。
+        启动引擎及其后台任务调度器。
         """
         if self._state not in [EngineState.IDLE, EngineState.STOPPED]:
             logger.warning("Cannot start engine from state: %s", self._state.name)
             return
 
         logger.info("Starting Core Engine...")
-        self._state = EngineState.STARTING
-        # 在这里可以启动后台线程/进程来运行主事件循环或任务队列
-        # ... simulation of startup tasks ...
-        self._state = EngineState.RUNNING
+        self._set_state(EngineState.STARTING)
+        # 同一目标应用的任务串行执行，不同应用之间并行
+        self._scheduler = TaskScheduler(
+            max_workers=self.config.get(
+                "task_max_workers", settings.ENGINE_TASK_MAX_WORKERS
+            ),
+            max_pending=self.config.get(
+                "task_max_pending", settings.ENGINE_TASK_MAX_PENDING
+            ),
+        )
+        self._scheduler.start()
+        self._preload_adapters()
+        self._set_state(EngineState.RUNNING)
         logger.info("Core Engine started successfully. State: %s", self._state.name)
 
+    def _preload_adapters(self) -> None:
+        """
+        在后台并行预热配置的应用适配器 (config["preload_adapters"]，默认
+        settings.ADAPTER_PRELOAD_APPS)，不阻塞 start()。
+        预热期间到达的任务等待同一次加载，不会重复初始化。
+        """
+        apps = self.config.get("preload_adapters", settings.ADAPTER_PRELOAD_APPS)
+        if not apps:
+            self._preload_future = None
+            return
+        adapter_configs = self.config.get("adapters", {})
+        self._preload_future = self.adapter_manager.preload_adapters(
+            {app_name: adapter_configs.get(app_name, {}) for app_name in apps},
+            max_workers=self.config.get(
+                "preload_max_workers", settings.ADAPTER_PRELOAD_MAX_WORKERS
+            ),
+        )
+
+    def wait_for_adapters(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待 start() 开始的适配器预加载完成。
+        :return: 所有预加载的适配器都已就绪时返回 True；超时或有适配器失败时返回 False。
+        """
+        if self._preload_future is not None:
+            try:
+                self._preload_future.result(timeout)
+            except futures.TimeoutError:
+                return False
+        return self.adapter_manager.is_ready()
+
+    def get_adapter_readiness(self) -> Dict[str, AdapterWarmupStatus]:
+        """返回预加载的应用及其预热状态 (pending / ready / failed 和耗时)。"""
+        return self.adapter_manager.get_warmup_status()
+
     def stop(self, timeout: float = 10.0) -> None:
         """
         停止引擎并清理资源。
-        :param timeout: 等待后台任务（如果存在）正常停止的超时时间（秒）。
+        :param timeout: 等待已提交任务完成的超时时间（秒），超时后取消剩余任务。
         """
         if self._state not in [
             EngineState.RUNNING,
@@ -84,154 +200,200 @@ class CoreEngine:
                 return
             # If idle, just move to stopped
             if self._state == EngineState.IDLE:
-                self._state = EngineState.STOPPED
+                self._set_state(EngineState.STOPPED)
                 logger.info("Engine was idle, moved directly to STOPPED state.")
                 return
 
         logger.info("Stopping Core Engine...")
-        self._state = EngineState.STOPPING
-
-        # 1. 通知后台任务停止 (如果存在)
-        #    例如: self._main_loop_thread.stop_event.set()
-
-        # 2. 等待后台任务结束 (如果存在)
-        #    例如: self._main_loop_thread.join(timeout)
-        #    if self._main_loop_thread.is_alive():
-        #        logger.warning(
-        #           "Engine main loop did not stop gracefully within timeout."
-        #        )
-        logger.debug("Simulating graceful shutdown wait (up to %ss)...", timeout)
-        # time.sleep(min(1, timeout)) # Simulate some shutdown activity
+        self._set_state(EngineState.STOPPING)
+
+        # 1. 停止接受新任务，并在超时内等待已提交的任务完成
+        if self._scheduler is not None:
+            if not self._scheduler.stop(timeout):
+                logger.warning(
+                    "Engine tasks did not finish within %ss and were cancelled.",
+                    timeout,
+                )
+            self._scheduler = None
 
-        # 3. 执行清理操作
+        # 2. 执行清理操作
         self.shutdown()
         # Note: shutdown() already sets state to STOPPED if called directly,
         # We set it again here to ensure correct state after stop() sequence.
-        self._state = EngineState.STOPPED
+        self._set_state(EngineState.STOPPED)
         logger.info("Core Engine stopped. State: %s", self._state.name)
 
-    def _get_or_load_adapters(self, app_name: str) -> AdapterPair:
+    @contextmanager
+    def _checkout_adapters(self, app_name: str) -> Iterator[AdapterPair]:
         """
-        获取或加载指定应用的适配器。
+        从适配器管理器的实例池借出指定应用的适配器，退出时归还。
         这是引擎与适配器管理器交互的核心点 (T1.2.1)。
+        适配器缺失、池已满或初始化失败时抛出异常，只影响该任务，不改变引擎状态。
         """
-        if self._state != EngineState.RUNNING:
+        # 停止过程中仍允许已提交的任务完成
+        if self._state not in (EngineState.RUNNING, EngineState.STOPPING):
             logger.error(
                 "Cannot load adapters when engine state is %s", self._state.name
             )
             raise RuntimeError(f"Engine is not running (state: {self._state.name})")
 
-        if app_name in self._active_adapters:
-            return self._active_adapters[app_name]
-        else:
-            try:
-                # 从配置中获取特定于应用的适配器配置 (如果存在)
-                adapter_config = self.config.get("adapters", {}).get(app_name, {})
-                logger.info("Requesting adapters for '%s' from manager...", app_name)
-                perception_adapter, action_adapter = self.adapter_manager.get_adapter(
-                    app_name, config=adapter_config
-                )
-
-                # 基本检查，确保至少有一个适配器被加载
-                if not perception_adapter and not action_adapter:
-                    # 这通常不应发生，get_adapter 会在失败时引发异常
-                    raise RuntimeError(
-                        f"Adapter manager returned no adapters for {app_name} "
-                        f"without raising an error."
-                    )
-
-                self._active_adapters[app_name] = (perception_adapter, action_adapter)
-                logger.info("Successfully obtained adapters for '%s'.", app_name)
-                return perception_adapter, action_adapter
-            except ValueError as e:
-                logger.error("Adapter not found for '%s': %s", app_name, e)
-                self._state = EngineState.ERROR  # Potentially move to error state
-                raise
-            except Exception as e:
-                # 捕获初始化错误等
-                logger.error(
-                    "Failed to get or load adapters for '%s': %s",
-                    app_name,
-                    e,
-                    exc_info=True,
-                )
-                self._state = EngineState.ERROR  # Move to error state
-                raise
+        # 从配置中获取特定于应用的适配器配置 (如果存在)
+        adapter_config = self.config.get("adapters", {}).get(app_name, {})
+        logger.debug("Checking out adapters for '%s' from manager...", app_name)
+        try:
+            adapter_pair = self.adapter_manager.checkout_adapter(
+                app_name,
+                config=adapter_config,
+                timeout=self.config.get(
+                    "adapter_pool_checkout_timeout",
+                    settings.ADAPTER_POOL_CHECKOUT_TIMEOUT,
+                ),
+            )
+        except ValueError as e:
+            logger.error("Adapter not found for '%s': %s", app_name, e)
+            raise
+        except TimeoutError as e:
+            logger.error("No adapter instance available for '%s': %s", app_name, e)
+            raise
+        except Exception as e:
+            # 捕获初始化错误等
+            logger.error(
+                "Failed to get or load adapters for '%s': %s",
+                app_name,
+                e,
+                exc_info=True,
+            )
+            raise
+        try:
+            yield adapter_pair
+        finally:
+            self.adapter_manager.checkin_adapter(app_name, adapter_pair)
 
-    def run_task(self, task_description: str, target_app: str) -> None:
+    def run_task(
+        self, task_description: str, target_app: str, timeout: Optional[float] = None
+    ) -> Optional[TaskFuture]:
         """
-        (示例方法) 运行一个简单的任务。
-        后续会实现完整的 Perception-Cognition-Action 循环。
+        提交一个任务到后台调度器。同一 target_app 的任务按提交顺序串行执行。
+        :param timeout: 任务的截止时间 (秒，从提交起计算)，None 表示不限制。
+        :return: 任务的 Future (可调用 cancel() 取消)，结果为 LoopReport；
+                 引擎未运行或队列已满时返回 None。
         """
-        if self._state != EngineState.RUNNING:
+        if self._state != EngineState.RUNNING or self._scheduler is None:
             logger.error(
                 "Cannot run task: Engine is not in RUNNING state (current: %s).",
                 self._state.name,
             )
-            return
-
+            return None
+        try:
+            return self._scheduler.submit(
+                target_app,
+                self._run_task_loop,
+                task_description,
+                target_app,
+                timeout=timeout,
+            )
+        except TaskRejectedError as e:
+            logger.error("Cannot run task '%s': %s", task_description, e)
+            return None
+
+    def _plan_next_action(
+        self, task_description: str, snapshot: Any
+    ) -> Optional[PlannedAction]:
+        """调用认知模块规划下一个动作；尚未配置认知模块时任务在首次感知后结束。"""
+        if self.cognitive_module is None:
+            logger.debug("No cognitive module configured; nothing to plan.")
+            return None
+        return self.cognitive_module.plan(task_description, snapshot)
+
+    def _run_task_loop(
+        self, context: TaskContext, task_description: str, target_app: str
+    ) -> Optional[LoopReport]:
+        """
+        在调度器工作线程中运行一个任务的 Perception-Cognition-Action 循环。
+        每个步骤之前检查取消请求和截止时间。
+        :return: 循环统计 (迭代次数、端到端迭代延迟等)；适配器缺失时返回 None。
+        """
         logger.info(
             "Starting task: '%s' on application '%s'",
             task_description,
             target_app,
         )
+        started = time.perf_counter()
+        outcome = "error"
         try:
-            perception_adapter, action_adapter = self._get_or_load_adapters(target_app)
-
-            if not perception_adapter:
-                logger.error(
-                    "Cannot perform task: Perception adapter for '%s' "
-                    "is missing or failed to load.",
-                    target_app,
+            context.check()
+            with self._checkout_adapters(target_app) as adapter_pair:
+                perception_adapter, action_adapter = adapter_pair
+
+                if not perception_adapter:
+                    logger.error(
+                        "Cannot perform task: Perception adapter for '%s' "
+                        "is missing or failed to load.",
+                        target_app,
+                    )
+                    outcome = "missing_adapter"
+                    return None
+                if not action_adapter:
+                    logger.error(
+                        "Cannot perform task: Action adapter for '%s' "
+                        "is missing or failed to load.",
+                        target_app,
+                    )
+                    outcome = "missing_adapter"
+                    return None
+
+                mode = self.config.get("task_loop_mode", settings.ENGINE_TASK_LOOP_MODE)
+                loop = TaskLoop(
+                    # --- 1. 感知 (Perception) ---
+                    perceive=lambda options: perception_adapter.get_ui_snapshot(
+                        options=options or {}
+                    ),
+                    # --- 2. 认知 (Cognition) ---
+                    plan=lambda snapshot: self._plan_next_action(
+                        task_description, snapshot
+                    ),
+                    # --- 3. 行动 (Action) ---
+                    act=lambda action: getattr(action_adapter, action.name)(
+                        *action.args, **action.kwargs
+                    ),
+                    mode=mode,
+                    max_iterations=self.config.get(
+                        "task_loop_max_iterations",
+                        settings.ENGINE_TASK_LOOP_MAX_ITERATIONS,
+                    ),
+                    max_stale_retries=self.config.get(
+                        "task_loop_max_stale_retries",
+                        settings.ENGINE_TASK_LOOP_MAX_STALE_RETRIES,
+                    ),
                 )
-                # Consider setting engine state to ERROR here?
-                return
-            if not action_adapter:
-                logger.error(
-                    "Cannot perform task: Action adapter for '%s' "
-                    "is missing or failed to load.",
-                    target_app,
+                logger.info("Starting Perception-Cognition-Action loop (%s)...", mode)
+                report = loop.run(context)
+                logger.info(
+                    "Task '%s' finished after %d iterations.",
+                    task_description,
+                    report.iterations,
                 )
-                # Consider setting engine state to ERROR here?
-                return
-
-            logger.info("Starting Perception-Cognition-Action loop (placeholder)...")
-
-            # --- 1. 感知 (Perception) ---
-            if self._state != EngineState.RUNNING:
-                return  # Check state before long operation
-            logger.debug("Step 1: Performing perception...")
-            # snapshot = perception_adapter.get_ui_snapshot()
-            # logger.debug(f"Got snapshot: {snapshot}") # 可能非常冗长
-            logger.debug("Perception step placeholder completed.")
-
-            # --- 2. 认知 (Cognition) ---
-            if self._state != EngineState.RUNNING:
-                return  # Check state before long operation
-            logger.debug("Step 2: Performing cognition (planning)...")
-            # action_plan = self.cognitive_module.plan(
-            #    task_description, snapshot, memory_context, dkg_context)
-            # logger.debug(f"Generated action plan: {action_plan}")
-            logger.debug("Cognition step placeholder completed.")
-
-            # --- 3. 行动 (Action) ---
-            if self._state != EngineState.RUNNING:
-                return  # Check state before long operation
-            logger.debug("Step 3: Executing action...")
-            # result = action_adapter.click(...) # 基于 action_plan
-            # logger.debug(f"Action result: {result}")
-            logger.debug("Action step placeholder completed.")
-
-            # --- 循环、错误处理、反思等 ---
-            if self._state != EngineState.RUNNING:
-                return  # Final check
-
-            logger.info("Task '%s' placeholder execution finished.", task_description)
-
+                outcome = "completed" if report.completed else "max_iterations"
+                return report
+
+        except (TaskCancelledError, TaskDeadlineExceeded) as e:
+            # 取消和超时只影响该任务，不改变引擎状态
+            outcome = (
+                "cancelled"
+                if isinstance(e, TaskCancelledError)
+                else "deadline_exceeded"
+            )
+            logger.warning("Task '%s' stopped: %s", task_description, e)
+            raise
         except Exception as e:
+            # 任务失败 (动作失败、快照过时、适配器错误等) 只结束该任务的 Future，
+            # 不影响其他应用排队中的任务；ERROR 状态保留给引擎自身的故障
             logger.error("Error during task execution: %s", e, exc_info=True)
-            self._state = EngineState.ERROR  # Move to error state on task failure
             # 可能需要进行错误恢复或反思
+            raise
+        finally:
+            _TASKS.inc(result=outcome)
+            _TASK_SECONDS.observe(time.perf_counter() - started, result=outcome)
 
     def shutdown(self) -> None:
         """
@@ -319,7 +481,9 @@ if __name__ == "__main__":
     print(f"Engine status: {engine.get_status()}")
 
     try:
-        engine.run_task("Perform a mock action", "mock_adapter")
+        future = engine.run_task("Perform a mock action", "mock_adapter")
+        if future is not None:
+            future.result(timeout=30)
     except Exception as e:
         print(f"Task failed: {e}")
 
@@ -0,0 +1,417 @@
+import asyncio
+import itertools
+import logging
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+import grpc
+from google.protobuf.struct_pb2 import Struct
+
+from config import settings
+from core.blob_store import get_host_id
+from core.element_identity import ElementIdentityTracker
+from core.snapshot_chunks import SnapshotChunkAssembler
+from core.snapshot_columnar import from_columnar_snapshot
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+    import generated_protobuf.core_services_pb2_grpc as pb2_grpc
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+ChannelOptions = List[Tuple[str, object]]
+
+
+def build_channel_options(
+    keepalive_time_ms: Optional[int] = None,
+    keepalive_timeout_ms: Optional[int] = None,
+    max_message_length: Optional[int] = None,
+    extra_options: Optional[Sequence[Tuple[str, object]]] = None,
+) -> ChannelOptions:
+    """
+    构建 gRPC 通道参数，未指定的值使用 settings 中的默认值。
+    :param keepalive_time_ms: keepalive ping 间隔，0 表示禁用 keepalive。
+    :param keepalive_timeout_ms: 等待 ping 响应的超时。
+    :param max_message_length: 收发消息的最大字节数，-1 表示不限制。
+    :param extra_options: 额外的通道参数，同名参数会覆盖上面的值。
+    """
+    if keepalive_time_ms is None:
+        keepalive_time_ms = settings.GRPC_CLIENT_KEEPALIVE_TIME_MS
+    if keepalive_timeout_ms is None:
+        keepalive_timeout_ms = settings.GRPC_CLIENT_KEEPALIVE_TIMEOUT_MS
+    if max_message_length is None:
+        max_message_length = settings.GRPC_MAX_MESSAGE_LENGTH
+
+    options = {
+        "grpc.max_send_message_length": max_message_length,
+        "grpc.max_receive_message_length": max_message_length,
+    }
+    if keepalive_time_ms > 0:
+        options.update(
+            {
+                "grpc.keepalive_time_ms": keepalive_time_ms,
+                "grpc.keepalive_timeout_ms": keepalive_timeout_ms,
+                # 长时间等待 (如 WaitForElement) 期间没有活动调用也保持连接
+                "grpc.keepalive_permit_without_calls": 1,
+                "grpc.http2.max_pings_without_data": 0,
+            }
+        )
+    options.update(dict(extra_options or ()))
+    return list(options.items())
+
+
+class _ChannelStubs:
+    """一个通道及其上的服务存根。"""
+
+    def __init__(self, channel: grpc.aio.Channel):
+        self.channel = channel
+        self.perception = pb2_grpc.PerceptionServiceStub(channel)
+        self.action = pb2_grpc.ActionServiceStub(channel)
+        self.adapter_control = pb2_grpc.AdapterControlServiceStub(channel)
+
+
+class AsyncArgusClient:
+    """
+    基于 grpc.aio 的异步客户端，接口与 ArgusClient 相同但方法为协程。
+    单个通道即可承载大量并发请求 (HTTP/2 多路复用)；pool_size > 1 时
+    请求轮询分布到多个独立连接上，避免单连接的流数量上限和队头阻塞。
+    """
+
+    def __init__(
+        self,
+        server_address: str = "localhost:50051",
+        pool_size: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        channel_options: Optional[ChannelOptions] = None,
+        track_element_identities: bool = False,
+    ):
+        """
+        :param server_address: 服务端地址。
+        :param pool_size: 通道数量，None 表示使用 settings.GRPC_CLIENT_CHANNEL_POOL_SIZE。
+        :param max_in_flight: 同时进行的请求上限，None 表示不限制。
+        :param channel_options: 通道参数，None 表示使用 build_channel_options() 的默认值。
+        :param track_element_identities: 为 True 时用返回的每个完整快照更新
+            element_identities (同 ArgusClient)。
+        """
+        self.server_address = server_address
+        self.pool_size = max(1, pool_size or settings.GRPC_CLIENT_CHANNEL_POOL_SIZE)
+        self.channel_options = (
+            channel_options if channel_options is not None else build_channel_options()
+        )
+        self._max_in_flight = max_in_flight
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._pool: List[_ChannelStubs] = []
+        self._round_robin = None
+        self.element_identities: Optional[ElementIdentityTracker] = (
+            ElementIdentityTracker() if track_element_identities else None
+        )
+
+    # grpc.aio 通道绑定到创建时的事件循环，因此在第一次使用时才创建
+    def _ensure_channels(self) -> None:
+        if self._pool:
+            return
+        options = list(self.channel_options)
+        if self.pool_size > 1:
+            # 每个通道使用独立的子通道池，否则参数相同的通道会共用同一个连接
+            options.append(("grpc.use_local_subchannel_pool", 1))
+        self._pool = [
+            _ChannelStubs(grpc.aio.insecure_channel(self.server_address, options))
+            for _ in range(self.pool_size)
+        ]
+        self._round_robin = itertools.cycle(self._pool)
+        if self._max_in_flight:
+            self._in_flight = asyncio.Semaphore(self._max_in_flight)
+        logger.info(
+            "Created %d gRPC aio channel(s) to %s", self.pool_size, self.server_address
+        )
+
+    def _track_identities(
+        self, snapshot: Optional[pb2.UISnapshot]
+    ) -> Optional[pb2.UISnapshot]:
+        """启用了身份跟踪时用新快照更新 element_identities，返回原快照。"""
+        if snapshot is not None and self.element_identities is not None:
+            self.element_identities.update(snapshot)
+        return snapshot
+
+    def _next_stubs(self) -> _ChannelStubs:
+        self._ensure_channels()
+        return next(self._round_robin)
+
+    async def _call(self, stub_method, request):
+        """发起一次调用，设置了 max_in_flight 时先获取并发名额。"""
+        if self._in_flight is None:
+            return await stub_method(request)
+        async with self._in_flight:
+            return await stub_method(request)
+
+    async def connect(self, timeout: Optional[float] = None) -> None:
+        """
+        等待所有通道连接就绪 (可选，调用 RPC 时会自动连接)。
+        :raises ConnectionError: 超时仍未连接成功。
+        """
+        self._ensure_channels()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *(stubs.channel.channel_ready() for stubs in self._pool)
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError as e:
+            raise ConnectionError(
+                f"Failed to connect to {self.server_address} within {timeout}s"
+            ) from e
+        logger.info("Successfully connected to gRPC server at %s", self.server_address)
+
+    async def close(self) -> None:
+        """关闭所有通道。"""
+        pool, self._pool = self._pool, []
+        for stubs in pool:
+            await stubs.channel.close()
+        if pool:
+            logger.info("gRPC aio channel(s) closed.")
+
+    async def __aenter__(self) -> "AsyncArgusClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    # --- AdapterControlService 方法 ---
+    async def initialize_adapter(
+        self, adapter_name: str, config: Struct
+    ) -> pb2.InitializeResponse:
+        request = pb2.InitializeRequest(adapter_name=adapter_name, config=config)
+        logger.info("Sending Initialize request for adapter '%s'", adapter_name)
+        try:
+            return await self._call(
+                self._next_stubs().adapter_control.Initialize, request
+            )
+        except grpc.RpcError as e:
+            logger.error("RPC failed for Initialize: %s", e, exc_info=True)
+            return pb2.InitializeResponse(success=False, message=f"RPC Error: {e}")
+
+    async def shutdown_server(self) -> pb2.ShutdownResponse:
+        logger.info("Sending Shutdown request")
+        try:
+            return await self._call(
+                self._next_stubs().adapter_control.Shutdown,
+                pb2.ShutdownRequest(),
+            )
+        except grpc.RpcError as e:
+            logger.error("RPC failed for Shutdown: %s", e, exc_info=True)
+            return pb2.ShutdownResponse(success=False, message=f"RPC Error: {e}")
+
+    async def get_metrics(
+        self, name_prefixes: list[str] | None = None
+    ) -> pb2.GetMetricsResponse | None:
+        """
+        :param name_prefixes: 只返回名称以其中任一前缀开头的指标，None 表示全部。
+        """
+        logger.debug("Sending GetMetrics request")
+        try:
+            return await self._call(
+                self._next_stubs().adapter_control.GetMetrics,
+                pb2.GetMetricsRequest(name_prefixes=name_prefixes or []),
+            )
+        except grpc.RpcError as e:
+            logger.error("RPC failed for GetMetrics: %s", e, exc_info=True)
+            return None
+
+    async def get_readiness(self) -> pb2.GetReadinessResponse | None:
+        """返回服务端预加载适配器的就绪状态。"""
+        logger.debug("Sending GetReadiness request")
+        try:
+            return await self._call(
+                self._next_stubs().adapter_control.GetReadiness,
+                pb2.GetReadinessRequest(),
+            )
+        except grpc.RpcError as e:
+            logger.error("RPC failed for GetReadiness: %s", e, exc_info=True)
+            return None
+
+    # --- PerceptionService 方法 ---
+    async def get_ui_snapshot(
+        self,
+        options: Struct | None = None,
+        columnar: bool = False,
+        share_blobs: bool = False,
+    ) -> pb2.UISnapshot | None:
+        """
+        :param columnar: 为 True 时请求列式编码 (传输更小)，返回前在本地还原为普通快照。
+        :param share_blobs: 为 True 且与服务端在同一主机时，大块原始数据以
+                            accessibility_tree_blob 句柄返回，用 open_blob() 映射。
+        """
+        request = pb2.GetUISnapshotRequest(
+            options=options if options else Struct(),
+            columnar=columnar,
+            client_host_id=get_host_id() if share_blobs else "",
+        )
+        logger.debug("Sending GetUISnapshot request")
+        try:
+            response = await self._call(
+                self._next_stubs().perception.GetUISnapshot, request
+            )
+            return self._track_identities(from_columnar_snapshot(response))
+        except grpc.RpcError as e:
+            logger.error("RPC failed for GetUISnapshot: %s", e, exc_info=True)
+            return None
+
+    async def stream_ui_snapshot_chunks(
+        self,
+        options: Struct | None = None,
+        max_chunk_bytes: int = 0,
+        share_blobs: bool = False,
+    ) -> AsyncIterator[pb2.UISnapshotChunk]:
+        """
+        调用 StreamUISnapshot，逐条产出分块消息: 首条只有快照头，之后为元素批次。
+        :param max_chunk_bytes: 每条消息的目标字节上限，0 表示使用服务端默认值。
+        :param share_blobs: 同 get_ui_snapshot()。
+        :raises grpc.RpcError: 流异常中断 (此时已收到的元素不构成完整快照)。
+        """
+        request = pb2.StreamUISnapshotRequest(
+            options=options if options else Struct(),
+            max_chunk_bytes=max_chunk_bytes,
+            client_host_id=get_host_id() if share_blobs else "",
+        )
+        logger.debug("Sending StreamUISnapshot request")
+        call = self._next_stubs().perception.StreamUISnapshot(request)
+        try:
+            async for chunk in call:
+                yield chunk
+        except grpc.RpcError as e:
+            logger.error("RPC failed for StreamUISnapshot: %s", e, exc_info=True)
+            raise
+        finally:
+            call.cancel()
+
+    async def get_ui_snapshot_streamed(
+        self,
+        options: Struct | None = None,
+        max_chunk_bytes: int = 0,
+        share_blobs: bool = False,
+    ) -> pb2.UISnapshot | None:
+        """通过 StreamUISnapshot 分块获取完整快照，不受单条消息大小上限限制。"""
+        assembler = SnapshotChunkAssembler()
+        try:
+            async for chunk in self.stream_ui_snapshot_chunks(
+                options, max_chunk_bytes, share_blobs
+            ):
+                assembler.add(chunk)
+            return self._track_identities(assembler.snapshot())
+        except grpc.RpcError:
+            return None
+
+    async def find_element(
+        self, query: pb2.ElementQuery | dict
+    ) -> pb2.FindElementResponse | None:
+        """
+        :param query: ElementQuery，或以 ElementQuery 字段名为键的字典
+                      (例如 {"element_type": "button", "name": "OK"})。
+        """
+        request = (
+            query if isinstance(query, pb2.ElementQuery) else pb2.ElementQuery(**query)
+        )
+        logger.debug("Sending FindElement request")
+        try:
+            return await self._call(self._next_stubs().perception.FindElement, request)
+        except grpc.RpcError as e:
+            logger.error("RPC failed for FindElement: %s", e, exc_info=True)
+            return None
+
+    async def wait_for_condition(
+        self, request: pb2.WaitForConditionRequest
+    ) -> pb2.WaitForConditionResponse | None:
+        """
+        在服务端等待条件成立 (一次往返，替代客户端循环 FindElement)。
+        超时不是错误: 返回 satisfied=False 的响应。
+        """
+        logger.debug("Sending WaitForCondition request")
+        try:
+            return await self._call(
+                self._next_stubs().perception.WaitForCondition, request
+            )
+        except grpc.RpcError as e:
+            logger.error("RPC failed for WaitForCondition: %s", e, exc_info=True)
+            return None
+
+    async def wait_for_element(
+        self, query: pb2.ElementQuery | dict, timeout_ms: int = 0
+    ) -> pb2.UIElement | None:
+        """
+        等待匹配 query 的元素出现，返回第一个匹配的元素，超时或失败时返回 None。
+        :param query: 同 find_element()。
+        :param timeout_ms: 等待上限，0 表示使用服务端默认值。
+        """
+        if not isinstance(query, pb2.ElementQuery):
+            query = pb2.ElementQuery(**query)
+        response = await self.wait_for_condition(
+            pb2.WaitForConditionRequest(element_present=query, timeout_ms=timeout_ms)
+        )
+        if response is None or not response.satisfied:
+            return None
+        return response.elements[0]
+
+    # --- ActionService 方法 ---
+    async def click_element(
+        self, element_id: bytes, options: Struct | None = None
+    ) -> pb2.ActionResult | None:
+        request = pb2.ClickRequest(
+            adapter_specific_id=element_id, options=options if options else Struct()
+        )
+        logger.debug("Sending Click request")
+        try:
+            return await self._call(self._next_stubs().action.Click, request)
+        except grpc.RpcError as e:
+            logger.error("RPC failed for Click: %s", e, exc_info=True)
+            return None
+
+    async def type_text_in_element(
+        self,
+        text: str,
+        element_id: bytes | None = None,
+        options: Struct | None = None,
+    ) -> pb2.ActionResult | None:
+        request = pb2.TypeTextRequest(
+            text=text, options=options if options else Struct()
+        )
+        if element_id:
+            request.adapter_specific_id = element_id
+        log_text = (text[:50] + "...") if len(text) > 50 else text
+        logger.debug("Sending TypeText request with text: '%s'", log_text)
+        try:
+            return await self._call(self._next_stubs().action.TypeText, request)
+        except grpc.RpcError as e:
+            logger.error("RPC failed for TypeText: %s", e, exc_info=True)
+            return None
+
+    async def execute_action_batch(
+        self,
+        steps: list[pb2.ActionStep],
+        stop_on_failure: bool = True,
+        default_delay_ms: int = 0,
+    ) -> pb2.ExecuteActionBatchResponse | None:
+        request = pb2.ExecuteActionBatchRequest(
+            steps=steps,
+            failure_policy=(
+                pb2.BatchFailurePolicy.BATCH_FAILURE_POLICY_STOP_ON_FAILURE
+                if stop_on_failure
+                else pb2.BatchFailurePolicy.BATCH_FAILURE_POLICY_CONTINUE
+            ),
+            default_delay_ms=default_delay_ms,
+        )
+        logger.debug("Sending ExecuteActionBatch request with %d steps", len(steps))
+        try:
+            return await self._call(
+                self._next_stubs().action.ExecuteActionBatch, request
+            )
+        except grpc.RpcError as e:
+            logger.error("RPC failed for ExecuteActionBatch: %s", e, exc_info=True)
+            return None
@@ -0,0 +1,296 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent import futures
+from typing import Any, Callable, List, Optional
+
+import grpc
+
+from config import settings
+from core.grpc_server import (
+    ActionServiceImpl,
+    AdapterControlServiceImpl,
+    PerceptionServiceImpl,
+)
+from core.grpc_tracing import AsyncTracingServerInterceptor
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+    import generated_protobuf.core_services_pb2_grpc as pb2_grpc
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+# 服务端流结束的哨兵值
+_STREAM_END = object()
+
+# 引用全局 aio 服务器实例 (在 serve_aio 中创建)，供 Shutdown RPC 使用
+aio_server_instance: Optional[grpc.aio.Server] = None
+
+
+class _AbortRequested(Exception):
+    """同步 servicer 在执行器线程中调用 abort() 时抛出，由事件循环一侧真正终止 RPC。"""
+
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class SyncServicerContext:
+    """
+    让同步 servicer 在执行器线程中使用 grpc.aio 的 ServicerContext。
+    提供同步 API 中的 is_active()、add_callback() 和 abort()，
+    其余属性直接转发给 aio 上下文。
+    """
+
+    def __init__(self, aio_context: grpc.aio.ServicerContext):
+        self._aio_context = aio_context
+        self._done = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+        aio_context.add_done_callback(self._on_done)
+
+    def _on_done(self, _context) -> None:
+        # 在事件循环线程中调用: RPC 完成、取消或超时
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("RPC termination callback raised: %s", e, exc_info=True)
+
+    def is_active(self) -> bool:
+        return not self._done.is_set()
+
+    def add_callback(self, callback: Callable[[], None]) -> bool:
+        """注册 RPC 终止时调用的回调；RPC 已终止时返回 False (与同步 API 一致)。"""
+        with self._callbacks_lock:
+            if self._done.is_set():
+                return False
+            self._callbacks.append(callback)
+            return True
+
+    def abort(self, code: grpc.StatusCode, details: str):
+        raise _AbortRequested(code, details)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._aio_context, name)
+
+
+class BlockingCallDispatcher:
+    """
+    在有界线程池中执行阻塞的同步 servicer 调用，事件循环本身从不阻塞。
+    适配器相关的服务 (Perception / Action) 和控制服务 (AdapterControlService) 使用
+    各自的线程池: 慢速适配器调用占满线程池时，指标和就绪检查仍能立即得到处理。
+    调用方的 contextvars 会被复制到工作线程。
+    """
+
+    def __init__(self, max_workers: int, control_workers: int = 2):
+        """
+        :param max_workers: 执行适配器相关 RPC 的线程数。
+        :param control_workers: 执行控制服务 RPC 的线程数。
+        """
+        self.max_workers = max_workers
+        self.control_workers = control_workers
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="argus-aio-worker"
+        )
+        self._control_executor = futures.ThreadPoolExecutor(
+            max_workers=control_workers, thread_name_prefix="argus-aio-control"
+        )
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """在适配器线程池中执行 fn(*args)。"""
+        return await self._run(self._executor, fn, *args)
+
+    async def call_control(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """在控制服务线程池中执行 fn(*args)。"""
+        return await self._run(self._control_executor, fn, *args)
+
+    @staticmethod
+    async def _run(
+        executor: futures.Executor, fn: Callable[..., Any], *args: Any
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            executor, functools.partial(context.run, fn, *args)
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._control_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _unary_handler(method_name: str):
+    async def handler(self, request, context):
+        sync_context = SyncServicerContext(context)
+        method = getattr(self._servicer, method_name)
+        try:
+            return await self._call(method, request, sync_context)
+        except _AbortRequested as e:
+            await context.abort(e.code, e.details)
+
+    handler.__name__ = method_name
+    return handler
+
+
+def _server_streaming_handler(method_name: str):
+    async def handler(self, request, context):
+        sync_context = SyncServicerContext(context)
+        method = getattr(self._servicer, method_name)
+        try:
+            iterator = await self._call(lambda: iter(method(request, sync_context)))
+            # 每次 next() 都在执行器中运行; 客户端取消后 sync_context.is_active()
+            # 变为 False，同步生成器会自行结束
+            while True:
+                item = await self._call(next, iterator, _STREAM_END)
+                if item is _STREAM_END:
+                    break
+                yield item
+        except _AbortRequested as e:
+            await context.abort(e.code, e.details)
+
+    handler.__name__ = method_name
+    return handler
+
+
+def _build_async_servicer(
+    service_name: str,
+    base_class: type,
+    overrides: Optional[dict] = None,
+    control: bool = False,
+) -> type:
+    """
+    按 proto 服务描述为同步 servicer 生成 aio 包装类。
+    每个 RPC 都转发到同步实现，proto 中新增的 RPC 无需在这里重复定义。
+    :param control: 为 True 时在 dispatcher 的控制服务线程池中执行，
+        不与适配器调用争用线程。
+    """
+    namespace: dict = {}
+    service = pb2.DESCRIPTOR.services_by_name[service_name]
+    for method in service.methods:
+        if method.client_streaming:
+            raise NotImplementedError(
+                f"Client streaming RPC '{service_name}.{method.name}' is not supported."
+            )
+        if method.server_streaming:
+            namespace[method.name] = _server_streaming_handler(method.name)
+        else:
+            namespace[method.name] = _unary_handler(method.name)
+    namespace.update(overrides or {})
+
+    def __init__(self, servicer, dispatcher: BlockingCallDispatcher):
+        self._servicer = servicer
+        self._call = dispatcher.call_control if control else dispatcher.call
+
+    namespace["__init__"] = __init__
+    return type(f"Async{service_name}", (base_class,), namespace)
+
+
+async def _shutdown(self, request: pb2.ShutdownRequest, context):
+    logger.info("RPC: Shutdown received. Scheduling aio server stop...")
+    if aio_server_instance is not None:
+        # 在后台停止，以便响应可以先发送回去
+        asyncio.get_running_loop().create_task(aio_server_instance.stop(grace=1))
+    return pb2.ShutdownResponse(success=True, message="Server shutdown initiated")
+
+
+AsyncPerceptionService = _build_async_servicer(
+    "PerceptionService", pb2_grpc.PerceptionServiceServicer
+)
+AsyncActionService = _build_async_servicer(
+    "ActionService", pb2_grpc.ActionServiceServicer
+)
+AsyncAdapterControlService = _build_async_servicer(
+    "AdapterControlService",
+    pb2_grpc.AdapterControlServiceServicer,
+    overrides={"Shutdown": _shutdown},
+    control=True,
+)
+
+
+def create_aio_server(
+    port: int = 50051,
+    dispatcher: Optional[BlockingCallDispatcher] = None,
+    max_concurrent_rpcs: Optional[int] = None,
+) -> tuple[grpc.aio.Server, int, BlockingCallDispatcher]:
+    """
+    创建 grpc.aio 服务器并注册所有服务 (不启动)。必须在事件循环中调用。
+    :param port: 监听端口，0 表示由系统分配。
+    :param dispatcher: 执行阻塞调用的线程池，None 时按配置创建。
+    :param max_concurrent_rpcs: 同时处理的 RPC 上限，None 表示不限制。
+    :return: (服务器, 实际绑定的端口, dispatcher)。
+    """
+    if dispatcher is None:
+        dispatcher = BlockingCallDispatcher(
+            settings.GRPC_AIO_EXECUTOR_WORKERS,
+            control_workers=settings.GRPC_AIO_CONTROL_EXECUTOR_WORKERS,
+        )
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
+        interceptors=[AsyncTracingServerInterceptor()],
+    )
+    pb2_grpc.add_PerceptionServiceServicer_to_server(
+        AsyncPerceptionService(PerceptionServiceImpl(), dispatcher), server
+    )
+    pb2_grpc.add_ActionServiceServicer_to_server(
+        AsyncActionService(ActionServiceImpl(), dispatcher), server
+    )
+    pb2_grpc.add_AdapterControlServiceServicer_to_server(
+        AsyncAdapterControlService(AdapterControlServiceImpl(), dispatcher), server
+    )
+    bound_port = server.add_insecure_port(f"[::]:{port}")
+    return server, bound_port, dispatcher
+
+
+async def serve_aio(
+    port: int = 50051,
+    executor_workers: Optional[int] = None,
+    max_concurrent_rpcs: Optional[int] = None,
+) -> None:
+    """启动 grpc.aio 服务器，直到服务器被停止。"""
+    global aio_server_instance
+    dispatcher = BlockingCallDispatcher(
+        executor_workers or settings.GRPC_AIO_EXECUTOR_WORKERS,
+        control_workers=settings.GRPC_AIO_CONTROL_EXECUTOR_WORKERS,
+    )
+    aio_server_instance, _, _ = create_aio_server(
+        port, dispatcher=dispatcher, max_concurrent_rpcs=max_concurrent_rpcs
+    )
+    logger.info(
+        "Starting gRPC aio server on [::]:%s (%s executor workers)...",
+        port,
+        dispatcher.max_workers,
+    )
+    await aio_server_instance.start()
+    logger.info("Server started. Waiting for termination signal...")
+    try:
+        await aio_server_instance.wait_for_termination()
+    finally:
+        dispatcher.shutdown()
+        logger.info("Server stopped.")
+
+
+def run_aio_server(port: int = 50051) -> None:
+    """在新的事件循环中运行 aio 服务器 (阻塞)，供 grpc_server.serve 调用。"""
+    try:
+        asyncio.run(
+            serve_aio(
+                port=port, max_concurrent_rpcs=settings.GRPC_AIO_MAX_CONCURRENT_RPCS
+            )
+        )
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt received, server stopped.")
@@ -1,10 +1,21 @@
 import logging
+import threading
+from typing import Iterator
 
 import grpc
+from google.protobuf.struct_pb2 import Struct
 
 # 导入配置 (移到顶部)
 from config import settings
 
+# 导入快照列式编码和增量工具
+from core.blob_store import get_host_id
+from core.element_identity import ElementIdentityTracker
+from core.grpc_tracing import TracingClientInterceptor
+from core.snapshot_chunks import SnapshotChunkAssembler
+from core.snapshot_columnar import from_columnar_snapshot
+from core.snapshot_diff import SnapshotDiffApplier
+
 # 导入新的日志配置函数 (移到顶部)
 from utils.logging_config import setup_logging
 
@@ -12,6 +23,7 @@ from utils.logging_config import setup_logging
 from utils.proto_utils import (  # proto_struct_to_python_dict, # 未使用
     python_dict_to_proto_struct,
 )
+from utils.tracing import Tracer
 
 # 导入生成的 protobuf 代码
 try:
@@ -31,8 +43,25 @@ logger = logging.getLogger(__name__)
 class ArgusClient:
     """gRPC 客户端，用于与 Argus 服务端交互。"""
 
-    def __init__(self, server_address: str = "localhost:50051"):
+    def __init__(
+        self,
+        server_address: str = "localhost:50051",
+        tracer: Tracer | None = None,
+        track_element_identities: bool = False,
+    ):
+        """
+        :param tracer: 请求 ID 和追踪采样使用的 Tracer，None 表示进程默认 Tracer
+                       (settings.TRACE_SAMPLE_RATE / TRACE_SPAN_FILE)。
+        :param track_element_identities: 为 True 时用返回的每个完整快照更新
+                       element_identities，元素句柄跨快照保持不变，
+                       不必在每个新快照上重新 FindElement。
+        """
         self.server_address = server_address
+        self.tracer = tracer
+        self.element_identities: ElementIdentityTracker | None = (
+            ElementIdentityTracker() if track_element_identities else None
+        )
+        self._identities_lock = threading.Lock()
         self.channel = None
         self.perception_stub = None
         self.action_stub = None
@@ -42,7 +71,11 @@ class ArgusClient:
     def _connect(self):
         """建立到 gRPC 服务器的连接并创建服务存根。"""
         try:
-            self.channel = grpc.insecure_channel(self.server_address)
+            # 每个调用携带 x-request-id，采样时记录客户端 span
+            self.channel = grpc.intercept_channel(
+                grpc.insecure_channel(self.server_address),
+                TracingClientInterceptor(self.tracer),
+            )
             # 可以添加 channel readiness 检查
             # grpc.channel_ready_future(self.channel).result(timeout=10) # 等待连接就绪
             self.perception_stub = pb2_grpc.PerceptionServiceStub(self.channel)
@@ -62,6 +95,13 @@ class ArgusClient:
             self.channel = None
             raise ConnectionError(f"Failed to connect to {self.server_address}") from e
 
+    def _track_identities(self, snapshot: pb2.UISnapshot | None):
+        """启用了身份跟踪时用新快照更新 element_identities，返回原快照。"""
+        if snapshot is not None and self.element_identities is not None:
+            with self._identities_lock:
+                self.element_identities.update(snapshot)
+        return snapshot
+
     def close(self):
         """关闭 gRPC 连接。"""
         if self.channel:
@@ -72,7 +112,7 @@ class ArgusClient:
     def initialize_adapter(
         self,
         adapter_name: str,
-        config: pb2.Struct,  # Changed: Expect pre-converted struct
+        config: Struct,  # Changed: Expect pre-converted struct
     ) -> pb2.InitializeResponse:
         if not self.adapter_control_stub:
             raise ConnectionError("Client not connected.")
@@ -82,7 +122,7 @@ class ArgusClient:
         logger.info("Sending Initialize request for adapter '%s'", adapter_name)
         try:
             response = self.adapter_control_stub.Initialize(request)
-            logger.info(f"Initialize response: {response}")
+            logger.info("Initialize response: %s", response)
             return response
         except grpc.RpcError as e:
             logger.error("RPC failed for Initialize: %s", e, exc_info=True)
@@ -96,28 +136,149 @@ class ArgusClient:
         logger.info("Sending Shutdown request")
         try:
             response = self.adapter_control_stub.Shutdown(request)
-            logger.info(f"Shutdown response: {response}")
+            logger.info("Shutdown response: %s", response)
             return response
         except grpc.RpcError as e:
             logger.error("RPC failed for Shutdown: %s", e, exc_info=True)
             return pb2.ShutdownResponse(success=False, message=f"RPC Error: {e}")
 
+    def get_metrics(
+        self, name_prefixes: list[str] | None = None
+    ) -> pb2.GetMetricsResponse | None:
+        """
+        :param name_prefixes: 只返回名称以其中任一前缀开头的指标，None 表示全部。
+        """
+        if not self.adapter_control_stub:
+            raise ConnectionError("Client not connected.")
+        request = pb2.GetMetricsRequest(name_prefixes=name_prefixes or [])
+        logger.debug("Sending GetMetrics request")
+        try:
+            return self.adapter_control_stub.GetMetrics(request)
+        except grpc.RpcError as e:
+            logger.error("RPC failed for GetMetrics: %s", e, exc_info=True)
+            return None
+
+    def get_readiness(self) -> pb2.GetReadinessResponse | None:
+        """返回服务端预加载适配器的就绪状态。"""
+        if not self.adapter_control_stub:
+            raise ConnectionError("Client not connected.")
+        logger.debug("Sending GetReadiness request")
+        try:
+            return self.adapter_control_stub.GetReadiness(pb2.GetReadinessRequest())
+        except grpc.RpcError as e:
+            logger.error("RPC failed for GetReadiness: %s", e, exc_info=True)
+            return None
+
     # --- PerceptionService 方法 (示例) ---
     def get_ui_snapshot(
-        self, options: pb2.Struct | None = None
+        self,
+        options: Struct | None = None,
+        columnar: bool = False,
+        share_blobs: bool = False,
     ) -> pb2.UISnapshot | None:
+        """
+        :param columnar: 为 True 时请求列式编码 (传输更小)，返回前在本地还原为普通快照。
+        :param share_blobs: 为 True 且与服务端在同一主机时，大块原始数据以
+                            accessibility_tree_blob 句柄返回，用 open_blob() 映射。
+        """
         if not self.perception_stub:
             raise ConnectionError("Client not connected.")
-        request = pb2.GetUISnapshotRequest(options=options if options else pb2.Struct())
+        request = pb2.GetUISnapshotRequest(
+            options=options if options else Struct(),
+            columnar=columnar,
+            client_host_id=get_host_id() if share_blobs else "",
+        )
         logger.info("Sending GetUISnapshot request")
         try:
             response = self.perception_stub.GetUISnapshot(request)
             logger.debug("GetUISnapshot response received (details omitted)")
-            return response
+            return self._track_identities(from_columnar_snapshot(response))
         except grpc.RpcError as e:
             logger.error("RPC failed for GetUISnapshot: %s", e, exc_info=True)
             return None
 
+    def stream_ui_snapshots(
+        self,
+        options: Struct | None = None,
+        interval_ms: int = 0,
+        max_updates: int | None = None,
+    ) -> Iterator[pb2.UISnapshot]:
+        """
+        订阅 StreamUISnapshotDiffs，并在本地应用增量，逐次产出重建后的完整快照。
+        :param options: 传递给适配器的快照选项。
+        :param interval_ms: 服务端采集间隔，0 表示使用服务端默认值。
+        :param max_updates: 最多接收的更新数，None 表示直到流结束或被取消。
+        """
+        if not self.perception_stub:
+            raise ConnectionError("Client not connected.")
+        request = pb2.StreamUISnapshotDiffsRequest(
+            options=options if options else Struct(), interval_ms=interval_ms
+        )
+        if max_updates is not None:
+            request.max_updates = max_updates
+        logger.info("Sending StreamUISnapshotDiffs request")
+        applier = SnapshotDiffApplier()
+        responses = self.perception_stub.StreamUISnapshotDiffs(request)
+        try:
+            for diff in responses:
+                applier.apply(diff)
+                yield self._track_identities(applier.snapshot())
+        except grpc.RpcError as e:
+            logger.error("RPC failed for StreamUISnapshotDiffs: %s", e, exc_info=True)
+        finally:
+            # 调用方提前停止迭代时取消服务端流
+            responses.cancel()
+
+    def stream_ui_snapshot_chunks(
+        self,
+        options: Struct | None = None,
+        max_chunk_bytes: int = 0,
+        share_blobs: bool = False,
+    ) -> Iterator[pb2.UISnapshotChunk]:
+        """
+        调用 StreamUISnapshot，逐条产出分块消息: 首条只有快照头，之后为元素批次。
+        适合在采集完成前就开始处理元素；需要完整快照时使用 get_ui_snapshot_streamed()。
+        :param max_chunk_bytes: 每条消息的目标字节上限，0 表示使用服务端默认值。
+        :param share_blobs: 同 get_ui_snapshot()。
+        :raises grpc.RpcError: 流异常中断 (此时已收到的元素不构成完整快照)。
+        """
+        if not self.perception_stub:
+            raise ConnectionError("Client not connected.")
+        request = pb2.StreamUISnapshotRequest(
+            options=options if options else Struct(),
+            max_chunk_bytes=max_chunk_bytes,
+            client_host_id=get_host_id() if share_blobs else "",
+        )
+        logger.info("Sending StreamUISnapshot request")
+        responses = self.perception_stub.StreamUISnapshot(request)
+        try:
+            yield from responses
+        except grpc.RpcError as e:
+            logger.error("RPC failed for StreamUISnapshot: %s", e, exc_info=True)
+            raise
+        finally:
+            # 调用方提前停止迭代时取消服务端流
+            responses.cancel()
+
+    def get_ui_snapshot_streamed(
+        self,
+        options: Struct | None = None,
+        max_chunk_bytes: int = 0,
+        share_blobs: bool = False,
+    ) -> pb2.UISnapshot | None:
+        """
+        通过 StreamUISnapshot 分块获取完整快照，不受单条消息大小上限限制。
+        """
+        assembler = SnapshotChunkAssembler()
+        try:
+            for chunk in self.stream_ui_snapshot_chunks(
+                options, max_chunk_bytes, share_blobs
+            ):
+                assembler.add(chunk)
+            return self._track_identities(assembler.snapshot())
+        except grpc.RpcError:
+            return None
+
     def find_element(
         self, query_criteria: dict, strategy: str = "xpath", max_results: int = 1
     ) -> pb2.FindElementResponse | None:
@@ -133,26 +294,64 @@ class ArgusClient:
         logger.info("Sending FindElement request with strategy '%s'", strategy)
         try:
             response = self.perception_stub.FindElement(request)
-            logger.debug(f"FindElement response: {response}")
+            logger.debug("FindElement response: %s", response)
             return response
         except grpc.RpcError as e:
             logger.error("RPC failed for FindElement: %s", e, exc_info=True)
             return None
 
+    def wait_for_condition(
+        self, request: pb2.WaitForConditionRequest
+    ) -> pb2.WaitForConditionResponse | None:
+        """
+        在服务端等待条件成立 (一次往返，替代客户端循环 FindElement)。
+        超时不是错误: 返回 satisfied=False 的响应。
+        """
+        if not self.perception_stub:
+            raise ConnectionError("Client not connected.")
+        logger.info(
+            "Sending WaitForCondition request (%s)", request.WhichOneof("condition")
+        )
+        try:
+            response = self.perception_stub.WaitForCondition(request)
+            logger.debug(
+                "WaitForCondition response: satisfied=%s after %d attempts",
+                response.satisfied,
+                response.attempts,
+            )
+            return response
+        except grpc.RpcError as e:
+            logger.error("RPC failed for WaitForCondition: %s", e, exc_info=True)
+            return None
+
+    def wait_for_element(
+        self, query: pb2.ElementQuery, timeout_ms: int = 0
+    ) -> pb2.UIElement | None:
+        """
+        等待匹配 query 的元素出现，返回第一个匹配的元素，超时或失败时返回 None。
+        :param timeout_ms: 等待上限，0 表示使用服务端默认值。
+        """
+        response = self.wait_for_condition(
+            pb2.WaitForConditionRequest(element_present=query, timeout_ms=timeout_ms)
+        )
+        if response is None or not response.satisfied:
+            return None
+        return response.elements[0]
+
     # --- ActionService 方法 (示例) ---
     def click_element(
-        self, element_id: bytes, options: pb2.Struct | None = None
+        self, element_id: bytes, options: Struct | None = None
     ) -> pb2.ActionResult | None:
         if not self.action_stub:
             raise ConnectionError("Client not connected.")
         request = pb2.ClickRequest(
             adapter_specific_id=element_id,
-            options=options if options else pb2.Struct(),
+            options=options if options else Struct(),
         )
         logger.info("Sending Click request")
         try:
             response = self.action_stub.Click(request)
-            logger.info(f"Click response: {response}")
+            logger.info("Click response: %s", response)
             return response
         except grpc.RpcError as e:
             logger.error("RPC failed for Click: %s", e, exc_info=True)
@@ -162,12 +361,12 @@ class ArgusClient:
         self,
         text: str,
         element_id: bytes | None = None,
-        options: pb2.Struct | None = None,
+        options: Struct | None = None,
     ) -> pb2.ActionResult | None:
         if not self.action_stub:
             raise ConnectionError("Client not connected.")
         request = pb2.TypeTextRequest(
-            text=text, options=options if options else pb2.Struct()
+            text=text, options=options if options else Struct()
         )
         if element_id:
             request.adapter_specific_id = element_id
@@ -176,12 +375,48 @@ class ArgusClient:
         logger.info("Sending TypeText request with text: '%s'", log_text)
         try:
             response = self.action_stub.TypeText(request)
-            logger.info(f"TypeText response: {response}")
+            logger.info("TypeText response: %s", response)
             return response
         except grpc.RpcError as e:
             logger.error("RPC failed for TypeText: %s", e, exc_info=True)
             return None
 
+    def execute_action_batch(
+        self,
+        steps: list[pb2.ActionStep],
+        stop_on_failure: bool = True,
+        default_delay_ms: int = 0,
+    ) -> pb2.ExecuteActionBatchResponse | None:
+        """
+        在一次往返中按顺序执行多个动作步骤。
+        :param steps: 动作步骤，例如 pb2.ActionStep(click=pb2.ClickRequest(...))。
+        :param stop_on_failure: 为 True 时第一个失败步骤之后不再执行。
+        :param default_delay_ms: 未单独设置 delay_after_ms 的步骤之后的等待时间。
+        """
+        if not self.action_stub:
+            raise ConnectionError("Client not connected.")
+        request = pb2.ExecuteActionBatchRequest(
+            steps=steps,
+            failure_policy=(
+                pb2.BatchFailurePolicy.BATCH_FAILURE_POLICY_STOP_ON_FAILURE
+                if stop_on_failure
+                else pb2.BatchFailurePolicy.BATCH_FAILURE_POLICY_CONTINUE
+            ),
+            default_delay_ms=default_delay_ms,
+        )
+        logger.info("Sending ExecuteActionBatch request with %d steps", len(steps))
+        try:
+            response = self.action_stub.ExecuteActionBatch(request)
+            logger.info(
+                "ExecuteActionBatch response: success=%s, %d steps executed",
+                response.success,
+                len(response.results),
+            )
+            return response
+        except grpc.RpcError as e:
+            logger.error("RPC failed for ExecuteActionBatch: %s", e, exc_info=True)
+            return None
+
 
 # --- 辅助函数占位符 (需要实现) ---
 # def convert_dict_to_struct(py_dict):
@@ -247,7 +482,7 @@ if __name__ == "__main__":
         find_resp = client.find_element(query_criteria=query_dict, strategy="xpath")
         if find_resp and find_resp.elements:
             found_element_id = find_resp.elements[0].adapter_specific_id
-            logger.info(f"Found element with ID (bytes): {found_element_id}")
+            logger.info("Found element with ID (bytes): %s", found_element_id)
 
             # 示例: 点击找到的元素 (带选项)
             click_options_dict = {"button": "left", "click_count": 1}
@@ -288,9 +523,9 @@ if __name__ == "__main__":
         #     logger.info(f"Server shutdown result: {shutdown_resp.success}")
 
     except ConnectionError as e:
-        logger.critical(f"Connection Error: {e}")
+        logger.critical("Connection Error: %s", e)
     except Exception as e:
-        logger.exception(f"An unexpected error occurred: {e}")
+        logger.exception("An unexpected error occurred: %s", e)
     finally:
         if client:
             client.close()
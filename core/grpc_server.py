@@ -1,19 +1,51 @@
+import functools
 import logging
+import re
 import threading
-
-# import time # 未使用
+import time
+import weakref
 from concurrent import futures
+from contextlib import contextmanager
+from typing import Any, Iterator, NamedTuple
 
 import grpc
 
 # 导入配置 (移到底部，仅在 __main__ 中使用)
 from config import settings
+from core.adapter_manager import AdapterManager
+from core.adapter_pool import AdapterPoolConfig
+from core.blob_store import (
+    BlobStore,
+    BlobStoreFullError,
+    has_offloadable_blobs,
+    offload_snapshot_blobs,
+    release_snapshot_blobs,
+)
+from core.element_query import compile_query, has_selector
+from core.grpc_tracing import TracingServerInterceptor, get_default_tracer
+from core.snapshot_cache import SnapshotCache
+from core.snapshot_chunks import iter_snapshot_chunks
+from core.snapshot_columnar import to_columnar_snapshot
+from core.snapshot_diff import compute_snapshot_diff, copy_snapshot_header
+from core.snapshot_index import SnapshotIndex, SnapshotIndexStore
+from core.snapshot_selectors import SelectorError
+from core.ui_wait import PollingBackoff, UIChangeNotifier
+from utils import tracing
 
 # 导入日志配置 (移到底部，仅在 __main__ 中使用)
 from utils.logging_config import setup_logging
+from utils.metrics import (
+    MetricFamilySnapshot,
+    default_registry,
+    start_metrics_http_server,
+)
 
 # 导入转换工具 (移到顶部)
-from utils.proto_utils import proto_struct_to_python_dict, python_dict_to_proto_struct
+from utils.proto_utils import (
+    proto_struct_to_python_dict,
+    proto_value_map_to_python_dict,
+    python_dict_to_proto_value_map,
+)
 
 # from google.protobuf.struct_pb2 import Struct  # 未直接使用，通过转换函数间接使用
 
@@ -45,6 +77,12 @@ class PerceptionAdapterInterface:
     def get_ui_snapshot(self, options: dict) -> pb2.UISnapshot:
         return pb2.UISnapshot()
 
+    # 可选: iter_ui_snapshot(options) -> (快照头, 元素可迭代对象)。
+    # 实现后 StreamUISnapshot 会边采集边发送元素，而不是先采集完整快照。
+
+    # 可选: add_ui_change_listener(callback)。UI 发生变化时适配器 (在任意线程中)
+    # 调用 callback()，WaitForCondition 据此立即重新求值，而不是只靠轮询发现变化。
+
     def find_element(self, query: pb2.ElementQuery) -> pb2.FindElementResponse:
         return pb2.FindElementResponse()
 
@@ -107,166 +145,793 @@ global_mock_perception_adapter = PerceptionAdapterInterface()
 global_mock_action_adapter = ActionAdapterInterface()
 # --- 临时定义 --- END
 
+# 服务端的适配器管理器，serve() 在配置了 SERVER_ADAPTER_APP 或需要预加载适配器时
+# 创建；RPC 从其实例池借出适配器，GetReadiness 报告其预热状态
+adapter_manager: AdapterManager | None = None
+
+# 每个感知适配器最近一次 GetUISnapshot 的结果，用于在服务端本地解析 ElementQuery
+snapshot_index_store = SnapshotIndexStore()
+# GetUISnapshot 结果缓存，ActionService 执行动作后失效
+snapshot_cache = SnapshotCache(ttl=settings.SNAPSHOT_CACHE_TTL_MS / 1000.0)
+# 大块原始数据 (accessibility_tree_raw) 的共享内存存储，同主机客户端可直接映射
+blob_store = BlobStore(
+    max_bytes=settings.BLOB_STORE_MAX_BYTES,
+    ttl=settings.BLOB_STORE_TTL_MS / 1000.0,
+    directory=settings.BLOB_STORE_DIR,
+)
+# UI 变化通知 (动作执行、适配器回调)，唤醒等待中的 WaitForCondition
+ui_change_notifier = UIChangeNotifier()
+
+
+def is_local_client(client_host_id: str) -> bool:
+    """客户端是否与服务端在同一主机上 (可以直接映射 blob)。"""
+    return bool(client_host_id) and client_host_id == blob_store.host_id
+
+
+def _offloaded_copy(snapshot: pb2.UISnapshot, pin: bool) -> pb2.UISnapshot:
+    """返回 accessibility_tree_raw 移入 blob 存储的快照副本 (不修改原快照)。"""
+    shared = pb2.UISnapshot()
+    shared.CopyFrom(snapshot)
+    offload_snapshot_blobs(shared, blob_store, settings.BLOB_STORE_MIN_BYTES, pin=pin)
+    return shared
+
+
+def snapshot_for_client(
+    snapshot: pb2.UISnapshot, client_host_id: str, ui_key: Any = None
+) -> pb2.UISnapshot:
+    """
+    同主机客户端得到 accessibility_tree_raw 换成 blob 句柄的副本 (按需写入 blob 存储)，
+    其他客户端直接得到原快照，不经过 blob 存储。
+    snapshot 在 ui_key 的快照缓存中时，副本附加在缓存条目上: blob 在快照被缓存期间
+    保持被引用，同一快照的后续请求只续租句柄，不重复写入。
+    blob 存储容量不足时原样返回快照 (内联原始树)。
+    """
+    if not is_local_client(client_host_id) or not has_offloadable_blobs(
+        snapshot, settings.BLOB_STORE_MIN_BYTES
+    ):
+        return snapshot
+    try:
+        shared = None
+        if ui_key is not None:
+            shared = snapshot_cache.get_resource(
+                ui_key,
+                snapshot,
+                "blob_offloaded",
+                create=functools.partial(_offloaded_copy, snapshot, True),
+                release=functools.partial(release_snapshot_blobs, store=blob_store),
+            )
+        if shared is None:
+            return _offloaded_copy(snapshot, False)
+    except BlobStoreFullError as e:
+        logger.warning("Sending accessibility tree inline: %s", e)
+        return snapshot
+    if shared.HasField("accessibility_tree_blob") and not blob_store.renew(
+        shared.accessibility_tree_blob.blob_id
+    ):
+        # 只在快照刚离开缓存 (blob 已释放) 且租期已过时发生
+        logger.warning(
+            "Cached snapshot blob missing, sending accessibility tree inline"
+        )
+        return snapshot
+    return shared
+
+
+class ServedAdapters(NamedTuple):
+    """处理一个 RPC 的适配器。"""
+
+    # 快照缓存、快照索引、UI 变化通知和动作锁的键。同一应用的池实例观察同一个 UI，
+    # 因此共享同一个键
+    ui_key: Any
+    perception: Any
+    action: Any
+
+
+class _AppUIKey:
+    """池化应用的 UI 键 (可以作为弱引用字典的键)。"""
+
+    def __init__(self, app_name: str):
+        self.app_name = app_name
+
+
+_app_ui_keys: dict[str, _AppUIKey] = {}
+_app_ui_keys_guard = threading.Lock()
+
+
+def _app_ui_key(app_name: str) -> _AppUIKey:
+    with _app_ui_keys_guard:
+        key = _app_ui_keys.get(app_name)
+        if key is None:
+            key = _app_ui_keys[app_name] = _AppUIKey(app_name)
+        return key
+
+
+@contextmanager
+def served_adapters(context) -> Iterator[ServedAdapters]:
+    """
+    借出处理一个 RPC 的适配器，退出时归还。
+    配置了 settings.SERVER_ADAPTER_APP 时从 adapter_manager 的实例池借出，
+    否则使用内置的模拟适配器。池中没有可用实例或实例初始化失败时以 UNAVAILABLE 结束 RPC。
+    """
+    app_name = settings.SERVER_ADAPTER_APP
+    manager = adapter_manager
+    if not app_name or manager is None:
+        yield ServedAdapters(
+            global_mock_perception_adapter,
+            global_mock_perception_adapter,
+            global_mock_action_adapter,
+        )
+        return
+    try:
+        adapter_pair = manager.checkout_adapter(
+            app_name,
+            config=settings.SERVER_ADAPTER_CONFIG,
+            timeout=settings.ADAPTER_POOL_CHECKOUT_TIMEOUT,
+        )
+    except Exception as e:
+        logger.error("Cannot check out adapters for '%s': %s", app_name, e)
+        context.abort(
+            grpc.StatusCode.UNAVAILABLE, f"Adapter '{app_name}' unavailable: {e}"
+        )
+        raise
+    try:
+        yield ServedAdapters(_app_ui_key(app_name), *adapter_pair)
+    finally:
+        manager.checkin_adapter(app_name, adapter_pair)
+
+
+def invalidate_ui_caches(ui_key) -> None:
+    """动作可能改变了 UI: 丢弃该 UI 的快照缓存和快照索引，并唤醒等待方。"""
+    snapshot_cache.invalidate(ui_key)
+    snapshot_index_store.invalidate(ui_key)
+    ui_change_notifier.notify(ui_key)
+
+
+# 每个 UI 键一把锁: 单个动作 RPC 和 ExecuteActionBatch 都在锁内执行，
+# 保证批量步骤之间不会插入其他请求的动作
+_adapter_locks: "weakref.WeakKeyDictionary[object, threading.RLock]" = (
+    weakref.WeakKeyDictionary()
+)
+_adapter_locks_guard = threading.Lock()
+
+
+def get_adapter_lock(adapter) -> threading.RLock:
+    """返回 UI 键 (ServedAdapters.ui_key) 对应的 (可重入) 锁，首次访问时创建。"""
+    with _adapter_locks_guard:
+        lock = _adapter_locks.get(adapter)
+        if lock is None:
+            lock = threading.RLock()
+            _adapter_locks[adapter] = lock
+        return lock
+
+
+def struct_to_dict_traced(struct) -> dict:
+    """proto_struct_to_python_dict()，耗时计入当前请求追踪的 conversion span。"""
+    with tracing.span("conversion"):
+        return proto_struct_to_python_dict(struct)
+
+
 # 移除重复导入
 # from utils.proto_utils import proto_struct_to_python_dict, python_dict_to_proto_struct
 
 logger = logging.getLogger(__name__)
 
+# WaitForCondition 在客户端 deadline 之前预留的返回时间 (秒)
+_WAIT_DEADLINE_MARGIN = 0.05
+
+
+def _wait_condition_query(request: pb2.WaitForConditionRequest) -> pb2.ElementQuery:
+    """返回 WaitForCondition 条件中的元素查询。"""
+    condition = request.WhichOneof("condition")
+    if condition == "element_state":
+        return request.element_state.query
+    return getattr(request, condition)
+
+
 # --- 服务实现类 (Servicers) ---
 
 
 class PerceptionServiceImpl(pb2_grpc.PerceptionServiceServicer):
     """实现 PerceptionService 定义的 RPC 方法。"""
 
+    def _get_snapshot(
+        self, adapters: ServedAdapters, options_dict: dict
+    ) -> tuple[pb2.UISnapshot, bool]:
+        """
+        通过快照缓存获取快照，缓存未命中时采集。
+        只有默认选项 (完整 UI) 的采集会更新快照索引: region / depth 等选项得到的
+        部分快照不能用来回答 FindElement(s)。
+        :return: (快照, 是否命中缓存)
+        """
+
+        def capture() -> pb2.UISnapshot:
+            with tracing.span("adapter", method="get_ui_snapshot"):
+                return adapters.perception.get_ui_snapshot(options=options_dict)
+
+        # 采集期间执行了动作时结果已过时，不用于快照索引
+        on_current = None
+        if not options_dict:
+            on_current = functools.partial(snapshot_index_store.put, adapters.ui_key)
+        return snapshot_cache.get_or_capture(
+            adapters.ui_key, options_dict, capture, on_current=on_current
+        )
+
     def GetUISnapshot(
         self, request: pb2.GetUISnapshotRequest, context
     ) -> pb2.UISnapshot:
-        logger.info("RPC: GetUISnapshot received")
+        logger.debug("RPC: GetUISnapshot received")
         # 使用转换工具处理 options
-        options_dict = proto_struct_to_python_dict(request.options)
-        logger.debug(f"GetUISnapshot options: {options_dict}")
-        snapshot = global_mock_perception_adapter.get_ui_snapshot(options=options_dict)
-        logger.debug("RPC: GetUISnapshot returning snapshot (details omitted)")
+        options_dict = struct_to_dict_traced(request.options)
+        logger.debug("GetUISnapshot options: %s", options_dict)
+        with served_adapters(context) as adapters:
+            snapshot, cache_hit = self._get_snapshot(adapters, options_dict)
+        snapshot = snapshot_for_client(
+            snapshot, request.client_host_id, adapters.ui_key
+        )
+        logger.debug(
+            "RPC: GetUISnapshot returning snapshot (cache %s, columnar=%s)",
+            "hit" if cache_hit else "miss",
+            request.columnar,
+        )
+        if request.columnar:
+            return to_columnar_snapshot(snapshot)
         return snapshot
 
+    def _find_in_snapshot_index(
+        self,
+        adapters: ServedAdapters,
+        request: pb2.ElementQuery,
+        limit: int | None = None,
+    ) -> list[pb2.UIElement]:
+        """
+        尝试在最近的快照索引中解析查询。
+        选择器查询在没有足够新的快照时先采集一次快照 (经过快照缓存)。
+        查询需要实时数据、快照过期、选择器超出本地支持的子集或本地没有匹配时
+        返回空列表，由调用方回退到适配器。
+        """
+        if not SnapshotIndex.can_answer(request):
+            return []
+        max_age = settings.SNAPSHOT_INDEX_MAX_AGE_MS / 1000.0
+        index = snapshot_index_store.get_fresh(adapters.ui_key, max_age)
+        if (
+            index is None
+            and settings.SNAPSHOT_SELECTOR_CAPTURE
+            and has_selector(request)
+        ):
+            self._get_snapshot(adapters, {})
+            index = snapshot_index_store.get_fresh(adapters.ui_key, max_age)
+        if index is None:
+            return []
+        try:
+            return index.find(request, limit=limit)
+        except SelectorError as e:
+            logger.debug("Selector not evaluated locally, using adapter: %s", e)
+            return []
+        except re.error as e:
+            # 正则的语法由适配器决定 (例如适配器支持的扩展语法)，交给适配器处理
+            logger.debug(
+                "text_content_regex not compiled locally, using adapter: %s", e
+            )
+            return []
+
     def FindElement(
         self, request: pb2.ElementQuery, context
     ) -> pb2.FindElementResponse:
-        logger.info("RPC: FindElement received")
-        # 实际应调用对应适配器的 find_element
-        response = global_mock_perception_adapter.find_element(request)
-        logger.debug(f"RPC: FindElement returning: {response}")
+        logger.debug("RPC: FindElement received")
+        with served_adapters(context) as adapters:
+            local_matches = self._find_in_snapshot_index(adapters, request, limit=1)
+            if local_matches:
+                logger.debug("RPC: FindElement answered from snapshot index")
+                return pb2.FindElementResponse(element=local_matches[0])
+            with tracing.span("adapter", method="find_element"):
+                response = adapters.perception.find_element(request)
+        logger.debug("RPC: FindElement returning: %s", response)
         return response
 
     def FindElements(
         self, request: pb2.ElementQuery, context
     ) -> pb2.FindElementsResponse:
-        logger.info("RPC: FindElements received")
-        # 实际应调用对应适配器的 find_elements
-        response = global_mock_perception_adapter.find_elements(request)
+        logger.debug("RPC: FindElements received")
+        with served_adapters(context) as adapters:
+            local_matches = self._find_in_snapshot_index(adapters, request)
+            if local_matches:
+                logger.debug(
+                    "RPC: FindElements answered from snapshot index: %d elements",
+                    len(local_matches),
+                )
+                return pb2.FindElementsResponse(elements=local_matches)
+            with tracing.span("adapter", method="find_elements"):
+                response = adapters.perception.find_elements(request)
         logger.debug(
-            f"RPC: FindElements returning elements count: {len(response.elements)}"
+            "RPC: FindElements returning elements count: %s", len(response.elements)
         )
         return response
 
     def GetElementState(
         self, request: pb2.GetElementStateRequest, context
     ) -> pb2.GetElementStateResponse:
-        logger.info("RPC: GetElementState received")
-        state_dict = global_mock_perception_adapter.get_element_state(
-            request.adapter_specific_id
-        )
-        # 使用转换工具将 dict 转换为 Struct 下的 Value map (通过 Struct 转换间接实现)
-        response_state_struct = python_dict_to_proto_struct(state_dict or {})
+        logger.debug("RPC: GetElementState received")
+        with served_adapters(context) as adapters:
+            with tracing.span("adapter", method="get_element_state"):
+                state_dict = adapters.perception.get_element_state(
+                    request.adapter_specific_id
+                )
+        response = pb2.GetElementStateResponse()
+        # 直接填充 map<string, Value>，不经过中间 Struct
+        with tracing.span("conversion"):
+            python_dict_to_proto_value_map(state_dict or {}, response.state)
         logger.debug("RPC: GetElementState returning state (details omitted)")
-        # GetElementStateResponse 需要 map<string, Value>, Struct 内部就是这个结构
-        return pb2.GetElementStateResponse(state=response_state_struct.fields)
+        return response
 
     def GetElementText(
         self, request: pb2.GetElementTextRequest, context
     ) -> pb2.GetElementTextResponse:
-        logger.info("RPC: GetElementText received")
-        # 实际应调用对应适配器的 get_element_text
-        text = global_mock_perception_adapter.get_element_text(
-            request.adapter_specific_id
-        )
-        logger.debug(f"RPC: GetElementText returning: {text}")
+        logger.debug("RPC: GetElementText received")
+        with served_adapters(context) as adapters:
+            with tracing.span("adapter", method="get_element_text"):
+                text = adapters.perception.get_element_text(request.adapter_specific_id)
+        logger.debug("RPC: GetElementText returning: %s", text)
         return pb2.GetElementTextResponse(text=text)
 
     def GetFocusedElement(
         self, request: pb2.GetFocusedElementRequest, context
     ) -> pb2.GetFocusedElementResponse:
-        logger.info("RPC: GetFocusedElement received")
-        # 实际应调用对应适配器的 get_focused_element
-        element = global_mock_perception_adapter.get_focused_element()
-        logger.debug(f"RPC: GetFocusedElement returning: {element}")
+        logger.debug("RPC: GetFocusedElement received")
+        with served_adapters(context) as adapters:
+            with tracing.span("adapter", method="get_focused_element"):
+                element = adapters.perception.get_focused_element()
+        logger.debug("RPC: GetFocusedElement returning: %s", element)
         return pb2.GetFocusedElementResponse(element=element)
 
+    def StreamUISnapshotDiffs(self, request: pb2.StreamUISnapshotDiffsRequest, context):
+        logger.debug("RPC: StreamUISnapshotDiffs received")
+        options_dict = struct_to_dict_traced(request.options)
+        interval_ms = request.interval_ms or settings.SNAPSHOT_DIFF_INTERVAL_MS
+        max_updates = request.max_updates if request.HasField("max_updates") else None
+        # 客户端取消或断开时唤醒等待，尽快结束流
+        stream_closed = threading.Event()
+        context.add_callback(stream_closed.set)
+
+        previous_snapshot = None
+        updates_sent = 0
+        while context.is_active():
+            # 每次采集单独借出适配器，流的等待间隔不占用池实例；
+            # 经过快照缓存，与轮询 GetUISnapshot 的客户端共享采集
+            with served_adapters(context) as adapters:
+                snapshot, _ = self._get_snapshot(adapters, options_dict)
+            diff = compute_snapshot_diff(previous_snapshot, snapshot)
+            if diff is not None:
+                logger.debug(
+                    "RPC: StreamUISnapshotDiffs sending %s (+%d -%d ~%d)",
+                    "diff" if previous_snapshot is not None else "full snapshot",
+                    len(diff.added),
+                    len(diff.removed_framework_ids),
+                    len(diff.modified),
+                )
+                yield diff
+                previous_snapshot = snapshot
+                updates_sent += 1
+                if max_updates is not None and updates_sent >= max_updates:
+                    break
+            if stream_closed.wait(interval_ms / 1000.0):
+                break
+        logger.debug(
+            "RPC: StreamUISnapshotDiffs finished after %d updates", updates_sent
+        )
+
+    def StreamUISnapshot(self, request: pb2.StreamUISnapshotRequest, context):
+        logger.debug("RPC: StreamUISnapshot received")
+        options_dict = struct_to_dict_traced(request.options)
+        max_chunk_bytes = (
+            request.max_chunk_bytes or settings.SNAPSHOT_STREAM_CHUNK_BYTES
+        )
+        # 适配器的元素生成器在流结束前一直使用借出的实例
+        with served_adapters(context) as adapters:
+            iter_ui_snapshot = getattr(adapters.perception, "iter_ui_snapshot", None)
+            if iter_ui_snapshot is not None:
+                # 适配器边采集边产出元素，服务端不需要持有完整快照
+                with tracing.span("adapter", method="iter_ui_snapshot"):
+                    header, elements = iter_ui_snapshot(options=options_dict)
+                header = snapshot_for_client(header, request.client_host_id)
+            else:
+                snapshot, _ = self._get_snapshot(adapters, options_dict)
+                elements = snapshot.elements
+                header = copy_snapshot_header(
+                    snapshot_for_client(
+                        snapshot, request.client_host_id, adapters.ui_key
+                    )
+                )
+
+            chunks = iter_snapshot_chunks(header, elements, max_chunk_bytes)
+            element_count = 0
+            try:
+                for chunk in chunks:
+                    if not context.is_active():
+                        logger.info("RPC: StreamUISnapshot cancelled by client")
+                        return
+                    element_count += len(chunk.elements)
+                    yield chunk
+            finally:
+                chunks.close()
+                # 提前结束时让适配器的元素生成器释放其资源
+                close_elements = getattr(elements, "close", None)
+                if close_elements is not None:
+                    close_elements()
+        logger.debug("RPC: StreamUISnapshot sent %d elements", element_count)
+
+    def _wait_condition_matches(
+        self,
+        adapters: ServedAdapters,
+        request: pb2.WaitForConditionRequest,
+        options_dict: dict,
+    ) -> tuple[bool, list[pb2.UIElement], str | None]:
+        """
+        对 WaitForCondition 的条件求值一次。
+        可以本地求值的查询使用 (经过快照缓存的) 快照索引，否则直接查询适配器。
+        :return: (条件是否成立, 相关元素, 使用的快照 ID 或 None)
+        """
+        adapter = adapters.perception
+        condition = request.WhichOneof("condition")
+        query = _wait_condition_query(request)
+        matches = None
+        snapshot_id = None
+        if SnapshotIndex.can_answer(query):
+            snapshot, _ = self._get_snapshot(adapters, options_dict)
+            try:
+                matches = snapshot_index_store.get_for_snapshot(
+                    adapters.ui_key, snapshot
+                ).find(query)
+                snapshot_id = snapshot.snapshot_id
+            except SelectorError as e:
+                logger.debug("Selector not evaluated locally, using adapter: %s", e)
+        if matches is None:
+            with tracing.span("adapter", method="find_elements"):
+                matches = list(adapter.find_elements(query).elements)
+
+        if condition == "element_present":
+            return bool(matches), matches, snapshot_id
+        if condition == "element_absent":
+            return not matches, [], snapshot_id
+        expected = proto_value_map_to_python_dict(request.element_state.expected_state)
+        satisfied = []
+        for element in matches:
+            if snapshot_id is None:
+                with tracing.span("adapter", method="get_element_state"):
+                    state = adapter.get_element_state(element.adapter_specific_id)
+            else:
+                state = proto_value_map_to_python_dict(element.state)
+            state = state or {}
+            if all(key in state and state[key] == expected[key] for key in expected):
+                satisfied.append(element)
+        return bool(satisfied), satisfied, snapshot_id
+
+    def WaitForCondition(
+        self, request: pb2.WaitForConditionRequest, context
+    ) -> pb2.WaitForConditionResponse:
+        logger.debug("RPC: WaitForCondition received")
+        if request.WhichOneof("condition") is None:
+            context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                "WaitForCondition requires a condition.",
+            )
+        query = _wait_condition_query(request)
+        if SnapshotIndex.can_answer(query):
+            # 在等待循环之前编译一次: 无效的正则每次求值都会失败
+            try:
+                compile_query(query)
+            except re.error as e:
+                context.abort(
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    f"Invalid text_content_regex: {e}",
+                )
+        started = time.monotonic()
+        timeout = (
+            min(request.timeout_ms, settings.WAIT_CONDITION_MAX_TIMEOUT_MS)
+            if request.timeout_ms
+            else settings.WAIT_CONDITION_DEFAULT_TIMEOUT_MS
+        ) / 1000.0
+        time_remaining = context.time_remaining()
+        if time_remaining is not None:
+            # 在客户端 deadline 之前返回 satisfied=false，而不是让 RPC 以超时失败
+            timeout = min(timeout, max(time_remaining - _WAIT_DEADLINE_MARGIN, 0.0))
+        deadline = started + timeout
+        policy = request.polling
+        backoff = PollingBackoff(
+            initial=(
+                policy.initial_interval_ms
+                or settings.WAIT_CONDITION_INITIAL_INTERVAL_MS
+            )
+            / 1000.0,
+            maximum=(policy.max_interval_ms or settings.WAIT_CONDITION_MAX_INTERVAL_MS)
+            / 1000.0,
+            multiplier=policy.backoff_multiplier
+            or settings.WAIT_CONDITION_BACKOFF_MULTIPLIER,
+        )
+        options_dict = struct_to_dict_traced(request.options)
+        # 客户端取消时唤醒等待，尽快结束
+        context.add_callback(ui_change_notifier.wake_all)
+
+        attempts = 0
+        while True:
+            # 每次求值单独借出适配器，等待期间不占用池实例
+            with served_adapters(context) as adapters:
+                # 适配器支持变化通知时，轮询只是兜底，按最大间隔进行
+                notified = ui_change_notifier.subscribe(
+                    adapters.perception,
+                    functools.partial(invalidate_ui_caches, adapters.ui_key),
+                )
+                # 在求值前读取版本: 求值期间发生的变化会让下面的等待立即返回
+                version = ui_change_notifier.version(adapters.ui_key)
+                attempts += 1
+                satisfied, elements, snapshot_id = self._wait_condition_matches(
+                    adapters, request, options_dict
+                )
+            remaining = deadline - time.monotonic()
+            if satisfied or remaining <= 0 or not context.is_active():
+                break
+            interval = backoff.maximum if notified else backoff.next_interval()
+            if ui_change_notifier.wait(
+                adapters.ui_key, version, min(interval, remaining)
+            ):
+                backoff.reset()
+
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        logger.debug(
+            "RPC: WaitForCondition %s after %d attempts in %d ms",
+            "satisfied" if satisfied else "not satisfied",
+            attempts,
+            elapsed_ms,
+        )
+        response = pb2.WaitForConditionResponse(
+            satisfied=satisfied,
+            elements=elements,
+            attempts=attempts,
+            elapsed_ms=elapsed_ms,
+        )
+        if snapshot_id is not None:
+            response.snapshot_id = snapshot_id
+        return response
+
+
+def with_action_adapters(rpc_method):
+    """
+    装饰 ActionService RPC: 借出适配器并作为 adapters 参数传入；
+    无论动作成功与否，结束后都使该 UI 的快照缓存失效。
+    """
+
+    @functools.wraps(rpc_method)
+    def wrapper(self, request, context):
+        with served_adapters(context) as adapters:
+            try:
+                return rpc_method(self, request, context, adapters)
+            finally:
+                invalidate_ui_caches(adapters.ui_key)
+
+    return wrapper
+
 
 class ActionServiceImpl(pb2_grpc.ActionServiceServicer):
     """实现 ActionService 定义的 RPC 方法。"""
 
-    def Click(self, request: pb2.ClickRequest, context) -> pb2.ActionResult:
-        logger.info("RPC: Click received")
-        options_dict = proto_struct_to_python_dict(request.options)
-        logger.debug(f"Click options: {options_dict}")
-        result = global_mock_action_adapter.click(
-            request.adapter_specific_id, options=options_dict
-        )
-        logger.debug(f"RPC: Click returning: {result}")
-        return result
+    # ActionStep.action oneof 字段名 -> 执行该类步骤的方法名
+    _BATCH_STEP_HANDLERS = {
+        "click": "_click",
+        "type_text": "_type_text",
+        "scroll": "_scroll",
+        "press_key": "_press_key",
+        "drag_and_drop": "_drag_and_drop",
+    }
+
+    # --- 动作实现 (调用方负责借出适配器并持有 UI 键的锁) ---
+
+    def _click(self, action_adapter, request: pb2.ClickRequest) -> pb2.ActionResult:
+        options_dict = struct_to_dict_traced(request.options)
+        logger.debug("Click options: %s", options_dict)
+        with tracing.span("adapter", method="click"):
+            return action_adapter.click(
+                request.adapter_specific_id, options=options_dict
+            )
 
-    def TypeText(self, request: pb2.TypeTextRequest, context) -> pb2.ActionResult:
-        logger.info("RPC: TypeText received")
-        options_dict = proto_struct_to_python_dict(request.options)
-        logger.debug(f"TypeText options: {options_dict}")
+    def _type_text(
+        self, action_adapter, request: pb2.TypeTextRequest
+    ) -> pb2.ActionResult:
+        options_dict = struct_to_dict_traced(request.options)
+        logger.debug("TypeText options: %s", options_dict)
         element_id = (
             request.adapter_specific_id
             if request.HasField("adapter_specific_id")
             else None
         )
-        result = global_mock_action_adapter.type_text(
-            request.text, element_id, options=options_dict
-        )
-        logger.debug(f"RPC: TypeText returning: {result}")
-        return result
+        with tracing.span("adapter", method="type_text"):
+            return action_adapter.type_text(
+                request.text, element_id, options=options_dict
+            )
 
-    def Scroll(self, request: pb2.ScrollRequest, context) -> pb2.ActionResult:
-        logger.info("RPC: Scroll received")
-        options_dict = proto_struct_to_python_dict(request.options)
-        logger.debug(f"Scroll options: {options_dict}")
+    def _scroll(self, action_adapter, request: pb2.ScrollRequest) -> pb2.ActionResult:
+        options_dict = struct_to_dict_traced(request.options)
+        logger.debug("Scroll options: %s", options_dict)
         element_id = (
             request.adapter_specific_id
             if request.HasField("adapter_specific_id")
             else None
         )
-        result = global_mock_action_adapter.scroll(
-            request.direction, request.magnitude, element_id, options=options_dict
-        )
-        logger.debug(f"RPC: Scroll returning: {result}")
-        return result
+        with tracing.span("adapter", method="scroll"):
+            return action_adapter.scroll(
+                request.direction, request.magnitude, element_id, options=options_dict
+            )
 
-    def PressKey(self, request: pb2.PressKeyRequest, context) -> pb2.ActionResult:
-        logger.info("RPC: PressKey received")
-        options_dict = proto_struct_to_python_dict(request.options)
-        logger.debug(f"PressKey options: {options_dict}")
-        result = global_mock_action_adapter.press_key(
-            request.key_combination, options=options_dict
-        )
-        logger.debug(f"RPC: PressKey returning: {result}")
-        return result
+    def _press_key(
+        self, action_adapter, request: pb2.PressKeyRequest
+    ) -> pb2.ActionResult:
+        options_dict = struct_to_dict_traced(request.options)
+        logger.debug("PressKey options: %s", options_dict)
+        with tracing.span("adapter", method="press_key"):
+            return action_adapter.press_key(
+                request.key_combination, options=options_dict
+            )
 
-    def DragAndDrop(self, request: pb2.DragAndDropRequest, context) -> pb2.ActionResult:
-        logger.info("RPC: DragAndDrop received")
-        options_dict = proto_struct_to_python_dict(request.options)
-        logger.debug(f"DragAndDrop options: {options_dict}")
+    def _drag_and_drop(
+        self, action_adapter, request: pb2.DragAndDropRequest
+    ) -> pb2.ActionResult:
+        options_dict = struct_to_dict_traced(request.options)
+        logger.debug("DragAndDrop options: %s", options_dict)
         target_id = None
         target_coords = None
         if request.HasField("target_adapter_specific_id"):
             target_id = request.target_adapter_specific_id
         elif request.HasField("target_coords"):
             target_coords = (request.target_coords.x, request.target_coords.y)
-        result = global_mock_action_adapter.drag_and_drop(
-            request.source_adapter_specific_id,
-            target_id,
-            target_coords,
-            options=options_dict,
-        )
-        logger.debug(f"RPC: DragAndDrop returning: {result}")
+        with tracing.span("adapter", method="drag_and_drop"):
+            return action_adapter.drag_and_drop(
+                request.source_adapter_specific_id,
+                target_id,
+                target_coords,
+                options=options_dict,
+            )
+
+    # --- RPC 方法 ---
+
+    @with_action_adapters
+    def Click(
+        self, request: pb2.ClickRequest, context, adapters: ServedAdapters
+    ) -> pb2.ActionResult:
+        logger.debug("RPC: Click received")
+        with get_adapter_lock(adapters.ui_key):
+            result = self._click(adapters.action, request)
+        logger.debug("RPC: Click returning: %s", result)
+        return result
+
+    @with_action_adapters
+    def TypeText(
+        self, request: pb2.TypeTextRequest, context, adapters: ServedAdapters
+    ) -> pb2.ActionResult:
+        logger.debug("RPC: TypeText received")
+        with get_adapter_lock(adapters.ui_key):
+            result = self._type_text(adapters.action, request)
+        logger.debug("RPC: TypeText returning: %s", result)
+        return result
+
+    @with_action_adapters
+    def Scroll(
+        self, request: pb2.ScrollRequest, context, adapters: ServedAdapters
+    ) -> pb2.ActionResult:
+        logger.debug("RPC: Scroll received")
+        with get_adapter_lock(adapters.ui_key):
+            result = self._scroll(adapters.action, request)
+        logger.debug("RPC: Scroll returning: %s", result)
         return result
 
+    @with_action_adapters
+    def PressKey(
+        self, request: pb2.PressKeyRequest, context, adapters: ServedAdapters
+    ) -> pb2.ActionResult:
+        logger.debug("RPC: PressKey received")
+        with get_adapter_lock(adapters.ui_key):
+            result = self._press_key(adapters.action, request)
+        logger.debug("RPC: PressKey returning: %s", result)
+        return result
+
+    @with_action_adapters
+    def DragAndDrop(
+        self, request: pb2.DragAndDropRequest, context, adapters: ServedAdapters
+    ) -> pb2.ActionResult:
+        logger.debug("RPC: DragAndDrop received")
+        with get_adapter_lock(adapters.ui_key):
+            result = self._drag_and_drop(adapters.action, request)
+        logger.debug("RPC: DragAndDrop returning: %s", result)
+        return result
+
+    @with_action_adapters
     def ExecuteNativeCommand(
-        self, request: pb2.ExecuteNativeCommandRequest, context
+        self,
+        request: pb2.ExecuteNativeCommandRequest,
+        context,
+        adapters: ServedAdapters,
     ) -> pb2.ActionResult:
-        logger.info("RPC: ExecuteNativeCommand received")
-        params_dict = proto_struct_to_python_dict(request.params)
-        logger.debug(f"ExecuteNativeCommand params: {params_dict}")
-        result = global_mock_action_adapter.execute_native_command(
-            request.command_name, params=params_dict
-        )
-        logger.debug(f"RPC: ExecuteNativeCommand returning: {result}")
+        logger.debug("RPC: ExecuteNativeCommand received")
+        params_dict = struct_to_dict_traced(request.params)
+        logger.debug("ExecuteNativeCommand params: %s", params_dict)
+        with get_adapter_lock(adapters.ui_key):
+            with tracing.span("adapter", method="execute_native_command"):
+                result = adapters.action.execute_native_command(
+                    request.command_name, params=params_dict
+                )
+        logger.debug("RPC: ExecuteNativeCommand returning: %s", result)
         return result
 
+    def _execute_batch_step(
+        self, action_adapter, step: pb2.ActionStep
+    ) -> pb2.ActionResult:
+        """执行单个批量步骤；适配器抛出的异常转换为失败的 ActionResult。"""
+        action = step.WhichOneof("action")
+        if action is None:
+            return pb2.ActionResult(
+                success=False,
+                message="Action step does not specify an action.",
+                error_type="InvalidArgument",
+            )
+        handler = getattr(self, self._BATCH_STEP_HANDLERS[action])
+        try:
+            return handler(action_adapter, getattr(step, action))
+        except Exception as e:
+            logger.error("Batch step '%s' raised: %s", action, e, exc_info=True)
+            return pb2.ActionResult(
+                success=False, message=str(e), error_type=type(e).__name__
+            )
+
+    @with_action_adapters
+    def ExecuteActionBatch(
+        self,
+        request: pb2.ExecuteActionBatchRequest,
+        context,
+        adapters: ServedAdapters,
+    ) -> pb2.ExecuteActionBatchResponse:
+        logger.debug("RPC: ExecuteActionBatch received (%d steps)", len(request.steps))
+        stop_on_failure = (
+            request.failure_policy
+            == pb2.BatchFailurePolicy.BATCH_FAILURE_POLICY_STOP_ON_FAILURE
+        )
+        response = pb2.ExecuteActionBatchResponse(success=True)
+        batch_started = time.perf_counter()
+        last_index = len(request.steps) - 1
+        # 整个批次持有适配器锁，其他动作 RPC 不会插入到步骤之间
+        with get_adapter_lock(adapters.ui_key):
+            for step_index, step in enumerate(request.steps):
+                if not context.is_active():
+                    logger.info(
+                        "ExecuteActionBatch cancelled by client after %d steps.",
+                        step_index,
+                    )
+                    response.success = False
+                    break
+                step_started = time.perf_counter()
+                result = self._execute_batch_step(adapters.action, step)
+                response.results.add(
+                    step_index=step_index,
+                    result=result,
+                    duration_ms=(time.perf_counter() - step_started) * 1000.0,
+                )
+                if not result.success:
+                    if response.success:
+                        response.failed_step_index = step_index
+                    response.success = False
+                    if stop_on_failure:
+                        break
+                delay_ms = (
+                    step.delay_after_ms
+                    if step.HasField("delay_after_ms")
+                    else request.default_delay_ms
+                )
+                if delay_ms and step_index < last_index:
+                    time.sleep(delay_ms / 1000.0)
+        response.total_duration_ms = (time.perf_counter() - batch_started) * 1000.0
+        logger.debug(
+            "RPC: ExecuteActionBatch returning: success=%s, %d/%d steps executed",
+            response.success,
+            len(response.results),
+            len(request.steps),
+        )
+        return response
+
 
 class AdapterControlServiceImpl(pb2_grpc.AdapterControlServiceServicer):
     """实现 AdapterControlService 定义的 RPC 方法。"""
@@ -278,7 +943,9 @@ class AdapterControlServiceImpl(pb2_grpc.AdapterControlServiceServicer):
         adapter_name = request.adapter_name
         config_dict = proto_struct_to_python_dict(request.config)
         logger.debug(
-            f"Initialize request for adapter '{adapter_name}' with config {config_dict}"
+            "Initialize request for adapter '%s' with config %s",
+            adapter_name,
+            config_dict,
         )
         try:
             # 这里应该调用实际的 AdapterManager 来加载和初始化
@@ -288,18 +955,18 @@ class AdapterControlServiceImpl(pb2_grpc.AdapterControlServiceServicer):
                     config_dict.get("perception", {})
                 )
                 global_mock_action_adapter.initialize(config_dict.get("action", {}))
-                logger.info(f"Mock adapter '{adapter_name}' initialized successfully.")
+                logger.info("Mock adapter '%s' initialized successfully.", adapter_name)
                 return pb2.InitializeResponse(success=True, message="Initialized mock")
             else:
                 logger.warning(
-                    f"Adapter '{adapter_name}' not found for initialization."
+                    "Adapter '%s' not found for initialization.", adapter_name
                 )
                 return pb2.InitializeResponse(
                     success=False, message=f"Adapter '{adapter_name}' not found"
                 )
         except Exception as e:
             logger.error(
-                f"Error initializing adapter '{adapter_name}': {e}", exc_info=True
+                "Error initializing adapter '%s': %s", adapter_name, e, exc_info=True
             )
             return pb2.InitializeResponse(success=False, message=f"Error: {e}")
 
@@ -309,6 +976,53 @@ class AdapterControlServiceImpl(pb2_grpc.AdapterControlServiceServicer):
         threading.Thread(target=schedule_server_stop).start()
         return pb2.ShutdownResponse(success=True, message="Server shutdown initiated")
 
+    def GetMetrics(
+        self, request: pb2.GetMetricsRequest, context
+    ) -> pb2.GetMetricsResponse:
+        logger.debug("RPC: GetMetrics received")
+        families = default_registry.collect(list(request.name_prefixes))
+        return pb2.GetMetricsResponse(
+            families=[metric_family_to_proto(family) for family in families]
+        )
+
+    def GetReadiness(
+        self, request: pb2.GetReadinessRequest, context
+    ) -> pb2.GetReadinessResponse:
+        logger.debug("RPC: GetReadiness received")
+        manager = adapter_manager
+        if manager is None:
+            return pb2.GetReadinessResponse(ready=True)
+        response = pb2.GetReadinessResponse(ready=manager.is_ready())
+        for app_name, status in sorted(manager.get_warmup_status().items()):
+            adapter = response.adapters.add(
+                app_name=app_name,
+                state=status.state,
+                warmup_seconds=status.seconds or 0.0,
+            )
+            if status.error is not None:
+                adapter.error = status.error
+        return response
+
+
+def metric_family_to_proto(family: MetricFamilySnapshot) -> pb2.MetricFamily:
+    """把指标注册表的快照转换为 MetricFamily 消息。"""
+    return pb2.MetricFamily(
+        name=family.name,
+        help=family.help,
+        type=family.type,
+        bucket_upper_bounds=family.bucket_bounds,
+        samples=[
+            pb2.MetricSample(
+                labels=sample.labels,
+                value=sample.value,
+                bucket_counts=sample.bucket_counts,
+                sum=sample.sum,
+                count=sample.count,
+            )
+            for sample in family.samples
+        ],
+    )
+
 
 # 引用全局服务器实例 (稍后在 serve 函数中创建)
 server_instance = None
@@ -323,26 +1037,101 @@ def schedule_server_stop():
         logger.info("Server stopped.")
 
 
-def serve(port: int = 50051, workers: int = 10):
-    """启动 gRPC 服务器。"""
-    global server_instance
-    server_instance = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+def create_server(port: int = 50051, workers: int = 10) -> tuple[grpc.Server, int]:
+    """
+    创建线程池模式的 gRPC 服务器并注册所有服务 (不启动)。
+    :return: (服务器, 实际绑定的端口)。port 为 0 时由系统分配端口。
+    """
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=workers),
+        interceptors=[TracingServerInterceptor()],
+    )
 
     # 注册服务实现者
-    pb2_grpc.add_PerceptionServiceServicer_to_server(
-        PerceptionServiceImpl(), server_instance
-    )
-    pb2_grpc.add_ActionServiceServicer_to_server(ActionServiceImpl(), server_instance)
+    pb2_grpc.add_PerceptionServiceServicer_to_server(PerceptionServiceImpl(), server)
+    pb2_grpc.add_ActionServiceServicer_to_server(ActionServiceImpl(), server)
     pb2_grpc.add_AdapterControlServiceServicer_to_server(
-        AdapterControlServiceImpl(), server_instance
+        AdapterControlServiceImpl(), server
     )
 
     # 监听端口
     listen_addr = f"[::]:{port}"  # 监听所有接口
-    server_instance.add_insecure_port(listen_addr)
+    bound_port = server.add_insecure_port(listen_addr)
+    return server, bound_port
+
+
+def server_preload_apps() -> dict[str, dict | None]:
+    """
+    serve() 预热的应用 -> 适配器配置: settings.ADAPTER_PRELOAD_APPS，以及 RPC 使用的
+    SERVER_ADAPTER_APP (使用与 served_adapters() 相同的配置，预热的实例直接被借出)。
+    """
+    apps: dict[str, dict | None] = dict.fromkeys(settings.ADAPTER_PRELOAD_APPS)
+    if settings.SERVER_ADAPTER_APP:
+        apps[settings.SERVER_ADAPTER_APP] = settings.SERVER_ADAPTER_CONFIG
+    return apps
+
+
+def serve(port: int = 50051, workers: int = 10, mode: str | None = None):
+    """
+    启动 gRPC 服务器，阻塞直到服务器终止。
+    :param mode: "threaded" 或 "aio"，None 表示使用 settings.GRPC_SERVER_MODE。
+    """
+    global adapter_manager
+    mode = mode or settings.GRPC_SERVER_MODE
+    if mode not in ("threaded", "aio"):
+        raise ValueError(f"Unknown gRPC server mode: '{mode}'")
+    metrics_server = None
+    if settings.METRICS_HTTP_PORT is not None:
+        metrics_server = start_metrics_http_server(
+            settings.METRICS_HTTP_HOST, settings.METRICS_HTTP_PORT
+        )
+    if adapter_manager is None and (
+        settings.SERVER_ADAPTER_APP or settings.ADAPTER_PRELOAD_APPS
+    ):
+        adapter_manager = AdapterManager(
+            lazy_discovery=settings.ADAPTER_LAZY_DISCOVERY,
+            cache_file=settings.ADAPTER_DISCOVERY_CACHE_FILE,
+            default_process_mode=settings.ADAPTER_PROCESS_MODE,
+            pool_config=AdapterPoolConfig(
+                min_size=settings.ADAPTER_POOL_MIN_SIZE,
+                max_size=settings.ADAPTER_POOL_MAX_SIZE,
+                idle_timeout=settings.ADAPTER_POOL_IDLE_TIMEOUT,
+                max_total_instances=settings.ADAPTER_POOL_MAX_TOTAL_INSTANCES,
+                max_total_memory_bytes=settings.ADAPTER_POOL_MAX_TOTAL_MEMORY_BYTES,
+                instance_memory_bytes=settings.ADAPTER_POOL_INSTANCE_MEMORY_BYTES,
+            ),
+        )
+    preload_apps = server_preload_apps()
+    if preload_apps:
+        # 在后台预热 RPC 借出实例的池，服务器立即开始监听；进度通过 GetReadiness 报告
+        adapter_manager.preload_adapters(
+            preload_apps, settings.ADAPTER_PRELOAD_MAX_WORKERS
+        )
+    try:
+        if mode == "aio":
+            # 延迟导入，避免线程池模式加载 asyncio 相关代码
+            from core.grpc_aio_server import run_aio_server
+
+            run_aio_server(port=port)
+        else:
+            _serve_threaded(port, workers)
+    finally:
+        if adapter_manager is not None:
+            adapter_manager.unload_all_adapters()
+        # 删除共享内存中的 blob 文件
+        blob_store.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        # 写完尚未导出的追踪
+        get_default_tracer().close(timeout=5)
+
+
+def _serve_threaded(port: int, workers: int) -> None:
+    global server_instance
+    server_instance, _ = create_server(port, workers)
 
     # 启动服务器
-    logger.info(f"Starting gRPC server on {listen_addr}...")
+    logger.info("Starting gRPC server on [::]:%s (%s workers)...", port, workers)
     server_instance.start()
     logger.info("Server started. Waiting for termination signal...")
     try:
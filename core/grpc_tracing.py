@@ -0,0 +1,348 @@
+import collections
+import functools
+import inspect
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+import grpc
+
+from config import settings
+from utils import tracing
+from utils.tracing import (
+    REQUEST_ID_METADATA_KEY,
+    SPAN_KIND_CLIENT,
+    SPAN_KIND_SERVER,
+    TRACEPARENT_METADATA_KEY,
+    Span,
+    Trace,
+    Tracer,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_tracer() -> Tracer:
+    """进程内共享的 Tracer (服务端和客户端写入同一个 span 文件)。"""
+    return Tracer(
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        span_file=settings.TRACE_SPAN_FILE,
+        service_name=settings.TRACE_SERVICE_NAME,
+    )
+
+
+def _metadata_value(metadata: Dict[str, str], key: str) -> Optional[str]:
+    value = metadata.get(key)
+    return value if isinstance(value, str) else None
+
+
+class _ServerTracing:
+    """同步和 aio 服务端拦截器共用的追踪开始 / 结束逻辑。"""
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        self.tracer = tracer or get_default_tracer()
+
+    def _wrap_handler(self, handler, handler_call_details, unary_unary, unary_stream):
+        """用追踪包装一元请求的处理器，其余处理器原样返回。"""
+        if handler is None or handler.request_streaming:
+            return handler
+        method = handler_call_details.method
+        metadata = dict(handler_call_details.invocation_metadata or ())
+        if handler.response_streaming:
+            return grpc.unary_stream_rpc_method_handler(
+                functools.partial(unary_stream, handler, method, metadata)
+            )
+        return grpc.unary_unary_rpc_method_handler(
+            functools.partial(unary_unary, handler, method, metadata)
+        )
+
+    def _start_trace(
+        self, method: str, metadata: Dict[str, str]
+    ) -> Tuple[Trace, Optional[Span]]:
+        request_id = _metadata_value(metadata, REQUEST_ID_METADATA_KEY)
+        parent = tracing.parse_traceparent(
+            _metadata_value(metadata, TRACEPARENT_METADATA_KEY)
+        )
+        if parent is not None:
+            # 客户端已采样: 沿用其 trace ID 和采样决定
+            trace_id, parent_span_id, sampled = parent
+            trace = self.tracer.new_trace(request_id, trace_id, sampled)
+        else:
+            parent_span_id = ""
+            trace = self.tracer.new_trace(request_id)
+        root = None
+        if trace.sampled:
+            root = Span(
+                trace.trace_id,
+                method,
+                kind=SPAN_KIND_SERVER,
+                parent_span_id=parent_span_id,
+                attributes={
+                    "rpc.system": "grpc",
+                    "rpc.method": method,
+                    "argus.request_id": trace.request_id,
+                },
+            )
+        return trace, root
+
+    def _finish_trace(
+        self, trace: Trace, root: Optional[Span], context, error: Optional[str]
+    ) -> None:
+        if root is None:
+            return
+        root.end()
+        code = getattr(context, "code", lambda: None)()
+        if code is not None:
+            root.set_attribute("rpc.grpc.status_code", getattr(code, "name", str(code)))
+        root.error = error
+        trace.add(root)
+        self.tracer.export(trace)
+
+
+class TracingServerInterceptor(_ServerTracing, grpc.ServerInterceptor):
+    """
+    为每个 RPC 分配请求 ID (沿用客户端传入的 x-request-id)，并在采样时记录
+    deserialize / conversion / adapter / serialize 各阶段的 span。
+    为了把序列化计入 span，包装后的处理器自己完成请求反序列化和响应序列化
+    (gRPC 只收发字节)，不会重复序列化。
+    只处理一元请求的 RPC (一元和服务端流式响应)，当前服务没有客户端流式 RPC。
+    """
+
+    def intercept_service(self, continuation, handler_call_details):
+        return self._wrap_handler(
+            continuation(handler_call_details),
+            handler_call_details,
+            self._unary_unary,
+            self._unary_stream,
+        )
+
+    def _unary_unary(
+        self, handler, method: str, metadata: Dict[str, str], request_bytes, context
+    ):
+        trace, root = self._start_trace(method, metadata)
+        error = None
+        try:
+            with tracing.activate(trace, root):
+                with tracing.span("deserialize"):
+                    request = _apply(handler.request_deserializer, request_bytes)
+                response = handler.unary_unary(request, context)
+                if response is None:
+                    return None
+                with tracing.span("serialize"):
+                    return _apply(handler.response_serializer, response)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._finish_trace(trace, root, context, error)
+
+    def _unary_stream(
+        self, handler, method: str, metadata: Dict[str, str], request_bytes, context
+    ):
+        trace, root = self._start_trace(method, metadata)
+        error = None
+        responses = None
+        messages = 0
+        try:
+            with tracing.activate(trace, root):
+                with tracing.span("deserialize"):
+                    request = _apply(handler.request_deserializer, request_bytes)
+                responses = iter(handler.unary_stream(request, context))
+            while True:
+                # 每次只在推进服务端生成器时激活追踪上下文，不泄漏到 gRPC 线程
+                with tracing.activate(trace, root):
+                    try:
+                        response = next(responses)
+                    except StopIteration:
+                        break
+                    with tracing.span("serialize", message_index=messages):
+                        data = _apply(handler.response_serializer, response)
+                messages += 1
+                yield data
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            close = getattr(responses, "close", None)
+            if close is not None:
+                close()
+            if root is not None:
+                root.set_attribute("rpc.response_messages", messages)
+            self._finish_trace(trace, root, context, error)
+
+
+class AsyncTracingServerInterceptor(_ServerTracing, grpc.aio.ServerInterceptor):
+    """
+    TracingServerInterceptor 的 grpc.aio 版本，记录相同的请求 ID 和 span。
+    处理器是协程 / 异步生成器；追踪上下文只在推进处理器时激活，
+    BlockingCallDispatcher 会把它复制到执行同步 servicer 的工作线程。
+    """
+
+    async def intercept_service(self, continuation, handler_call_details):
+        return self._wrap_handler(
+            await continuation(handler_call_details),
+            handler_call_details,
+            self._unary_unary,
+            self._unary_stream,
+        )
+
+    async def _unary_unary(
+        self, handler, method: str, metadata: Dict[str, str], request_bytes, context
+    ):
+        trace, root = self._start_trace(method, metadata)
+        error = None
+        try:
+            with tracing.activate(trace, root):
+                with tracing.span("deserialize"):
+                    request = _apply(handler.request_deserializer, request_bytes)
+                response = handler.unary_unary(request, context)
+                if inspect.isawaitable(response):
+                    response = await response
+                if response is None:
+                    return None
+                with tracing.span("serialize"):
+                    return _apply(handler.response_serializer, response)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._finish_trace(trace, root, context, error)
+
+    async def _unary_stream(
+        self, handler, method: str, metadata: Dict[str, str], request_bytes, context
+    ):
+        trace, root = self._start_trace(method, metadata)
+        error = None
+        responses = None
+        messages = 0
+        try:
+            with tracing.activate(trace, root):
+                with tracing.span("deserialize"):
+                    request = _apply(handler.request_deserializer, request_bytes)
+                responses = handler.unary_stream(request, context).__aiter__()
+            while True:
+                # 与同步版本相同: 只在推进处理器时激活追踪上下文
+                with tracing.activate(trace, root):
+                    try:
+                        response = await responses.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    with tracing.span("serialize", message_index=messages):
+                        data = _apply(handler.response_serializer, response)
+                messages += 1
+                yield data
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            close = getattr(responses, "aclose", None)
+            if close is not None:
+                await close()
+            if root is not None:
+                root.set_attribute("rpc.response_messages", messages)
+            self._finish_trace(trace, root, context, error)
+
+
+def _apply(codec: Optional[Callable], value):
+    return codec(value) if codec is not None else value
+
+
+class _ClientCallDetails(
+    collections.namedtuple(
+        "_ClientCallDetails",
+        (
+            "method",
+            "timeout",
+            "metadata",
+            "credentials",
+            "wait_for_ready",
+            "compression",
+        ),
+    ),
+    grpc.ClientCallDetails,
+):
+    pass
+
+
+class TracingClientInterceptor(
+    grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor
+):
+    """
+    为 ArgusClient 的每个调用附加 x-request-id 元数据；采样时记录 CLIENT span，
+    并通过 traceparent 把 trace ID 和采样决定传给服务端。
+    未采样的请求不发送 traceparent，由服务端按自己的采样率决定。
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        self.tracer = tracer or get_default_tracer()
+
+    def _start(self, client_call_details):
+        metadata = list(client_call_details.metadata or ())
+        existing = dict(metadata)
+        # 在已追踪的请求中发起的调用 (例如服务端调用其他服务) 加入同一追踪
+        trace = tracing.current_trace()
+        owns_trace = trace is None
+        if owns_trace:
+            trace = self.tracer.new_trace(
+                _metadata_value(existing, REQUEST_ID_METADATA_KEY)
+            )
+        if REQUEST_ID_METADATA_KEY not in existing:
+            metadata.append((REQUEST_ID_METADATA_KEY, trace.request_id))
+        span = None
+        if trace.sampled:
+            parent = tracing.current_span()
+            span = Span(
+                trace.trace_id,
+                client_call_details.method,
+                kind=SPAN_KIND_CLIENT,
+                parent_span_id=parent.span_id if parent is not None else "",
+                attributes={
+                    "rpc.system": "grpc",
+                    "rpc.method": client_call_details.method,
+                    "argus.request_id": trace.request_id,
+                },
+            )
+            metadata.append(
+                (
+                    TRACEPARENT_METADATA_KEY,
+                    tracing.format_traceparent(trace.trace_id, span.span_id, True),
+                )
+            )
+        details = _ClientCallDetails(
+            client_call_details.method,
+            client_call_details.timeout,
+            metadata,
+            client_call_details.credentials,
+            getattr(client_call_details, "wait_for_ready", None),
+            getattr(client_call_details, "compression", None),
+        )
+        logger.debug(
+            "RPC %s request_id=%s", client_call_details.method, trace.request_id
+        )
+        return details, trace, span, owns_trace
+
+    def _on_done(self, trace: Trace, span: Span, owns_trace: bool):
+        def done(call) -> None:
+            span.end()
+            code = call.code()
+            span.set_attribute("rpc.grpc.status_code", getattr(code, "name", str(code)))
+            if code != grpc.StatusCode.OK:
+                span.error = call.details()
+            trace.add(span)
+            if owns_trace:
+                self.tracer.export(trace)
+
+        return done
+
+    def _intercept(self, continuation, client_call_details, request):
+        details, trace, span, owns_trace = self._start(client_call_details)
+        call = continuation(details, request)
+        if span is not None:
+            call.add_done_callback(self._on_done(trace, span, owns_trace))
+        return call
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._intercept(continuation, client_call_details, request)
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        return self._intercept(continuation, client_call_details, request)
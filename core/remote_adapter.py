@@ -0,0 +1,562 @@
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+
+import grpc
+
+from config import settings
+from utils.metrics import default_registry
+from utils.proto_utils import (
+    proto_value_map_to_python_dict,
+    python_dict_to_proto_struct,
+)
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+    import generated_protobuf.core_services_pb2_grpc as pb2_grpc
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+# 调用失败后等待监视线程确认工作进程是否已退出的时间 (秒)
+_EXIT_DETECTION_TIMEOUT = 1.0
+
+_WORKER_RESTARTS = default_registry.counter(
+    "argus_adapter_worker_restarts_total",
+    "Adapter worker processes restarted after exiting unexpectedly.",
+    ("app",),
+)
+_WORKERS_RUNNING = default_registry.gauge(
+    "argus_adapter_workers_running",
+    "Adapter worker processes currently running.",
+)
+
+
+class AdapterWorkerError(RuntimeError):
+    """工作进程无法启动、初始化失败，或在重启次数用尽后不可用。"""
+
+
+@dataclass
+class AdapterWorkerConfig:
+    """适配器工作进程配置。"""
+
+    startup_timeout: float = settings.ADAPTER_WORKER_STARTUP_TIMEOUT
+    call_timeout: Optional[float] = settings.ADAPTER_WORKER_CALL_TIMEOUT
+    max_restarts: int = settings.ADAPTER_WORKER_MAX_RESTARTS
+    restart_window: float = settings.ADAPTER_WORKER_RESTART_WINDOW
+    restart_backoff: float = 0.5  # 首次重启前的等待，之后每次翻倍 (最多 10 秒)
+    rpc_threads: int = settings.ADAPTER_WORKER_RPC_THREADS
+
+
+class AdapterWorkerProcess:
+    """
+    启动并监督一个托管适配器的子进程 (core.adapter_worker)。
+    父进程通过 Unix socket 上的 gRPC 与其通信；子进程意外退出时由后台线程按退避
+    策略自动重启并重新 Initialize。
+    """
+
+    def __init__(
+        self,
+        app_name: str,
+        perception_class_path: Optional[str],
+        action_class_path: Optional[str],
+        adapter_config: Optional[Dict] = None,
+        config: Optional[AdapterWorkerConfig] = None,
+    ):
+        """
+        :param app_name: 应用名称。
+        :param perception_class_path: Perception 适配器类路径，None 表示没有。
+        :param action_class_path: Action 适配器类路径，None 表示没有。
+        :param adapter_config: 传给 Initialize 的适配器配置 (含 perception / action 子配置)。
+        :param config: 工作进程配置。
+        """
+        self.app_name = app_name
+        self.perception_class_path = perception_class_path
+        self.action_class_path = action_class_path
+        self.adapter_config = adapter_config or {}
+        self.config = config or AdapterWorkerConfig()
+        self._condition = threading.Condition()
+        self._process: Optional[subprocess.Popen] = None
+        self._channel: Optional[grpc.Channel] = None
+        self._perception_stub: Optional[pb2_grpc.PerceptionServiceStub] = None
+        self._action_stub: Optional[pb2_grpc.ActionServiceStub] = None
+        self._generation = 0  # 每次成功 (重新) 启动加一
+        self._ready = False
+        self._failed: Optional[str] = None
+        self._stopping = False
+        self._restart_times: Deque[float] = deque()
+        self._socket_dir: Optional[str] = None
+        self._monitor_thread: Optional[threading.Thread] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        process = self._process
+        return process.pid if process is not None else None
+
+    def memory_usage_bytes(self) -> int:
+        """工作进程的常驻内存 (RSS，字节)；进程未运行或平台不支持 /proc 时返回 0。"""
+        pid = self.pid
+        if pid is None:
+            return 0
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                resident_pages = int(f.read().split()[1])
+            return resident_pages * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def start(self) -> None:
+        """
+        启动工作进程并等待其完成初始化。
+        :raises AdapterWorkerError: 启动或初始化失败。
+        """
+        self._socket_dir = tempfile.mkdtemp(prefix="argus-worker-")
+        try:
+            self._spawn()
+        except BaseException:
+            self._cleanup_socket_dir()
+            raise
+        self._monitor_thread = threading.Thread(
+            target=self._monitor,
+            name=f"AdapterWorkerMonitor-{self.app_name}",
+            daemon=True,
+        )
+        self._monitor_thread.start()
+
+    def _spawn(self) -> None:
+        socket_path = os.path.join(self._socket_dir, "adapter.sock")
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        command = [
+            sys.executable,
+            "-m",
+            "core.adapter_worker",
+            "--app",
+            self.app_name,
+            "--socket",
+            socket_path,
+            "--workers",
+            str(self.config.rpc_threads),
+        ]
+        if self.perception_class_path:
+            command += ["--perception", self.perception_class_path]
+        if self.action_class_path:
+            command += ["--action", self.action_class_path]
+        # 子进程使用与父进程相同的模块搜索路径 (项目根目录、生成的 protobuf 等)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+        process = subprocess.Popen(command, env=env)
+        channel = grpc.insecure_channel(f"unix:{socket_path}")
+        try:
+            self._wait_until_listening(process, channel)
+            response = pb2_grpc.AdapterControlServiceStub(channel).Initialize(
+                pb2.InitializeRequest(
+                    adapter_name=self.app_name,
+                    config=python_dict_to_proto_struct(self.adapter_config),
+                ),
+                timeout=self.config.startup_timeout,
+            )
+            if not response.success:
+                raise AdapterWorkerError(
+                    f"Adapter worker for '{self.app_name}' failed to initialize: "
+                    f"{response.message}"
+                )
+        except BaseException:
+            channel.close()
+            self._kill(process)
+            raise
+        with self._condition:
+            if self._stopping:
+                # 重启过程中调用了 stop(): 不再保留新进程
+                channel.close()
+                self._kill(process)
+                return
+            self._process = process
+            self._channel = channel
+            self._perception_stub = pb2_grpc.PerceptionServiceStub(channel)
+            self._action_stub = pb2_grpc.ActionServiceStub(channel)
+            self._generation += 1
+            self._ready = True
+            self._condition.notify_all()
+        _WORKERS_RUNNING.inc()
+        logger.info(
+            "Adapter worker for '%s' started (pid %d)", self.app_name, process.pid
+        )
+
+    def _wait_until_listening(
+        self, process: subprocess.Popen, channel: grpc.Channel
+    ) -> None:
+        deadline = time.monotonic() + self.config.startup_timeout
+        ready_future = grpc.channel_ready_future(channel)
+        while True:
+            try:
+                ready_future.result(timeout=0.05)
+                return
+            except grpc.FutureTimeoutError:
+                pass
+            if process.poll() is not None:
+                raise AdapterWorkerError(
+                    f"Adapter worker for '{self.app_name}' exited during startup "
+                    f"(code {process.returncode})"
+                )
+            if time.monotonic() > deadline:
+                ready_future.cancel()
+                raise AdapterWorkerError(
+                    f"Adapter worker for '{self.app_name}' did not start within "
+                    f"{self.config.startup_timeout}s"
+                )
+
+    def _monitor(self) -> None:
+        """等待工作进程退出；非主动停止时按退避策略重启。"""
+        backoff = self.config.restart_backoff
+        while True:
+            with self._condition:
+                process = self._process
+            if process is None:
+                return
+            returncode = process.wait()
+            with self._condition:
+                if self._stopping:
+                    return
+                self._ready = False
+                channel = self._detach_locked()
+            channel.close()
+            _WORKERS_RUNNING.dec()
+            logger.error(
+                "Adapter worker for '%s' exited unexpectedly (code %s)",
+                self.app_name,
+                returncode,
+            )
+            while True:
+                if not self._allow_restart():
+                    self._mark_failed(
+                        f"Adapter worker for '{self.app_name}' exceeded "
+                        f"{self.config.max_restarts} restarts within "
+                        f"{self.config.restart_window}s"
+                    )
+                    return
+                time.sleep(backoff)
+                with self._condition:
+                    if self._stopping:
+                        return
+                _WORKER_RESTARTS.inc(app=self.app_name)
+                try:
+                    self._spawn()
+                    backoff = self.config.restart_backoff
+                    break
+                except Exception as e:
+                    logger.error(
+                        "Failed to restart adapter worker for '%s': %s",
+                        self.app_name,
+                        e,
+                    )
+                    backoff = min(backoff * 2, 10.0)
+
+    def _allow_restart(self) -> bool:
+        now = time.monotonic()
+        while (
+            self._restart_times
+            and now - self._restart_times[0] > self.config.restart_window
+        ):
+            self._restart_times.popleft()
+        if len(self._restart_times) >= self.config.max_restarts:
+            return False
+        self._restart_times.append(now)
+        return True
+
+    def _mark_failed(self, reason: str) -> None:
+        logger.error("%s; giving up", reason)
+        with self._condition:
+            self._failed = reason
+            self._condition.notify_all()
+
+    def _detach_locked(self) -> Optional[grpc.Channel]:
+        """清除当前进程的引用，返回其通道 (由调用方关闭)。"""
+        channel = self._channel
+        self._process = None
+        self._channel = None
+        self._perception_stub = None
+        self._action_stub = None
+        return channel
+
+    def _wait_ready(self) -> int:
+        """等待工作进程可用 (重启中时阻塞)，返回当前代数。"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._ready or self._failed or self._stopping,
+                timeout=self.config.startup_timeout,
+            )
+            if self._stopping:
+                raise AdapterWorkerError(
+                    f"Adapter worker for '{self.app_name}' is stopped"
+                )
+            if self._failed:
+                raise AdapterWorkerError(self._failed)
+            if not self._ready:
+                raise AdapterWorkerError(
+                    f"Adapter worker for '{self.app_name}' is not available"
+                )
+            return self._generation
+
+    def _restarted_since(self, generation: int) -> bool:
+        """调用失败后判断工作进程是否已退出: 是则等待其重启完成并返回 True。"""
+        with self._condition:
+            # 进程由监视线程回收 (Popen.poll() 在其他线程 wait() 时不可靠)，
+            # 给它一点时间发现进程退出
+            exited = self._condition.wait_for(
+                lambda: not self._ready or self._generation != generation,
+                timeout=_EXIT_DETECTION_TIMEOUT,
+            )
+            if not exited:
+                return False  # 进程仍在运行，失败不是由崩溃引起的
+            self._condition.wait_for(
+                lambda: (self._ready and self._generation != generation)
+                or self._stopping
+                or self._failed,
+                timeout=self.config.startup_timeout,
+            )
+            return self._ready and self._generation != generation
+
+    def call(self, service: str, method: str, request, idempotent: bool) -> Any:
+        """
+        调用工作进程的 RPC。
+        工作进程在调用期间崩溃时: 幂等调用 (感知) 在重启后重试一次；
+        非幂等调用 (动作) 直接抛出，避免重复执行。
+        :param service: "perception" 或 "action"。
+        :raises AdapterWorkerError: 工作进程不可用。
+        :raises grpc.RpcError: RPC 失败。
+        """
+        for attempt in range(2):
+            generation = self._wait_ready()
+            with self._condition:
+                stub = (
+                    self._perception_stub
+                    if service == "perception"
+                    else self._action_stub
+                )
+            if stub is None:
+                continue  # 在获取存根前进程已退出
+            try:
+                return getattr(stub, method)(request, timeout=self.config.call_timeout)
+            except grpc.RpcError as e:
+                retry = (
+                    idempotent
+                    and attempt == 0
+                    and e.code() == grpc.StatusCode.UNAVAILABLE
+                    and self._restarted_since(generation)
+                )
+                if not retry:
+                    raise
+                logger.warning(
+                    "Retrying %s on restarted adapter worker for '%s'",
+                    method,
+                    self.app_name,
+                )
+        raise AdapterWorkerError(
+            f"Adapter worker for '{self.app_name}' is not available"
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """请求工作进程优雅退出 (Shutdown RPC)，超时后强制结束。可重复调用。"""
+        with self._condition:
+            if self._stopping:
+                return
+            self._stopping = True
+            process = self._process
+            was_ready = self._ready
+            self._ready = False
+            channel = self._detach_locked()
+            self._condition.notify_all()
+        if process is not None:
+            if channel is not None:
+                try:
+                    pb2_grpc.AdapterControlServiceStub(channel).Shutdown(
+                        pb2.ShutdownRequest(), timeout=timeout
+                    )
+                except grpc.RpcError as e:
+                    logger.debug("Shutdown RPC to adapter worker failed: %s", e)
+                finally:
+                    channel.close()
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(
+                    "Adapter worker for '%s' did not exit; killing it", self.app_name
+                )
+                self._kill(process)
+            if was_ready:
+                _WORKERS_RUNNING.dec()
+        if (
+            self._monitor_thread is not None
+            and self._monitor_thread is not threading.current_thread()
+        ):
+            self._monitor_thread.join(timeout)
+        self._cleanup_socket_dir()
+        logger.info("Adapter worker for '%s' stopped", self.app_name)
+
+    @staticmethod
+    def _kill(process: subprocess.Popen) -> None:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    def _cleanup_socket_dir(self) -> None:
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+
+class RemotePerceptionAdapter:
+    """在父进程中代表工作进程内的 Perception 适配器 (实现相同的方法)。"""
+
+    def __init__(self, worker: AdapterWorkerProcess):
+        self.worker = worker
+        # 报告工作进程的 RSS；同一对中的两个代理绑定同一进程，实例池估算时只计一次
+        self.memory_usage_bytes = worker.memory_usage_bytes
+
+    def initialize(self, config: Dict) -> None:
+        pass  # 工作进程启动时已用适配器配置完成初始化
+
+    def close(self) -> None:
+        self.worker.stop()
+
+    def _call(self, method: str, request) -> Any:
+        return self.worker.call("perception", method, request, idempotent=True)
+
+    def get_ui_snapshot(self, options: Optional[Dict] = None) -> pb2.UISnapshot:
+        # 不传 client_host_id: 工作进程内联大块原始数据，不返回其本地 blob 句柄
+        return self._call(
+            "GetUISnapshot",
+            pb2.GetUISnapshotRequest(
+                options=python_dict_to_proto_struct(options or {})
+            ),
+        )
+
+    def find_element(self, query: pb2.ElementQuery) -> pb2.FindElementResponse:
+        return self._call("FindElement", query)
+
+    def find_elements(self, query: pb2.ElementQuery) -> pb2.FindElementsResponse:
+        return self._call("FindElements", query)
+
+    def get_element_state(self, element_id: bytes) -> Dict:
+        response = self._call(
+            "GetElementState",
+            pb2.GetElementStateRequest(adapter_specific_id=element_id),
+        )
+        return proto_value_map_to_python_dict(response.state)
+
+    def get_element_text(self, element_id: bytes) -> Optional[str]:
+        response = self._call(
+            "GetElementText", pb2.GetElementTextRequest(adapter_specific_id=element_id)
+        )
+        return response.text if response.HasField("text") else None
+
+    def get_focused_element(self) -> Optional[pb2.UIElement]:
+        response = self._call("GetFocusedElement", pb2.GetFocusedElementRequest())
+        return response.element if response.HasField("element") else None
+
+
+class RemoteActionAdapter:
+    """在父进程中代表工作进程内的 Action 适配器 (实现相同的方法)。"""
+
+    def __init__(self, worker: AdapterWorkerProcess):
+        self.worker = worker
+        # 报告工作进程的 RSS；同一对中的两个代理绑定同一进程，实例池估算时只计一次
+        self.memory_usage_bytes = worker.memory_usage_bytes
+
+    def initialize(self, config: Dict) -> None:
+        pass  # 工作进程启动时已用适配器配置完成初始化
+
+    def close(self) -> None:
+        self.worker.stop()
+
+    def _call(self, method: str, request) -> pb2.ActionResult:
+        return self.worker.call("action", method, request, idempotent=False)
+
+    def click(self, element_id: bytes, options: Optional[Dict] = None):
+        return self._call(
+            "Click",
+            pb2.ClickRequest(
+                adapter_specific_id=element_id,
+                options=python_dict_to_proto_struct(options or {}),
+            ),
+        )
+
+    def type_text(
+        self,
+        text: str,
+        element_id: Optional[bytes] = None,
+        options: Optional[Dict] = None,
+    ):
+        request = pb2.TypeTextRequest(
+            text=text, options=python_dict_to_proto_struct(options or {})
+        )
+        if element_id is not None:
+            request.adapter_specific_id = element_id
+        return self._call("TypeText", request)
+
+    def scroll(
+        self,
+        direction: str,
+        magnitude: int,
+        element_id: Optional[bytes] = None,
+        options: Optional[Dict] = None,
+    ):
+        request = pb2.ScrollRequest(
+            direction=direction,
+            magnitude=magnitude,
+            options=python_dict_to_proto_struct(options or {}),
+        )
+        if element_id is not None:
+            request.adapter_specific_id = element_id
+        return self._call("Scroll", request)
+
+    def press_key(self, key_combination: str, options: Optional[Dict] = None):
+        return self._call(
+            "PressKey",
+            pb2.PressKeyRequest(
+                key_combination=key_combination,
+                options=python_dict_to_proto_struct(options or {}),
+            ),
+        )
+
+    def drag_and_drop(
+        self,
+        source_element_id: bytes,
+        target_element_id: Optional[bytes] = None,
+        target_coords: Optional[tuple] = None,
+        options: Optional[Dict] = None,
+    ):
+        request = pb2.DragAndDropRequest(
+            source_adapter_specific_id=source_element_id,
+            options=python_dict_to_proto_struct(options or {}),
+        )
+        if target_element_id is not None:
+            request.target_adapter_specific_id = target_element_id
+        elif target_coords is not None:
+            request.target_coords.x, request.target_coords.y = target_coords
+        return self._call("DragAndDrop", request)
+
+    def execute_native_command(self, command_name: str, params: Optional[Dict] = None):
+        return self._call(
+            "ExecuteNativeCommand",
+            pb2.ExecuteNativeCommandRequest(
+                command_name=command_name,
+                params=python_dict_to_proto_struct(params or {}),
+            ),
+        )
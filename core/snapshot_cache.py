@@ -0,0 +1,221 @@
+import json
+import logging
+import threading
+import time
+import weakref
+from concurrent import futures
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.metrics import default_registry
+
+logger = logging.getLogger(__name__)
+
+# 所有 SnapshotCache 实例的累计值 (单个实例的统计见 get_stats())
+_LOOKUPS = default_registry.counter(
+    "argus_snapshot_cache_lookups_total",
+    "GetUISnapshot cache lookups by result.",
+    ("result",),
+)
+_INVALIDATIONS = default_registry.counter(
+    "argus_snapshot_cache_invalidations_total",
+    "Snapshot cache invalidations after actions or UI change notifications.",
+)
+
+
+def normalize_options(options: Optional[Dict]) -> str:
+    """把快照选项规范化为稳定的缓存键 (键排序、紧凑 JSON)。"""
+    return json.dumps(options or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class _CachedSnapshot:
+    """缓存中的一个快照及附加在它上面的资源。"""
+
+    __slots__ = ("snapshot", "captured_at", "resources")
+
+    def __init__(self, snapshot: Any, captured_at: float):
+        self.snapshot = snapshot
+        self.captured_at = captured_at
+        # 资源名 -> (资源, 释放函数)，快照离开缓存时释放
+        self.resources: Dict[str, Tuple[Any, Callable[[Any], None]]] = {}
+
+    def release_resources(self) -> None:
+        for resource, release in self.resources.values():
+            try:
+                release(resource)
+            except Exception as e:
+                logger.error("Releasing cached snapshot resource failed: %s", e)
+        self.resources.clear()
+
+
+class _AdapterCacheEntry:
+    """单个适配器的缓存状态。"""
+
+    def __init__(self):
+        # 每次失效递增；采集开始后代数变化的结果不会写入缓存
+        self.generation = 0
+        self.snapshots: Dict[str, _CachedSnapshot] = {}  # 选项键 -> 缓存的快照
+        # 选项键 -> (采集开始时的代数, Future)；失效时清空，之后的请求不会加入旧的采集
+        self.in_flight: Dict[str, Tuple[int, futures.Future]] = {}
+
+
+class SnapshotCache:
+    """
+    服务端 UISnapshot 缓存，按适配器实例和规范化后的 options 分区。
+    同一键的并发未命中只触发一次采集 (single-flight)。
+    适配器执行动作后应调用 invalidate()，采集期间发生的失效会丢弃该次结果。
+    get_resource() 可以在缓存的快照上附加资源 (例如 blob)，快照被替换或失效时释放。
+    """
+
+    def __init__(self, ttl: float):
+        """
+        :param ttl: 缓存有效期 (秒)，<= 0 表示禁用缓存 (仍会合并并发采集)。
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "weakref.WeakKeyDictionary[Any, _AdapterCacheEntry]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get_or_capture(
+        self,
+        adapter: Any,
+        options: Optional[Dict],
+        capture: Callable[[], Any],
+        on_current: Optional[Callable[[Any], None]] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        返回缓存中的快照，未命中时调用 capture() 采集并写入缓存。
+        :param adapter: 感知适配器实例 (缓存分区键)。
+        :param options: 快照选项。
+        :param capture: 实际采集快照的函数。
+        :param on_current: 采集期间没有发生失效时，以新快照为参数在缓存锁内调用，
+            用于更新依赖快照的其他结构 (例如快照索引)。采集结果已过时则不调用。
+        :return: (快照, 是否命中缓存)。
+        """
+        key = normalize_options(options)
+        with self._lock:
+            entry = self._entries.get(adapter)
+            if entry is None:
+                entry = _AdapterCacheEntry()
+                self._entries[adapter] = entry
+            cached = entry.snapshots.get(key)
+            if cached is not None and time.monotonic() - cached.captured_at <= self.ttl:
+                self._hits += 1
+                _LOOKUPS.inc(result="hit")
+                return cached.snapshot, True
+            self._misses += 1
+            _LOOKUPS.inc(result="miss")
+            generation = entry.generation
+            joined = entry.in_flight.get(key)
+            # 只加入本代开始的采集: 失效之前开始的采集可能不包含动作的效果
+            is_capturer = joined is None or joined[0] != generation
+            if is_capturer:
+                in_flight: futures.Future = futures.Future()
+                entry.in_flight[key] = (generation, in_flight)
+            else:
+                in_flight = joined[1]
+
+        if not is_capturer:
+            return in_flight.result(), False
+
+        try:
+            snapshot = capture()
+        except BaseException as e:
+            with self._lock:
+                self._finish_in_flight(entry, key, in_flight)
+            in_flight.set_exception(e)
+            raise
+
+        replaced = None
+        with self._lock:
+            self._finish_in_flight(entry, key, in_flight)
+            if entry.generation == generation:
+                if self.ttl > 0:
+                    replaced = entry.snapshots.get(key)
+                    entry.snapshots[key] = _CachedSnapshot(snapshot, time.monotonic())
+                if on_current is not None:
+                    on_current(snapshot)
+        in_flight.set_result(snapshot)
+        if replaced is not None:
+            replaced.release_resources()
+        return snapshot, False
+
+    def get_resource(
+        self,
+        adapter: Any,
+        snapshot: Any,
+        name: str,
+        create: Callable[[], Any],
+        release: Callable[[Any], None],
+    ) -> Optional[Any]:
+        """
+        返回附加在缓存快照 snapshot 上名为 name 的资源，第一次请求时调用 create() 创建。
+        快照被替换或失效时以资源为参数调用 release()。
+        :return: 资源；snapshot 不在缓存中时返回 None (不调用 create)。
+            创建期间快照离开了缓存时返回已经释放的资源，调用方只能依赖释放后
+            仍然有效的部分 (例如 blob 句柄的租期)。
+        """
+        with self._lock:
+            cached = self._find_locked(adapter, snapshot)
+            if cached is None:
+                return None
+            existing = cached.resources.get(name)
+            if existing is not None:
+                return existing[0]
+        # 创建可能较慢 (例如写入 blob)，不持有缓存锁
+        resource = create()
+        with self._lock:
+            cached = self._find_locked(adapter, snapshot)
+            existing = cached.resources.get(name) if cached is not None else None
+            if cached is not None and existing is None:
+                cached.resources[name] = (resource, release)
+                return resource
+        # 创建期间快照已离开缓存或其他请求已附加了资源: 释放自己创建的资源
+        release(resource)
+        return existing[0] if existing is not None else resource
+
+    def _find_locked(self, adapter: Any, snapshot: Any) -> Optional[_CachedSnapshot]:
+        entry = self._entries.get(adapter)
+        if entry is None:
+            return None
+        for cached in entry.snapshots.values():
+            if cached.snapshot is snapshot:
+                return cached
+        return None
+
+    @staticmethod
+    def _finish_in_flight(
+        entry: _AdapterCacheEntry, key: str, in_flight: futures.Future
+    ) -> None:
+        """移除自己的在途记录 (失效后同一键可能已经开始了新的采集)。调用方持有锁。"""
+        current = entry.in_flight.get(key)
+        if current is not None and current[1] is in_flight:
+            del entry.in_flight[key]
+
+    def invalidate(self, adapter: Any) -> None:
+        """丢弃适配器的所有缓存快照 (例如执行了可能改变 UI 的动作)。"""
+        with self._lock:
+            entry = self._entries.get(adapter)
+            if entry is None:
+                return
+            entry.generation += 1
+            dropped = list(entry.snapshots.values())
+            entry.snapshots.clear()
+            entry.in_flight.clear()
+            self._invalidations += 1
+            _INVALIDATIONS.inc()
+        for cached in dropped:
+            cached.release_resources()
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回命中、未命中、失效次数和当前缓存条目数。"""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "entries": sum(len(e.snapshots) for e in self._entries.values()),
+            }
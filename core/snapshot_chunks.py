@@ -0,0 +1,96 @@
+import logging
+from typing import Iterable, Iterator, List, Optional
+
+from core.snapshot_diff import copy_snapshot_header
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+
+def _encoded_element_size(element: pb2.UIElement) -> int:
+    """元素作为 UISnapshotChunk.elements 的一项序列化后的字节数 (含标签和长度前缀)。"""
+    size = element.ByteSize()
+    return 1 + max(1, (size.bit_length() + 6) // 7) + size
+
+
+def iter_snapshot_chunks(
+    header: pb2.UISnapshot,
+    elements: Iterable[pb2.UIElement],
+    max_chunk_bytes: int,
+) -> Iterator[pb2.UISnapshotChunk]:
+    """将快照拆分为 UISnapshotChunk 流。
+
+    首条消息只包含快照头，之后每条消息包含尽可能多的元素，序列化后不超过
+    max_chunk_bytes；单个元素本身超过上限时独占一条消息。elements 按需逐个读取，
+    因此可以是适配器边采集边产出的生成器。
+
+    Args:
+        header: 快照级字段 (其中的 elements 会被忽略)。
+        elements: 快照元素，按顺序产出。
+        max_chunk_bytes: 每条元素消息的目标字节上限。
+
+    Yields:
+        首个为 header 消息，其余为元素批次。
+    """
+    if len(header.elements):
+        header = copy_snapshot_header(header)
+    yield pb2.UISnapshotChunk(header=header)
+
+    batch: List[pb2.UIElement] = []
+    batch_bytes = 0
+    for element in elements:
+        element_bytes = _encoded_element_size(element)
+        if batch and batch_bytes + element_bytes > max_chunk_bytes:
+            yield pb2.UISnapshotChunk(elements=batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(element)
+        batch_bytes += element_bytes
+    if batch:
+        yield pb2.UISnapshotChunk(elements=batch)
+
+
+class SnapshotChunkAssembler:
+    """按顺序接收 UISnapshotChunk，重建完整快照。"""
+
+    def __init__(self):
+        self._snapshot: Optional[pb2.UISnapshot] = None
+
+    def add(self, chunk: pb2.UISnapshotChunk) -> None:
+        """追加一条消息。
+
+        Args:
+            chunk: 流中的下一条 UISnapshotChunk。
+
+        Raises:
+            ValueError: 重复的快照头，或在快照头之前收到元素。
+        """
+        if chunk.HasField("header"):
+            if self._snapshot is not None:
+                raise ValueError("Received a second snapshot header in one stream.")
+            self._snapshot = pb2.UISnapshot()
+            self._snapshot.CopyFrom(chunk.header)
+        if len(chunk.elements):
+            if self._snapshot is None:
+                raise ValueError("Received snapshot elements before the header.")
+            self._snapshot.elements.extend(chunk.elements)
+
+    def snapshot(self) -> pb2.UISnapshot:
+        """返回重建的快照。
+
+        Raises:
+            ValueError: 尚未收到快照头。
+        """
+        if self._snapshot is None:
+            raise ValueError("No snapshot header has been received yet.")
+        return self._snapshot
@@ -0,0 +1,316 @@
+import logging
+from typing import Dict, Iterable, List, Sequence
+
+from core.snapshot_diff import copy_snapshot_header
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+# ColumnarValueColumn.kinds 中的值类型
+_KIND_NULL = 0
+_KIND_BOOL = 1
+_KIND_NUMBER = 2
+_KIND_STRING = 3
+_KIND_OTHER = 4
+
+_KIND_BY_ONEOF = {
+    "null_value": _KIND_NULL,
+    "bool_value": _KIND_BOOL,
+    "number_value": _KIND_NUMBER,
+    "string_value": _KIND_STRING,
+}
+
+
+class _StringTable:
+    """编码时使用的字符串驻留表。"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self._index[value] = index
+            self.strings.append(value)
+        return index
+
+
+class _ValueColumnBuilder:
+    def __init__(self, key: int):
+        self.key = key
+        self.row_deltas: List[int] = []
+        self.last_row = 0
+        self.kinds = bytearray()
+        self.bool_values: List[bool] = []
+        self.number_values: List[float] = []
+        self.string_values: List[int] = []
+        self.other_values: List = []
+
+    def build(self) -> pb2.ColumnarValueColumn:
+        return pb2.ColumnarValueColumn(
+            key=self.key,
+            row_deltas=self.row_deltas,
+            kinds=bytes(self.kinds),
+            bool_values=self.bool_values,
+            number_values=self.number_values,
+            string_values=self.string_values,
+            other_values=self.other_values,
+        )
+
+
+def _encode_value_columns(
+    value_maps: Sequence, strings: _StringTable
+) -> List[pb2.ColumnarValueColumn]:
+    """把每行一个的 map<string, Value> 转换为按键分列的存储。"""
+    columns: Dict[str, _ValueColumnBuilder] = {}
+    for row, value_map in enumerate(value_maps):
+        if not value_map:
+            continue
+        for key in value_map:
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = _ValueColumnBuilder(strings.intern(key))
+            column.row_deltas.append(row - column.last_row)
+            column.last_row = row
+            value = value_map[key]
+            kind = _KIND_BY_ONEOF.get(value.WhichOneof("kind"), _KIND_OTHER)
+            column.kinds.append(kind)
+            if kind == _KIND_BOOL:
+                column.bool_values.append(value.bool_value)
+            elif kind == _KIND_NUMBER:
+                column.number_values.append(value.number_value)
+            elif kind == _KIND_STRING:
+                column.string_values.append(strings.intern(value.string_value))
+            elif kind == _KIND_OTHER:
+                column.other_values.append(value)
+    return [column.build() for column in columns.values()]
+
+
+def _decode_value_columns(
+    columns: Iterable[pb2.ColumnarValueColumn],
+    strings: Sequence[str],
+    elements: List[pb2.UIElement],
+    field_name: str,
+) -> None:
+    """把列式存储写回每个元素的 map 字段 (field_name 为 state 或 adapter_metadata)。"""
+    for column in columns:
+        key = strings[column.key]
+        bool_values = iter(column.bool_values)
+        number_values = iter(column.number_values)
+        string_values = iter(column.string_values)
+        other_values = iter(column.other_values)
+        row = 0
+        for delta, kind in zip(column.row_deltas, column.kinds):
+            row += delta
+            target = getattr(elements[row], field_name)[key]
+            if kind == _KIND_NULL:
+                target.null_value = 0
+            elif kind == _KIND_BOOL:
+                target.bool_value = next(bool_values)
+            elif kind == _KIND_NUMBER:
+                target.number_value = next(number_values)
+            elif kind == _KIND_STRING:
+                target.string_value = strings[next(string_values)]
+            else:
+                target.CopyFrom(next(other_values))
+
+
+def encode_columnar_elements(
+    elements: Sequence[pb2.UIElement],
+) -> pb2.ColumnarElements:
+    """将元素列表编码为列式表示。
+
+    元素类型、名称、文本和 state 键通过字符串表去重，bbox 打包为整数数组，
+    父子关系改为行号引用。
+
+    Args:
+        elements: 快照中的元素 (顺序即行号)。
+
+    Returns:
+        可由 decode_columnar_elements() 无损还原的 ColumnarElements。
+    """
+    strings = _StringTable()
+    row_by_id: Dict[str, int] = {}
+    for row, element in enumerate(elements):
+        row_by_id.setdefault(element.framework_id, row)
+
+    def element_ref(framework_id: str) -> int:
+        row = row_by_id.get(framework_id)
+        if row is not None:
+            return row + 1
+        return -(strings.intern(framework_id) + 1)
+
+    framework_ids: List[str] = []
+    adapter_ids: List[bytes] = []
+    element_types: List[int] = []
+    names: List[int] = []
+    text_contents: List[int] = []
+    bboxes: List[int] = []
+    rows_without_bbox: List[int] = []
+    parent_refs: List[int] = []
+    child_counts: List[int] = []
+    child_refs: List[int] = []
+    confidences: List[float] = []
+
+    for row, element in enumerate(elements):
+        framework_ids.append(element.framework_id)
+        adapter_ids.append(element.adapter_specific_id)
+        element_types.append(strings.intern(element.element_type))
+        names.append(
+            strings.intern(element.name) + 1 if element.HasField("name") else 0
+        )
+        text_contents.append(
+            strings.intern(element.text_content) + 1
+            if element.HasField("text_content")
+            else 0
+        )
+        if element.HasField("bbox"):
+            bbox = element.bbox
+            bboxes.extend((bbox.x_min, bbox.y_min, bbox.x_max, bbox.y_max))
+        else:
+            bboxes.extend((0, 0, 0, 0))
+            rows_without_bbox.append(row)
+        parent_refs.append(
+            element_ref(element.parent_framework_id)
+            if element.HasField("parent_framework_id")
+            else 0
+        )
+        child_counts.append(len(element.children_framework_ids))
+        child_refs.extend(
+            element_ref(child) for child in element.children_framework_ids
+        )
+        confidences.append(element.confidence)
+
+    state_columns = _encode_value_columns([e.state for e in elements], strings)
+    metadata_columns = _encode_value_columns(
+        [e.adapter_metadata for e in elements], strings
+    )
+    return pb2.ColumnarElements(
+        count=len(elements),
+        string_table=strings.strings,
+        framework_ids=framework_ids,
+        adapter_specific_ids=adapter_ids,
+        element_types=element_types,
+        names=names,
+        text_contents=text_contents,
+        bboxes=bboxes,
+        rows_without_bbox=rows_without_bbox,
+        parent_refs=parent_refs,
+        child_counts=child_counts,
+        child_refs=child_refs,
+        confidences=confidences,
+        state_columns=state_columns,
+        metadata_columns=metadata_columns,
+    )
+
+
+def decode_columnar_elements(columnar: pb2.ColumnarElements) -> List[pb2.UIElement]:
+    """将列式表示还原为 UIElement 列表。
+
+    Args:
+        columnar: encode_columnar_elements() 生成的列式元素。
+
+    Returns:
+        与编码前相等的元素列表。
+
+    Raises:
+        ValueError: 各列长度与 count 不一致。
+    """
+    count = columnar.count
+    if (
+        len(columnar.framework_ids) != count
+        or len(columnar.bboxes) != count * 4
+        or len(columnar.child_counts) != count
+    ):
+        raise ValueError("Columnar elements are inconsistent with their count.")
+    # 先把重复字段转换为 Python 列表，逐行索引 protobuf 容器要慢得多
+    strings = list(columnar.string_table)
+    framework_ids = list(columnar.framework_ids)
+    adapter_ids = list(columnar.adapter_specific_ids)
+    element_types = list(columnar.element_types)
+    names = list(columnar.names)
+    text_contents = list(columnar.text_contents)
+    bboxes = list(columnar.bboxes)
+    parent_refs = list(columnar.parent_refs)
+    child_counts = list(columnar.child_counts)
+    child_refs = list(columnar.child_refs)
+    confidences = list(columnar.confidences)
+    rows_without_bbox = set(columnar.rows_without_bbox)
+
+    def resolve_ref(ref: int) -> str:
+        return framework_ids[ref - 1] if ref > 0 else strings[-ref - 1]
+
+    child_offset = 0
+    elements: List[pb2.UIElement] = []
+    for row in range(count):
+        element = pb2.UIElement(
+            framework_id=framework_ids[row],
+            adapter_specific_id=adapter_ids[row],
+            element_type=strings[element_types[row]],
+            confidence=confidences[row],
+        )
+        name = names[row]
+        if name:
+            element.name = strings[name - 1]
+        text = text_contents[row]
+        if text:
+            element.text_content = strings[text - 1]
+        if row not in rows_without_bbox:
+            offset = row * 4
+            element.bbox.CopyFrom(
+                pb2.BBox(
+                    x_min=bboxes[offset],
+                    y_min=bboxes[offset + 1],
+                    x_max=bboxes[offset + 2],
+                    y_max=bboxes[offset + 3],
+                )
+            )
+        parent_ref = parent_refs[row]
+        if parent_ref:
+            element.parent_framework_id = resolve_ref(parent_ref)
+        child_count = child_counts[row]
+        if child_count:
+            element.children_framework_ids.extend(
+                resolve_ref(ref)
+                for ref in child_refs[child_offset : child_offset + child_count]
+            )
+            child_offset += child_count
+        elements.append(element)
+
+    _decode_value_columns(columnar.state_columns, strings, elements, "state")
+    _decode_value_columns(
+        columnar.metadata_columns, strings, elements, "adapter_metadata"
+    )
+    return elements
+
+
+def to_columnar_snapshot(snapshot: pb2.UISnapshot) -> pb2.UISnapshot:
+    """返回用 columnar_elements 代替 elements 的快照副本 (快照级字段保持不变)。"""
+    columnar_snapshot = copy_snapshot_header(snapshot)
+    columnar_snapshot.columnar_elements.CopyFrom(
+        encode_columnar_elements(snapshot.elements)
+    )
+    return columnar_snapshot
+
+
+def from_columnar_snapshot(snapshot: pb2.UISnapshot) -> pb2.UISnapshot:
+    """将列式快照还原为普通快照；未使用列式编码的快照原样返回。"""
+    if not snapshot.HasField("columnar_elements"):
+        return snapshot
+    elements = decode_columnar_elements(snapshot.columnar_elements)
+    restored = copy_snapshot_header(snapshot)
+    restored.ClearField("columnar_elements")
+    restored.elements.extend(elements)
+    return restored
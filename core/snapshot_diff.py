@@ -0,0 +1,200 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+# 每次采集都会变化、不参与变更检测的快照级字段
+_VOLATILE_HEADER_FIELDS = ("snapshot_id", "timestamp")
+_HEADER_FIELDS = tuple(
+    field for field in pb2.UISnapshot.DESCRIPTOR.fields if field.name != "elements"
+)
+
+
+def _is_repeated_field(field) -> bool:
+    """兼容新旧 protobuf 版本判断字段是否为 repeated (新版本移除了 label)。"""
+    is_repeated = getattr(field, "is_repeated", None)
+    if is_repeated is not None:
+        return is_repeated
+    return field.label == field.LABEL_REPEATED
+
+
+def _copy_field(target: pb2.UISnapshot, field, value) -> None:
+    """把一个快照级字段的值复制到 target (替换 target 中原有的值)。"""
+    target.ClearField(field.name)
+    target_value = getattr(target, field.name)
+    if field.message_type is not None and field.message_type.GetOptions().map_entry:
+        for key, item in value.items():
+            target_value[key].CopyFrom(item)
+    elif _is_repeated_field(field):
+        target_value.extend(value)
+    elif field.message_type is not None:
+        target_value.CopyFrom(value)
+    else:
+        setattr(target, field.name, value)
+
+
+def _has_field(snapshot: pb2.UISnapshot, field) -> bool:
+    if _is_repeated_field(field):
+        return len(getattr(snapshot, field.name)) > 0
+    try:
+        return snapshot.HasField(field.name)
+    except ValueError:
+        # 没有存在性的 proto3 标量: 非默认值视为已设置
+        return getattr(snapshot, field.name) != field.default_value
+
+
+def copy_snapshot_header(snapshot: pb2.UISnapshot) -> pb2.UISnapshot:
+    """复制快照中除 elements 以外的所有字段 (不复制元素列表)。
+
+    Args:
+        snapshot: 源快照。
+
+    Returns:
+        只包含快照级字段的新 UISnapshot。
+    """
+    header = pb2.UISnapshot()
+    for field, value in snapshot.ListFields():
+        if field.name != "elements":
+            _copy_field(header, field, value)
+    return header
+
+
+def _changed_header_fields(
+    previous: pb2.UISnapshot, current: pb2.UISnapshot
+) -> Tuple[List, List[str]]:
+    """返回 (current 中与 previous 不同的快照级字段, current 中被清除的字段名)。"""
+    changed = []
+    cleared = []
+    for field in _HEADER_FIELDS:
+        if not _has_field(current, field):
+            if _has_field(previous, field):
+                cleared.append(field.name)
+        elif getattr(current, field.name) != getattr(previous, field.name) or (
+            not _has_field(previous, field)
+        ):
+            changed.append(field)
+    return changed, cleared
+
+
+def compute_snapshot_diff(
+    previous: Optional[pb2.UISnapshot], current: pb2.UISnapshot
+) -> Optional[pb2.UISnapshotDiff]:
+    """计算 current 相对于 previous 的增量。
+
+    元素以 framework_id 匹配；内容有任何变化的元素整体放入 modified。
+    增量的 header 只包含与 previous 不同的快照级字段，未变化的大字段
+    (accessibility_tree_raw、app_context 等) 不会在每次增量中重复发送。
+
+    Args:
+        previous: 上一个已发送的快照，None 表示需要发送完整快照。
+        current: 新采集的快照。
+
+    Returns:
+        增量消息；如果元素和快照级字段都没有变化则返回 None。
+    """
+    diff = pb2.UISnapshotDiff(snapshot_id=current.snapshot_id)
+    if previous is None:
+        diff.header.CopyFrom(copy_snapshot_header(current))
+        diff.added.extend(current.elements)
+        return diff
+
+    diff.base_snapshot_id = previous.snapshot_id
+    changed_fields, cleared_fields = _changed_header_fields(previous, current)
+    for field in changed_fields:
+        _copy_field(diff.header, field, getattr(current, field.name))
+    diff.cleared_header_fields.extend(cleared_fields)
+    previous_elements: Dict[str, pb2.UIElement] = {
+        element.framework_id: element for element in previous.elements
+    }
+    for element in current.elements:
+        old_element = previous_elements.pop(element.framework_id, None)
+        if old_element is None:
+            diff.added.append(element)
+        elif old_element != element:
+            diff.modified.append(element)
+    # 剩下的就是在新快照中消失的元素
+    diff.removed_framework_ids.extend(previous_elements.keys())
+
+    if (
+        not diff.added
+        and not diff.modified
+        and not diff.removed_framework_ids
+        and all(field.name in _VOLATILE_HEADER_FIELDS for field in changed_fields)
+        and all(name in _VOLATILE_HEADER_FIELDS for name in cleared_fields)
+    ):
+        return None
+    return diff
+
+
+class SnapshotDiffApplier:
+    """在客户端依次应用 UISnapshotDiff，重建当前完整快照。"""
+
+    def __init__(self):
+        self._header: Optional[pb2.UISnapshot] = None
+        self._elements: "OrderedDict[str, pb2.UIElement]" = OrderedDict()
+
+    @property
+    def snapshot_id(self) -> Optional[str]:
+        """当前重建快照的 ID，尚未收到完整快照时为 None。"""
+        return self._header.snapshot_id if self._header is not None else None
+
+    def apply(self, diff: pb2.UISnapshotDiff) -> None:
+        """应用一条增量。
+
+        Args:
+            diff: 服务端发送的增量消息。
+
+        Raises:
+            ValueError: 增量的 base_snapshot_id 与当前快照不一致 (丢失了中间消息)。
+        """
+        if diff.HasField("base_snapshot_id"):
+            if self._header is None or diff.base_snapshot_id != self.snapshot_id:
+                raise ValueError(
+                    f"Snapshot diff based on '{diff.base_snapshot_id}' cannot be "
+                    f"applied to snapshot '{self.snapshot_id}'."
+                )
+            for framework_id in diff.removed_framework_ids:
+                self._elements.pop(framework_id, None)
+            for element in diff.modified:
+                self._elements[element.framework_id] = element
+            # 增量的 header 只包含变化的字段
+            header = pb2.UISnapshot()
+            header.CopyFrom(self._header)
+            for field, value in diff.header.ListFields():
+                _copy_field(header, field, value)
+            for field_name in diff.cleared_header_fields:
+                header.ClearField(field_name)
+        else:
+            self._elements.clear()
+            header = diff.header
+
+        for element in diff.added:
+            self._elements[element.framework_id] = element
+        self._header = header
+
+    def snapshot(self) -> pb2.UISnapshot:
+        """构建当前的完整快照。
+
+        新增元素追加在末尾，修改的元素保留原位置，因此元素顺序可能与服务端不同。
+
+        Raises:
+            ValueError: 尚未收到完整快照。
+        """
+        if self._header is None:
+            raise ValueError("No full snapshot has been received yet.")
+        snapshot = pb2.UISnapshot()
+        snapshot.CopyFrom(self._header)
+        snapshot.elements.extend(self._elements.values())
+        return snapshot
@@ -0,0 +1,244 @@
+import logging
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.element_query import UNSUPPORTED_QUERY_FIELDS, can_evaluate, compile_query
+from core.snapshot_selectors import SnapshotTree, compile_css, compile_xpath
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRID_CELL_SIZE = 256  # 空间网格单元边长 (像素)
+# 覆盖超过该数量网格单元的大元素 (如窗口根节点) 不进网格，查询时总是检查
+MAX_GRID_CELLS_PER_ELEMENT = 64
+
+# 这些查询字段需要适配器的实时数据或原生能力，无法在快照上本地求值
+LIVE_ONLY_QUERY_FIELDS = UNSUPPORTED_QUERY_FIELDS
+
+
+def bbox_intersects(a: pb2.BBox, b: pb2.BBox) -> bool:
+    """判断两个 BBox 是否相交 (边界接触也算相交)。"""
+    return (
+        a.x_min <= b.x_max
+        and b.x_min <= a.x_max
+        and a.y_min <= b.y_max
+        and b.y_min <= a.y_max
+    )
+
+
+class SnapshotIndex:
+    """
+    UISnapshot 的内存索引。
+    按 framework_id、adapter_specific_id、element_type、name、精确文本和父元素建立
+    等值索引，并按 BBox 建立空间网格，使大多数 ElementQuery 可以在服务端本地求值。
+    xpath / css_selector 在按需构建的 SnapshotTree 上求值。
+    """
+
+    def __init__(
+        self, snapshot: pb2.UISnapshot, grid_cell_size: int = DEFAULT_GRID_CELL_SIZE
+    ):
+        self.snapshot = snapshot
+        self._elements = list(snapshot.elements)
+        self._grid_cell_size = grid_cell_size
+        self._by_framework_id: Dict[str, int] = {}
+        self._by_adapter_id: Dict[bytes, List[int]] = defaultdict(list)
+        self._by_type: Dict[str, List[int]] = defaultdict(list)
+        self._by_name: Dict[str, List[int]] = defaultdict(list)
+        self._by_text: Dict[str, List[int]] = defaultdict(list)
+        self._by_parent: Dict[str, List[int]] = defaultdict(list)
+        self._grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._large_elements: List[int] = []
+        self._tree: Optional[SnapshotTree] = None
+        self._tree_lock = threading.Lock()
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._elements)
+
+    def _build(self) -> None:
+        """一次遍历构建所有索引；各索引内的位置天然按文档顺序递增。"""
+        for position, element in enumerate(self._elements):
+            self._by_framework_id.setdefault(element.framework_id, position)
+            if element.adapter_specific_id:
+                self._by_adapter_id[element.adapter_specific_id].append(position)
+            self._by_type[element.element_type].append(position)
+            if element.HasField("name"):
+                self._by_name[element.name].append(position)
+            if element.HasField("text_content"):
+                self._by_text[element.text_content].append(position)
+            if element.HasField("parent_framework_id"):
+                self._by_parent[element.parent_framework_id].append(position)
+            if element.HasField("bbox"):
+                self._add_to_grid(position, element.bbox)
+
+    @property
+    def tree(self) -> SnapshotTree:
+        """快照的树结构索引 (第一次使用选择器时构建)。"""
+        if self._tree is None:
+            with self._tree_lock:
+                if self._tree is None:
+                    self._tree = SnapshotTree(self._elements)
+        return self._tree
+
+    def _select(self, query: pb2.ElementQuery) -> Optional[List[int]]:
+        """
+        求值查询中的选择器，返回匹配元素的位置 (文档顺序)；没有选择器时返回 None。
+        :raises SelectorError: 选择器无效或超出本地支持的子集。
+        """
+        selected: Optional[List[int]] = None
+        for field, compile_selector in (
+            ("xpath", compile_xpath),
+            ("css_selector", compile_css),
+        ):
+            if not query.HasField(field):
+                continue
+            positions = self.tree.select(compile_selector(getattr(query, field)))
+            if selected is None:
+                selected = positions
+            else:
+                allowed = set(positions)
+                selected = [p for p in selected if p in allowed]
+        return selected
+
+    def _cell_range(self, bbox: pb2.BBox) -> Tuple[range, range]:
+        size = self._grid_cell_size
+        return (
+            range(bbox.x_min // size, bbox.x_max // size + 1),
+            range(bbox.y_min // size, bbox.y_max // size + 1),
+        )
+
+    def _add_to_grid(self, position: int, bbox: pb2.BBox) -> None:
+        x_cells, y_cells = self._cell_range(bbox)
+        if len(x_cells) * len(y_cells) > MAX_GRID_CELLS_PER_ELEMENT:
+            self._large_elements.append(position)
+            return
+        for cell_x in x_cells:
+            for cell_y in y_cells:
+                self._grid[(cell_x, cell_y)].append(position)
+
+    def _grid_candidates(self, bbox: pb2.BBox) -> List[int]:
+        """返回可能与 bbox 相交的元素位置 (已排序、去重)。"""
+        x_cells, y_cells = self._cell_range(bbox)
+        candidates = set(self._large_elements)
+        for cell_x in x_cells:
+            for cell_y in y_cells:
+                candidates.update(self._grid.get((cell_x, cell_y), ()))
+        return sorted(candidates)
+
+    @staticmethod
+    def can_answer(query: pb2.ElementQuery) -> bool:
+        """判断查询是否可以只依赖快照在本地求值。"""
+        if query.HasField("require_live") and query.require_live:
+            return False
+        return can_evaluate(query)
+
+    def find(
+        self, query: pb2.ElementQuery, limit: Optional[int] = None
+    ) -> List[pb2.UIElement]:
+        """
+        在快照中查找匹配 query 的元素 (按文档顺序)。
+        先从最小的等值候选集出发，再用编译后的查询计划 (core.element_query) 检查
+        其余条件。
+        :param query: 元素查询条件。调用前应先用 can_answer() 判断。
+        :param limit: 最多返回的元素个数，None 表示不限。
+        :return: 匹配的元素列表。若设置了 query.index，只返回该位置的一个元素。
+        :raises SelectorError: xpath / css_selector 无效或超出本地支持的子集。
+        """
+        compiled = compile_query(query)
+        selected = self._select(query)
+        if selected is not None:
+            # 选择器结果是精确的候选集 (文档顺序)，其余条件由查询计划检查
+            return compiled.find(map(self._elements.__getitem__, selected), limit)
+
+        candidate_lists: List[List[int]] = []
+        if query.HasField("framework_id"):
+            position = self._by_framework_id.get(query.framework_id)
+            candidate_lists.append([] if position is None else [position])
+        if query.HasField("adapter_specific_id"):
+            candidate_lists.append(
+                self._by_adapter_id.get(query.adapter_specific_id, [])
+            )
+        if query.HasField("element_type"):
+            candidate_lists.append(self._by_type.get(query.element_type, []))
+        if query.HasField("name"):
+            candidate_lists.append(self._by_name.get(query.name, []))
+        if query.HasField("exact_text"):
+            candidate_lists.append(self._by_text.get(query.exact_text, []))
+        if query.HasField("parent_framework_id_constraint"):
+            candidate_lists.append(
+                self._by_parent.get(query.parent_framework_id_constraint, [])
+            )
+        if query.HasField("bbox"):
+            candidate_lists.append(self._grid_candidates(query.bbox))
+
+        if not candidate_lists:
+            return compiled.find(self._elements, limit)
+        candidates = min(candidate_lists, key=len)
+        return compiled.find(map(self._elements.__getitem__, candidates), limit)
+
+
+class SnapshotIndexStore:
+    """
+    按适配器实例保存最近一次快照及其 (按需构建的) 索引。
+    适配器对象被回收后对应条目自动消失。
+    """
+
+    def __init__(self, grid_cell_size: int = DEFAULT_GRID_CELL_SIZE):
+        self._grid_cell_size = grid_cell_size
+        self._lock = threading.Lock()
+        # adapter -> [快照, 采集时间, 索引或 None]
+        self._entries: "weakref.WeakKeyDictionary[Any, list]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def put(self, adapter: Any, snapshot: pb2.UISnapshot) -> None:
+        """记录适配器最新采集的快照。索引延迟到第一次查询时构建。"""
+        with self._lock:
+            self._entries[adapter] = [snapshot, time.monotonic(), None]
+
+    def invalidate(self, adapter: Any) -> None:
+        """丢弃适配器的快照 (例如 UI 因动作发生了变化)。"""
+        with self._lock:
+            self._entries.pop(adapter, None)
+
+    def get_for_snapshot(self, adapter: Any, snapshot: pb2.UISnapshot) -> SnapshotIndex:
+        """
+        返回 snapshot 的索引。snapshot 是适配器最近记录的快照时复用 (并保存) 其索引，
+        否则构建一个不保存的新索引。
+        """
+        with self._lock:
+            entry = self._entries.get(adapter)
+            if entry is not None and entry[0] is snapshot:
+                if entry[2] is None:
+                    entry[2] = SnapshotIndex(snapshot, self._grid_cell_size)
+                return entry[2]
+        return SnapshotIndex(snapshot, self._grid_cell_size)
+
+    def get_fresh(self, adapter: Any, max_age: float) -> Optional[SnapshotIndex]:
+        """
+        返回适配器快照的索引，快照不存在或超过 max_age 秒时返回 None。
+        """
+        with self._lock:
+            entry = self._entries.get(adapter)
+            if entry is None:
+                return None
+            snapshot, captured_at, index = entry
+            if time.monotonic() - captured_at > max_age:
+                return None
+            if index is None:
+                index = SnapshotIndex(snapshot, self._grid_cell_size)
+                entry[2] = index
+            return index
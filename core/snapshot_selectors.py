@@ -0,0 +1,966 @@
+"""
+在服务端对 UISnapshot 求值 XPath 子集和 CSS 选择器 (ElementQuery.xpath / css_selector)，
+不依赖适配器的原生支持。
+
+元素的标签名是 element_type；可用的属性:
+    id (framework_id)、type (element_type)、name、text (text_content)、confidence，
+    其余名称依次在 state 和 adapter_metadata 中查找。
+
+XPath 子集:
+    绝对路径 (/a/b)、后代 (//a)、相对路径 (视为从文档根开始)、通配符 *、. 和 ..、
+    以 | 连接的多个路径；谓词支持 @attr、text()、name()、position()、last()、数字
+    (按位置选择)、字符串、= != < <= > >=、and、or、not()、contains()、
+    starts-with()、ends-with()、normalize-space()、string-length() 和括号。
+CSS:
+    类型选择器、*、#id、[attr]、[attr=v]、[attr^=v]、[attr$=v]、[attr*=v]、
+    [attr~=v]、后代/子 (>)/相邻兄弟 (+)/后续兄弟 (~) 组合器、以逗号分隔的选择器列表，
+    以及 :first-child、:last-child、:only-child、:nth-child(an+b)、
+    :nth-last-child(an+b)、:empty、:not(...)。
+
+求值基于预先计算的父/子索引数组和深度优先 (先序) 编号: a 是 b 的祖先当且仅当
+pre[a] < pre[b] <= end[a]，因此后代组合器只需一次有序合并，而不必逐个向上遍历祖先。
+"""
+
+import bisect
+import functools
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 导入生成的 protobuf 代码
+try:
+    import generated_protobuf.core_services_pb2 as pb2
+except ImportError:
+    print("Error: Could not import generated protobuf files.")
+    print("Please ensure you have run the protobuf compilation step and")
+    print(
+        "that the generated_protobuf directory is in your Python path or project root."
+    )
+    exit(1)
+
+SELECTOR_CACHE_SIZE = 256  # 全局缓存的已编译选择器数量
+TREE_RESULT_CACHE_SIZE = 64  # 每个快照缓存的选择器结果数量
+
+AXIS_CHILD = "child"
+AXIS_DESCENDANT = "descendant"
+AXIS_PARENT = "parent"
+AXIS_SELF = "self"
+AXIS_NEXT_SIBLING = "next-sibling"  # CSS +
+AXIS_FOLLOWING_SIBLING = "following-sibling"  # CSS ~
+
+
+class SelectorError(ValueError):
+    """选择器语法无效，或使用了不在支持子集内的特性。"""
+
+
+# (树, 元素位置) -> 是否匹配
+Condition = Callable[["SnapshotTree", int], bool]
+# (树, 元素位置, 在同组中的位置 (从 1 开始), 同组大小) -> 是否保留
+PositionalPredicate = Callable[["SnapshotTree", int, int, int], bool]
+
+
+@dataclass(frozen=True)
+class Step:
+    """路径中的一步: 从上下文节点沿 axis 选择 element_type 为 name (None 表示任意)、
+    满足 conditions 的元素，再按顺序应用依赖位置的谓词。"""
+
+    axis: str
+    name: Optional[str] = None
+    conditions: Tuple[Condition, ...] = ()
+    # (是否依赖位置, 谓词)；依赖位置的谓词按父元素分组后求值
+    predicates: Tuple[Tuple[bool, PositionalPredicate], ...] = ()
+
+
+@dataclass(frozen=True)
+class CompiledSelector:
+    """已编译的选择器: 多个路径 (XPath | 或 CSS 逗号) 的并集。与具体快照无关。"""
+
+    kind: str  # "xpath" 或 "css"
+    source: str
+    paths: Tuple[Tuple[Step, ...], ...]
+
+
+# --- 元素属性 ---
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _proto_value_to_string(value) -> Optional[str]:
+    kind = value.WhichOneof("kind")
+    if kind == "string_value":
+        return value.string_value
+    if kind == "bool_value":
+        return "true" if value.bool_value else "false"
+    if kind == "number_value":
+        return _format_number(value.number_value)
+    if kind == "null_value":
+        return ""
+    return None  # 列表和结构体不参与比较
+
+
+def element_attribute(element: pb2.UIElement, name: str) -> Optional[str]:
+    """返回选择器中 name 属性的字符串值，元素没有该属性时返回 None。"""
+    if name in ("id", "framework_id"):
+        return element.framework_id
+    if name in ("type", "element_type"):
+        return element.element_type
+    if name == "name":
+        return element.name if element.HasField("name") else None
+    if name in ("text", "text_content"):
+        return element.text_content if element.HasField("text_content") else None
+    if name == "confidence":
+        return _format_number(element.confidence)
+    if name in element.state:
+        return _proto_value_to_string(element.state[name])
+    if name in element.adapter_metadata:
+        return _proto_value_to_string(element.adapter_metadata[name])
+    return None
+
+
+# --- 快照树 ---
+
+
+class SnapshotTree:
+    """
+    UISnapshot 元素的树结构索引 (位置即元素在快照 elements 中的下标)。
+
+    父子关系取自 parent_framework_id，缺失时取自父元素的 children_framework_ids；
+    兄弟顺序按 children_framework_ids，未列出的按快照顺序排在后面。
+    父元素不在快照中的元素作为根。
+    """
+
+    def __init__(self, elements: Sequence[pb2.UIElement]):
+        self.elements = list(elements)
+        count = len(self.elements)
+        self.position_of: Dict[str, int] = {}
+        for position, element in enumerate(self.elements):
+            self.position_of.setdefault(element.framework_id, position)
+
+        self.parent: List[int] = [-1] * count
+        for position, element in enumerate(self.elements):
+            if element.HasField("parent_framework_id"):
+                parent = self.position_of.get(element.parent_framework_id, -1)
+                self.parent[position] = parent if parent != position else -1
+        for position, element in enumerate(self.elements):
+            for child_id in element.children_framework_ids:
+                child = self.position_of.get(child_id)
+                if child is not None and child != position and self.parent[child] < 0:
+                    self.parent[child] = position
+
+        self.children: List[List[int]] = [[] for _ in range(count)]
+        self.roots: List[int] = []
+        self._link_children()
+        self.pre: List[int] = [0] * count  # 先序编号
+        self.end: List[int] = [0] * count  # 子树中最大的先序编号
+        self.order: List[int] = []  # 按先序排列的位置 (文档顺序)
+        self._number_nodes()
+
+        self.sibling_index: List[int] = [0] * count
+        for siblings in [self.roots] + self.children:
+            for index, position in enumerate(siblings):
+                self.sibling_index[position] = index
+        self.by_type: Dict[str, List[int]] = {}
+        for position in self.order:
+            self.by_type.setdefault(self.elements[position].element_type, []).append(
+                position
+            )
+        # 选择器结果缓存 (同一快照上重复的选择器直接返回)，按 (类型, 选择器文本) 索引
+        self._results: "OrderedDict[Tuple[str, str], Tuple[int, ...]]" = OrderedDict()
+        self._results_lock = threading.Lock()
+
+    def _link_children(self) -> None:
+        for position, parent in enumerate(self.parent):
+            if parent >= 0:
+                self.children[parent].append(position)
+            else:
+                self.roots.append(position)
+        for position, element in enumerate(self.elements):
+            children = self.children[position]
+            if len(children) > 1 and element.children_framework_ids:
+                rank = {
+                    self.position_of.get(child_id): index
+                    for index, child_id in enumerate(element.children_framework_ids)
+                }
+                children.sort(key=lambda child: (rank.get(child, len(rank)), child))
+
+    def _number_nodes(self) -> None:
+        """迭代式深度优先遍历，计算先序编号和子树范围。环上的元素被断开为根。"""
+        visited = [False] * len(self.elements)
+        counter = 0
+
+        def visit(root: int) -> None:
+            nonlocal counter
+            stack = [(root, False)]
+            while stack:
+                position, exiting = stack.pop()
+                if exiting:
+                    self.end[position] = counter - 1
+                    continue
+                visited[position] = True
+                self.pre[position] = counter
+                self.order.append(position)
+                counter += 1
+                stack.append((position, True))
+                stack.extend(
+                    (child, False) for child in reversed(self.children[position])
+                )
+
+        for root in self.roots:
+            visit(root)
+        for position in range(len(self.elements)):
+            if not visited[position]:
+                # 父链成环: 从父元素中摘除，作为新的根
+                self.children[self.parent[position]].remove(position)
+                self.parent[position] = -1
+                self.roots.append(position)
+                visit(position)
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def is_ancestor(self, ancestor: int, descendant: int) -> bool:
+        """O(1) 判断 ancestor 是否是 descendant 的 (真) 祖先。"""
+        return self.pre[ancestor] < self.pre[descendant] <= self.end[ancestor]
+
+    def siblings(self, position: int) -> List[int]:
+        parent = self.parent[position]
+        return self.children[parent] if parent >= 0 else self.roots
+
+    def attribute(self, position: int, name: str) -> Optional[str]:
+        return element_attribute(self.elements[position], name)
+
+    # --- 求值 ---
+
+    def select(self, selector: CompiledSelector) -> List[int]:
+        """返回匹配选择器的元素位置 (文档顺序，去重)。结果按选择器文本缓存。"""
+        key = (selector.kind, selector.source)
+        with self._results_lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                return list(cached)
+        if len(selector.paths) == 1:
+            result = self._evaluate_path(selector.paths[0])
+        else:
+            merged = set()
+            for path in selector.paths:
+                merged.update(self._evaluate_path(path))
+            result = sorted(merged, key=self.pre.__getitem__)
+        with self._results_lock:
+            self._results[key] = tuple(result)
+            if len(self._results) > TREE_RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    def xpath(self, expression: str) -> List[pb2.UIElement]:
+        """按 XPath 子集选择元素。
+
+        Raises:
+            SelectorError: 表达式无效或超出支持的子集。
+        """
+        return [self.elements[p] for p in self.select(compile_xpath(expression))]
+
+    def css(self, selector: str) -> List[pb2.UIElement]:
+        """按 CSS 选择器选择元素。
+
+        Raises:
+            SelectorError: 选择器无效或超出支持的子集。
+        """
+        return [self.elements[p] for p in self.select(compile_css(selector))]
+
+    def _evaluate_path(self, steps: Tuple[Step, ...]) -> List[int]:
+        context: Optional[List[int]] = None  # None 表示文档根 (所有根元素的父节点)
+        for step in steps:
+            if context is None and step.axis == AXIS_SELF and not step.predicates:
+                continue  # 相对路径开头的 "." 即文档根
+            context = self._evaluate_step(step, context)
+            if not context:
+                return []
+        return context or []
+
+    def _typed(self, name: Optional[str]) -> List[int]:
+        return self.order if name is None else self.by_type.get(name, [])
+
+    def _evaluate_step(self, step: Step, context: Optional[List[int]]) -> List[int]:
+        candidates = self._axis_candidates(step, context)
+        if step.name is not None and step.axis not in (AXIS_CHILD, AXIS_DESCENDANT):
+            candidates = [
+                p for p in candidates if self.elements[p].element_type == step.name
+            ]
+        for condition in step.conditions:
+            candidates = [p for p in candidates if condition(self, p)]
+        for uses_position, predicate in step.predicates:
+            if not uses_position:
+                candidates = [p for p in candidates if predicate(self, p, 1, 1)]
+                continue
+            candidates = self._apply_positional(step.axis, candidates, predicate)
+        return candidates
+
+    def _axis_candidates(self, step: Step, context: Optional[List[int]]) -> List[int]:
+        """返回 axis 选出的元素 (文档顺序)。child/descendant 已按 name 过滤。"""
+        pre = self.pre
+        if step.axis == AXIS_CHILD:
+            typed = self._typed(step.name)
+            if context is None:
+                return [p for p in typed if self.parent[p] < 0]
+            child_count = sum(len(self.children[p]) for p in context)
+            if child_count < len(typed):
+                found = [c for p in context for c in self.children[p]]
+                if step.name is not None:
+                    found = [
+                        c for c in found if self.elements[c].element_type == step.name
+                    ]
+                return sorted(found, key=pre.__getitem__)
+            context_set = set(context)
+            return [p for p in typed if self.parent[p] in context_set]
+        if step.axis == AXIS_DESCENDANT:
+            typed = self._typed(step.name)
+            if context is None:
+                return list(typed)
+            return self._within_subtrees(typed, context)
+        if context is None:
+            return []  # 文档根没有父元素、自身或兄弟
+        if step.axis == AXIS_SELF:
+            return list(context)
+        if step.axis == AXIS_PARENT:
+            parents = {self.parent[p] for p in context if self.parent[p] >= 0}
+            return sorted(parents, key=pre.__getitem__)
+        if step.axis == AXIS_NEXT_SIBLING:
+            found = set()
+            for p in context:
+                siblings = self.siblings(p)
+                index = self.sibling_index[p] + 1
+                if index < len(siblings):
+                    found.add(siblings[index])
+            return sorted(found, key=pre.__getitem__)
+        if step.axis == AXIS_FOLLOWING_SIBLING:
+            # 每组兄弟只需要最靠前的上下文元素
+            first_index: Dict[int, int] = {}
+            for p in context:
+                parent = self.parent[p]
+                index = self.sibling_index[p]
+                if index < first_index.get(parent, len(self.elements)):
+                    first_index[parent] = index
+            found = []
+            for parent, index in first_index.items():
+                siblings = self.children[parent] if parent >= 0 else self.roots
+                found.extend(siblings[index + 1 :])
+            return sorted(found, key=pre.__getitem__)
+        raise SelectorError(f"Unsupported axis: {step.axis}")
+
+    def _within_subtrees(self, candidates: List[int], context: List[int]) -> List[int]:
+        """返回 candidates 中位于 context 某个元素子树内 (不含其自身) 的元素。
+
+        先把上下文合并为互不重叠的先序区间，再与候选做一次有序合并。
+        """
+        pre, end = self.pre, self.end
+        intervals: List[Tuple[int, int]] = []
+        for p in sorted(context, key=pre.__getitem__):
+            if intervals and pre[p] <= intervals[-1][1]:
+                continue  # 已被外层上下文的子树覆盖
+            intervals.append((pre[p], end[p]))
+        if not intervals:
+            return []
+        starts = [start for start, _ in intervals]
+        found = []
+        for p in candidates:
+            number = pre[p]
+            index = bisect.bisect_left(starts, number) - 1
+            if index >= 0 and number <= intervals[index][1]:
+                found.append(p)
+        return found
+
+    def _apply_positional(
+        self, axis: str, candidates: List[int], predicate: PositionalPredicate
+    ) -> List[int]:
+        """按 XPath 语义对每个上下文的结果分组 (child/descendant 按父元素) 求位置谓词。"""
+        if axis not in (AXIS_CHILD, AXIS_DESCENDANT):
+            return [p for p in candidates if predicate(self, p, 1, 1)]
+        groups: Dict[int, List[int]] = {}
+        for p in candidates:
+            groups.setdefault(self.parent[p], []).append(p)
+        kept = set()
+        for group in groups.values():
+            size = len(group)
+            for position, p in enumerate(group, start=1):
+                if predicate(self, p, position, size):
+                    kept.add(p)
+        return [p for p in candidates if p in kept]
+
+
+# --- 词法分析 ---
+
+_XPATH_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"[^"]*"|'[^']*')
+      | (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<op>//|/|\.\.|\.|\[|\]|\(|\)|@|,|\||!=|<=|>=|=|<|>|\*|::)
+      | (?P<name>[A-Za-z_][\w\-]*(?:\(\))?)
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize_xpath(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _XPATH_TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise SelectorError(
+                f"Invalid XPath near {expression[position:position + 10]!r}"
+            )
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+# --- XPath 谓词表达式 ---
+
+# 表达式求值函数: (树, 位置, 组内位置, 组大小) -> 值 (str / float / bool / None)
+_Expr = Callable[[SnapshotTree, int, int, int], Any]
+_NUMBER, _STRING, _BOOLEAN = "number", "string", "boolean"
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_boolean(value: Any) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value != ""
+    return bool(value)
+
+
+def _to_string(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _format_number(value)
+
+
+def _compare(operator: str, left: Any, right: Any) -> bool:
+    # 缺失的属性相当于空节点集: 任何比较都不成立
+    if left is None or right is None:
+        return False
+    if operator in ("=", "!="):
+        if isinstance(left, bool) or isinstance(right, bool):
+            equal = _to_boolean(left) == _to_boolean(right)
+        elif isinstance(left, float) or isinstance(right, float):
+            a, b = _to_number(left), _to_number(right)
+            equal = a is not None and a == b
+        else:
+            equal = left == right
+        return equal if operator == "=" else not equal
+    a, b = _to_number(left), _to_number(right)
+    if a is None or b is None:
+        return False
+    if operator == "<":
+        return a < b
+    if operator == "<=":
+        return a <= b
+    if operator == ">":
+        return a > b
+    return a >= b
+
+
+class _XPathParser:
+    def __init__(self, expression: str):
+        self.source = expression
+        self.tokens = _tokenize_xpath(expression)
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        index = self.index + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self) -> Tuple[Optional[str], Optional[str]]:
+        token = self.peek()
+        self.index += 1
+        return token
+
+    def expect(self, value: str) -> None:
+        kind, text = self.next()
+        if text != value:
+            raise SelectorError(
+                f"Expected {value!r} in XPath {self.source!r}, got {text!r}"
+            )
+
+    def error(self, message: str) -> SelectorError:
+        return SelectorError(f"{message} in XPath {self.source!r}")
+
+    # 路径
+
+    def parse(self) -> CompiledSelector:
+        if not self.tokens:
+            raise self.error("Empty expression")
+        paths = [self.parse_path()]
+        while self.peek()[1] == "|":
+            self.next()
+            paths.append(self.parse_path())
+        if self.index < len(self.tokens):
+            raise self.error(f"Unexpected token {self.peek()[1]!r}")
+        return CompiledSelector("xpath", self.source, tuple(paths))
+
+    def parse_path(self) -> Tuple[Step, ...]:
+        steps = []
+        axis = AXIS_CHILD  # 相对路径从文档根开始
+        if self.peek()[1] in ("/", "//"):
+            axis = AXIS_CHILD if self.next()[1] == "/" else AXIS_DESCENDANT
+        while True:
+            steps.append(self.parse_step(axis))
+            separator = self.peek()[1]
+            if separator not in ("/", "//"):
+                break
+            self.next()
+            axis = AXIS_CHILD if separator == "/" else AXIS_DESCENDANT
+        return tuple(steps)
+
+    def parse_step(self, axis: str) -> Step:
+        kind, text = self.next()
+        if text == ".":
+            if axis != AXIS_CHILD:
+                raise self.error("'//.' is not supported")
+            return Step(AXIS_SELF)
+        if text == "..":
+            if axis != AXIS_CHILD:
+                raise self.error("'//..' is not supported")
+            return Step(AXIS_PARENT)
+        if self.peek()[1] == "::":
+            raise self.error("Explicit axes are not supported")
+        if text == "*" or text == "node()":
+            name = None
+        elif kind == "name" and not text.endswith("()"):
+            name = text
+        else:
+            raise self.error(f"Expected a step, got {text!r}")
+        predicates = []
+        while self.peek()[1] == "[":
+            self.next()
+            expression, value_type, uses_position = self.parse_or()
+            self.expect("]")
+            if value_type == _NUMBER:
+                # [N] 是 [position() = N] 的简写
+                number = expression
+
+                def predicate(tree, p, position, size, number=number):
+                    return position == _to_number(number(tree, p, position, size))
+
+                uses_position = True
+            else:
+
+                def predicate(tree, p, position, size, expression=expression):
+                    return _to_boolean(expression(tree, p, position, size))
+
+            predicates.append((uses_position, predicate))
+        return Step(axis, name=name, predicates=tuple(predicates))
+
+    # 表达式: 每个 parse_* 返回 (求值函数, 静态类型, 是否依赖位置)
+
+    def parse_or(self):
+        left, left_type, left_positional = self.parse_and()
+        while self.peek() == ("name", "or"):
+            self.next()
+            right, _, right_positional = self.parse_and()
+            left = functools.partial(_eval_or, left, right)
+            left_type = _BOOLEAN
+            left_positional = left_positional or right_positional
+        return left, left_type, left_positional
+
+    def parse_and(self):
+        left, left_type, left_positional = self.parse_comparison()
+        while self.peek() == ("name", "and"):
+            self.next()
+            right, _, right_positional = self.parse_comparison()
+            left = functools.partial(_eval_and, left, right)
+            left_type = _BOOLEAN
+            left_positional = left_positional or right_positional
+        return left, left_type, left_positional
+
+    def parse_comparison(self):
+        left, left_type, left_positional = self.parse_primary()
+        operator = self.peek()[1]
+        if operator in ("=", "!=", "<", "<=", ">", ">="):
+            self.next()
+            right, _, right_positional = self.parse_primary()
+            return (
+                functools.partial(_eval_compare, operator, left, right),
+                _BOOLEAN,
+                left_positional or right_positional,
+            )
+        return left, left_type, left_positional
+
+    def parse_primary(self):
+        kind, text = self.next()
+        if kind == "string":
+            value = text[1:-1]
+            return (lambda tree, p, position, size: value), _STRING, False
+        if kind == "number":
+            number = float(text)
+            return (lambda tree, p, position, size: number), _NUMBER, False
+        if text == "(":
+            result = self.parse_or()
+            self.expect(")")
+            return result
+        if text == "@":
+            attr_kind, name = self.next()
+            if attr_kind != "name" or name.endswith("()"):
+                raise self.error("Expected an attribute name after '@'")
+            return (
+                lambda tree, p, position, size: tree.attribute(p, name),
+                _STRING,
+                False,
+            )
+        if kind == "name" and text.endswith("()"):
+            return self.parse_nullary_function(text[:-2])
+        if kind == "name" and self.peek()[1] == "(":
+            self.next()
+            return self.parse_function(text)
+        raise self.error(f"Unexpected token {text!r}")
+
+    def parse_nullary_function(self, name: str):
+        if name == "text":
+            return (
+                lambda tree, p, position, size: tree.attribute(p, "text"),
+                _STRING,
+                False,
+            )
+        if name in ("name", "local-name"):
+            return (
+                lambda tree, p, position, size: tree.elements[p].element_type,
+                _STRING,
+                False,
+            )
+        if name == "position":
+            return (lambda tree, p, position, size: float(position)), _NUMBER, True
+        if name == "last":
+            return (lambda tree, p, position, size: float(size)), _NUMBER, True
+        if name in ("true", "false"):
+            value = name == "true"
+            return (lambda tree, p, position, size: value), _BOOLEAN, False
+        raise self.error(f"Unsupported function {name}()")
+
+    def parse_function(self, name: str):
+        arguments = []
+        if self.peek()[1] != ")":
+            arguments.append(self.parse_or())
+            while self.peek()[1] == ",":
+                self.next()
+                arguments.append(self.parse_or())
+        self.expect(")")
+        functions = {
+            "contains": (2, _BOOLEAN, _fn_contains),
+            "starts-with": (2, _BOOLEAN, _fn_starts_with),
+            "ends-with": (2, _BOOLEAN, _fn_ends_with),
+            "not": (1, _BOOLEAN, _fn_not),
+            "normalize-space": (1, _STRING, _fn_normalize_space),
+            "string-length": (1, _NUMBER, _fn_string_length),
+        }
+        if name not in functions:
+            raise self.error(f"Unsupported function {name}()")
+        arity, result_type, implementation = functions[name]
+        if len(arguments) != arity:
+            raise self.error(f"{name}() takes {arity} argument(s)")
+        evaluators = tuple(argument[0] for argument in arguments)
+        return (
+            functools.partial(_eval_function, implementation, evaluators),
+            result_type,
+            any(argument[2] for argument in arguments),
+        )
+
+
+def _eval_or(left: _Expr, right: _Expr, tree, p, position, size) -> bool:
+    return _to_boolean(left(tree, p, position, size)) or _to_boolean(
+        right(tree, p, position, size)
+    )
+
+
+def _eval_and(left: _Expr, right: _Expr, tree, p, position, size) -> bool:
+    return _to_boolean(left(tree, p, position, size)) and _to_boolean(
+        right(tree, p, position, size)
+    )
+
+
+def _eval_compare(
+    operator: str, left: _Expr, right: _Expr, tree, p, position, size
+) -> bool:
+    return _compare(
+        operator, left(tree, p, position, size), right(tree, p, position, size)
+    )
+
+
+def _eval_function(implementation, evaluators, tree, p, position, size):
+    return implementation(*(e(tree, p, position, size) for e in evaluators))
+
+
+def _fn_contains(haystack, needle) -> bool:
+    haystack, needle = _to_string(haystack), _to_string(needle)
+    return haystack is not None and needle is not None and needle in haystack
+
+
+def _fn_starts_with(value, prefix) -> bool:
+    value, prefix = _to_string(value), _to_string(prefix)
+    return value is not None and prefix is not None and value.startswith(prefix)
+
+
+def _fn_ends_with(value, suffix) -> bool:
+    value, suffix = _to_string(value), _to_string(suffix)
+    return value is not None and suffix is not None and value.endswith(suffix)
+
+
+def _fn_not(value) -> bool:
+    return not _to_boolean(value)
+
+
+def _fn_normalize_space(value) -> Optional[str]:
+    value = _to_string(value)
+    return " ".join(value.split()) if value is not None else None
+
+
+def _fn_string_length(value) -> float:
+    value = _to_string(value)
+    return float(len(value)) if value is not None else 0.0
+
+
+@functools.lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_xpath(expression: str) -> CompiledSelector:
+    """编译 XPath 子集表达式 (结果缓存，与具体快照无关)。
+
+    Raises:
+        SelectorError: 表达式无效或超出支持的子集。
+    """
+    return _XPathParser(expression).parse()
+
+
+# --- CSS ---
+
+_CSS_IDENT = r"-?[A-Za-z_][\w\-]*"
+_CSS_TOKEN = re.compile(
+    rf"""
+      (?P<comma>\s*,\s*)
+    | (?P<combinator>\s*[>+~]\s*|\s+)
+    | (?P<type>{_CSS_IDENT}|\*)
+    | (?P<id>\#(?:[\w\-]|\\.)+)
+    | (?P<attr>\[\s*(?P<attr_name>{_CSS_IDENT})\s*
+        (?:(?P<attr_op>[~^$*|]?=)\s*
+           (?P<attr_value>"[^"]*"|'[^']*'|[^\s\]]+)\s*)?\])
+    | (?P<pseudo>:(?P<pseudo_name>{_CSS_IDENT})
+        (?:\((?P<pseudo_arg>[^()]*(?:\([^()]*\)[^()]*)*)\))?)
+    | (?P<cls>\.{_CSS_IDENT})
+    """,
+    re.VERBOSE,
+)
+_NTH_PATTERN = re.compile(
+    r"""^\s*(?:
+        (?P<odd>odd)
+      | (?P<even>even)
+      | (?P<a>[+-]?\d*)n\s*(?:(?P<sign>[+-])\s*(?P<b_with_a>\d+))?
+      | (?P<b>[+-]?\d+)
+    )\s*$""",
+    re.VERBOSE,
+)
+
+_COMBINATOR_AXES = {
+    " ": AXIS_DESCENDANT,
+    ">": AXIS_CHILD,
+    "+": AXIS_NEXT_SIBLING,
+    "~": AXIS_FOLLOWING_SIBLING,
+}
+
+
+def _parse_nth(argument: str, source: str) -> Tuple[int, int]:
+    """解析 an+b，返回 (a, b)。"""
+    match = _NTH_PATTERN.match(argument)
+    if match is None:
+        raise SelectorError(f"Invalid :nth-child argument {argument!r} in {source!r}")
+    if match.group("odd"):
+        return 2, 1
+    if match.group("even"):
+        return 2, 0
+    if match.group("b") is not None:
+        return 0, int(match.group("b"))
+    a_text = match.group("a")
+    a = -1 if a_text == "-" else int(a_text) if a_text not in ("", "+") else 1
+    b = int(match.group("b_with_a") or 0)
+    if match.group("sign") == "-":
+        b = -b
+    return a, b
+
+
+def _nth_matches(a: int, b: int, index: int) -> bool:
+    """index (从 1 开始) 是否可以写成 a*n + b (n >= 0)。"""
+    if a == 0:
+        return index == b
+    return (index - b) % a == 0 and (index - b) // a >= 0
+
+
+def _attribute_condition(
+    name: str, operator: Optional[str], value: Optional[str]
+) -> Condition:
+    if operator is None:
+        return lambda tree, p: tree.attribute(p, name) is not None
+    tests: Dict[str, Callable[[str], bool]] = {
+        "=": lambda actual: actual == value,
+        "^=": lambda actual: bool(value) and actual.startswith(value),
+        "$=": lambda actual: bool(value) and actual.endswith(value),
+        "*=": lambda actual: bool(value) and value in actual,
+        "~=": lambda actual: value in actual.split(),
+        "|=": lambda actual: actual == value or actual.startswith(value + "-"),
+    }
+    test = tests[operator]
+
+    def condition(tree: SnapshotTree, p: int) -> bool:
+        actual = tree.attribute(p, name)
+        return actual is not None and test(actual)
+
+    return condition
+
+
+def _pseudo_condition(name: str, argument: Optional[str], source: str) -> Condition:
+    if name == "first-child":
+        return lambda tree, p: tree.sibling_index[p] == 0
+    if name == "last-child":
+        return lambda tree, p: tree.sibling_index[p] == len(tree.siblings(p)) - 1
+    if name == "only-child":
+        return lambda tree, p: len(tree.siblings(p)) == 1
+    if name == "empty":
+        return lambda tree, p: not tree.children[p]
+    if name in ("nth-child", "nth-last-child") and argument is not None:
+        a, b = _parse_nth(argument, source)
+        if name == "nth-child":
+            return lambda tree, p: _nth_matches(a, b, tree.sibling_index[p] + 1)
+        return lambda tree, p: _nth_matches(
+            a, b, len(tree.siblings(p)) - tree.sibling_index[p]
+        )
+    if name == "not" and argument is not None:
+        inner = _parse_compound_only(argument, source)
+        return lambda tree, p: not _matches_compound(inner, tree, p)
+    raise SelectorError(f"Unsupported pseudo-class :{name} in {source!r}")
+
+
+def _matches_compound(step: Step, tree: SnapshotTree, p: int) -> bool:
+    if step.name is not None and tree.elements[p].element_type != step.name:
+        return False
+    return all(condition(tree, p) for condition in step.conditions)
+
+
+class _CompoundBuilder:
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.conditions: List[Condition] = []
+        self.empty = True
+
+    def build(self, axis: str) -> Step:
+        return Step(axis, name=self.name, conditions=tuple(self.conditions))
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def _parse_css_paths(selector: str, source: str) -> Tuple[Tuple[Step, ...], ...]:
+    text = selector.strip()
+    if not text:
+        raise SelectorError("Empty CSS selector")
+    paths: List[Tuple[Step, ...]] = []
+    steps: List[Step] = []
+    compound = _CompoundBuilder()
+    axis = AXIS_DESCENDANT  # 第一个复合选择器可以出现在任意位置
+    position = 0
+
+    def finish_compound() -> None:
+        nonlocal compound
+        if compound.empty:
+            raise SelectorError(
+                f"Missing selector near position {position} in {source!r}"
+            )
+        steps.append(compound.build(axis))
+        compound = _CompoundBuilder()
+
+    while position < len(text):
+        match = _CSS_TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise SelectorError(f"Invalid CSS selector near {text[position:]!r}")
+        if match.group("combinator") is not None:
+            finish_compound()
+            axis = _COMBINATOR_AXES[match.group("combinator").strip() or " "]
+        elif match.group("comma") is not None:
+            finish_compound()
+            paths.append(tuple(steps))
+            steps = []
+            axis = AXIS_DESCENDANT
+        elif match.group("type") is not None:
+            if not compound.empty:
+                raise SelectorError(f"Type selector must come first in {source!r}")
+            type_name = match.group("type")
+            compound.name = None if type_name == "*" else type_name
+            compound.empty = False
+        elif match.group("id") is not None:
+            framework_id = re.sub(r"\\(.)", r"\1", match.group("id")[1:])
+            compound.conditions.append(
+                lambda tree, p, framework_id=framework_id: (
+                    tree.elements[p].framework_id == framework_id
+                )
+            )
+            compound.empty = False
+        elif match.group("attr") is not None:
+            value = match.group("attr_value")
+            compound.conditions.append(
+                _attribute_condition(
+                    match.group("attr_name"),
+                    match.group("attr_op"),
+                    _unquote(value) if value is not None else None,
+                )
+            )
+            compound.empty = False
+        elif match.group("pseudo") is not None:
+            compound.conditions.append(
+                _pseudo_condition(
+                    match.group("pseudo_name"), match.group("pseudo_arg"), source
+                )
+            )
+            compound.empty = False
+        else:
+            raise SelectorError(
+                f"Class selectors are not supported (UI elements have no classes): "
+                f"{source!r}"
+            )
+        position = match.end()
+    finish_compound()
+    paths.append(tuple(steps))
+    return tuple(paths)
+
+
+def _parse_compound_only(selector: str, source: str) -> Step:
+    paths = _parse_css_paths(selector, source)
+    if len(paths) != 1 or len(paths[0]) != 1:
+        raise SelectorError(f":not() only accepts a compound selector in {source!r}")
+    return paths[0][0]
+
+
+@functools.lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_css(selector: str) -> CompiledSelector:
+    """编译 CSS 选择器 (结果缓存，与具体快照无关)。
+
+    Raises:
+        SelectorError: 选择器无效或超出支持的子集。
+    """
+    return CompiledSelector("css", selector, _parse_css_paths(selector, selector))
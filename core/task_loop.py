@@ -0,0 +1,271 @@
+import logging
+import time
+from concurrent import futures
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.task_scheduler import TaskContext
+from utils.metrics import default_registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_MODES = ("sequential", "pipelined")
+
+_PHASE_SECONDS = default_registry.histogram(
+    "argus_task_phase_seconds",
+    "Duration of perception, cognition and action calls in seconds.",
+    ("phase", "mode"),
+)
+_ITERATION_SECONDS = default_registry.histogram(
+    "argus_task_iteration_seconds",
+    "Time from dispatching one action to dispatching the next.",
+    ("mode",),
+)
+_STALE_CAPTURES = default_registry.counter(
+    "argus_task_stale_captures_total",
+    "Snapshots discarded because they did not reflect the last action.",
+    ("mode",),
+)
+_DISCARDED_PLANS = default_registry.counter(
+    "argus_task_discarded_plans_total",
+    "Speculative plans discarded after an unconfirmed action.",
+    ("mode",),
+)
+
+
+def _timed(phase: str, mode: str, fn: Callable) -> Callable:
+    # 包装感知/认知/行动回调，记录每次调用的耗时 (异常时同样记录)
+    def wrapper(*args):
+        with _PHASE_SECONDS.time(phase=phase, mode=mode):
+            return fn(*args)
+
+    return wrapper
+
+
+@dataclass
+class PlannedAction:
+    """认知模块规划出的一个动作。"""
+
+    name: str  # ActionAdapter 方法名，例如 "click"、"type_text"
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    # 可能受影响区域的快照选项 (例如 {"region": {...}})。流水线模式下先采集该区域，
+    # 用于更快地确认动作效果 (区域快照过时时不再采集完整快照)
+    prefetch_options: Optional[Dict[str, Any]] = None
+    # 判断快照是否已反映动作效果；返回 False 表示快照过时，需要重新采集。
+    # 流水线模式下有 expectation 的动作在执行期间就开始采集
+    expectation: Optional[Callable[[Any], bool]] = None
+    # 预测的动作后快照。流水线模式下用它提前规划下一步 (与动作和采集并行)，
+    # 实际快照满足 expectation 时采用该规划，否则丢弃。规划器不提供时不做推测规划
+    predicted_snapshot: Optional[Any] = None
+
+
+@dataclass
+class LoopReport:
+    """一次任务循环的统计。"""
+
+    mode: str
+    iterations: int = 0  # 执行的动作数
+    completed: bool = False  # 规划器是否给出了结束信号 (返回 None)
+    # 每次迭代的端到端延迟: 从动作 N 下发到动作 N + 1 下发 (或循环结束)
+    iteration_latencies_ms: List[float] = field(default_factory=list)
+    stale_captures: int = 0  # 因未反映动作效果而丢弃的快照
+    discarded_plans: int = 0  # 基于预测快照提前完成、但动作效果未确认而被丢弃的规划
+
+    def summary(self) -> Dict[str, float]:
+        """返回迭代延迟的均值、p50、p95 和最大值 (毫秒)。"""
+        latencies = sorted(self.iteration_latencies_ms)
+        if not latencies:
+            return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+        def percentile(fraction: float) -> float:
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            "mean": sum(latencies) / len(latencies),
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": latencies[-1],
+        }
+
+
+class StaleSnapshotError(RuntimeError):
+    """多次重新采集后，快照仍未反映上一个动作的效果。"""
+
+
+class ActionFailedError(RuntimeError):
+    """动作适配器报告动作失败。"""
+
+
+def _action_succeeded(result: Any) -> bool:
+    # ActionResult 或其他带 success 属性的结果；没有该属性时视为成功
+    return bool(getattr(result, "success", True))
+
+
+class TaskLoop:
+    """
+    Perception-Cognition-Action 循环。
+
+    sequential 模式按 感知 -> 规划 -> 行动 严格串行执行。
+    pipelined 模式在执行器中下发动作 N:
+    - 动作有 expectation 时立即开始下一次采集，与动作执行重叠 (动作效果尚未出现的
+      快照被识别为过时，等动作返回后重新采集)；
+    - 先采集受影响区域 (prefetch_options)，区域快照过时时跳过完整快照；
+    - 动作提供 predicted_snapshot 时基于它规划动作 N + 1，与动作和采集重叠。
+      区域快照确认动作效果后直接采用该规划，不再等待完整快照。
+    同一次迭代中的采集串行执行 (感知适配器不保证可以被并发调用)。
+    """
+
+    def __init__(
+        self,
+        perceive: Callable[[Optional[Dict[str, Any]]], Any],
+        plan: Callable[[Any], Optional[PlannedAction]],
+        act: Callable[[PlannedAction], Any],
+        mode: str = "sequential",
+        max_iterations: int = 50,
+        max_stale_retries: int = 3,
+    ):
+        """
+        :param perceive: 采集快照，参数为快照选项 (None 表示完整快照)。
+        :param plan: 根据快照规划下一个动作，返回 None 表示任务完成。
+        :param act: 执行动作并返回结果 (例如 ActionResult)。
+        :param mode: "sequential" 或 "pipelined"。
+        :param max_iterations: 最多执行的动作数。
+        :param max_stale_retries: 单次迭代中快照过时后最多重新采集的次数。
+        """
+        if mode not in LOOP_MODES:
+            raise ValueError(f"Unknown task loop mode: '{mode}'")
+        self.perceive = _timed("perception", mode, perceive)
+        self.plan = _timed("cognition", mode, plan)
+        self.act = _timed("action", mode, act)
+        self.mode = mode
+        self.max_iterations = max_iterations
+        self.max_stale_retries = max_stale_retries
+
+    def run(self, context: TaskContext) -> LoopReport:
+        """
+        运行循环直到规划器返回 None 或达到 max_iterations。
+        :raises ActionFailedError: 动作执行失败。
+        :raises StaleSnapshotError: 快照多次重新采集后仍然过时。
+        :raises TaskCancelledError, TaskDeadlineExceeded: 来自 context.check()。
+        """
+        report = LoopReport(mode=self.mode)
+        # 动作、采集和推测规划各占一个线程
+        with futures.ThreadPoolExecutor(
+            max_workers=3, thread_name_prefix="TaskLoop"
+        ) as executor:
+            context.check()
+            action = self.plan(self.perceive(None))
+            while action is not None and report.iterations < self.max_iterations:
+                context.check()
+                dispatched_at = time.perf_counter()
+                report.iterations += 1
+                if self.mode == "pipelined":
+                    action = self._act_and_plan_pipelined(
+                        context, executor, action, report
+                    )
+                else:
+                    self._check_result(action, self.act(action))
+                    action = self._observe_and_plan_sequential(context, action, report)
+                elapsed = time.perf_counter() - dispatched_at
+                report.iteration_latencies_ms.append(elapsed * 1000.0)
+                _ITERATION_SECONDS.observe(elapsed, mode=self.mode)
+            report.completed = action is None
+        summary = report.summary()
+        logger.info(
+            "Task loop (%s) finished: %d iterations, p50 %.1fms, p95 %.1fms, "
+            "%d stale captures, %d discarded plans",
+            self.mode,
+            report.iterations,
+            summary["p50"],
+            summary["p95"],
+            report.stale_captures,
+            report.discarded_plans,
+        )
+        return report
+
+    @staticmethod
+    def _confirms(action: PlannedAction, snapshot: Any) -> bool:
+        return action.expectation is None or action.expectation(snapshot)
+
+    @staticmethod
+    def _check_result(action: PlannedAction, result: Any) -> None:
+        if not _action_succeeded(result):
+            raise ActionFailedError(
+                f"Action '{action.name}' failed: {getattr(result, 'message', result)}"
+            )
+
+    def _capture(self, action: PlannedAction, need_full: bool) -> Tuple[bool, Any]:
+        """
+        先采集受影响区域 (如果有)，再按需采集完整快照，两次采集串行执行。
+        :param need_full: 区域快照确认动作效果后是否仍需要完整快照 (没有推测规划时)。
+        :return: (是否确认了动作效果, 完整快照或 None)。
+        """
+        if action.prefetch_options is not None:
+            region = self.perceive(action.prefetch_options)
+            if not self._confirms(action, region):
+                return False, None
+            if not need_full:
+                return True, None
+        snapshot = self.perceive(None)
+        return self._confirms(action, snapshot), snapshot
+
+    def _observe_and_plan_sequential(
+        self, context: TaskContext, action: PlannedAction, report: LoopReport
+    ) -> Optional[PlannedAction]:
+        for _ in range(self.max_stale_retries + 1):
+            context.check()
+            snapshot = self.perceive(None)
+            if self._confirms(action, snapshot):
+                context.check()
+                return self.plan(snapshot)
+            report.stale_captures += 1
+            _STALE_CAPTURES.inc(mode=self.mode)
+        raise StaleSnapshotError(
+            f"Snapshot did not reflect action '{action.name}' "
+            f"after {self.max_stale_retries} retries"
+        )
+
+    def _act_and_plan_pipelined(
+        self,
+        context: TaskContext,
+        executor: futures.Executor,
+        action: PlannedAction,
+        report: LoopReport,
+    ) -> Optional[PlannedAction]:
+        pending_action = executor.submit(self.act, action)
+        if action.expectation is None:
+            # 无法识别动作之前的快照，只能等动作返回后再采集
+            self._check_result(action, pending_action.result())
+        # 在动作执行、采集和确认的同时，基于预测快照规划动作 N + 1
+        speculative_plan = (
+            executor.submit(self.plan, action.predicted_snapshot)
+            if action.predicted_snapshot is not None
+            else None
+        )
+        for _ in range(self.max_stale_retries + 1):
+            capture = executor.submit(
+                self._capture, action, need_full=speculative_plan is None
+            )
+            confirmed, snapshot = capture.result()
+            # 动作必须已经成功返回；之后的重新采集都在动作完成后开始
+            self._check_result(action, pending_action.result())
+            context.check()
+            if confirmed:
+                if speculative_plan is not None:
+                    return speculative_plan.result()
+                return self.plan(snapshot)
+
+            # 快照过时: 丢弃推测规划 (尚未开始则取消)，重新采集
+            report.stale_captures += 1
+            _STALE_CAPTURES.inc(mode=self.mode)
+            if speculative_plan is not None:
+                if not speculative_plan.cancel():
+                    futures.wait([speculative_plan])
+                speculative_plan = None
+                report.discarded_plans += 1
+                _DISCARDED_PLANS.inc(mode=self.mode)
+        raise StaleSnapshotError(
+            f"Snapshot did not reflect action '{action.name}' "
+            f"after {self.max_stale_retries} retries"
+        )
@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRejectedError(RuntimeError):
+    """调度器未运行或等待队列已满，任务未被接受。"""
+
+
+class TaskCancelledError(futures.CancelledError):
+    """任务在执行过程中被取消 (由 TaskContext.check() 抛出)。"""
+
+
+class TaskDeadlineExceeded(TimeoutError):
+    """任务超过了截止时间 (开始前或执行过程中)。"""
+
+
+class TaskContext:
+    """
+    传给任务函数的第一个参数。任务应在耗时步骤之间调用 check()，
+    以便响应取消请求和截止时间 (调度器无法强行中断正在运行的线程)。
+    """
+
+    def __init__(self, key: str, deadline: Optional[float]):
+        """
+        :param key: 任务的串行化键 (例如目标应用名)。
+        :param deadline: time.monotonic() 时间点，None 表示没有截止时间。
+        """
+        self.key = key
+        self.deadline = deadline
+        self._cancel_requested = threading.Event()
+
+    def request_cancel(self) -> None:
+        self._cancel_requested.set()
+
+    def cancelled(self) -> bool:
+        """是否已请求取消。"""
+        return self._cancel_requested.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数 (可能为负)，没有截止时间时返回 None。"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check(self) -> None:
+        """
+        :raises TaskCancelledError: 已请求取消。
+        :raises TaskDeadlineExceeded: 已超过截止时间。
+        """
+        if self.cancelled():
+            raise TaskCancelledError(f"Task for '{self.key}' was cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise TaskDeadlineExceeded(f"Task for '{self.key}' exceeded its deadline")
+
+
+class TaskFuture(futures.Future):
+    """
+    submit() 返回的 Future。cancel() 对尚未开始的任务直接取消，
+    对正在运行的任务则请求协作式取消 (返回 False，任务在下一次 check() 时结束)。
+    """
+
+    def __init__(self, context: TaskContext):
+        super().__init__()
+        self.context = context
+
+    def cancel(self) -> bool:
+        self.context.request_cancel()
+        return super().cancel()
+
+
+class _Task:
+    __slots__ = ("future", "fn", "args", "kwargs")
+
+    def __init__(self, future: TaskFuture, fn: Callable, args, kwargs):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+
+class TaskScheduler:
+    """
+    有界线程池任务调度器。
+    同一个键 (例如目标应用) 的任务按提交顺序串行执行，不同键之间并行执行；
+    就绪的键按轮询顺序分配给工作线程，单个应用的长队列不会饿死其他应用。
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: Optional[int] = None):
+        """
+        :param max_workers: 工作线程数 (同时执行的任务上限)。
+        :param max_pending: 已提交但未完成的任务上限 (含正在执行的)，None 表示不限制。
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # 任何任务结束或有键就绪时通知 (工作线程和 stop() 都在此等待)
+        self._condition = threading.Condition(self._lock)
+        # 每个键等待执行的任务；键在其最后一个任务结束后才被移除
+        self._queues: Dict[str, Deque[_Task]] = {}
+        self._ready_keys: Deque[str] = deque()  # 有待执行任务且当前空闲的键
+        self._running: Dict[str, _Task] = {}  # 键 -> 正在执行的任务
+        self._pending_count = 0
+        self._accepting = False
+        self._shutdown = False
+        self._workers: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """启动工作线程。"""
+        with self._lock:
+            if self._workers:
+                return
+            self._accepting = True
+            self._shutdown = False
+            self._workers = [
+                threading.Thread(
+                    target=self._worker_loop, name=f"TaskWorker-{i}", daemon=True
+                )
+                for i in range(self.max_workers)
+            ]
+        for worker in self._workers:
+            worker.start()
+        logger.info("Task scheduler started with %d workers", self.max_workers)
+
+    def submit(
+        self,
+        key: str,
+        fn: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> TaskFuture:
+        """
+        提交任务，fn 将以 fn(context, *args, **kwargs) 的形式在工作线程中调用。
+        :param key: 串行化键，相同键的任务不会同时执行。
+        :param timeout: 从提交起计算的截止时间 (秒)，None 表示不限制。
+        :return: 任务的 Future，结果为 fn 的返回值。
+        :raises TaskRejectedError: 调度器未运行或等待队列已满。
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        future = TaskFuture(TaskContext(key, deadline))
+        task = _Task(future, fn, args, kwargs)
+        with self._condition:
+            if not self._accepting:
+                raise TaskRejectedError("Task scheduler is not accepting tasks.")
+            if self.max_pending is not None and self._pending_count >= self.max_pending:
+                raise TaskRejectedError(
+                    f"Task queue is full ({self.max_pending} pending tasks)."
+                )
+            self._pending_count += 1
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append(task)
+            # 键空闲且尚未排队时才加入就绪队列，保证同一键同时只有一个任务在执行
+            if key not in self._running and len(queue) == 1:
+                self._ready_keys.append(key)
+                self._condition.notify()
+        return future
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._ready_keys and not self._shutdown:
+                    self._condition.wait()
+                if not self._ready_keys:
+                    return
+                key = self._ready_keys.popleft()
+                task = self._queues[key].popleft()
+                self._running[key] = task
+            try:
+                self._run_task(task)
+            finally:
+                with self._condition:
+                    del self._running[key]
+                    self._pending_count -= 1
+                    queue = self._queues[key]
+                    if queue:
+                        self._ready_keys.append(key)
+                    else:
+                        del self._queues[key]
+                    self._condition.notify_all()
+
+    @staticmethod
+    def _run_task(task: _Task) -> None:
+        future = task.future
+        if not future.set_running_or_notify_cancel():
+            return  # 排队期间已被取消
+        context = future.context
+        try:
+            context.check()
+            result = task.fn(context, *task.args, **task.kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回未完成任务数、正在执行的任务数和有任务的键数。"""
+        with self._lock:
+            return {
+                "pending": self._pending_count,
+                "running": len(self._running),
+                "keys": len(self._queues),
+            }
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        停止接受新任务，等待已提交的任务完成。
+        超时后取消仍在排队的任务，并请求正在执行的任务协作式取消。
+        :param timeout: 等待排空的最长时间 (秒)，None 表示一直等待。
+        :return: 所有任务是否在超时前完成。
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            self._accepting = False
+            drained = self._condition.wait_for(
+                lambda: self._pending_count == 0, timeout=timeout
+            )
+            if not drained:
+                queued = [task for queue in self._queues.values() for task in queue]
+                running = list(self._running.values())
+                logger.warning(
+                    "Task scheduler did not drain within %ss; cancelling %d queued "
+                    "and %d running task(s)",
+                    timeout,
+                    len(queued),
+                    len(running),
+                )
+                for task in queued + running:
+                    task.future.cancel()
+            self._shutdown = True
+            self._condition.notify_all()
+            workers, self._workers = self._workers, []
+
+        # 排队中的已取消任务会被工作线程快速跳过；正在执行的任务只能等待其响应取消
+        for worker in workers:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            worker.join(remaining)
+        logger.info("Task scheduler stopped (drained=%s)", drained)
+        return drained
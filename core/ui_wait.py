@@ -0,0 +1,98 @@
+"""
+服务端等待 UI 条件 (WaitForCondition) 的基础设施: UI 变化通知和自适应轮询退避。
+"""
+
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UIChangeNotifier:
+    """
+    按适配器记录 UI 可能发生变化的次数 (版本号)，等待方在版本变化时被唤醒。
+    变化来源: ActionService 执行的动作，以及支持变化通知的适配器的回调。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions: "weakref.WeakKeyDictionary[Any, int]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # 已注册变化回调的适配器，每个适配器只注册一次
+        self._subscribed: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+    def version(self, adapter: Any) -> int:
+        with self._condition:
+            return self._versions.get(adapter, 0)
+
+    def notify(self, adapter: Any) -> None:
+        """记录适配器的 UI 发生了 (可能的) 变化并唤醒等待方。"""
+        with self._condition:
+            self._versions[adapter] = self._versions.get(adapter, 0) + 1
+            self._condition.notify_all()
+
+    def wake_all(self) -> None:
+        """唤醒所有等待方而不改变版本 (例如某个 RPC 被取消，需要尽快检查退出)。"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, adapter: Any, version: int, timeout: float) -> bool:
+        """
+        等待适配器的版本号不再等于 version，最多 timeout 秒。
+        wake_all() 也会让调用提前返回，调用方需要自行检查退出条件。
+        :return: 版本是否已经变化。
+        """
+        with self._condition:
+            if self._versions.get(adapter, 0) == version:
+                self._condition.wait(timeout)
+            return self._versions.get(adapter, 0) != version
+
+    def subscribe(self, adapter: Any, on_change: Callable[[], None]) -> bool:
+        """
+        如果适配器实现了可选的 add_ui_change_listener(callback)，注册 on_change
+        (每个适配器只注册一次)。
+        :return: 适配器是否支持变化通知。
+        """
+        add_listener = getattr(adapter, "add_ui_change_listener", None)
+        if add_listener is None:
+            return False
+        with self._condition:
+            if adapter in self._subscribed:
+                return True
+            self._subscribed.add(adapter)
+        try:
+            add_listener(on_change)
+        except Exception as e:
+            logger.warning("Adapter rejected UI change listener: %s", e)
+            with self._condition:
+                self._subscribed.discard(adapter)
+            return False
+        return True
+
+
+class PollingBackoff:
+    """条件求值之间的等待间隔: 从 initial 按 multiplier 增长到 maximum。"""
+
+    def __init__(self, initial: float, maximum: float, multiplier: float):
+        """
+        :param initial: 首次等待的秒数。
+        :param maximum: 等待间隔上限 (秒)，小于 initial 时按 initial 处理。
+        :param multiplier: 每次未发生变化时间隔的增长倍数，小于 1 时按 1 处理。
+        """
+        self.initial = initial
+        self.maximum = max(maximum, initial)
+        self.multiplier = max(multiplier, 1.0)
+        self._current = initial
+
+    def next_interval(self, remaining: Optional[float] = None) -> float:
+        """返回下一次的等待间隔 (不超过剩余时间)，并增长之后的间隔。"""
+        interval = self._current
+        self._current = min(self._current * self.multiplier, self.maximum)
+        return interval if remaining is None else max(min(interval, remaining), 0.0)
+
+    def reset(self) -> None:
+        """UI 发生变化后回到初始间隔，变化往往是连续发生的。"""
+        self._current = self.initial
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("generated_protobuf.core_services_pb2")
+
+import generated_protobuf.core_services_pb2 as pb2  # noqa: E402
+
+from core import grpc_server  # noqa: E402
+
+
+class RecordingActionAdapter:
+    """记录调用顺序的动作适配器，可指定某些按键失败或抛出异常。"""
+
+    def __init__(self, failing_keys=(), raising_keys=()):
+        self.calls = []
+        self.failing_keys = set(failing_keys)
+        self.raising_keys = set(raising_keys)
+
+    def click(self, element_id, options):
+        self.calls.append(("click", element_id, options))
+        return pb2.ActionResult(success=True)
+
+    def type_text(self, text, element_id, options):
+        self.calls.append(("type_text", text, element_id))
+        return pb2.ActionResult(success=True)
+
+    def press_key(self, key_combination, options):
+        self.calls.append(("press_key", key_combination))
+        if key_combination in self.raising_keys:
+            raise RuntimeError("adapter crashed")
+        return pb2.ActionResult(success=key_combination not in self.failing_keys)
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    recording_adapter = RecordingActionAdapter(
+        failing_keys={"bad"}, raising_keys={"boom"}
+    )
+    monkeypatch.setattr(grpc_server, "global_mock_action_adapter", recording_adapter)
+    return recording_adapter
+
+
+def _press(key):
+    return pb2.ActionStep(press_key=pb2.PressKeyRequest(key_combination=key))
+
+
+def _run(steps, **kwargs):
+    request = pb2.ExecuteActionBatchRequest(steps=steps, **kwargs)
+    context = MagicMock()
+    context.is_active.return_value = True
+    return grpc_server.ActionServiceImpl().ExecuteActionBatch(request, context)
+
+
+def test_batch_runs_steps_in_order(adapter):
+    response = _run(
+        [
+            pb2.ActionStep(click=pb2.ClickRequest(adapter_specific_id=b"field")),
+            pb2.ActionStep(
+                type_text=pb2.TypeTextRequest(text="hello", adapter_specific_id=b"f")
+            ),
+            _press("Enter"),
+        ]
+    )
+
+    assert response.success
+    assert not response.HasField("failed_step_index")
+    assert [r.step_index for r in response.results] == [0, 1, 2]
+    assert all(r.duration_ms >= 0 for r in response.results)
+    assert adapter.calls == [
+        ("click", b"field", {}),
+        ("type_text", "hello", b"f"),
+        ("press_key", "Enter"),
+    ]
+
+
+def test_stop_on_failure_skips_remaining_steps(adapter):
+    response = _run([_press("a"), _press("bad"), _press("c")])
+
+    assert not response.success
+    assert response.failed_step_index == 1
+    assert len(response.results) == 2
+    assert [call[1] for call in adapter.calls] == ["a", "bad"]
+
+
+def test_continue_policy_runs_all_steps(adapter):
+    response = _run(
+        [_press("bad"), _press("boom"), _press("c")],
+        failure_policy=pb2.BatchFailurePolicy.BATCH_FAILURE_POLICY_CONTINUE,
+    )
+
+    assert not response.success
+    assert response.failed_step_index == 0
+    assert [r.result.success for r in response.results] == [False, False, True]
+    assert response.results[1].result.error_type == "RuntimeError"
+
+
+def test_step_without_action_fails(adapter):
+    response = _run([pb2.ActionStep()])
+
+    assert not response.success
+    assert response.results[0].result.error_type == "InvalidArgument"
+
+
+def test_delay_is_applied_between_steps_only(adapter, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(grpc_server.time, "sleep", sleeps.append)
+
+    _run(
+        [
+            pb2.ActionStep(
+                press_key=pb2.PressKeyRequest(key_combination="a"), delay_after_ms=50
+            ),
+            _press("b"),
+            _press("c"),
+        ],
+        default_delay_ms=10,
+    )
+
+    assert sleeps == [0.05, 0.01]
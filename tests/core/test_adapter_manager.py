@@ -1,4 +1,7 @@
 # import importlib.metadata # F401 Unused import
+import logging
+import threading
+from concurrent import futures
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -10,6 +13,7 @@ from core.adapter_manager import (
     InitializationError,
     PerceptionAdapterInterface,
 )
+from core.adapter_pool import AdapterPoolConfig
 
 
 # --- Mock Adapters --- (可以放在 conftest.py 中共享)
@@ -257,3 +261,346 @@ def test_unload_adapter_close_failure(manager, caplog):
         )
         # Check instance was still removed from cache
         assert "close_fail" not in manager._loaded_instances
+
+
+# --- Lazy discovery & manifest cache ---
+def test_lazy_discovery_defers_class_import():
+    """Lazy discovery registers names without importing adapter classes."""
+    mock_entry_point = MockEntryPoint(name="lazy_adapter", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        with patch.object(AdapterManager, "_load_class_from_path") as mock_load:
+            lazy_manager = AdapterManager(lazy_discovery=True)
+            assert lazy_manager.list_available_adapters() == ["lazy_adapter"]
+            assert lazy_manager.is_adapter_registered("lazy_adapter")
+            assert lazy_manager.get_registered_adapters() == {}
+            mock_load.assert_not_called()
+
+
+def test_lazy_discovery_imports_on_first_get_adapter():
+    """Classes are resolved on the first get_adapter() call."""
+    mock_entry_point = MockEntryPoint(name="lazy_adapter", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        lazy_manager = AdapterManager(lazy_discovery=True)
+
+    perception_instance, action_instance = lazy_manager.get_adapter("lazy_adapter")
+    assert isinstance(perception_instance, MockPerception)
+    assert isinstance(action_instance, MockAction)
+    assert "lazy_adapter" in lazy_manager.get_registered_adapters()
+
+
+def test_lazy_discovery_unloadable_adapter_raises_on_get():
+    """An adapter whose classes cannot be imported fails at get_adapter()."""
+    mock_entry_point = MockEntryPoint(
+        name="invalid_path", value=MockAdapterSetInvalidPath
+    )
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        lazy_manager = AdapterManager(lazy_discovery=True)
+
+    assert lazy_manager.list_available_adapters() == ["invalid_path"]
+    with pytest.raises(ValueError, match=r"Adapter for 'invalid_path' not registered"):
+        lazy_manager.get_adapter("invalid_path")
+    assert not lazy_manager.is_adapter_registered("invalid_path")
+
+
+def test_manifest_cache_skips_entry_point_load(tmp_path):
+    """A matching on-disk cache avoids loading entry points again."""
+    cache_file = str(tmp_path / "adapter_manifest.json")
+    mock_ep = MagicMock()
+    mock_ep.name = "cached_adapter"
+    mock_ep.value = "tests.core.test_adapter_manager:ADAPTER_SET"
+    mock_ep.load.return_value = {
+        "perception": "tests.core.test_adapter_manager.MockPerception",
+    }
+    with patch("importlib.metadata.entry_points", return_value=[mock_ep]):
+        AdapterManager(lazy_discovery=True, cache_file=cache_file)
+        assert mock_ep.load.call_count == 1
+
+        cached_manager = AdapterManager(lazy_discovery=True, cache_file=cache_file)
+        assert mock_ep.load.call_count == 1  # 命中缓存，未再次加载
+        assert cached_manager.get_adapter_manifests() == {
+            "cached_adapter": (
+                "tests.core.test_adapter_manager.MockPerception",
+                None,
+            )
+        }
+
+
+def test_manifest_cache_invalidated_by_distribution_change(tmp_path):
+    """The cache is rebuilt when installed distribution metadata changes."""
+    cache_file = str(tmp_path / "adapter_manifest.json")
+    mock_ep = MagicMock()
+    mock_ep.name = "cached_adapter"
+    mock_ep.value = "tests.core.test_adapter_manager:ADAPTER_SET"
+    mock_ep.dist.metadata = {"Name": "argus-cached-adapter"}
+    mock_ep.dist.version = "1.0.0"
+    mock_ep.load.return_value = {"action": "tests.core.test_adapter_manager.MockAction"}
+    with patch("importlib.metadata.entry_points", return_value=[mock_ep]):
+        AdapterManager(lazy_discovery=True, cache_file=cache_file)
+        mock_ep.dist.version = "1.1.0"
+        AdapterManager(lazy_discovery=True, cache_file=cache_file)
+        assert mock_ep.load.call_count == 2
+
+
+# --- Concurrency ---
+class SlowPerception(PerceptionAdapterInterface):
+    instances_created = 0
+    barrier = None
+
+    def __init__(self):
+        type(self).instances_created += 1
+
+    def initialize(self, config: dict) -> None:
+        # 只有与 SlowAction.initialize 并行执行时 barrier 才能通过
+        type(self).barrier.wait()
+
+
+class SlowAction(ActionAdapterInterface):
+    def initialize(self, config: dict) -> None:
+        SlowPerception.barrier.wait()
+
+
+class MockAdapterSetSlow:
+    def load(self):
+        return {
+            "perception": "tests.core.test_adapter_manager.SlowPerception",
+            "action": "tests.core.test_adapter_manager.SlowAction",
+        }
+
+
+def test_get_adapter_single_flight_and_parallel_initialize(manager):
+    """Concurrent callers share one initialization; both initializers overlap."""
+    SlowPerception.instances_created = 0
+    SlowPerception.barrier = threading.Barrier(2, timeout=5)
+    mock_entry_point = MockEntryPoint(name="slow_adapter", value=MockAdapterSetSlow)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        manager._discover_adapters()
+
+    with futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda _: manager.get_adapter("slow_adapter"), range(8))
+        )
+
+    assert SlowPerception.instances_created == 1
+    assert all(result is results[0] for result in results)
+    manager.unload_all_adapters()
+
+
+def test_get_adapter_failure_closes_initialized_partner(manager):
+    """A failing initializer closes its already-initialized partner."""
+    mock_entry_point = MockEntryPoint(name="half_fail", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        manager._discover_adapters()
+
+    with (
+        patch.object(MockAction, "initialize", side_effect=InitializationError("boom")),
+        patch.object(MockPerception, "close") as mock_close,
+    ):
+        with pytest.raises(InitializationError, match="boom"):
+            manager.get_adapter("half_fail")
+        mock_close.assert_called_once()
+    assert not manager.is_adapter_loaded("half_fail")
+
+
+# --- Instance pools ---
+def test_pooled_adapter_checkout_checkin(manager):
+    """Pooled instances are separate from the shared get_adapter() pair."""
+    mock_entry_point = MockEntryPoint(name="pooled", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        manager._discover_adapters()
+
+    with manager.pooled_adapter("pooled") as pooled_pair:
+        assert isinstance(pooled_pair[0], MockPerception)
+        assert manager.get_pool_stats()["pooled"]["in_use"] == 1
+    assert manager.get_pool_stats()["pooled"]["idle"] == 1
+    assert manager.get_adapter("pooled") is not pooled_pair
+    manager.unload_all_adapters()
+    assert manager.get_pool_stats() == {}
+
+
+def test_pool_global_lru_evicts_least_recently_used_app():
+    """The global instance limit closes idle instances of the LRU app first."""
+    mock_entry_points = [
+        MockEntryPoint(name="app_a", value=MockAdapterSetValid),
+        MockEntryPoint(name="app_b", value=MockAdapterSetValid),
+    ]
+    with patch("importlib.metadata.entry_points", return_value=mock_entry_points):
+        lru_manager = AdapterManager(
+            pool_config=AdapterPoolConfig(max_total_instances=1, idle_timeout=None)
+        )
+
+    pair_a = lru_manager.checkout_adapter("app_a")
+    lru_manager.checkin_adapter("app_a", pair_a)
+    pair_a[0].close = MagicMock()
+    pair_b = lru_manager.checkout_adapter("app_b")
+
+    pair_a[0].close.assert_called_once()
+    assert lru_manager.get_pool_stats()["app_a"]["idle"] == 0
+    lru_manager.checkin_adapter("app_b", pair_b)
+    lru_manager.unload_all_adapters()
+
+
+def test_pool_memory_limit_uses_configured_estimate(caplog):
+    """Adapters without memory_usage_bytes() count with the configured estimate."""
+    mock_entry_points = [
+        MockEntryPoint(name="app_a", value=MockAdapterSetValid),
+        MockEntryPoint(name="app_b", value=MockAdapterSetValid),
+    ]
+    with patch("importlib.metadata.entry_points", return_value=mock_entry_points):
+        lru_manager = AdapterManager(
+            pool_config=AdapterPoolConfig(
+                max_total_memory_bytes=1200,
+                instance_memory_bytes=1000,
+                idle_timeout=None,
+            )
+        )
+
+    pair_a = lru_manager.checkout_adapter("app_a")
+    lru_manager.checkin_adapter("app_a", pair_a)
+    # 应用配置的估算优先: app_b 只占 400，两者之和仍超过上限
+    pair_b = lru_manager.checkout_adapter("app_b", {"memory_estimate_bytes": 400})
+
+    assert lru_manager.get_pool_stats()["app_a"]["idle"] == 0
+    assert lru_manager._pools["app_b"].memory_bytes == 400
+    assert "no pooled adapter reports" not in caplog.text
+    lru_manager.checkin_adapter("app_b", pair_b)
+    lru_manager.unload_all_adapters()
+
+
+def test_pool_memory_limit_without_estimates_warns_once(caplog):
+    mock_entry_point = MockEntryPoint(name="app_a", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        lru_manager = AdapterManager(
+            pool_config=AdapterPoolConfig(max_total_memory_bytes=1, idle_timeout=None)
+        )
+
+    with caplog.at_level(logging.WARNING, logger="core.adapter_manager"):
+        for _ in range(2):
+            pair = lru_manager.checkout_adapter("app_a")
+            lru_manager.checkin_adapter("app_a", pair)
+
+    warnings = [r for r in caplog.records if "no pooled adapter reports" in r.message]
+    assert len(warnings) == 1
+    assert lru_manager.get_pool_stats()["app_a"]["idle"] == 1
+    lru_manager.unload_all_adapters()
+
+
+def test_checkout_unregistered_adapter_raises(manager):
+    with pytest.raises(ValueError, match=r"Adapter for 'missing' not registered"):
+        manager.checkout_adapter("missing")
+
+
+# --- Preloading ---
+class MockAdapterSetSlowPerception:
+    def load(self):
+        return {"perception": "tests.core.test_adapter_manager.SlowPerception"}
+
+
+def _warmup_sample_count(app_name):
+    from utils.metrics import default_registry
+
+    (family,) = default_registry.collect(["argus_adapter_warmup_seconds"])
+    return sum(s.count for s in family.samples if s.labels["app"] == app_name)
+
+
+def test_preload_adapters_initializes_in_parallel_and_records_status():
+    SlowPerception.instances_created = 0
+    # 只有两个应用的 initialize 同时执行时 barrier 才能通过
+    SlowPerception.barrier = threading.Barrier(2, timeout=5)
+    mock_entry_points = [
+        MockEntryPoint(name="preload_a", value=MockAdapterSetSlowPerception),
+        MockEntryPoint(name="preload_b", value=MockAdapterSetSlowPerception),
+    ]
+    with patch("importlib.metadata.entry_points", return_value=mock_entry_points):
+        preload_manager = AdapterManager()
+    observed_before = _warmup_sample_count("preload_a")
+
+    done = preload_manager.preload_adapters(
+        ["preload_a", "preload_b", "preload_missing"], max_workers=3
+    )
+    statuses = done.result(timeout=10)
+
+    assert statuses["preload_a"].state == statuses["preload_b"].state == "ready"
+    assert statuses["preload_a"].seconds >= 0
+    assert statuses["preload_missing"].state == "failed"
+    assert "not registered" in statuses["preload_missing"].error
+    assert not preload_manager.is_ready()
+    assert _warmup_sample_count("preload_a") == observed_before + 1
+    # 预热的实例放在池中，之后的 checkout 直接借出
+    assert preload_manager.get_pool_stats()["preload_a"]["idle"] == 1
+    with preload_manager.pooled_adapter("preload_a"):
+        pass
+    assert SlowPerception.instances_created == 2
+
+    preload_manager.unload_adapter("preload_missing")
+    assert preload_manager.is_ready()
+    preload_manager.unload_all_adapters()
+    assert preload_manager.get_warmup_status() == {}
+
+
+def test_engine_start_preloads_configured_adapters():
+    from core.engine import CoreEngine
+
+    mock_entry_point = MockEntryPoint(name="engine_app", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        engine = CoreEngine(
+            {
+                "lazy_adapter_discovery": False,
+                "adapter_discovery_cache_file": None,
+                "preload_adapters": ["engine_app"],
+                "adapters": {"engine_app": {"perception": {"key": "value"}}},
+            }
+        )
+    with patch.object(MockPerception, "initialize") as mock_initialize:
+        engine.start()
+        assert engine.wait_for_adapters(timeout=10)
+    mock_initialize.assert_called_once_with({"key": "value"})
+    assert engine.get_adapter_readiness()["engine_app"].state == "ready"
+    engine.stop()
+
+
+def test_get_readiness_rpc_reports_warmup(monkeypatch):
+    pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+    from core import grpc_server
+
+    servicer = grpc_server.AdapterControlServiceImpl()
+    monkeypatch.setattr(grpc_server, "adapter_manager", None)
+    assert servicer.GetReadiness(pb2.GetReadinessRequest(), MagicMock()).ready
+
+    mock_entry_point = MockEntryPoint(name="rpc_app", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        rpc_manager = AdapterManager()
+    monkeypatch.setattr(grpc_server, "adapter_manager", rpc_manager)
+    rpc_manager.preload_adapters(["rpc_app", "rpc_missing"]).result(timeout=10)
+
+    response = servicer.GetReadiness(pb2.GetReadinessRequest(), MagicMock())
+    assert not response.ready
+    assert [(a.app_name, a.state) for a in response.adapters] == [
+        ("rpc_app", "ready"),
+        ("rpc_missing", "failed"),
+    ]
+    assert response.adapters[1].HasField("error")
+    rpc_manager.unload_all_adapters()
+
+
+def test_rpcs_check_out_the_instance_preloaded_by_serve(monkeypatch):
+    pytest.importorskip("generated_protobuf.core_services_pb2")
+    from core import grpc_server
+
+    mock_entry_point = MockEntryPoint(name="served_app", value=MockAdapterSetValid)
+    with patch("importlib.metadata.entry_points", return_value=[mock_entry_point]):
+        served_manager = AdapterManager(pool_config=AdapterPoolConfig(min_size=1))
+    monkeypatch.setattr(grpc_server, "adapter_manager", served_manager)
+    monkeypatch.setattr(grpc_server.settings, "ADAPTER_PRELOAD_APPS", [])
+    monkeypatch.setattr(grpc_server.settings, "SERVER_ADAPTER_APP", "served_app")
+    served_manager.preload_adapters(grpc_server.server_preload_apps()).result(
+        timeout=10
+    )
+
+    with patch.object(MockPerception, "initialize") as mock_initialize:
+        with grpc_server.served_adapters(MagicMock()) as adapters:
+            assert isinstance(adapters.perception, MockPerception)
+            assert served_manager.get_pool_stats()["served_app"]["in_use"] == 1
+    # 借出的是预热的实例，没有初始化新实例
+    mock_initialize.assert_not_called()
+    assert served_manager.get_pool_stats()["served_app"]["idle"] == 1
+    served_manager.unload_all_adapters()
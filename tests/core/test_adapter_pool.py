@@ -0,0 +1,140 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.adapter_pool import AdapterPool, AdapterPoolConfig, estimate_pair_memory
+
+
+class SizedAdapter:
+    def __init__(self, size: int):
+        self.size = size
+
+    def memory_usage_bytes(self) -> int:
+        return self.size
+
+
+@pytest.fixture
+def closer():
+    return MagicMock()
+
+
+def make_pool(closer, **config_kwargs):
+    """Creates a pool whose factory returns fresh (object, object) pairs."""
+    return AdapterPool(
+        "test_app",
+        factory=lambda: (object(), object()),
+        closer=closer,
+        config=AdapterPoolConfig(**config_kwargs),
+    )
+
+
+def test_checkout_reuses_checked_in_instance(closer):
+    pool = make_pool(closer)
+    first = pool.checkout()
+    pool.checkin(first)
+    assert pool.checkout() is first
+    assert pool.stats()["in_use"] == 1
+    closer.assert_not_called()
+
+
+def test_checkout_creates_up_to_max_size_then_times_out(closer):
+    pool = make_pool(closer, max_size=2)
+    first = pool.checkout()
+    second = pool.checkout()
+    assert first is not second
+    with pytest.raises(TimeoutError):
+        pool.checkout(timeout=0.01)
+    pool.checkin(second)
+    assert pool.checkout(timeout=0.01) is second
+
+
+def test_checkin_unknown_instance_raises(closer):
+    pool = make_pool(closer)
+    with pytest.raises(ValueError):
+        pool.checkin((object(), object()))
+
+
+def test_factory_failure_releases_slot(closer):
+    pool = AdapterPool(
+        "test_app",
+        factory=MagicMock(side_effect=RuntimeError("init failed")),
+        closer=closer,
+        config=AdapterPoolConfig(max_size=1),
+    )
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+    assert pool.size == 0
+
+
+def test_evict_idle_keeps_min_size(closer):
+    pool = make_pool(closer, min_size=1, idle_timeout=10.0)
+    pairs = [pool.checkout() for _ in range(3)]
+    for pair in pairs:
+        pool.checkin(pair)
+
+    # 未超时不淘汰
+    assert pool.evict_idle() == 0
+    evicted = pool.evict_idle(now=pool.last_used + 11.0)
+    assert evicted == 2
+    assert pool.size == 1
+    assert closer.call_count == 2
+
+
+def test_prewarm_fills_to_min_size_and_checkout_reuses(closer):
+    pool = make_pool(closer, min_size=2, max_size=3)
+    assert pool.prewarm() == 2
+    assert pool.stats()["idle"] == 2
+    # 已达到目标数时不再创建，目标数不超过 max_size
+    assert pool.prewarm() == 0
+    assert pool.prewarm(5) == 1
+
+    pool.checkout()
+    assert pool.stats() == {"idle": 2, "in_use": 1, "creating": 0, "max_size": 3}
+
+
+def test_discard_closes_and_frees_slot(closer):
+    pool = make_pool(closer, max_size=1)
+    pair = pool.checkout()
+    pool.discard(pair)
+    closer.assert_called_once_with(pair)
+    assert pool.checkout(timeout=0.01) is not pair
+
+
+def test_close_closes_idle_and_returned_instances(closer):
+    pool = make_pool(closer)
+    idle_pair = pool.checkout()
+    busy_pair = pool.checkout()
+    pool.checkin(idle_pair)
+    pool.close()
+    closer.assert_called_once_with(idle_pair)
+    pool.checkin(busy_pair)
+    assert closer.call_count == 2
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+
+
+def test_estimate_pair_memory():
+    assert estimate_pair_memory((SizedAdapter(10), SizedAdapter(5))) == 15
+    assert estimate_pair_memory((None, object())) == 0
+
+
+def test_estimate_pair_memory_counts_shared_owner_once_and_falls_back():
+    shared = SizedAdapter(100)
+
+    class Proxy:
+        def __init__(self):
+            self.memory_usage_bytes = shared.memory_usage_bytes
+
+    assert estimate_pair_memory((Proxy(), Proxy())) == 100
+    assert estimate_pair_memory((object(), object()), default=64) == 64
+    assert estimate_pair_memory((SizedAdapter(0), None), default=64) == 64
+    assert estimate_pair_memory((SizedAdapter(7), None), default=64) == 7
+
+
+def test_pool_uses_instance_memory_bytes_for_unreported_instances(closer):
+    pool = make_pool(closer, instance_memory_bytes=1000)
+    pair = pool.checkout()
+    assert pool.memory_bytes == 1000
+    pool.checkin(pair)
+    pool.prewarm(2)
+    assert pool.memory_bytes == 2000
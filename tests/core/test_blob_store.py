@@ -0,0 +1,165 @@
+import time
+
+import pytest
+
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import grpc_server  # noqa: E402
+from core.blob_store import (  # noqa: E402
+    BlobStore,
+    BlobStoreFullError,
+    get_host_id,
+    inline_snapshot_blobs,
+    offload_snapshot_blobs,
+    open_blob,
+)
+from core.snapshot_cache import SnapshotCache  # noqa: E402
+from core.snapshot_index import SnapshotIndexStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    blob_store = BlobStore(max_bytes=1024, ttl=60.0, directory=str(tmp_path))
+    yield blob_store
+    blob_store.close()
+
+
+def test_put_and_map_blob(store):
+    handle = store.put(b"tree-bytes")
+    assert handle.host_id == get_host_id()
+    assert handle.size == 10
+
+    view = open_blob(handle)
+    assert isinstance(view, memoryview)
+    assert view.readonly
+    assert bytes(view) == b"tree-bytes"
+    assert store.read(handle.blob_id) == b"tree-bytes"
+
+
+def test_open_blob_rejects_other_host(store):
+    handle = store.put(b"data")
+    handle.host_id = "some-other-host"
+    with pytest.raises(ValueError):
+        open_blob(handle)
+
+
+def test_unreferenced_blobs_expire_after_ttl(tmp_path):
+    store = BlobStore(max_bytes=1024, ttl=0.01, directory=str(tmp_path))
+    handle = store.put(b"old")
+    time.sleep(0.02)
+    assert store.evict() == 1
+    with pytest.raises(KeyError):
+        store.read(handle.blob_id)
+    with pytest.raises(FileNotFoundError):
+        open_blob(handle)
+    store.close()
+
+
+def test_leased_and_pinned_blobs_are_not_evicted_over_capacity(tmp_path):
+    store = BlobStore(max_bytes=1024, ttl=0.05, directory=str(tmp_path))
+    pinned = store.put(b"p" * 400, pin=True)
+    leased = store.put(b"l" * 400)
+
+    # 租期内的句柄不会为了腾出容量被淘汰
+    with pytest.raises(BlobStoreFullError):
+        store.put(b"n" * 400)
+    assert store.read(leased.blob_id) == b"l" * 400
+    assert store.get_stats()["rejections"] == 1
+
+    time.sleep(0.06)
+    store.put(b"n" * 400)  # 租期已过的 leased 被淘汰，pinned 仍被引用
+    assert store.read(pinned.blob_id) == b"p" * 400
+    with pytest.raises(KeyError):
+        store.read(leased.blob_id)
+
+    assert store.renew(pinned.blob_id)
+    store.release(pinned.blob_id)
+    assert store.evict() == 0  # 续租之后仍在租期内
+    time.sleep(0.06)
+    assert store.evict() == 2
+    assert store.get_stats()["bytes"] == 0
+    store.close()
+
+
+def test_offload_and_inline_snapshot_blobs(store):
+    snapshot = pb2.UISnapshot(snapshot_id="s1", accessibility_tree_raw=b"x" * 100)
+    offload_snapshot_blobs(snapshot, store, min_bytes=50)
+    assert not snapshot.HasField("accessibility_tree_raw")
+    assert bytes(open_blob(snapshot.accessibility_tree_blob)) == b"x" * 100
+
+    inlined = inline_snapshot_blobs(snapshot, store)
+    assert inlined.accessibility_tree_raw == b"x" * 100
+    assert not inlined.HasField("accessibility_tree_blob")
+    assert snapshot.HasField("accessibility_tree_blob")  # 原快照不被修改
+
+    # blob 已被淘汰时报错，而不是返回缺少原始树的快照
+    store.close()
+    with pytest.raises(KeyError):
+        inline_snapshot_blobs(snapshot, store)
+
+    small = pb2.UISnapshot(accessibility_tree_raw=b"tiny")
+    offload_snapshot_blobs(small, store, min_bytes=50)
+    assert small.accessibility_tree_raw == b"tiny"
+
+
+@pytest.fixture
+def raw_tree_server(store, monkeypatch):
+    class RawTreeAdapter:
+        def get_ui_snapshot(self, options):
+            return pb2.UISnapshot(snapshot_id="s1", accessibility_tree_raw=b"t" * 100)
+
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", RawTreeAdapter())
+    monkeypatch.setattr(grpc_server, "blob_store", store)
+    monkeypatch.setattr(grpc_server, "snapshot_cache", SnapshotCache(ttl=60.0))
+    monkeypatch.setattr(grpc_server, "snapshot_index_store", SnapshotIndexStore())
+    monkeypatch.setattr(grpc_server.settings, "BLOB_STORE_MIN_BYTES", 50)
+    return grpc_server.PerceptionServiceImpl()
+
+
+def test_get_ui_snapshot_shares_blob_only_with_local_clients(store, raw_tree_server):
+    remote = raw_tree_server.GetUISnapshot(
+        pb2.GetUISnapshotRequest(client_host_id="remote-host"), None
+    )
+    assert remote.accessibility_tree_raw == b"t" * 100
+    assert not remote.HasField("accessibility_tree_blob")
+    # 远程客户端不经过 blob 存储
+    assert store.get_stats()["blobs"] == 0
+
+    local = raw_tree_server.GetUISnapshot(
+        pb2.GetUISnapshotRequest(client_host_id=get_host_id()), None
+    )
+    assert not local.HasField("accessibility_tree_raw")
+    assert bytes(open_blob(local.accessibility_tree_blob)) == b"t" * 100
+
+
+def test_cached_snapshot_blob_is_pinned_until_invalidated(
+    tmp_path, monkeypatch, raw_tree_server
+):
+    store = BlobStore(max_bytes=1024, ttl=0.01, directory=str(tmp_path))
+    monkeypatch.setattr(grpc_server, "blob_store", store)
+    request = pb2.GetUISnapshotRequest(client_host_id=get_host_id())
+
+    first = raw_tree_server.GetUISnapshot(request, None)
+    time.sleep(0.02)
+    assert store.evict() == 0  # 租期已过，但快照仍在缓存中
+    second = raw_tree_server.GetUISnapshot(request, None)
+    assert second.accessibility_tree_blob == first.accessibility_tree_blob
+    assert store.get_stats()["blobs"] == 1
+
+    grpc_server.invalidate_ui_caches(grpc_server.global_mock_perception_adapter)
+    time.sleep(0.02)
+    assert store.evict() == 1
+    store.close()
+
+
+def test_full_blob_store_sends_accessibility_tree_inline(
+    tmp_path, monkeypatch, raw_tree_server
+):
+    store = BlobStore(max_bytes=10, ttl=60.0, directory=str(tmp_path))
+    monkeypatch.setattr(grpc_server, "blob_store", store)
+    local = raw_tree_server.GetUISnapshot(
+        pb2.GetUISnapshotRequest(client_host_id=get_host_id()), None
+    )
+    assert local.accessibility_tree_raw == b"t" * 100
+    assert not local.HasField("accessibility_tree_blob")
+    assert store.get_stats()["rejections"] == 1
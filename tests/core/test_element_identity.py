@@ -0,0 +1,194 @@
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import element_identity  # noqa: E402
+from core.element_identity import (  # noqa: E402
+    ElementIdentityTracker,
+    ranked_overlaps,
+)
+
+
+def make_snapshot(snapshot_id, elements):
+    """elements: (framework_id, element_type, name, bbox, adapter_id, parent)"""
+    snapshot = pb2.UISnapshot(snapshot_id=snapshot_id)
+    for framework_id, element_type, name, bbox, adapter_id, parent in elements:
+        element = snapshot.elements.add(
+            framework_id=framework_id,
+            element_type=element_type,
+            adapter_specific_id=adapter_id,
+        )
+        if name is not None:
+            element.name = name
+        if bbox is not None:
+            element.bbox.CopyFrom(
+                pb2.BBox(x_min=bbox[0], y_min=bbox[1], x_max=bbox[2], y_max=bbox[3])
+            )
+        if parent is not None:
+            element.parent_framework_id = parent
+    return snapshot
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(element_identity, "np", None)
+    return request.param
+
+
+def test_handles_follow_adapter_ids_across_renumbering(backend):
+    tracker = ElementIdentityTracker()
+    first = tracker.update(
+        make_snapshot(
+            "s1",
+            [
+                ("e0", "window", "Main", (0, 0, 100, 100), b"w", None),
+                ("e1", "button", "OK", (10, 10, 20, 20), b"ok", "e0"),
+            ],
+        )
+    )
+    assert len(first.added) == 2
+    ok = tracker.handle_for("e1")
+
+    # 新快照中 framework_id 重新编号、按钮移动到远处: 仍按 adapter_specific_id 配对
+    second = tracker.update(
+        make_snapshot(
+            "s2",
+            [
+                ("n1", "button", "OK", (80, 80, 90, 90), b"ok", "n0"),
+                ("n0", "window", "Main", (0, 0, 100, 100), b"w", None),
+            ],
+        )
+    )
+    assert sorted(second.matched_by_id) == sorted(first.added)
+    assert second.added == second.removed == []
+    assert tracker.framework_id_for(ok) == "n1"
+    assert tracker.element_for(ok).bbox.x_min == 80
+    assert tracker.handle_for("e1") is None
+
+
+def test_elements_without_ids_match_by_signature_and_overlap(backend):
+    tracker = ElementIdentityTracker(min_iou=0.5)
+    items = [
+        (f"i{i}", "item", None, (0, i * 20, 100, i * 20 + 20), b"", "list")
+        for i in range(5)
+    ]
+    tracker.update(
+        make_snapshot("s1", [("list", "list", None, None, b"", None)] + items)
+    )
+    handles = [tracker.handle_for(f"i{i}") for i in range(5)]
+
+    # 列表整体下移 4 像素 (IoU = 16/24)，顺序打乱，最后一项被删除，新增一个按钮
+    moved = [
+        (f"m{i}", "item", None, (0, i * 20 + 4, 100, i * 20 + 24), b"", "root")
+        for i in (3, 1, 0, 2)
+    ]
+    update = tracker.update(
+        make_snapshot(
+            "s2",
+            [("root", "list", None, None, b"", None)]
+            + moved
+            + [("b", "button", "New", (0, 200, 50, 220), b"", "root")],
+        )
+    )
+    assert [tracker.framework_id_for(h) for h in handles] == [
+        "m0",
+        "m1",
+        "m2",
+        "m3",
+        None,
+    ]
+    assert update.removed == [handles[4]]
+    assert update.added == [tracker.handle_for("b")]
+    # 没有 BBox 的列表在签名组内一对一，同样保留句柄
+    assert tracker.handle_for("root") not in update.added
+    assert handles[4] not in tracker
+
+
+def test_signature_change_or_low_overlap_creates_new_handle(backend):
+    tracker = ElementIdentityTracker(min_iou=0.5)
+    tracker.update(
+        make_snapshot(
+            "s1",
+            [
+                ("a", "button", "Save", (0, 0, 10, 10), b"", None),
+                ("b", "button", "Open", (0, 0, 10, 10), b"", None),
+            ],
+        )
+    )
+    old_a, old_b = tracker.handle_for("a"), tracker.handle_for("b")
+    update = tracker.update(
+        make_snapshot(
+            "s2",
+            [
+                # 名称变化 → 不同签名
+                ("a", "button", "Save As", (0, 0, 10, 10), b"", None),
+                # IoU = 25 / 175 < 0.5
+                ("b", "button", "Open", (5, 5, 15, 15), b"", None),
+            ],
+        )
+    )
+    assert sorted(update.removed) == sorted([old_a, old_b])
+    assert len(update.added) == 2
+
+
+def test_elements_with_unique_adapter_ids_are_not_matched_by_geometry(backend):
+    tracker = ElementIdentityTracker()
+    tracker.update(
+        make_snapshot("s1", [("a", "button", "OK", (0, 0, 10, 10), b"x", None)])
+    )
+    update = tracker.update(
+        make_snapshot("s2", [("a", "button", "OK", (0, 0, 10, 10), b"y", None)])
+    )
+    assert len(update.added) == len(update.removed) == 1
+
+
+def test_ranked_overlaps_orders_by_iou(backend):
+    previous = [(0, 0, 10, 10), (100, 100, 110, 110), (0, 0, 10, 12)]
+    current = [(0, 0, 10, 11), (50, 50, 60, 60)]
+    # IoU: (2, 0) = 110/120, (0, 0) = 100/110
+    assert ranked_overlaps(previous, current, 0.5) == [(2, 0), (0, 0)]
+    assert ranked_overlaps(previous, [], 0.5) == []
+
+
+def test_python_overlaps_only_score_nearby_boxes(monkeypatch):
+    monkeypatch.setattr(element_identity, "np", None)
+    # 2500 x 2500 对超过了 MAX_IOU_PAIRS，但每个框只与相邻单元中的框比较
+    previous = [
+        (x * 20, y * 20, x * 20 + 10, y * 20 + 10) for x in range(50) for y in range(50)
+    ]
+    current = [(x0 + 1, y0, x1 + 1, y1) for x0, y0, x1, y1 in previous]
+    # 覆盖整个区域的框与网格中的框一起比较
+    previous.append((0, 0, 1000, 1000))
+    current.append((0, 0, 1000, 1001))
+
+    pairs = ranked_overlaps(previous, current, 0.5)
+
+    assert pairs[0] == (2500, 2500)
+    assert sorted(pairs[1:]) == [(i, i) for i in range(2500)]
+
+
+def test_python_overlaps_give_up_above_candidate_limit(monkeypatch):
+    monkeypatch.setattr(element_identity, "np", None)
+    monkeypatch.setattr(element_identity, "MAX_PYTHON_IOU_CANDIDATES", 10)
+    boxes = [(0, 0, 10, 10)] * 5
+    assert ranked_overlaps(boxes, boxes, 0.5) == []
+
+
+def test_parent_cycles_and_invalid_min_iou():
+    tracker = ElementIdentityTracker()
+    update = tracker.update(
+        make_snapshot(
+            "s1",
+            [
+                ("a", "pane", None, None, b"", "b"),
+                ("b", "pane", None, None, b"", "a"),
+            ],
+        )
+    )
+    assert len(update.added) == 2
+    with pytest.raises(ValueError):
+        ElementIdentityTracker(min_iou=0)
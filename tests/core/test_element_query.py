@@ -0,0 +1,166 @@
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import element_query  # noqa: E402
+from core.element_query import (  # noqa: E402
+    compile_query,
+    compile_regex,
+    find_element,
+    find_elements,
+)
+
+
+def make_elements():
+    elements = [
+        pb2.UIElement(
+            framework_id="root",
+            element_type="window",
+            bbox=pb2.BBox(x_min=0, y_min=0, x_max=1000, y_max=1000),
+            confidence=1.0,
+        )
+    ]
+    for i in range(10):
+        element = pb2.UIElement(
+            framework_id=f"btn{i}",
+            adapter_specific_id=f"native-{i}".encode(),
+            element_type="button",
+            name=f"Button {i}",
+            parent_framework_id="root",
+            bbox=pb2.BBox(x_min=i * 100, y_min=10, x_max=i * 100 + 50, y_max=40),
+            confidence=0.5 + i / 20,
+        )
+        if i % 3:
+            element.text_content = f"Save {i}"
+        elements.append(element)
+    return elements
+
+
+def ids(elements):
+    return [element.framework_id for element in elements]
+
+
+def test_each_field_filters_elements():
+    elements = make_elements()
+    assert ids(find_elements(elements, pb2.ElementQuery(framework_id="btn3"))) == [
+        "btn3"
+    ]
+    assert ids(
+        find_elements(elements, pb2.ElementQuery(adapter_specific_id=b"native-4"))
+    ) == ["btn4"]
+    assert len(find_elements(elements, pb2.ElementQuery(element_type="button"))) == 10
+    assert ids(find_elements(elements, pb2.ElementQuery(name="Button 2"))) == ["btn2"]
+    assert ids(find_elements(elements, pb2.ElementQuery(exact_text="Save 5"))) == [
+        "btn5"
+    ]
+    assert ids(
+        find_elements(
+            elements,
+            pb2.ElementQuery(bbox=pb2.BBox(x_min=160, y_min=0, x_max=210, y_max=5)),
+        )
+    ) == ["root"]
+    assert ids(
+        find_elements(
+            elements,
+            pb2.ElementQuery(
+                element_type="button",
+                bbox=pb2.BBox(x_min=160, y_min=20, x_max=210, y_max=30),
+            ),
+        )
+    ) == ["btn2"]
+    assert (
+        len(
+            find_elements(
+                elements, pb2.ElementQuery(parent_framework_id_constraint="root")
+            )
+        )
+        == 10
+    )
+    assert ids(find_elements(elements, pb2.ElementQuery(min_confidence=0.9))) == [
+        "root",
+        "btn8",
+        "btn9",
+    ]
+
+
+def test_empty_string_values_require_field_to_be_set():
+    elements = make_elements()
+    # text_content 未设置的元素不匹配 exact_text=""
+    assert find_elements(elements, pb2.ElementQuery(exact_text="")) == []
+    elements[1].text_content = ""
+    assert ids(find_elements(elements, pb2.ElementQuery(exact_text=""))) == ["btn0"]
+
+
+def test_regex_matching_skips_unset_text():
+    elements = make_elements()
+    query = pb2.ElementQuery(text_content_regex=r"^Save [2-5]$")
+    assert ids(find_elements(elements, query)) == ["btn2", "btn4", "btn5"]
+    # 可以匹配空串的正则仍然要求设置了 text_content
+    matches_everything = pb2.ElementQuery(text_content_regex=".*")
+    assert len(find_elements(elements, matches_everything)) == 6
+
+
+def test_index_and_limit_stop_early():
+    seen = []
+
+    def elements():
+        for element in make_elements():
+            seen.append(element.framework_id)
+            yield element
+
+    query = pb2.ElementQuery(element_type="button", index=2)
+    assert ids(find_elements(elements(), query)) == ["btn2"]
+    assert seen[-1] == "btn2"
+
+    seen.clear()
+    first = find_element(elements(), pb2.ElementQuery(element_type="button"))
+    assert first.framework_id == "btn0"
+    assert seen == ["root", "btn0"]
+
+    seen.clear()
+    assert len(find_elements(elements(), pb2.ElementQuery(), limit=3)) == 3
+    assert len(seen) == 3
+
+
+def test_index_out_of_range_or_negative_returns_nothing():
+    elements = make_elements()
+    assert find_elements(elements, pb2.ElementQuery(name="Button 1", index=1)) == []
+    assert (
+        find_elements(elements, pb2.ElementQuery(element_type="button", index=-1)) == []
+    )
+    assert find_element(elements, pb2.ElementQuery(name="missing")) is None
+
+
+def test_plan_orders_cheap_selective_predicates_before_regex():
+    query = pb2.ElementQuery(
+        text_content_regex="b", element_type="edit", framework_id="y"
+    )
+    compiled = compile_query(query)
+    framework_id_check, type_check, regex_check = compiled.predicates
+    element = pb2.UIElement(framework_id="x", element_type="edit", text_content="abc")
+    # framework_id 最先检查，不匹配时短路，不会执行正则
+    assert framework_id_check(element) is False
+    assert type_check(element) is True
+    assert regex_check(element) is True
+    assert not compiled.matches(element)
+
+
+def test_compiled_queries_and_regexes_are_cached():
+    element_query._compile_serialized.cache_clear()
+    compile_regex.cache_clear()
+    first = compile_query(pb2.ElementQuery(text_content_regex="Save", index=0))
+    second = compile_query(pb2.ElementQuery(index=0, text_content_regex="Save"))
+    assert first is second
+    compile_query(pb2.ElementQuery(text_content_regex="Save", name="Button 1"))
+    assert compile_regex.cache_info().misses == 1
+    assert compile_regex.cache_info().hits == 1
+
+
+def test_unsupported_fields_are_rejected():
+    assert not element_query.can_evaluate(pb2.ElementQuery(description="OK"))
+    with pytest.raises(ValueError, match="description"):
+        compile_query(pb2.ElementQuery(description="OK"))
+    # 选择器需要快照的树结构，不能在平铺的元素序列上求值
+    with pytest.raises(ValueError, match="SnapshotIndex"):
+        find_elements(make_elements(), pb2.ElementQuery(xpath="//button"))
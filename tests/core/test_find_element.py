@@ -0,0 +1,94 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import grpc_server  # noqa: E402
+from core.snapshot_cache import SnapshotCache  # noqa: E402
+from core.snapshot_index import SnapshotIndexStore  # noqa: E402
+
+
+class Adapter:
+    def __init__(self):
+        snapshot = pb2.UISnapshot(snapshot_id="s1")
+        snapshot.elements.add(framework_id="save", element_type="button", name="(")
+        self.snapshot = snapshot
+        self.find_element = MagicMock(
+            return_value=pb2.FindElementResponse(
+                element=pb2.UIElement(framework_id="live")
+            )
+        )
+
+    def get_ui_snapshot(self, options):
+        return self.snapshot
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    adapter = Adapter()
+    monkeypatch.setattr(grpc_server, "snapshot_cache", SnapshotCache(ttl=0))
+    monkeypatch.setattr(grpc_server, "snapshot_index_store", SnapshotIndexStore())
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+    return adapter
+
+
+def test_find_element_answers_from_snapshot_index(adapter):
+    servicer = grpc_server.PerceptionServiceImpl()
+    servicer.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+
+    response = servicer.FindElement(pb2.ElementQuery(name="("), MagicMock())
+
+    assert response.element.framework_id == "save"
+    adapter.find_element.assert_not_called()
+
+
+def test_invalid_regex_falls_back_to_adapter(adapter):
+    servicer = grpc_server.PerceptionServiceImpl()
+    servicer.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+    query = pb2.ElementQuery(text_content_regex="(")
+
+    response = servicer.FindElement(query, MagicMock())
+
+    assert response.element.framework_id == "live"
+    adapter.find_element.assert_called_once_with(query)
+
+
+def test_partial_capture_does_not_replace_snapshot_index(monkeypatch):
+    class RegionAdapter:
+        def __init__(self):
+            self.find_elements = MagicMock(
+                return_value=pb2.FindElementsResponse(
+                    elements=[pb2.UIElement(framework_id=f"b{i}") for i in range(5)]
+                )
+            )
+
+        def get_ui_snapshot(self, options):
+            count = 2 if options.get("region") else 5
+            snapshot = pb2.UISnapshot(snapshot_id=f"s{count}")
+            for i in range(count):
+                snapshot.elements.add(framework_id=f"b{i}", element_type="Button")
+            return snapshot
+
+    adapter = RegionAdapter()
+    monkeypatch.setattr(grpc_server, "snapshot_cache", SnapshotCache(ttl=0))
+    monkeypatch.setattr(grpc_server, "snapshot_index_store", SnapshotIndexStore())
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+    servicer = grpc_server.PerceptionServiceImpl()
+    query = pb2.ElementQuery(element_type="Button")
+
+    region = pb2.GetUISnapshotRequest()
+    region.options.update({"region": {"x": 0, "y": 0, "width": 10, "height": 10}})
+    servicer.GetUISnapshot(region, MagicMock())
+    # 部分快照不进入索引: 回退到适配器
+    response = servicer.FindElements(query, MagicMock())
+    assert len(response.elements) == 5
+    adapter.find_elements.assert_called_once()
+
+    servicer.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+    servicer.GetUISnapshot(region, MagicMock())
+    # 完整快照之后的部分采集不会覆盖索引
+    response = servicer.FindElements(query, MagicMock())
+    assert len(response.elements) == 5
+    adapter.find_elements.assert_called_once()
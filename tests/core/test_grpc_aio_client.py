@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("generated_protobuf.core_services_pb2")
+
+import generated_protobuf.core_services_pb2 as pb2  # noqa: E402
+
+from core import grpc_server  # noqa: E402
+from core.grpc_aio_client import AsyncArgusClient, build_channel_options  # noqa: E402
+from core.grpc_aio_server import BlockingCallDispatcher, create_aio_server  # noqa: E402
+from utils.proto_utils import python_dict_to_proto_struct  # noqa: E402
+
+
+class StubPerceptionAdapter:
+    def get_ui_snapshot(self, options):
+        return pb2.UISnapshot(snapshot_id=str(options.get("n")))
+
+    def find_element(self, query):
+        return pb2.FindElementResponse(element=pb2.UIElement(name=query.name))
+
+
+class StubActionAdapter:
+    def click(self, element_id, options):
+        return pb2.ActionResult(success=True, message=element_id.decode())
+
+
+@pytest.fixture
+def stub_adapters(monkeypatch):
+    monkeypatch.setattr(
+        grpc_server, "global_mock_perception_adapter", StubPerceptionAdapter()
+    )
+    monkeypatch.setattr(grpc_server, "global_mock_action_adapter", StubActionAdapter())
+
+
+def _run_against_server(scenario):
+    async def main():
+        server, port, dispatcher = create_aio_server(
+            port=0, dispatcher=BlockingCallDispatcher(max_workers=4)
+        )
+        await server.start()
+        try:
+            return await scenario(f"localhost:{port}")
+        finally:
+            await server.stop(grace=None)
+            dispatcher.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_build_channel_options_defaults_and_overrides():
+    options = dict(
+        build_channel_options(
+            keepalive_time_ms=1000,
+            max_message_length=1024,
+            extra_options=[("grpc.max_receive_message_length", 2048)],
+        )
+    )
+    assert options["grpc.keepalive_time_ms"] == 1000
+    assert options["grpc.max_send_message_length"] == 1024
+    assert options["grpc.max_receive_message_length"] == 2048
+
+    assert "grpc.keepalive_time_ms" not in dict(
+        build_channel_options(keepalive_time_ms=0)
+    )
+
+
+def test_concurrent_requests_over_channel_pool(stub_adapters):
+    async def scenario(address):
+        async with AsyncArgusClient(address, pool_size=3, max_in_flight=5) as client:
+            await client.connect(timeout=5)
+            snapshots = await asyncio.gather(
+                *(
+                    client.get_ui_snapshot(python_dict_to_proto_struct({"n": i}))
+                    for i in range(20)
+                )
+            )
+            found = await client.find_element({"name": "OK"})
+            clicked = await client.click_element(b"button-1")
+            return snapshots, found, clicked
+
+    snapshots, found, clicked = _run_against_server(scenario)
+
+    assert [s.snapshot_id for s in snapshots] == [str(float(i)) for i in range(20)]
+    assert found.element.name == "OK"
+    assert clicked.message == "button-1"
+
+
+def test_rpc_error_returns_none():
+    async def scenario():
+        async with AsyncArgusClient("localhost:1") as client:
+            return await client.get_ui_snapshot()
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_streamed_snapshot_is_assembled_from_chunks(monkeypatch):
+    elements = [
+        pb2.UIElement(framework_id=f"e{i}", text_content="x" * 100) for i in range(40)
+    ]
+
+    class LargeSnapshotAdapter:
+        def get_ui_snapshot(self, options):
+            return pb2.UISnapshot(snapshot_id="big", elements=elements)
+
+    monkeypatch.setattr(
+        grpc_server, "global_mock_perception_adapter", LargeSnapshotAdapter()
+    )
+
+    async def scenario(address):
+        async with AsyncArgusClient(address) as client:
+            chunks = [
+                chunk
+                async for chunk in client.stream_ui_snapshot_chunks(
+                    max_chunk_bytes=1000
+                )
+            ]
+            snapshot = await client.get_ui_snapshot_streamed(max_chunk_bytes=1000)
+            return chunks, snapshot
+
+    chunks, snapshot = _run_against_server(scenario)
+
+    assert chunks[0].header.snapshot_id == "big"
+    assert len(chunks) > 2
+    assert snapshot.snapshot_id == "big"
+    assert list(snapshot.elements) == elements
+
+
+def test_client_tracks_element_identities_across_snapshots(monkeypatch):
+    class MovingAdapter:
+        def __init__(self):
+            self.calls = 0
+
+        def get_ui_snapshot(self, options):
+            self.calls += 1
+            # 框架 ID 每次都变，位置轻微移动
+            return pb2.UISnapshot(
+                snapshot_id=str(self.calls),
+                elements=[
+                    pb2.UIElement(
+                        framework_id=f"ok-{self.calls}",
+                        element_type="button",
+                        name="OK",
+                        bbox=pb2.BBox(
+                            x_min=10 + self.calls, y_min=10, x_max=90, y_max=30
+                        ),
+                    )
+                ],
+            )
+
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", MovingAdapter())
+
+    async def scenario(address):
+        async with AsyncArgusClient(address, track_element_identities=True) as client:
+            await client.get_ui_snapshot(python_dict_to_proto_struct({"n": 1}))
+            first = set(client.element_identities.handles())
+            await client.get_ui_snapshot_streamed(python_dict_to_proto_struct({"n": 2}))
+            return first, client.element_identities
+
+    first, identities = _run_against_server(scenario)
+
+    assert len(first) == 1
+    (handle,) = first
+    assert set(identities.handles()) == first
+    assert identities.framework_id_for(handle) == "ok-2"
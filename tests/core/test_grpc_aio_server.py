@@ -0,0 +1,137 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("generated_protobuf.core_services_pb2")
+
+import grpc  # noqa: E402
+
+import generated_protobuf.core_services_pb2 as pb2  # noqa: E402
+import generated_protobuf.core_services_pb2_grpc as pb2_grpc  # noqa: E402
+
+from core import grpc_server  # noqa: E402
+from core.grpc_aio_server import BlockingCallDispatcher, create_aio_server  # noqa: E402
+
+
+class StubPerceptionAdapter:
+    def __init__(self):
+        self.captures = 0
+
+    def get_ui_snapshot(self, options):
+        self.captures += 1
+        return pb2.UISnapshot(
+            snapshot_id=f"snap-{self.captures}",
+            elements=[pb2.UIElement(framework_id=f"e{self.captures}")],
+        )
+
+    def get_focused_element(self):
+        return pb2.UIElement(framework_id="focused")
+
+
+class StubActionAdapter:
+    def press_key(self, key_combination, options):
+        return pb2.ActionResult(success=True, message=key_combination)
+
+
+@pytest.fixture
+def stub_adapters(monkeypatch):
+    perception = StubPerceptionAdapter()
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", perception)
+    monkeypatch.setattr(grpc_server, "global_mock_action_adapter", StubActionAdapter())
+    return perception
+
+
+async def _with_server(scenario, max_workers=2):
+    server, port, dispatcher = create_aio_server(
+        port=0, dispatcher=BlockingCallDispatcher(max_workers=max_workers)
+    )
+    await server.start()
+    try:
+        async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+            return await scenario(channel)
+    finally:
+        await server.stop(grace=None)
+        dispatcher.shutdown()
+
+
+def test_unary_rpcs_are_served_through_sync_servicers(stub_adapters):
+    async def scenario(channel):
+        perception = pb2_grpc.PerceptionServiceStub(channel)
+        action = pb2_grpc.ActionServiceStub(channel)
+        focused = await perception.GetFocusedElement(pb2.GetFocusedElementRequest())
+        results = await asyncio.gather(
+            *(
+                action.PressKey(pb2.PressKeyRequest(key_combination=f"k{i}"))
+                for i in range(8)
+            )
+        )
+        return focused, results
+
+    focused, results = asyncio.run(_with_server(scenario))
+
+    assert focused.element.framework_id == "focused"
+    assert [r.message for r in results] == [f"k{i}" for i in range(8)]
+
+
+def test_server_streaming_rpc(stub_adapters):
+    async def scenario(channel):
+        perception = pb2_grpc.PerceptionServiceStub(channel)
+        request = pb2.StreamUISnapshotDiffsRequest(interval_ms=1, max_updates=2)
+        return [diff async for diff in perception.StreamUISnapshotDiffs(request)]
+
+    diffs = asyncio.run(_with_server(scenario))
+
+    assert [d.snapshot_id for d in diffs] == ["snap-1", "snap-2"]
+    assert diffs[1].base_snapshot_id == "snap-1"
+
+
+def test_get_metrics_rpc_returns_registry_snapshot():
+    histogram = grpc_server.default_registry.histogram(
+        "test_rpc_latency_seconds", "Test histogram.", ("phase",)
+    )
+    histogram.observe(0.003, phase="perception")
+
+    async def scenario(channel):
+        control = pb2_grpc.AdapterControlServiceStub(channel)
+        return await control.GetMetrics(
+            pb2.GetMetricsRequest(name_prefixes=["test_rpc_"])
+        )
+
+    response = asyncio.run(_with_server(scenario))
+    (family,) = response.families
+    assert family.name == "test_rpc_latency_seconds"
+    assert family.type == "histogram"
+    (sample,) = family.samples
+    assert dict(sample.labels) == {"phase": "perception"}
+    assert sample.count == 1
+    assert len(sample.bucket_counts) == len(family.bucket_upper_bounds) + 1
+    assert sample.bucket_counts[list(family.bucket_upper_bounds).index(0.003)] == 1
+
+
+def test_control_rpcs_are_not_queued_behind_adapter_calls(stub_adapters):
+    release = threading.Event()
+    stub_adapters.get_focused_element = lambda: release.wait(10) and pb2.UIElement()
+
+    async def scenario(channel):
+        perception = pb2_grpc.PerceptionServiceStub(channel)
+        control = pb2_grpc.AdapterControlServiceStub(channel)
+        # 唯一的适配器线程被阻塞的调用占用
+        blocked = asyncio.ensure_future(
+            perception.GetFocusedElement(pb2.GetFocusedElementRequest())
+        )
+        await asyncio.sleep(0.05)
+        try:
+            readiness = await control.GetReadiness(pb2.GetReadinessRequest(), timeout=5)
+            metrics = await control.GetMetrics(pb2.GetMetricsRequest(), timeout=5)
+            return readiness, metrics, blocked.done()
+        finally:
+            release.set()
+            await blocked
+
+    readiness, metrics, adapter_call_done = asyncio.run(
+        _with_server(scenario, max_workers=1)
+    )
+    assert readiness.ready
+    assert metrics.families
+    assert not adapter_call_done
@@ -0,0 +1,186 @@
+import asyncio
+import json
+
+import grpc
+import pytest
+
+pytest.importorskip("generated_protobuf.core_services_pb2")
+
+import generated_protobuf.core_services_pb2 as pb2  # noqa: E402
+import generated_protobuf.core_services_pb2_grpc as pb2_grpc  # noqa: E402
+
+from core import grpc_server, grpc_tracing  # noqa: E402
+from core.grpc_aio_client import AsyncArgusClient  # noqa: E402
+from core.grpc_aio_server import BlockingCallDispatcher, create_aio_server  # noqa: E402
+from core.grpc_client import ArgusClient  # noqa: E402
+from utils import tracing  # noqa: E402
+from utils.proto_utils import python_dict_to_proto_struct  # noqa: E402
+from utils.tracing import Tracer  # noqa: E402
+
+
+class StubActionAdapter:
+    def __init__(self):
+        self.request_ids = []
+
+    def click(self, element_id, options):
+        self.request_ids.append(tracing.current_request_id())
+        return pb2.ActionResult(success=True, message=element_id.decode())
+
+
+class StubPerceptionAdapter:
+    def get_ui_snapshot(self, options):
+        return pb2.UISnapshot(
+            snapshot_id="snap", elements=[pb2.UIElement(framework_id="e1")]
+        )
+
+
+@pytest.fixture
+def traced_server(tmp_path, monkeypatch):
+    action = StubActionAdapter()
+    monkeypatch.setattr(grpc_server, "global_mock_action_adapter", action)
+    monkeypatch.setattr(
+        grpc_server, "global_mock_perception_adapter", StubPerceptionAdapter()
+    )
+    server_tracer = Tracer(
+        sample_rate=1.0, span_file=str(tmp_path / "server.jsonl"), service_name="srv"
+    )
+    monkeypatch.setattr(grpc_tracing, "get_default_tracer", lambda: server_tracer)
+    server, port = grpc_server.create_server(port=0, workers=2)
+    server.start()
+    yield f"localhost:{port}", action, server_tracer, tmp_path
+    server.stop(None)
+
+
+def _read_spans(path):
+    spans = []
+    for line in path.read_text().splitlines():
+        for resource_spans in json.loads(line)["resourceSpans"]:
+            for scope_spans in resource_spans["scopeSpans"]:
+                spans.extend(scope_spans["spans"])
+    return spans
+
+
+def test_server_records_phase_spans_and_propagates_request_id(traced_server):
+    address, action, server_tracer, tmp_path = traced_server
+    client = ArgusClient(address, tracer=Tracer())  # 客户端不采样
+    try:
+        result = client.action_stub.Click(
+            pb2.ClickRequest(
+                adapter_specific_id=b"ok",
+                options=python_dict_to_proto_struct({"button": "left"}),
+            ),
+            metadata=[("x-request-id", "req-123")],
+        )
+        assert result.message == "ok"
+        list(client.stream_ui_snapshot_chunks())
+    finally:
+        client.close()
+    server_tracer.close(timeout=5)
+
+    assert action.request_ids == ["req-123"]
+    spans = _read_spans(tmp_path / "server.jsonl")
+    click_root = next(
+        s for s in spans if s["name"] == "/argus.core.protos.ActionService/Click"
+    )
+    click_spans = [s for s in spans if s["traceId"] == click_root["traceId"]]
+    assert {s["name"] for s in click_spans} == {
+        "/argus.core.protos.ActionService/Click",
+        "deserialize",
+        "conversion",
+        "adapter",
+        "serialize",
+    }
+    assert {"key": "argus.request_id", "value": {"stringValue": "req-123"}} in (
+        click_root["attributes"]
+    )
+    assert all(
+        s["parentSpanId"] == click_root["spanId"]
+        for s in click_spans
+        if s is not click_root
+    )
+    # 流式响应: 每条消息一个 serialize span
+    stream_root = next(s for s in spans if s["name"].endswith("/StreamUISnapshot"))
+    stream_serialize = [
+        s
+        for s in spans
+        if s["traceId"] == stream_root["traceId"] and s["name"] == "serialize"
+    ]
+    assert len(stream_serialize) >= 2  # 头消息 + 元素批次
+
+
+def test_sampled_client_propagates_trace_to_server(traced_server):
+    address, action, server_tracer, tmp_path = traced_server
+    client_tracer = Tracer(
+        sample_rate=1.0, span_file=str(tmp_path / "client.jsonl"), service_name="cli"
+    )
+    client = ArgusClient(address, tracer=client_tracer)
+    try:
+        client.click_element(b"ok")
+    finally:
+        client.close()
+    client_tracer.close(timeout=5)
+    server_tracer.close(timeout=5)
+
+    (client_span,) = _read_spans(tmp_path / "client.jsonl")
+    assert client_span["kind"] == tracing.SPAN_KIND_CLIENT
+    server_root = next(
+        s
+        for s in _read_spans(tmp_path / "server.jsonl")
+        if s["kind"] == tracing.SPAN_KIND_SERVER
+    )
+    assert server_root["traceId"] == client_span["traceId"]
+    assert server_root["parentSpanId"] == client_span["spanId"]
+    assert action.request_ids == [client_span["traceId"]]
+
+
+def test_aio_server_records_phase_spans_and_propagates_request_id(
+    tmp_path, monkeypatch
+):
+    action = StubActionAdapter()
+    monkeypatch.setattr(grpc_server, "global_mock_action_adapter", action)
+    monkeypatch.setattr(
+        grpc_server, "global_mock_perception_adapter", StubPerceptionAdapter()
+    )
+    server_tracer = Tracer(
+        sample_rate=1.0, span_file=str(tmp_path / "server.jsonl"), service_name="srv"
+    )
+    monkeypatch.setattr(grpc_tracing, "get_default_tracer", lambda: server_tracer)
+
+    async def main():
+        server, port, dispatcher = create_aio_server(
+            port=0, dispatcher=BlockingCallDispatcher(max_workers=2)
+        )
+        await server.start()
+        try:
+            async with AsyncArgusClient(f"localhost:{port}") as client:
+                await client.get_ui_snapshot_streamed()
+            async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                await pb2_grpc.ActionServiceStub(channel).Click(
+                    pb2.ClickRequest(adapter_specific_id=b"ok"),
+                    metadata=[("x-request-id", "req-aio")],
+                )
+        finally:
+            await server.stop(grace=None)
+            dispatcher.shutdown()
+
+    asyncio.run(main())
+    server_tracer.close(timeout=5)
+
+    assert action.request_ids == ["req-aio"]
+    spans = _read_spans(tmp_path / "server.jsonl")
+    click_root = next(
+        s for s in spans if s["name"] == "/argus.core.protos.ActionService/Click"
+    )
+    assert {s["name"] for s in spans if s["traceId"] == click_root["traceId"]} == {
+        "/argus.core.protos.ActionService/Click",
+        "deserialize",
+        "conversion",
+        "adapter",
+        "serialize",
+    }
+    stream_root = next(s for s in spans if s["name"].endswith("/StreamUISnapshot"))
+    assert stream_root["kind"] == tracing.SPAN_KIND_SERVER
+    assert any(
+        s["traceId"] == stream_root["traceId"] and s["name"] == "serialize"
+        for s in spans
+    )
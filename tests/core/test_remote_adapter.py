@@ -0,0 +1,184 @@
+import os
+import signal
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("generated_protobuf.core_services_pb2")
+
+import generated_protobuf.core_services_pb2 as pb2  # noqa: E402
+import grpc  # noqa: E402
+
+from core.adapter_manager import AdapterManager  # noqa: E402
+from core.remote_adapter import (  # noqa: E402
+    AdapterWorkerConfig,
+    AdapterWorkerError,
+    AdapterWorkerProcess,
+    RemoteActionAdapter,
+    RemotePerceptionAdapter,
+)
+from utils.metrics import default_registry  # noqa: E402
+
+PERCEPTION_PATH = "tests.core.test_remote_adapter:WorkerPerception"
+ACTION_PATH = "tests.core.test_remote_adapter:WorkerAction"
+
+
+# --- 在工作进程中实例化的适配器 (子进程按类路径导入本模块) ---
+class WorkerPerception:
+    def initialize(self, config: dict) -> None:
+        if config.get("fail"):
+            raise RuntimeError("perception init failed")
+        self.title = config.get("title", "Window")
+
+    def close(self) -> None:
+        pass
+
+    def get_ui_snapshot(self, options: dict) -> pb2.UISnapshot:
+        return pb2.UISnapshot(
+            snapshot_id="snap",
+            elements=[pb2.UIElement(framework_id="root", name=self.title)],
+        )
+
+    def get_element_state(self, element_id: bytes) -> dict:
+        return {"enabled": True, "id": element_id.decode()}
+
+    def get_element_text(self, element_id: bytes) -> str:
+        return str(os.getpid())  # 让测试确认调用发生在哪个进程
+
+
+class WorkerAction:
+    def initialize(self, config: dict) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def click(self, element_id: bytes, options: dict) -> pb2.ActionResult:
+        return pb2.ActionResult(
+            success=True, message=f"{element_id.decode()}:{options.get('button')}"
+        )
+
+
+def _fast_config(**overrides) -> AdapterWorkerConfig:
+    values = dict(startup_timeout=30.0, call_timeout=10.0, restart_backoff=0.05)
+    values.update(overrides)
+    return AdapterWorkerConfig(**values)
+
+
+@pytest.fixture
+def worker():
+    process = AdapterWorkerProcess(
+        "remote_app",
+        PERCEPTION_PATH,
+        ACTION_PATH,
+        {"perception": {"title": "Remote"}},
+        _fast_config(),
+    )
+    process.start()
+    yield process
+    process.stop()
+
+
+def test_remote_adapters_forward_calls_to_worker(worker):
+    perception = RemotePerceptionAdapter(worker)
+    action = RemoteActionAdapter(worker)
+
+    snapshot = perception.get_ui_snapshot({})
+    assert [e.name for e in snapshot.elements] == ["Remote"]
+    assert perception.get_element_state(b"e1") == {"enabled": True, "id": "e1"}
+    assert perception.get_element_text(b"e1") == str(worker.pid)
+    assert worker.pid != os.getpid()
+
+    result = action.click(b"e1", {"button": "left"})
+    assert result.success
+    assert result.message == "e1:left"
+
+
+def test_remote_adapters_report_worker_rss_once(worker):
+    from core.adapter_pool import estimate_pair_memory
+
+    perception = RemotePerceptionAdapter(worker)
+    action = RemoteActionAdapter(worker)
+    rss = worker.memory_usage_bytes()
+    if rss == 0:
+        pytest.skip("/proc is not available on this platform")
+    estimate = estimate_pair_memory((perception, action))
+    # 两个代理共享同一工作进程，只计一次
+    assert rss // 2 < estimate < rss * 2
+
+
+def _restart_count(app_name: str) -> float:
+    (family,) = default_registry.collect(["argus_adapter_worker_restarts_total"])
+    return sum(s.value for s in family.samples if s.labels.get("app") == app_name)
+
+
+def test_worker_restarts_after_crash_and_retries_perception_calls(worker):
+    restarts_before = _restart_count("remote_app")
+    perception = RemotePerceptionAdapter(worker)
+    old_pid = worker.pid
+
+    os.kill(old_pid, signal.SIGKILL)
+
+    # 感知调用是幂等的: 在重启后的工作进程上重试
+    new_pid = perception.get_element_text(b"e1")
+    assert new_pid != str(old_pid)
+    assert new_pid == str(worker.pid)
+    assert _restart_count("remote_app") == restarts_before + 1
+    # 重启后重新 Initialize，沿用原来的适配器配置
+    assert perception.get_ui_snapshot({}).elements[0].name == "Remote"
+
+
+def test_worker_gives_up_after_max_restarts():
+    process = AdapterWorkerProcess(
+        "fragile_app", PERCEPTION_PATH, None, {}, _fast_config(max_restarts=0)
+    )
+    process.start()
+    try:
+        perception = RemotePerceptionAdapter(process)
+        os.kill(process.pid, signal.SIGKILL)
+        with pytest.raises((AdapterWorkerError, grpc.RpcError)):
+            perception.get_element_text(b"e1")
+        with pytest.raises(AdapterWorkerError, match="exceeded 0 restarts"):
+            perception.get_element_text(b"e1")
+    finally:
+        process.stop()
+
+
+def test_worker_initialization_failure_raises():
+    process = AdapterWorkerProcess(
+        "broken_app",
+        PERCEPTION_PATH,
+        None,
+        {"perception": {"fail": True}},
+        _fast_config(),
+    )
+    with pytest.raises(AdapterWorkerError, match="perception init failed"):
+        process.start()
+    assert process.pid is None
+
+
+def test_adapter_manager_worker_process_mode():
+    with patch("importlib.metadata.entry_points", return_value=[]):
+        manager = AdapterManager(worker_config=_fast_config())
+    manager._registered_adapters["remote_app"] = (WorkerPerception, WorkerAction)
+
+    perception, action = manager.get_adapter(
+        "remote_app",
+        {"process_mode": "worker", "perception": {"title": "Managed"}},
+    )
+    assert isinstance(perception, RemotePerceptionAdapter)
+    assert isinstance(action, RemoteActionAdapter)
+    assert perception.worker is action.worker
+    assert perception.get_ui_snapshot({}).elements[0].name == "Managed"
+
+    manager.unload_adapter("remote_app")
+    with pytest.raises(AdapterWorkerError, match="stopped"):
+        perception.get_ui_snapshot({})
+
+
+def test_adapter_manager_rejects_unknown_process_mode():
+    with patch("importlib.metadata.entry_points", return_value=[]):
+        manager = AdapterManager()
+    manager._registered_adapters["app"] = (WorkerPerception, WorkerAction)
+    with pytest.raises(ValueError, match="process_mode"):
+        manager.get_adapter("app", {"process_mode": "thread"})
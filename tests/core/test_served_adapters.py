@@ -0,0 +1,100 @@
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import grpc_server  # noqa: E402
+from core.snapshot_cache import SnapshotCache  # noqa: E402
+from core.snapshot_index import SnapshotIndexStore  # noqa: E402
+
+
+class PooledPerception:
+    def __init__(self):
+        self.captures = 0
+
+    def get_ui_snapshot(self, options):
+        self.captures += 1
+        return pb2.UISnapshot(snapshot_id=f"s{self.captures}")
+
+
+class PooledAction:
+    def click(self, element_id, options):
+        return pb2.ActionResult(success=True, message=element_id.decode())
+
+
+class FakePoolManager:
+    """按顺序借出给定的实例对，记录归还。"""
+
+    def __init__(self, *pairs):
+        self.pairs = list(pairs)
+        self.checked_in = []
+
+    def checkout_adapter(self, app_name, config=None, timeout=None):
+        if not self.pairs:
+            raise TimeoutError("pool exhausted")
+        return self.pairs.pop(0)
+
+    def checkin_adapter(self, app_name, adapter_pair):
+        self.checked_in.append((app_name, adapter_pair))
+
+
+@pytest.fixture
+def use_pool(monkeypatch):
+    monkeypatch.setattr(grpc_server, "snapshot_cache", SnapshotCache(ttl=10.0))
+    monkeypatch.setattr(grpc_server, "snapshot_index_store", SnapshotIndexStore())
+    monkeypatch.setattr(grpc_server.settings, "SERVER_ADAPTER_APP", "pooled_app")
+
+    def use(manager):
+        monkeypatch.setattr(grpc_server, "adapter_manager", manager)
+        return manager
+
+    return use
+
+
+def test_rpcs_check_out_pooled_adapters_and_share_ui_caches(use_pool):
+    first = (PooledPerception(), PooledAction())
+    second = (PooledPerception(), PooledAction())
+    manager = use_pool(FakePoolManager(first, second, first))
+    perception = grpc_server.PerceptionServiceImpl()
+
+    snapshot = perception.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+    # 同一应用的另一个池实例命中同一份缓存
+    cached = perception.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+    assert snapshot.snapshot_id == cached.snapshot_id == "s1"
+    assert second[0].captures == 0
+
+    result = grpc_server.ActionServiceImpl().Click(
+        pb2.ClickRequest(adapter_specific_id=b"ok"), MagicMock()
+    )
+    assert result.message == "ok"
+    assert manager.checked_in == [
+        ("pooled_app", first),
+        ("pooled_app", second),
+        ("pooled_app", first),
+    ]
+    # 动作使该应用的快照缓存失效
+    assert grpc_server.snapshot_cache.get_stats()["invalidations"] == 1
+
+
+def test_exhausted_pool_aborts_with_unavailable(use_pool):
+    use_pool(FakePoolManager())
+    context = MagicMock()
+    context.abort.side_effect = RuntimeError("aborted")
+    with pytest.raises(RuntimeError):
+        grpc_server.PerceptionServiceImpl().GetUISnapshot(
+            pb2.GetUISnapshotRequest(), context
+        )
+    assert context.abort.call_args[0][0] == grpc.StatusCode.UNAVAILABLE
+
+
+def test_serve_preloads_the_app_backing_the_rpcs(monkeypatch):
+    monkeypatch.setattr(grpc_server.settings, "ADAPTER_PRELOAD_APPS", ["other_app"])
+    monkeypatch.setattr(grpc_server.settings, "SERVER_ADAPTER_APP", "pooled_app")
+    monkeypatch.setattr(grpc_server.settings, "SERVER_ADAPTER_CONFIG", {"k": "v"})
+    assert grpc_server.server_preload_apps() == {
+        "other_app": None,
+        "pooled_app": {"k": "v"},
+    }
@@ -0,0 +1,173 @@
+import threading
+import time
+from concurrent import futures
+from unittest.mock import MagicMock
+
+from core.snapshot_cache import SnapshotCache, normalize_options
+from utils.metrics import default_registry
+
+
+class Adapter:
+    pass
+
+
+def test_normalize_options_is_order_independent():
+    assert normalize_options({"b": 1, "a": {"y": 2, "x": 1}}) == normalize_options(
+        {"a": {"x": 1, "y": 2}, "b": 1}
+    )
+    assert normalize_options(None) == normalize_options({})
+
+
+def test_hit_within_ttl_and_miss_for_other_options():
+    cache = SnapshotCache(ttl=10.0)
+    adapter = Adapter()
+    capture = MagicMock(side_effect=["snap1", "snap2"])
+
+    assert cache.get_or_capture(adapter, {"depth": 1}, capture) == ("snap1", False)
+    assert cache.get_or_capture(adapter, {"depth": 1}, capture) == ("snap1", True)
+    assert cache.get_or_capture(adapter, {"depth": 2}, capture) == ("snap2", False)
+    assert cache.get_stats() == {
+        "hits": 1,
+        "misses": 2,
+        "invalidations": 0,
+        "entries": 2,
+    }
+
+
+def test_entry_expires_after_ttl():
+    cache = SnapshotCache(ttl=0.01)
+    adapter = Adapter()
+    capture = MagicMock(side_effect=["old", "new"])
+    cache.get_or_capture(adapter, {}, capture)
+    time.sleep(0.02)
+    assert cache.get_or_capture(adapter, {}, capture) == ("new", False)
+
+
+def test_invalidate_drops_cached_snapshots():
+    cache = SnapshotCache(ttl=10.0)
+    adapter = Adapter()
+    capture = MagicMock(side_effect=["before", "after"])
+    cache.get_or_capture(adapter, {}, capture)
+    cache.invalidate(adapter)
+    assert cache.get_or_capture(adapter, {}, capture) == ("after", False)
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_capture_invalidated_while_in_flight_is_not_cached():
+    cache = SnapshotCache(ttl=10.0)
+    adapter = Adapter()
+
+    def capture_racing_with_action():
+        cache.invalidate(adapter)  # 模拟采集期间执行了动作
+        return "stale"
+
+    cache.get_or_capture(adapter, {}, capture_racing_with_action)
+    assert cache.get_or_capture(adapter, {}, lambda: "fresh") == ("fresh", False)
+
+
+def test_concurrent_misses_share_one_capture():
+    cache = SnapshotCache(ttl=10.0)
+    adapter = Adapter()
+    release = threading.Event()
+    calls = []
+
+    def slow_capture():
+        calls.append(1)
+        release.wait(5)
+        return "snapshot"
+
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = [
+            executor.submit(cache.get_or_capture, adapter, {}, slow_capture)
+            for _ in range(4)
+        ]
+        time.sleep(0.05)
+        release.set()
+        snapshots = [result.result()[0] for result in results]
+
+    assert snapshots == ["snapshot"] * 4
+    assert len(calls) == 1
+
+
+def test_reader_after_invalidation_does_not_join_stale_capture():
+    cache = SnapshotCache(ttl=10.0)
+    adapter = Adapter()
+    started = threading.Event()
+    release = threading.Event()
+    indexed = []
+
+    def stale_capture():
+        started.set()
+        release.wait(5)
+        return "before-action"
+
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        stale = executor.submit(
+            cache.get_or_capture, adapter, {}, stale_capture, indexed.append
+        )
+        assert started.wait(5)
+        cache.invalidate(adapter)
+
+        fresh_capture = MagicMock(return_value="after-action")
+        snapshot, hit = cache.get_or_capture(adapter, {}, fresh_capture, indexed.append)
+        assert (snapshot, hit) == ("after-action", False)
+        fresh_capture.assert_called_once()
+
+        release.set()
+        assert stale.result() == ("before-action", False)
+
+    # 过时的采集既不写入缓存，也不交给 on_current (快照索引)
+    assert indexed == ["after-action"]
+    assert cache.get_or_capture(adapter, {}, MagicMock()) == ("after-action", True)
+
+
+def test_counters_are_exported_to_metrics_registry():
+    def counter_values():
+        values = {}
+        for family in default_registry.collect(["argus_snapshot_cache_"]):
+            for sample in family.samples:
+                values[(family.name, sample.labels.get("result"))] = sample.value
+        return values
+
+    before = counter_values()
+    cache = SnapshotCache(ttl=10.0)
+    adapter = Adapter()
+    cache.get_or_capture(adapter, {}, MagicMock(return_value="s"))
+    cache.get_or_capture(adapter, {}, MagicMock())
+    cache.invalidate(adapter)
+    after = counter_values()
+
+    def delta(name, result=None):
+        return after.get((name, result), 0) - before.get((name, result), 0)
+
+    assert delta("argus_snapshot_cache_lookups_total", "hit") == 1
+    assert delta("argus_snapshot_cache_lookups_total", "miss") == 1
+    assert delta("argus_snapshot_cache_invalidations_total") == 1
+
+
+def test_resources_are_released_when_snapshot_leaves_cache():
+    cache = SnapshotCache(ttl=0.01)
+    adapter = Adapter()
+    released = []
+    create = MagicMock(side_effect=["res-old", "res-new"])
+
+    old, _ = cache.get_or_capture(adapter, {}, lambda: ["old"])
+    assert cache.get_resource(adapter, old, "blob", create, released.append) == (
+        "res-old"
+    )
+    assert cache.get_resource(adapter, old, "blob", create, released.append) == (
+        "res-old"
+    )
+    create.assert_called_once()
+    # 不在缓存中的快照不附加资源
+    assert cache.get_resource(adapter, ["other"], "blob", create, released.append) is (
+        None
+    )
+
+    time.sleep(0.02)
+    new, _ = cache.get_or_capture(adapter, {}, lambda: ["new"])  # 替换过期条目
+    assert released == ["res-old"]
+
+    cache.get_resource(adapter, new, "blob", create, released.append)
+    cache.invalidate(adapter)
+    assert released == ["res-old", "res-new"]
@@ -0,0 +1,148 @@
+import pytest
+
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import grpc_server  # noqa: E402
+from core.grpc_client import ArgusClient  # noqa: E402
+from core.snapshot_chunks import (  # noqa: E402
+    SnapshotChunkAssembler,
+    iter_snapshot_chunks,
+)
+
+
+def make_element(index: int, text_size: int = 100) -> pb2.UIElement:
+    return pb2.UIElement(
+        framework_id=f"e{index}",
+        element_type="text",
+        text_content="x" * text_size,
+    )
+
+
+def make_snapshot(count: int, text_size: int = 100) -> pb2.UISnapshot:
+    snapshot = pb2.UISnapshot(
+        snapshot_id="s1",
+        elements=[make_element(i, text_size) for i in range(count)],
+    )
+    snapshot.app_context["title"].string_value = "app"
+    return snapshot
+
+
+class FakeContext:
+    def __init__(self, active_checks: int = 1_000_000):
+        self.active_checks = active_checks
+
+    def is_active(self):
+        self.active_checks -= 1
+        return self.active_checks >= 0
+
+
+def test_header_comes_first_and_chunks_respect_size_limit():
+    snapshot = make_snapshot(50)
+    chunks = list(iter_snapshot_chunks(snapshot, snapshot.elements, 1000))
+
+    assert chunks[0].HasField("header")
+    assert len(chunks[0].elements) == 0
+    assert len(chunks[0].header.elements) == 0
+    assert chunks[0].header.app_context["title"].string_value == "app"
+    assert len(chunks) > 2
+    for chunk in chunks[1:]:
+        assert not chunk.HasField("header")
+        assert 0 < chunk.ByteSize() <= 1000
+
+
+def test_oversized_element_is_sent_alone():
+    elements = [make_element(0, 10), make_element(1, 5000), make_element(2, 10)]
+    chunks = list(iter_snapshot_chunks(pb2.UISnapshot(), elements, 1000))
+    assert [len(chunk.elements) for chunk in chunks[1:]] == [1, 1, 1]
+
+
+def test_assembler_restores_snapshot():
+    snapshot = make_snapshot(50)
+    assembler = SnapshotChunkAssembler()
+    for chunk in iter_snapshot_chunks(snapshot, snapshot.elements, 1000):
+        assembler.add(chunk)
+    assert assembler.snapshot() == snapshot
+
+
+def test_assembler_rejects_out_of_order_chunks():
+    assembler = SnapshotChunkAssembler()
+    with pytest.raises(ValueError):
+        assembler.add(pb2.UISnapshotChunk(elements=[make_element(0)]))
+    assembler.add(pb2.UISnapshotChunk(header=pb2.UISnapshot()))
+    with pytest.raises(ValueError):
+        assembler.add(pb2.UISnapshotChunk(header=pb2.UISnapshot()))
+
+
+class IteratingPerceptionAdapter:
+    def __init__(self, count: int):
+        self.count = count
+        self.produced = 0
+        self.closed = False
+
+    def get_ui_snapshot(self, options):
+        raise AssertionError("StreamUISnapshot should use iter_ui_snapshot")
+
+    def iter_ui_snapshot(self, options):
+        def elements():
+            try:
+                for i in range(self.count):
+                    self.produced += 1
+                    yield make_element(i)
+            finally:
+                self.closed = True
+
+        return pb2.UISnapshot(snapshot_id="live"), elements()
+
+
+def test_stream_uses_adapter_element_iterator(monkeypatch):
+    adapter = IteratingPerceptionAdapter(count=30)
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+    request = pb2.StreamUISnapshotRequest(max_chunk_bytes=500)
+
+    chunks = list(
+        grpc_server.PerceptionServiceImpl().StreamUISnapshot(request, FakeContext())
+    )
+    assembler = SnapshotChunkAssembler()
+    for chunk in chunks:
+        assembler.add(chunk)
+    snapshot = assembler.snapshot()
+    assert snapshot.snapshot_id == "live"
+    assert [e.framework_id for e in snapshot.elements] == [f"e{i}" for i in range(30)]
+    assert adapter.closed
+
+
+def test_cancelled_stream_stops_pulling_elements(monkeypatch):
+    adapter = IteratingPerceptionAdapter(count=1000)
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+    request = pb2.StreamUISnapshotRequest(max_chunk_bytes=500)
+
+    chunks = list(
+        grpc_server.PerceptionServiceImpl().StreamUISnapshot(
+            request, FakeContext(active_checks=3)
+        )
+    )
+    assert len(chunks) == 3
+    assert adapter.produced < 1000
+    assert adapter.closed
+
+
+def test_client_receives_snapshot_larger_than_message_limit(monkeypatch):
+    # 约 6 MB，超过 gRPC 默认的 4 MB 接收上限
+    snapshot = make_snapshot(3000, text_size=2000)
+
+    class FullSnapshotAdapter:
+        def get_ui_snapshot(self, options):
+            return snapshot
+
+    monkeypatch.setattr(
+        grpc_server, "global_mock_perception_adapter", FullSnapshotAdapter()
+    )
+    server, port = grpc_server.create_server(port=0, workers=2)
+    server.start()
+    client = ArgusClient(f"localhost:{port}")
+    try:
+        received = client.get_ui_snapshot_streamed(max_chunk_bytes=256 * 1024)
+    finally:
+        client.close()
+        server.stop(grace=None)
+    assert received == snapshot
@@ -0,0 +1,131 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("generated_protobuf.core_services_pb2")
+
+import generated_protobuf.core_services_pb2 as pb2  # noqa: E402
+from google.protobuf.struct_pb2 import Value  # noqa: E402
+
+from core import grpc_server  # noqa: E402
+from core.snapshot_columnar import (  # noqa: E402
+    decode_columnar_elements,
+    encode_columnar_elements,
+    from_columnar_snapshot,
+    to_columnar_snapshot,
+)
+from utils.proto_utils import python_value_to_proto_value  # noqa: E402
+
+
+def _element(framework_id, **kwargs):
+    return pb2.UIElement(framework_id=framework_id, **kwargs)
+
+
+def _sample_snapshot() -> pb2.UISnapshot:
+    root = _element(
+        "root",
+        element_type="window",
+        name="Main",
+        bbox=pb2.BBox(x_min=-10, y_min=0, x_max=1920, y_max=1080),
+        children_framework_ids=["a", "b", "missing-child"],
+        confidence=0.5,
+    )
+    a = _element(
+        "a",
+        adapter_specific_id=b"\x00\x01",
+        element_type="button",
+        name="OK",
+        text_content="",
+        parent_framework_id="root",
+        bbox=pb2.BBox(x_min=1, y_min=2, x_max=3, y_max=4),
+    )
+    a.state["enabled"].bool_value = True
+    a.state["value"].string_value = "OK"
+    a.state["count"].number_value = 3.5
+    a.state["nothing"].null_value = 0
+    a.state["nested"].CopyFrom(python_value_to_proto_value({"x": [1, "y"]}))
+    a.state["unset"].CopyFrom(Value())
+    a.adapter_metadata["role"].string_value = "push button"
+    # 没有 bbox，父元素不在快照中
+    b = _element("b", element_type="button", parent_framework_id="detached")
+    b.state["enabled"].bool_value = False
+    # 与 a 重复的 framework_id 也必须原样保留
+    duplicate = _element("a", element_type="button")
+
+    snapshot = pb2.UISnapshot(
+        snapshot_id="snap-1",
+        elements=[root, a, b, duplicate],
+        focused_element_framework_id="a",
+    )
+    snapshot.app_context["title"].string_value = "App"
+    return snapshot
+
+
+def test_round_trip_is_lossless():
+    snapshot = _sample_snapshot()
+
+    columnar = to_columnar_snapshot(snapshot)
+
+    assert not columnar.elements
+    assert columnar.columnar_elements.count == 4
+    assert columnar.app_context["title"].string_value == "App"
+    assert from_columnar_snapshot(columnar) == snapshot
+
+
+def test_round_trip_of_empty_element_list():
+    assert decode_columnar_elements(encode_columnar_elements([])) == []
+
+
+def test_plain_snapshot_is_returned_unchanged():
+    snapshot = _sample_snapshot()
+    assert from_columnar_snapshot(snapshot) is snapshot
+
+
+def test_repeated_strings_are_interned():
+    elements = []
+    for i in range(200):
+        element = _element(
+            f"e{i}",
+            element_type="list item",
+            parent_framework_id="e0",
+            bbox=pb2.BBox(x_min=0, y_min=i * 20, x_max=300, y_max=i * 20 + 18),
+        )
+        element.state["is_keyboard_focusable"].bool_value = True
+        element.state["is_offscreen"].bool_value = False
+        elements.append(element)
+    snapshot = pb2.UISnapshot(elements=elements)
+
+    columnar = to_columnar_snapshot(snapshot)
+
+    # map 的遍历顺序不固定，只比较内容
+    assert sorted(columnar.columnar_elements.string_table) == [
+        "is_keyboard_focusable",
+        "is_offscreen",
+        "list item",
+    ]
+    assert columnar.ByteSize() < snapshot.ByteSize() / 2
+    assert from_columnar_snapshot(columnar) == snapshot
+
+
+def test_inconsistent_columns_are_rejected():
+    columnar = encode_columnar_elements([_element("a")])
+    columnar.count = 2
+    with pytest.raises(ValueError):
+        decode_columnar_elements(columnar)
+
+
+def test_get_ui_snapshot_columnar_flag(monkeypatch):
+    snapshot = _sample_snapshot()
+    adapter = MagicMock()
+    adapter.get_ui_snapshot.return_value = snapshot
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+    servicer = grpc_server.PerceptionServiceImpl()
+
+    columnar = servicer.GetUISnapshot(
+        pb2.GetUISnapshotRequest(columnar=True), MagicMock()
+    )
+    plain = servicer.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+
+    assert columnar.HasField("columnar_elements")
+    assert from_columnar_snapshot(columnar) == snapshot
+    assert plain == snapshot
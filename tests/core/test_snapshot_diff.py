@@ -0,0 +1,130 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import grpc_server  # noqa: E402
+from core.snapshot_cache import SnapshotCache  # noqa: E402
+from core.snapshot_diff import (  # noqa: E402
+    SnapshotDiffApplier,
+    compute_snapshot_diff,
+    copy_snapshot_header,
+)
+
+
+def make_element(framework_id: str, name: str = "", x: int = 0) -> pb2.UIElement:
+    element = pb2.UIElement(
+        framework_id=framework_id,
+        element_type="button",
+        bbox=pb2.BBox(x_min=x, y_min=0, x_max=x + 10, y_max=10),
+    )
+    if name:
+        element.name = name
+    return element
+
+
+def make_snapshot(snapshot_id: str, elements, title: str = "app") -> pb2.UISnapshot:
+    snapshot = pb2.UISnapshot(snapshot_id=snapshot_id, elements=elements)
+    snapshot.app_context["title"].string_value = title
+    snapshot.timestamp.GetCurrentTime()
+    return snapshot
+
+
+def test_first_diff_is_full_snapshot():
+    snapshot = make_snapshot("s1", [make_element("a"), make_element("b")])
+    diff = compute_snapshot_diff(None, snapshot)
+    assert not diff.HasField("base_snapshot_id")
+    assert [e.framework_id for e in diff.added] == ["a", "b"]
+    assert len(diff.header.elements) == 0
+    assert diff.header.app_context["title"].string_value == "app"
+
+
+def test_diff_reports_added_removed_modified():
+    previous = make_snapshot("s1", [make_element("a"), make_element("b", "old")])
+    current = make_snapshot("s2", [make_element("b", "new"), make_element("c")])
+    diff = compute_snapshot_diff(previous, current)
+    assert diff.base_snapshot_id == "s1"
+    assert [e.framework_id for e in diff.added] == ["c"]
+    assert list(diff.removed_framework_ids) == ["a"]
+    assert [e.name for e in diff.modified] == ["new"]
+
+
+def test_unchanged_snapshot_produces_no_diff():
+    previous = make_snapshot("s1", [make_element("a")])
+    current = make_snapshot("s2", [make_element("a")])
+    assert compute_snapshot_diff(previous, current) is None
+
+
+def test_header_change_alone_produces_diff():
+    previous = make_snapshot("s1", [make_element("a")], title="before")
+    current = make_snapshot("s2", [make_element("a")], title="after")
+    diff = compute_snapshot_diff(previous, current)
+    assert diff is not None
+    assert not diff.added and not diff.modified and not diff.removed_framework_ids
+
+
+def test_applier_rebuilds_current_snapshot():
+    snapshots = [
+        make_snapshot("s1", [make_element("a"), make_element("b")]),
+        make_snapshot("s2", [make_element("a", x=5), make_element("c")]),
+        make_snapshot("s3", [make_element("c")], title="done"),
+    ]
+    applier = SnapshotDiffApplier()
+    previous = None
+    for snapshot in snapshots:
+        applier.apply(compute_snapshot_diff(previous, snapshot))
+        previous = snapshot
+        rebuilt = applier.snapshot()
+        assert rebuilt.snapshot_id == snapshot.snapshot_id
+        assert {e.framework_id: e for e in rebuilt.elements} == {
+            e.framework_id: e for e in snapshot.elements
+        }
+        assert copy_snapshot_header(rebuilt) == copy_snapshot_header(snapshot)
+
+
+def test_diff_header_only_carries_changed_fields():
+    previous = make_snapshot("s1", [make_element("a")])
+    previous.accessibility_tree_raw = b"t" * 10000
+    previous.focused_element_framework_id = "a"
+    current = make_snapshot("s2", [make_element("a", "new")])
+    current.accessibility_tree_raw = b"t" * 10000
+
+    diff = compute_snapshot_diff(previous, current)
+
+    assert diff.header.snapshot_id == "s2"
+    assert not diff.header.HasField("accessibility_tree_raw")
+    assert "title" not in diff.header.app_context
+    assert list(diff.cleared_header_fields) == ["focused_element_framework_id"]
+
+    applier = SnapshotDiffApplier()
+    applier.apply(compute_snapshot_diff(None, previous))
+    applier.apply(diff)
+    assert copy_snapshot_header(applier.snapshot()) == copy_snapshot_header(current)
+
+
+def test_applier_rejects_diff_with_wrong_base():
+    applier = SnapshotDiffApplier()
+    applier.apply(compute_snapshot_diff(None, make_snapshot("s1", [])))
+    stale = compute_snapshot_diff(
+        make_snapshot("s0", []), make_snapshot("s2", [make_element("a")])
+    )
+    with pytest.raises(ValueError):
+        applier.apply(stale)
+
+
+def test_diff_stream_shares_snapshot_cache_with_pollers(monkeypatch):
+    adapter = MagicMock()
+    adapter.get_ui_snapshot.return_value = make_snapshot("s1", [make_element("a")])
+    monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+    monkeypatch.setattr(grpc_server, "snapshot_cache", SnapshotCache(ttl=60.0))
+    servicer = grpc_server.PerceptionServiceImpl()
+
+    servicer.GetUISnapshot(pb2.GetUISnapshotRequest(), MagicMock())
+    (diff,) = servicer.StreamUISnapshotDiffs(
+        pb2.StreamUISnapshotDiffsRequest(max_updates=1), MagicMock()
+    )
+
+    assert diff.snapshot_id == "s1"
+    adapter.get_ui_snapshot.assert_called_once()
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core.snapshot_index import SnapshotIndex, SnapshotIndexStore  # noqa: E402
+
+
+def make_snapshot() -> pb2.UISnapshot:
+    snapshot = pb2.UISnapshot(snapshot_id="s1")
+    snapshot.elements.add(
+        framework_id="root",
+        element_type="window",
+        bbox=pb2.BBox(x_min=0, y_min=0, x_max=4000, y_max=4000),
+        confidence=1.0,
+    )
+    for i in range(20):
+        snapshot.elements.add(
+            framework_id=f"btn{i}",
+            adapter_specific_id=f"native-{i}".encode(),
+            element_type="button",
+            name=f"Button {i}",
+            text_content="OK" if i % 2 else f"Cancel {i}",
+            parent_framework_id="root",
+            bbox=pb2.BBox(x_min=i * 100, y_min=10, x_max=i * 100 + 50, y_max=40),
+            confidence=0.5 + i / 100,
+        )
+    return snapshot
+
+
+@pytest.fixture
+def index():
+    return SnapshotIndex(make_snapshot())
+
+
+def ids(elements):
+    return [element.framework_id for element in elements]
+
+
+def test_find_by_equality_fields(index):
+    assert ids(index.find(pb2.ElementQuery(framework_id="btn3"))) == ["btn3"]
+    assert ids(index.find(pb2.ElementQuery(name="Button 4"))) == ["btn4"]
+    assert ids(index.find(pb2.ElementQuery(adapter_specific_id=b"native-5"))) == [
+        "btn5"
+    ]
+    assert len(index.find(pb2.ElementQuery(element_type="button"))) == 20
+    assert len(index.find(pb2.ElementQuery(exact_text="OK"))) == 10
+    assert (
+        len(index.find(pb2.ElementQuery(parent_framework_id_constraint="root"))) == 20
+    )
+
+
+def test_find_combines_conditions(index):
+    query = pb2.ElementQuery(
+        element_type="button", text_content_regex=r"^Cancel 1\d$", min_confidence=0.65
+    )
+    assert ids(index.find(query)) == ["btn16", "btn18"]
+
+
+def test_find_by_bbox_includes_large_elements(index):
+    query = pb2.ElementQuery(bbox=pb2.BBox(x_min=305, y_min=0, x_max=320, y_max=20))
+    assert ids(index.find(query)) == ["root", "btn3"]
+
+
+def test_find_index_and_limit(index):
+    query = pb2.ElementQuery(exact_text="OK", index=2)
+    assert ids(index.find(query)) == ["btn5"]
+    assert ids(index.find(pb2.ElementQuery(exact_text="OK"), limit=1)) == ["btn1"]
+    assert index.find(pb2.ElementQuery(exact_text="OK", index=99)) == []
+
+
+def test_can_answer_rejects_live_queries():
+    assert SnapshotIndex.can_answer(pb2.ElementQuery(name="x"))
+    assert SnapshotIndex.can_answer(pb2.ElementQuery(xpath="//button"))
+    assert not SnapshotIndex.can_answer(pb2.ElementQuery(description="OK button"))
+    assert not SnapshotIndex.can_answer(pb2.ElementQuery(name="x", require_live=True))
+
+
+def test_find_with_selectors_combines_other_conditions(index):
+    assert ids(index.find(pb2.ElementQuery(xpath="/window/button[3]"))) == ["btn2"]
+    query = pb2.ElementQuery(css_selector="window > button", exact_text="OK", index=1)
+    assert ids(index.find(query)) == ["btn3"]
+    both = pb2.ElementQuery(
+        xpath="//button[position() <= 4]", css_selector="button:nth-child(even)"
+    )
+    assert ids(index.find(both)) == ["btn1", "btn3"]
+
+
+def test_store_expires_and_invalidates():
+    class Adapter:
+        pass
+
+    adapter = Adapter()
+    store = SnapshotIndexStore()
+    assert store.get_fresh(adapter, max_age=1.0) is None
+    store.put(adapter, make_snapshot())
+    assert len(store.get_fresh(adapter, max_age=1.0)) == 21
+    time.sleep(0.01)
+    assert store.get_fresh(adapter, max_age=0.001) is None
+    store.invalidate(adapter)
+    assert store.get_fresh(adapter, max_age=1.0) is None
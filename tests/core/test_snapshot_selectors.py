@@ -0,0 +1,165 @@
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core.snapshot_selectors import (  # noqa: E402
+    SelectorError,
+    SnapshotTree,
+    compile_css,
+    compile_xpath,
+)
+
+
+def make_tree() -> SnapshotTree:
+    """
+    window#root
+      toolbar#tb
+        button#save (name=Save, enabled)
+        button#open (name=Open, disabled)
+      pane#main
+        list#files
+          item#f0 (text=a.txt) ... item#f3 (text=d.txt)
+        button#ok (name=OK, text=OK)
+    """
+    snapshot = pb2.UISnapshot()
+
+    def add(framework_id, element_type, parent=None, **fields):
+        element = snapshot.elements.add(
+            framework_id=framework_id, element_type=element_type, **fields
+        )
+        if parent is not None:
+            element.parent_framework_id = parent
+        return element
+
+    add("root", "window", name="Main")
+    add("tb", "toolbar", "root")
+    add("save", "button", "tb", name="Save", confidence=0.9).state[
+        "enabled"
+    ].bool_value = True
+    add("open", "button", "tb", name="Open", confidence=0.4).state[
+        "enabled"
+    ].bool_value = False
+    add("main", "pane", "root")
+    add("files", "list", "main")
+    for i, name in enumerate(["a.txt", "b.txt", "c.log", "d.txt"]):
+        add(f"f{i}", "item", "files", text_content=name)
+    add("ok", "button", "main", name="OK", text_content="OK")
+    return SnapshotTree(snapshot.elements)
+
+
+@pytest.fixture
+def tree():
+    return make_tree()
+
+
+def ids(elements):
+    return [element.framework_id for element in elements]
+
+
+def test_tree_numbering_supports_constant_time_ancestor_checks(tree):
+    position = tree.position_of
+    assert tree.is_ancestor(position["root"], position["f2"])
+    assert tree.is_ancestor(position["main"], position["ok"])
+    assert not tree.is_ancestor(position["tb"], position["ok"])
+    assert not tree.is_ancestor(position["f2"], position["f2"])
+    assert tree.children[position["files"]] == [position[f"f{i}"] for i in range(4)]
+
+
+def test_children_framework_ids_define_links_and_sibling_order():
+    snapshot = pb2.UISnapshot()
+    snapshot.elements.add(
+        framework_id="p", element_type="pane", children_framework_ids=["c2", "c1"]
+    )
+    snapshot.elements.add(framework_id="c1", element_type="button")
+    snapshot.elements.add(framework_id="c2", element_type="edit")
+    tree = SnapshotTree(snapshot.elements)
+    assert ids(tree.css("pane > :first-child")) == ["c2"]
+    assert ids(tree.xpath("/pane/*")) == ["c2", "c1"]
+
+
+def test_parent_cycles_do_not_hang():
+    snapshot = pb2.UISnapshot()
+    snapshot.elements.add(framework_id="a", element_type="x", parent_framework_id="b")
+    snapshot.elements.add(framework_id="b", element_type="x", parent_framework_id="a")
+    tree = SnapshotTree(snapshot.elements)
+    assert sorted(ids(tree.xpath("//x"))) == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ("/window/toolbar/button", ["save", "open"]),
+        ("//button", ["save", "open", "ok"]),
+        ("window/pane/button", ["ok"]),
+        ("//pane//item", ["f0", "f1", "f2", "f3"]),
+        ("//button[@name='Open']", ["open"]),
+        ("//button[@enabled='true']", ["save"]),
+        ("//*[@id='files']/item[2]", ["f1"]),
+        ("//item[last()]", ["f3"]),
+        ("//item[position() > 2]", ["f2", "f3"]),
+        ("//item[contains(text(), '.txt')][2]", ["f1"]),
+        ("//item[starts-with(@text, 'c') or ends-with(@text, 'd.txt')]", ["f2", "f3"]),
+        ("//button[not(@text)]", ["save", "open"]),
+        ("//button[@confidence >= 0.5 and @name != 'OK']", ["save"]),
+        ("//button[1]", ["save", "ok"]),
+        ("//item[@text='b.txt']/../../button", ["ok"]),
+        ("//list/.//item[3]", ["f2"]),
+        ("//toolbar | //list", ["tb", "files"]),
+        ("//*[name()='list']", ["files"]),
+        ("//button[text()='missing']", []),
+    ],
+)
+def test_xpath(tree, expression, expected):
+    assert ids(tree.xpath(expression)) == expected
+
+
+@pytest.mark.parametrize(
+    "selector, expected",
+    [
+        ("button", ["save", "open", "ok"]),
+        ("toolbar > button", ["save", "open"]),
+        ("window button", ["save", "open", "ok"]),
+        ("#files > item:nth-child(2n+1)", ["f0", "f2"]),
+        ("item:nth-last-child(1)", ["f3"]),
+        ("item:first-child, item:last-child", ["f0", "f3"]),
+        ('item[text$=".txt"]:not(:first-child)', ["f1", "f3"]),
+        ("[name^=O]", ["open", "ok"]),
+        ("button[enabled]", ["save", "open"]),
+        ("button[enabled=false]", ["open"]),
+        ("list + button", ["ok"]),
+        ("toolbar ~ pane", ["main"]),
+        ("item + item", ["f1", "f2", "f3"]),
+        ("toolbar:only-child", []),
+        ("item:empty", ["f0", "f1", "f2", "f3"]),
+        (
+            "*",
+            ["root", "tb", "save", "open", "main", "files"]
+            + ["f0", "f1", "f2", "f3", "ok"],
+        ),
+    ],
+)
+def test_css(tree, selector, expected):
+    assert ids(tree.css(selector)) == expected
+
+
+@pytest.mark.parametrize("expression", ["", "//button[", "child::button", "//a/b)"])
+def test_invalid_xpath_raises(expression):
+    with pytest.raises(SelectorError):
+        compile_xpath(expression)
+
+
+@pytest.mark.parametrize("selector", ["", ".primary", "a >", ":hover", "a[b"])
+def test_invalid_or_unsupported_css_raises(selector):
+    with pytest.raises(SelectorError):
+        compile_css(selector)
+
+
+def test_selectors_are_compiled_once_and_results_cached_per_tree(tree):
+    assert compile_css("toolbar > button") is compile_css("toolbar > button")
+    first = tree.css("toolbar > button")
+    # 结果缓存按选择器类型区分: 同样的文本作为 XPath 含义不同
+    assert ids(tree.xpath("button")) == []
+    assert tree.css("toolbar > button") == first
+    # 另一个快照的树有自己的缓存
+    assert ids(make_tree().css("toolbar > button")) == ["save", "open"]
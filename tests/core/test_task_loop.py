@@ -0,0 +1,226 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core.task_loop import (
+    ActionFailedError,
+    PlannedAction,
+    StaleSnapshotError,
+    TaskLoop,
+)
+from core.task_scheduler import TaskCancelledError, TaskContext
+from utils.metrics import default_registry
+
+
+class FakeApp:
+    """
+    计数器应用: 每个 "increment" 动作在 settle_captures 次采集之后才在快照中可见，
+    用于模拟 UI 更新滞后 (过时快照)。
+    """
+
+    def __init__(self, target: int, settle_captures: int = 0, latency: float = 0.0):
+        self.target = target
+        self.settle_captures = settle_captures
+        self.latency = latency
+        self.applied = 0
+        self.visible = 0
+        self._captures_until_visible = 0
+        self.captures = []
+        self.concurrent_captures = 0
+        self.max_concurrent_captures = 0
+        self._lock = threading.Lock()
+
+    def perceive(self, options):
+        with self._lock:
+            self.concurrent_captures += 1
+            self.max_concurrent_captures = max(
+                self.max_concurrent_captures, self.concurrent_captures
+            )
+        time.sleep(self.latency)
+        with self._lock:
+            self.concurrent_captures -= 1
+            self.captures.append(options)
+            if self._captures_until_visible > 0:
+                self._captures_until_visible -= 1
+            else:
+                self.visible = self.applied
+            return {"count": self.visible}
+
+    def plan(self, snapshot):
+        time.sleep(self.latency)
+        if snapshot["count"] >= self.target:
+            return None
+        expected = snapshot["count"] + 1
+        return PlannedAction(
+            name="increment",
+            prefetch_options={"region": "counter"},
+            expectation=lambda s: s["count"] >= expected,
+            predicted_snapshot={"count": expected},
+        )
+
+    def act(self, action):
+        with self._lock:
+            self.applied += 1
+            self._captures_until_visible = self.settle_captures
+        return SimpleNamespace(success=True)
+
+
+def run_loop(app: FakeApp, mode: str, **kwargs):
+    loop = TaskLoop(app.perceive, app.plan, app.act, mode=mode, **kwargs)
+    return loop.run(TaskContext("app", None))
+
+
+@pytest.mark.parametrize("mode", ["sequential", "pipelined"])
+def test_loop_runs_until_planner_finishes(mode):
+    app = FakeApp(target=3)
+    report = run_loop(app, mode)
+    assert report.completed
+    assert report.iterations == 3
+    assert len(report.iteration_latencies_ms) == 3
+    if mode == "sequential":
+        # 流水线模式的首次采集与动作重叠，可能早于动作生效
+        assert report.stale_captures == 0
+    assert app.visible == 3
+
+
+def test_pipelined_mode_prefetches_affected_region():
+    app = FakeApp(target=2)
+    run_loop(app, "pipelined")
+    assert {"region": "counter"} in app.captures
+
+
+def test_pipelined_captures_never_run_concurrently():
+    app = FakeApp(target=3, latency=0.01)
+    run_loop(app, "pipelined")
+    assert app.max_concurrent_captures == 1
+
+
+def test_pipelined_capture_overlaps_action_execution():
+    app = FakeApp(target=1)
+    acting = threading.Event()
+    captured_while_acting = threading.Event()
+
+    def perceive(options):
+        snapshot = app.perceive(options)
+        if acting.is_set():
+            captured_while_acting.set()
+        return snapshot
+
+    def slow_act(action):
+        acting.set()
+        # 采集在动作返回之前就已完成
+        assert captured_while_acting.wait(timeout=1.0)
+        return app.act(action)
+
+    loop = TaskLoop(perceive, app.plan, slow_act, mode="pipelined")
+    report = loop.run(TaskContext("app", None))
+
+    assert report.completed
+    assert app.visible == 1
+    # 与动作重叠的采集看不到动作效果，被识别为过时后重新采集
+    assert report.stale_captures >= 1
+
+
+def test_pipelined_waits_for_action_without_expectation():
+    app = FakeApp(target=1)
+    acting = threading.Event()
+    captured_while_acting = []
+    original_plan = app.plan
+
+    def plan(snapshot):
+        action = original_plan(snapshot)
+        if action is not None:
+            action.expectation = None
+            action.predicted_snapshot = None
+        return action
+
+    def perceive(options):
+        captured_while_acting.append(acting.is_set())
+        return app.perceive(options)
+
+    def act(action):
+        acting.set()
+        time.sleep(0.02)
+        result = app.act(action)
+        acting.clear()
+        return result
+
+    TaskLoop(perceive, plan, act, mode="pipelined").run(TaskContext("app", None))
+
+    assert not any(captured_while_acting)
+    assert app.visible == 1
+
+
+@pytest.mark.parametrize("mode", ["sequential", "pipelined"])
+def test_stale_captures_are_discarded(mode):
+    app = FakeApp(target=2, settle_captures=1)
+    report = run_loop(app, mode)
+    assert report.completed
+    assert app.visible == 2
+    assert report.stale_captures >= 2
+    if mode == "pipelined":
+        assert report.discarded_plans >= 1
+
+
+def _phase_counts(mode):
+    (family,) = default_registry.collect(["argus_task_phase_seconds"])
+    return {
+        sample.labels["phase"]: sample.count
+        for sample in family.samples
+        if sample.labels["mode"] == mode
+    }
+
+
+def test_loop_records_phase_latency_histograms():
+    run_loop(FakeApp(target=1), "sequential")  # 确保指标已有样本
+    before = _phase_counts("sequential")
+    run_loop(FakeApp(target=2), "sequential")
+    after = _phase_counts("sequential")
+    # 3 次感知和规划 (初始 + 每个动作之后各一次)，2 个动作
+    assert after["perception"] - before["perception"] == 3
+    assert after["cognition"] - before["cognition"] == 3
+    assert after["action"] - before["action"] == 2
+
+
+def test_gives_up_when_snapshot_never_reflects_action():
+    app = FakeApp(target=1, settle_captures=100)
+    with pytest.raises(StaleSnapshotError):
+        run_loop(app, "sequential", max_stale_retries=2)
+
+
+def test_failed_action_stops_loop():
+    app = FakeApp(target=1)
+    app.act = lambda action: SimpleNamespace(success=False, message="boom")
+    with pytest.raises(ActionFailedError):
+        run_loop(app, "pipelined")
+
+
+def test_cancellation_is_checked_between_iterations():
+    app = FakeApp(target=100)
+    context = TaskContext("app", None)
+    loop = TaskLoop(app.perceive, app.plan, app.act, mode="pipelined")
+    original_act = app.act
+
+    def act_then_cancel(action):
+        context.request_cancel()
+        return original_act(action)
+
+    loop.act = act_then_cancel
+    with pytest.raises(TaskCancelledError):
+        loop.run(context)
+    assert app.applied == 1
+
+
+def test_pipelining_reduces_iteration_latency():
+    # 基于预测快照的规划与采集并行: 每次迭代约 1 个延迟而不是 2 个
+    latency = 0.02
+    sequential = run_loop(FakeApp(target=5, latency=latency), "sequential")
+    pipelined = run_loop(FakeApp(target=5, latency=latency), "pipelined")
+    assert pipelined.summary()["mean"] < sequential.summary()["mean"] * 0.75
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        TaskLoop(lambda o: None, lambda s: None, lambda a: None, mode="turbo")
@@ -0,0 +1,213 @@
+import threading
+import time
+from concurrent import futures
+
+import pytest
+
+from core.engine import CoreEngine, EngineState
+from core.task_scheduler import (
+    TaskCancelledError,
+    TaskDeadlineExceeded,
+    TaskRejectedError,
+    TaskScheduler,
+)
+
+
+@pytest.fixture
+def scheduler():
+    task_scheduler = TaskScheduler(max_workers=4)
+    task_scheduler.start()
+    yield task_scheduler
+    task_scheduler.stop(timeout=5)
+
+
+def test_future_returns_task_result(scheduler):
+    future = scheduler.submit("app", lambda context, a, b=0: a + b, 1, b=2)
+    assert future.result(timeout=5) == 3
+
+
+def test_tasks_for_same_key_run_serially_in_order(scheduler):
+    order = []
+    active = []
+
+    def task(context, index):
+        active.append(index)
+        assert len(active) == 1
+        time.sleep(0.01)
+        order.append(index)
+        active.remove(index)
+
+    results = [scheduler.submit("app", task, i) for i in range(5)]
+    futures.wait(results, timeout=5)
+    for future in results:
+        future.result()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_tasks_for_different_keys_run_in_parallel(scheduler):
+    barrier = threading.Barrier(3, timeout=5)
+    results = [
+        scheduler.submit(f"app-{i}", lambda context: barrier.wait()) for i in range(3)
+    ]
+    for future in results:
+        future.result(timeout=5)
+
+
+def test_cancel_queued_and_running_tasks(scheduler):
+    started = threading.Event()
+
+    def cooperative(context):
+        started.set()
+        while True:
+            context.check()
+            time.sleep(0.005)
+
+    running = scheduler.submit("app", cooperative)
+    queued = scheduler.submit("app", lambda context: "never")
+    assert started.wait(5)
+
+    assert queued.cancel()
+    assert not running.cancel()  # 正在执行: 请求协作式取消
+    with pytest.raises(TaskCancelledError):
+        running.result(timeout=5)
+    assert queued.cancelled()
+
+
+def test_deadline_applies_before_and_during_execution(scheduler):
+    release = threading.Event()
+    blocker = scheduler.submit("app", lambda context: release.wait(5))
+    expired = scheduler.submit("app", lambda context: "late", timeout=0.01)
+    time.sleep(0.05)
+    release.set()
+    blocker.result(timeout=5)
+    with pytest.raises(TaskDeadlineExceeded):
+        expired.result(timeout=5)
+
+    def slow(context):
+        while True:
+            context.check()
+            time.sleep(0.005)
+
+    with pytest.raises(TaskDeadlineExceeded):
+        scheduler.submit("other", slow, timeout=0.05).result(timeout=5)
+
+
+def test_rejects_when_queue_full_or_stopped():
+    task_scheduler = TaskScheduler(max_workers=1, max_pending=1)
+    with pytest.raises(TaskRejectedError):
+        task_scheduler.submit("app", lambda context: None)
+
+    task_scheduler.start()
+    release = threading.Event()
+    task_scheduler.submit("app", lambda context: release.wait(5))
+    with pytest.raises(TaskRejectedError):
+        task_scheduler.submit("app", lambda context: None)
+    release.set()
+    assert task_scheduler.stop(timeout=5)
+    with pytest.raises(TaskRejectedError):
+        task_scheduler.submit("app", lambda context: None)
+
+
+def test_stop_drains_in_flight_tasks():
+    task_scheduler = TaskScheduler(max_workers=2)
+    task_scheduler.start()
+    results = [
+        task_scheduler.submit("app", lambda context: time.sleep(0.02) or "done")
+        for _ in range(3)
+    ]
+    assert task_scheduler.stop(timeout=5)
+    assert [future.result(timeout=0) for future in results] == ["done"] * 3
+
+
+def test_stop_cancels_remaining_tasks_after_timeout():
+    task_scheduler = TaskScheduler(max_workers=1)
+    task_scheduler.start()
+
+    def cooperative(context):
+        while True:
+            context.check()
+            time.sleep(0.005)
+
+    running = task_scheduler.submit("app", cooperative)
+    queued = task_scheduler.submit("app", lambda context: "never")
+    assert not task_scheduler.stop(timeout=0.05)
+    assert queued.cancelled()
+    with pytest.raises(TaskCancelledError):
+        running.result(timeout=5)
+
+
+class StubPerception:
+    def get_ui_snapshot(self, options):
+        return {}
+
+
+def test_engine_runs_tasks_on_scheduler(tmp_path, monkeypatch):
+    engine = CoreEngine(
+        config={
+            "lazy_adapter_discovery": True,
+            "adapter_discovery_cache_file": str(tmp_path / "manifest.json"),
+        }
+    )
+    checked_in = []
+    monkeypatch.setattr(
+        engine.adapter_manager,
+        "checkout_adapter",
+        lambda app_name, config=None, timeout=None: (StubPerception(), object()),
+    )
+    monkeypatch.setattr(
+        engine.adapter_manager,
+        "checkin_adapter",
+        lambda app_name, adapter_pair: checked_in.append(app_name),
+    )
+    assert engine.run_task("before start", "app") is None
+
+    engine.start()
+    results = [engine.run_task(f"task {i}", f"app-{i % 2}") for i in range(4)]
+    engine.stop(timeout=5)
+
+    for future in results:
+        assert future.result(timeout=0).completed  # 未配置认知模块: 感知一次后结束
+    # 每个任务结束后归还借出的实例
+    assert sorted(checked_in) == ["app-0", "app-0", "app-1", "app-1"]
+    assert engine.get_status() == EngineState.STOPPED
+    assert engine.run_task("after stop", "app") is None
+
+
+def test_task_failure_does_not_affect_other_apps(tmp_path, monkeypatch):
+    engine = CoreEngine(
+        config={
+            "lazy_adapter_discovery": True,
+            "adapter_discovery_cache_file": str(tmp_path / "manifest.json"),
+            "task_max_workers": 1,  # 另一个应用的任务排在失败任务之后
+        }
+    )
+
+    class BrokenPerception:
+        def get_ui_snapshot(self, options):
+            raise RuntimeError("adapter crashed")
+
+    def checkout_adapter(app_name, config=None, timeout=None):
+        if app_name == "missing":
+            raise ValueError("no adapter")
+        perception = BrokenPerception() if app_name == "broken" else StubPerception()
+        return perception, object()
+
+    monkeypatch.setattr(engine.adapter_manager, "checkout_adapter", checkout_adapter)
+    monkeypatch.setattr(
+        engine.adapter_manager, "checkin_adapter", lambda app_name, adapter_pair: None
+    )
+    engine.start()
+    try:
+        broken = engine.run_task("crash", "broken")
+        missing = engine.run_task("no adapter", "missing")
+        healthy = engine.run_task("work", "healthy")
+
+        with pytest.raises(RuntimeError):
+            broken.result(timeout=5)
+        with pytest.raises(ValueError):
+            missing.result(timeout=5)
+        assert healthy.result(timeout=5).completed
+        assert engine.get_status() == EngineState.RUNNING
+        assert engine.run_task("later", "healthy").result(timeout=5).completed
+    finally:
+        engine.stop(timeout=5)
@@ -0,0 +1,236 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+# 需要先编译 protobuf (generated_protobuf)，否则跳过
+pb2 = pytest.importorskip("generated_protobuf.core_services_pb2")
+
+from core import grpc_server  # noqa: E402
+from core.snapshot_cache import SnapshotCache  # noqa: E402
+from core.snapshot_index import SnapshotIndexStore  # noqa: E402
+from core.ui_wait import PollingBackoff, UIChangeNotifier  # noqa: E402
+
+
+def make_snapshot(snapshot_id, *buttons, enabled=True):
+    snapshot = pb2.UISnapshot(snapshot_id=snapshot_id)
+    for name in buttons:
+        element = snapshot.elements.add(
+            framework_id=name, element_type="button", name=name
+        )
+        element.adapter_specific_id = name.encode()
+        element.state["enabled"].bool_value = enabled
+    return snapshot
+
+
+class SequenceAdapter:
+    """依次返回给定的快照，最后一个快照重复返回。"""
+
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+        self.captures = 0
+        self.live_state = {"enabled": False}
+
+    def get_ui_snapshot(self, options):
+        snapshot = self.snapshots[min(self.captures, len(self.snapshots) - 1)]
+        self.captures += 1
+        return snapshot
+
+    def find_elements(self, query):
+        return pb2.FindElementsResponse(
+            elements=[pb2.UIElement(framework_id="live", adapter_specific_id=b"live")]
+        )
+
+    def get_element_state(self, element_id):
+        return self.live_state
+
+
+class NotifyingAdapter(SequenceAdapter):
+    def __init__(self, *snapshots):
+        super().__init__(*snapshots)
+        self.listeners = []
+
+    def add_ui_change_listener(self, callback):
+        self.listeners.append(callback)
+
+
+def make_context(time_remaining=None):
+    context = MagicMock()
+    context.time_remaining.return_value = time_remaining
+    context.is_active.return_value = True
+    return context
+
+
+@pytest.fixture
+def use_adapter(monkeypatch):
+    # 禁用快照缓存，每次求值都重新采集
+    monkeypatch.setattr(grpc_server, "snapshot_cache", SnapshotCache(ttl=0))
+    monkeypatch.setattr(grpc_server, "snapshot_index_store", SnapshotIndexStore())
+    monkeypatch.setattr(grpc_server, "ui_change_notifier", UIChangeNotifier())
+
+    def use(adapter):
+        monkeypatch.setattr(grpc_server, "global_mock_perception_adapter", adapter)
+        return adapter
+
+    return use
+
+
+def polling(initial_ms, max_ms, multiplier=2.0):
+    return pb2.WaitPollingPolicy(
+        initial_interval_ms=initial_ms,
+        max_interval_ms=max_ms,
+        backoff_multiplier=multiplier,
+    )
+
+
+def test_polling_backoff_grows_caps_and_resets():
+    backoff = PollingBackoff(initial=0.1, maximum=0.3, multiplier=2.0)
+    assert [backoff.next_interval() for _ in range(4)] == [0.1, 0.2, 0.3, 0.3]
+    assert backoff.next_interval(remaining=0.05) == 0.05
+    backoff.reset()
+    assert backoff.next_interval() == 0.1
+
+
+def test_waits_until_element_appears(use_adapter):
+    adapter = use_adapter(
+        SequenceAdapter(
+            make_snapshot("s1"), make_snapshot("s2"), make_snapshot("s3", "OK")
+        )
+    )
+    request = pb2.WaitForConditionRequest(
+        element_present=pb2.ElementQuery(name="OK"),
+        timeout_ms=5000,
+        polling=polling(1, 5),
+    )
+    response = grpc_server.PerceptionServiceImpl().WaitForCondition(
+        request, make_context()
+    )
+    assert response.satisfied
+    assert [e.framework_id for e in response.elements] == ["OK"]
+    assert response.attempts == adapter.captures == 3
+    assert response.snapshot_id == "s3"
+
+
+def test_timeout_and_client_deadline_return_unsatisfied(use_adapter):
+    use_adapter(SequenceAdapter(make_snapshot("s1", "OK")))
+    servicer = grpc_server.PerceptionServiceImpl()
+    request = pb2.WaitForConditionRequest(
+        element_absent=pb2.ElementQuery(name="OK"),
+        timeout_ms=100,
+        polling=polling(10, 20),
+    )
+    response = servicer.WaitForCondition(request, make_context())
+    assert not response.satisfied
+    assert response.attempts > 1
+    assert 100 <= response.elapsed_ms < 1000
+
+    # deadline 比 timeout_ms 更早时按 deadline 返回
+    request.timeout_ms = 60000
+    started = time.monotonic()
+    response = servicer.WaitForCondition(request, make_context(time_remaining=0.2))
+    assert not response.satisfied
+    assert time.monotonic() - started < 1.0
+
+
+def test_action_wakes_waiter_before_poll_interval(use_adapter):
+    adapter = use_adapter(SequenceAdapter(make_snapshot("s1")))
+    request = pb2.WaitForConditionRequest(
+        element_present=pb2.ElementQuery(name="OK"),
+        timeout_ms=10000,
+        polling=polling(5000, 5000),
+    )
+
+    def act():
+        time.sleep(0.1)
+        adapter.snapshots.append(make_snapshot("s2", "OK"))
+        adapter.captures = 1
+        grpc_server.invalidate_ui_caches(adapter)
+
+    threading.Thread(target=act).start()
+    response = grpc_server.PerceptionServiceImpl().WaitForCondition(
+        request, make_context()
+    )
+    assert response.satisfied
+    assert response.attempts == 2
+    assert response.elapsed_ms < 2000
+
+
+def test_adapter_change_notifications_replace_polling(use_adapter):
+    adapter = use_adapter(NotifyingAdapter(make_snapshot("s1")))
+    request = pb2.WaitForConditionRequest(
+        element_present=pb2.ElementQuery(name="OK"),
+        timeout_ms=10000,
+        polling=polling(1, 5000),
+    )
+
+    def change():
+        while not adapter.listeners:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        adapter.snapshots.append(make_snapshot("s2", "OK"))
+        adapter.captures = 1
+        adapter.listeners[0]()
+
+    threading.Thread(target=change).start()
+    response = grpc_server.PerceptionServiceImpl().WaitForCondition(
+        request, make_context()
+    )
+    assert response.satisfied
+    # 通知可用时按最大间隔兜底轮询，不会以 1 ms 的间隔反复采集
+    assert response.attempts == 2
+    assert len(adapter.listeners) == 1
+
+
+def test_element_state_condition_uses_snapshot_or_live_state(use_adapter):
+    adapter = use_adapter(
+        SequenceAdapter(
+            make_snapshot("s1", "OK", enabled=False),
+            make_snapshot("s2", "OK", enabled=True),
+        )
+    )
+    servicer = grpc_server.PerceptionServiceImpl()
+    condition = pb2.ElementStateCondition(query=pb2.ElementQuery(name="OK"))
+    condition.expected_state["enabled"].bool_value = True
+    request = pb2.WaitForConditionRequest(
+        element_state=condition, timeout_ms=5000, polling=polling(1, 5)
+    )
+    response = servicer.WaitForCondition(request, make_context())
+    assert response.satisfied and response.attempts == 2
+    assert response.elements[0].framework_id == "OK"
+
+    # require_live 的查询和状态都直接来自适配器
+    request.element_state.query.require_live = True
+    request.timeout_ms = 50
+    response = servicer.WaitForCondition(request, make_context())
+    assert not response.satisfied and not response.HasField("snapshot_id")
+    adapter.live_state = {"enabled": True, "focused": False}
+    response = servicer.WaitForCondition(request, make_context())
+    assert response.satisfied
+    assert response.elements[0].framework_id == "live"
+
+
+def test_missing_condition_is_rejected(use_adapter):
+    use_adapter(SequenceAdapter(make_snapshot("s1")))
+    context = make_context()
+    context.abort.side_effect = RuntimeError("aborted")
+    with pytest.raises(RuntimeError):
+        grpc_server.PerceptionServiceImpl().WaitForCondition(
+            pb2.WaitForConditionRequest(), context
+        )
+    context.abort.assert_called_once()
+    assert context.abort.call_args[0][0] == grpc.StatusCode.INVALID_ARGUMENT
+
+
+def test_invalid_regex_is_rejected_before_waiting(use_adapter):
+    adapter = use_adapter(SequenceAdapter(make_snapshot("s1")))
+    context = make_context()
+    context.abort.side_effect = RuntimeError("aborted")
+    request = pb2.WaitForConditionRequest(
+        element_present=pb2.ElementQuery(text_content_regex="("), timeout_ms=1000
+    )
+    with pytest.raises(RuntimeError):
+        grpc_server.PerceptionServiceImpl().WaitForCondition(request, context)
+    assert context.abort.call_args[0][0] == grpc.StatusCode.INVALID_ARGUMENT
+    assert adapter.captures == 0
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from utils import logging_config
+from utils.logging_config import RateLimitFilter, setup_logging, stop_logging
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    stop_logging()
+    logging_config._install_rate_limits({})
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _record(level=logging.INFO, msg="hot path %s", args=("x",)):
+    return logging.LogRecord("hot", level, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_filter_allows_burst_and_reports_suppressed():
+    rate_filter = RateLimitFilter(rate=1000.0, burst=2)
+    assert rate_filter.filter(_record())
+    assert rate_filter.filter(_record())
+    assert not rate_filter.filter(_record())
+    assert not rate_filter.filter(_record())
+    assert rate_filter.filter(_record(logging.WARNING))  # 警告不受限流影响
+
+    time.sleep(0.01)
+    record = _record(msg="100% done", args=())
+    assert rate_filter.filter(record)
+    assert record.getMessage() == "100% done (2 similar messages suppressed)"
+
+
+def test_async_logging_writes_through_background_listener(tmp_path, restore_logging):
+    log_file = tmp_path / "argus.log"
+    setup_logging(
+        log_level=logging.INFO,
+        log_dir=str(tmp_path),
+        log_file=str(log_file),
+        console_logging=False,
+        async_logging=True,
+        rate_limits={},
+    )
+    root = logging.getLogger()
+    assert [type(h) for h in root.handlers] == [logging.handlers.QueueHandler]
+
+    # 慢速 handler 不应阻塞调用线程
+    release = threading.Event()
+
+    class SlowHandler(logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+
+    slow_handler = SlowHandler()
+    logging_config._queue_listener.handlers += (slow_handler,)
+    started = time.perf_counter()
+    logging.getLogger("test").info("queued %d", 1)
+    assert time.perf_counter() - started < 0.5
+    release.set()
+
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logging.getLogger("test").exception("failed")
+    stop_logging()
+    content = log_file.read_text()
+    assert "test - INFO - queued 1" in content
+    assert "ZeroDivisionError" in content
+
+
+def test_rate_limits_are_installed_per_logger(tmp_path, restore_logging):
+    setup_logging(
+        log_dir=str(tmp_path),
+        log_file=str(tmp_path / "argus.log"),
+        console_logging=False,
+        async_logging=False,
+        rate_limits={"core.grpc_server": 5.0},
+    )
+    filters = logging.getLogger("core.grpc_server").filters
+    assert [f.rate for f in filters if isinstance(f, RateLimitFilter)] == [5.0]
+
+    setup_logging(
+        log_dir=str(tmp_path),
+        log_file=str(tmp_path / "argus.log"),
+        console_logging=False,
+        async_logging=False,
+        rate_limits={},
+    )
+    assert not logging.getLogger("core.grpc_server").filters
@@ -0,0 +1,137 @@
+import threading
+import urllib.request
+
+import pytest
+
+from utils.metrics import (
+    DEFAULT_BUCKETS,
+    PROMETHEUS_CONTENT_TYPE,
+    MetricsRegistry,
+    log_linear_buckets,
+    start_metrics_http_server,
+)
+
+
+def test_log_linear_buckets():
+    assert log_linear_buckets(0, 1) == [
+        1.0,
+        2.0,
+        3.0,
+        4.0,
+        5.0,
+        6.0,
+        7.0,
+        8.0,
+        9.0,
+        10.0,
+        20.0,
+        30.0,
+        40.0,
+        50.0,
+        60.0,
+        70.0,
+        80.0,
+        90.0,
+    ]
+    assert DEFAULT_BUCKETS[0] == 0.0001 and DEFAULT_BUCKETS[-1] == 900.0
+    assert DEFAULT_BUCKETS == sorted(DEFAULT_BUCKETS)
+
+
+def test_counter_and_gauge():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests.", ("result",))
+    counter.inc(result="ok")
+    counter.inc(2, result="ok")
+    assert counter.get(result="ok") == 3.0
+    assert counter.get(result="error") == 0.0
+    with pytest.raises(ValueError):
+        counter.inc(-1, result="ok")
+    with pytest.raises(ValueError):
+        counter.inc(app="x")
+
+    gauge = registry.gauge("in_flight", "In-flight requests.")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.get() == 1.0
+    gauge.set(7)
+    assert gauge.get() == 7.0
+
+
+def test_registry_returns_existing_metric_and_rejects_type_conflict():
+    registry = MetricsRegistry()
+    counter = registry.counter("events_total", "Events.")
+    assert registry.counter("events_total", "Events.") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events.")
+
+
+def test_histogram_buckets_and_prometheus_rendering():
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "phase_seconds", "Phase duration.", ("phase",), buckets=[0.1, 1.0]
+    )
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, phase="act")
+    registry.counter("a_total", 'Help with "quotes".', ("path",)).inc(path='C:\\"x"')
+
+    (family,) = registry.collect(["phase_"])
+    (sample,) = family.samples
+    assert sample.bucket_counts == [2, 1, 1]  # le 是闭区间上界
+    assert sample.count == 4 and sample.sum == pytest.approx(3.65)
+
+    text = registry.render_prometheus()
+    assert text.splitlines() == [
+        '# HELP a_total Help with "quotes".',
+        "# TYPE a_total counter",
+        'a_total{path="C:\\\\\\"x\\""} 1.0',
+        "# HELP phase_seconds Phase duration.",
+        "# TYPE phase_seconds histogram",
+        'phase_seconds_bucket{phase="act",le="0.1"} 2',
+        'phase_seconds_bucket{phase="act",le="1.0"} 3',
+        'phase_seconds_bucket{phase="act",le="+Inf"} 4',
+        'phase_seconds_sum{phase="act"} 3.65',
+        'phase_seconds_count{phase="act"} 4',
+    ]
+
+
+def test_histogram_time_records_on_exception():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("op_seconds", "Op duration.")
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError("boom")
+    (sample,) = registry.collect()[0].samples
+    assert sample.count == 1
+
+
+def test_concurrent_observations_are_not_lost():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("concurrent_seconds", "Concurrent.")
+
+    def observe():
+        for _ in range(1000):
+            histogram.observe(0.001)
+
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.collect()[0].samples[0].count == 4000
+
+
+def test_http_endpoint_serves_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("served_total", "Served.").inc()
+    server = start_metrics_http_server(port=0, registry=registry)
+    try:
+        host, port = server.server_address[:2]
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            assert response.headers["Content-Type"] == PROMETHEUS_CONTENT_TYPE
+            assert "served_total 1.0" in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://{host}:{port}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
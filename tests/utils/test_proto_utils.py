@@ -1,8 +1,16 @@
 # tests/utils/test_proto_utils.py
 import pytest
-from google.protobuf.struct_pb2 import Struct
+from google.protobuf.json_format import MessageToDict, ParseDict
+from google.protobuf.struct_pb2 import Struct, Value
 
-from utils.proto_utils import proto_struct_to_python_dict, python_dict_to_proto_struct
+from utils.proto_utils import (
+    proto_struct_to_python_dict,
+    proto_value_map_to_python_dict,
+    proto_value_to_python_value,
+    python_dict_to_proto_struct,
+    python_dict_to_proto_value_map,
+    python_value_to_proto_value,
+)
 
 # --- Test Data ---
 TEST_CASES = [
@@ -71,4 +79,66 @@ def test_struct_to_dict_empty():
     assert result == {}
 
 
-# 可以添加更多针对无效输入的测试，但 json_format 库已处理大部分情况
+@pytest.mark.parametrize("name, py_dict, expected_dict", TEST_CASES)
+def test_struct_matches_json_format(name, py_dict, expected_dict):
+    """直接转换的结果应与 json_format 的结果一致。"""
+    reference = Struct()
+    ParseDict(py_dict, reference)
+    assert python_dict_to_proto_struct(py_dict) == reference
+    assert proto_struct_to_python_dict(reference) == MessageToDict(reference)
+
+
+def test_integers_become_floats_by_default():
+    result = proto_struct_to_python_dict(python_dict_to_proto_struct({"n": 3}))
+    assert isinstance(result["n"], float)
+
+
+def test_preserve_integers():
+    proto_struct = python_dict_to_proto_struct(
+        {"n": 3, "f": 2.5, "nested": {"items": [1, 2.0, 2**60]}}
+    )
+    result = proto_struct_to_python_dict(proto_struct, preserve_integers=True)
+    assert result == {"n": 3, "f": 2.5, "nested": {"items": [1, 2, 2.0**60]}}
+    assert isinstance(result["n"], int)
+    # 超出 2**53 的数无法精确表示，保持 float
+    assert isinstance(result["nested"]["items"][2], float)
+
+
+def test_empty_containers_are_preserved():
+    proto_struct = python_dict_to_proto_struct({"d": {}, "l": [], "t": (1, "x")})
+    assert proto_struct_to_python_dict(proto_struct) == {
+        "d": {},
+        "l": [],
+        "t": [1, "x"],
+    }
+
+
+def test_unsupported_type_returns_empty_struct():
+    assert python_dict_to_proto_struct({"bad": object()}) == Struct()
+    assert python_dict_to_proto_struct({1: "non-string key"}) == Struct()
+    with pytest.raises(TypeError):
+        python_value_to_proto_value({"bad": {1, 2}})
+
+
+def test_value_round_trip():
+    value = python_value_to_proto_value([None, True, "s", {"k": 1}])
+    assert isinstance(value, Value)
+    assert proto_value_to_python_value(value, preserve_integers=True) == [
+        None,
+        True,
+        "s",
+        {"k": 1},
+    ]
+    assert proto_value_to_python_value(Value()) is None
+
+
+def test_value_map_round_trip():
+    target = Struct()  # Struct.fields 与 UIElement.state 同为 map<string, Value>
+    python_dict_to_proto_value_map({"enabled": True, "count": 2}, target.fields)
+    assert proto_value_map_to_python_dict(target.fields, preserve_integers=True) == {
+        "enabled": True,
+        "count": 2,
+    }
+
+    python_dict_to_proto_value_map({"bad": object()}, target.fields)
+    assert proto_value_map_to_python_dict(target.fields) == {}
@@ -0,0 +1,78 @@
+import json
+
+from utils import tracing
+from utils.tracing import Tracer
+
+
+def test_traceparent_round_trip_and_validation():
+    trace_id, span_id = tracing.new_trace_id(), tracing.new_span_id()
+    header = tracing.format_traceparent(trace_id, span_id, True)
+    assert tracing.parse_traceparent(header) == (trace_id, span_id, True)
+    assert tracing.parse_traceparent(
+        tracing.format_traceparent(trace_id, span_id, False)
+    ) == (trace_id, span_id, False)
+    for invalid in (None, "", "garbage", f"01-{trace_id}-{span_id}-01"):
+        assert tracing.parse_traceparent(invalid) is None
+    assert tracing.parse_traceparent(f"00-{'0' * 32}-{span_id}-01") is None
+
+
+def test_request_id_is_reused_as_trace_id_when_possible():
+    tracer = Tracer()
+    hex_id = tracing.new_trace_id()
+    assert tracer.new_trace(hex_id).trace_id == hex_id
+
+    trace = tracer.new_trace("order-42")
+    assert trace.request_id == "order-42"
+    assert len(trace.trace_id) == 32 and trace.trace_id != "order-42"
+
+
+def test_spans_are_noops_outside_sampled_traces():
+    with tracing.span("conversion") as span:
+        assert span is None
+    assert tracing.current_request_id() is None
+
+    trace = Tracer(sample_rate=1.0).new_trace("req-1")  # 没有导出器: 不采样
+    assert not trace.sampled
+    with tracing.activate(trace, None):
+        assert tracing.current_request_id() == "req-1"
+        with tracing.span("conversion") as span:
+            assert span is None
+    assert trace.drain() == []
+
+
+def test_sampled_trace_is_exported_as_otlp_json(tmp_path):
+    span_file = tmp_path / "spans.jsonl"
+    tracer = Tracer(sample_rate=1.0, span_file=str(span_file), service_name="test")
+    trace = tracer.new_trace()
+    assert trace.sampled
+    root = tracing.Span(trace.trace_id, "/Service/Method", tracing.SPAN_KIND_SERVER)
+    with tracing.activate(trace, root):
+        with tracing.span("adapter", method="click", retries=2):
+            pass
+        try:
+            with tracing.span("serialize"):
+                raise ValueError("bad message")
+        except ValueError:
+            pass
+    root.end()
+    trace.add(root)
+    tracer.export(trace)
+    tracer.close(timeout=5)
+
+    (line,) = span_file.read_text().splitlines()
+    resource_spans = json.loads(line)["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "test"}}
+    ]
+    spans = {s["name"]: s for s in resource_spans["scopeSpans"][0]["spans"]}
+    assert set(spans) == {"adapter", "serialize", "/Service/Method"}
+    adapter = spans["adapter"]
+    assert adapter["traceId"] == trace.trace_id
+    assert adapter["parentSpanId"] == root.span_id
+    assert {"key": "retries", "value": {"intValue": "2"}} in adapter["attributes"]
+    assert int(adapter["endTimeUnixNano"]) >= int(adapter["startTimeUnixNano"])
+    assert spans["serialize"]["status"] == {
+        "code": tracing.STATUS_CODE_ERROR,
+        "message": "ValueError: bad message",
+    }
+    assert "parentSpanId" not in spans["/Service/Method"]
@@ -1,10 +1,115 @@
+import atexit
 import logging
 import logging.config
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
 
 # 导入配置
 from config import settings
 
+# 异步模式下在后台线程中执行实际 handler 的监听器 (setup_logging 创建)
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_atexit_registered = False
+
+
+class RateLimitFilter(logging.Filter):
+    """令牌桶限流: 每秒最多放行 rate 条记录 (允许 burst 条突发)。
+
+    用于热路径上的 logger (例如每个 RPC 都会输出的日志)。不低于 bypass_level
+    的记录 (默认 WARNING 及以上) 总是放行；被丢弃的条数附加到下一条放行的记录中。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        bypass_level: int = logging.WARNING,
+    ):
+        """
+        Args:
+            rate: 每秒放行的记录数。
+            burst: 令牌桶容量，None 表示等于 rate (至少 1)。
+            bypass_level: 不受限流影响的最低级别。
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.bypass_level = bypass_level
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.bypass_level:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last_refill) * self.rate
+            )
+            self._last_refill = now
+            if self._tokens < 1.0:
+                self._suppressed += 1
+                return False
+            self._tokens -= 1.0
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed and isinstance(record.args, tuple):
+            msg = str(record.msg)
+            if not record.args:
+                # 没有参数的消息不会经过 % 格式化，其中的 % 需要转义
+                msg = msg.replace("%", "%%")
+            record.msg = f"{msg} (%d similar messages suppressed)"
+            record.args = record.args + (suppressed,)
+        return True
+
+
+def _install_rate_limits(rate_limits: Dict[str, float]) -> None:
+    """为 rate_limits 中的 logger 安装 (或替换) RateLimitFilter。"""
+    for name in list(logging.Logger.manager.loggerDict) + [""]:
+        target = logging.getLogger(name)
+        for existing in [f for f in target.filters if isinstance(f, RateLimitFilter)]:
+            target.removeFilter(existing)
+    for name, rate in rate_limits.items():
+        logging.getLogger(name).addFilter(RateLimitFilter(rate))
+
+
+def _install_queue_listener() -> None:
+    """把根 logger 的 handler 移到后台 QueueListener，请求线程只负责入队。"""
+    global _queue_listener, _atexit_registered
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _queue_listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _queue_listener.start()
+    if not _atexit_registered:
+        # 进程退出前写完队列中的记录
+        atexit.register(stop_logging)
+        _atexit_registered = True
+
+
+def stop_logging() -> None:
+    """停止异步日志监听器: 处理完队列中剩余的记录后关闭其 handler。"""
+    global _queue_listener
+    listener, _queue_listener = _queue_listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
 # # 日志文件默认存放目录 (项目根目录下 logs/) # 改为从配置读取
 # DEFAULT_LOG_DIR = os.path.join(os.path.dirname\
 # (os.path.dirname(os.path.abspath(__file__))), 'logs')
@@ -18,6 +123,8 @@ def setup_logging(
     log_file: str = settings.LOG_FILE,
     console_logging: bool = settings.LOG_CONSOLE_ENABLED,
     file_logging: bool = settings.LOG_FILE_ENABLED,
+    async_logging: bool = settings.LOG_ASYNC_ENABLED,
+    rate_limits: Optional[Dict[str, float]] = None,
 ):
     """配置全局日志记录。
 
@@ -27,7 +134,13 @@ def setup_logging(
         log_file: 日志文件名。
         console_logging: 是否启用控制台日志输出。
         file_logging: 是否启用文件日志输出。
+        async_logging: 是否通过 QueueHandler/QueueListener 在后台线程中写日志，
+            调用线程只负责格式化消息并入队。
+        rate_limits: logger 名称 -> 每秒最多放行的记录数 (WARNING 及以上不受限)，
+            None 表示使用 settings.LOG_RATE_LIMITS。
     """
+    # 重新配置前先写完并关闭上一次的异步 handler
+    stop_logging()
     if isinstance(log_level, str):
         log_level = getattr(logging, log_level.upper(), logging.INFO)
 
@@ -94,10 +207,15 @@ def setup_logging(
 
     try:
         logging.config.dictConfig(logging_config)
+        if async_logging:
+            _install_queue_listener()
+        _install_rate_limits(
+            settings.LOG_RATE_LIMITS if rate_limits is None else rate_limits
+        )
         if console_logging or file_logging:
             logging.info("Logging configured successfully.")
             if file_logging:
-                logging.info(f"Log file located at: {log_file}")
+                logging.info("Log file located at: %s", log_file)
         else:
             print("Warning: No logging handlers enabled (console or file).")
     except Exception as e:
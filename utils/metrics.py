@@ -0,0 +1,347 @@
+import bisect
+import contextlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def log_linear_buckets(
+    min_exponent: int = -4, max_exponent: int = 2, steps: Sequence[int] = range(1, 10)
+) -> List[float]:
+    """生成对数-线性桶边界: 每个 10 的幂次内按 steps 线性划分。
+
+    默认边界为 0.0001, 0.0002, ..., 0.0009, 0.001, ..., 900 (秒)，
+    每个数量级内的相对误差不超过一个步长。
+
+    Args:
+        min_exponent: 最小的 10 的幂次。
+        max_exponent: 最大的 10 的幂次。
+        steps: 每个幂次内的倍数 (1 到 9)。
+
+    Returns:
+        升序的有限桶上界 (不含 +Inf)。
+    """
+    # 通过字符串构造，避免 3 * 0.0001 这类浮点误差出现在导出的 le 标签中
+    return [
+        float(f"{step}e{exponent}")
+        for exponent in range(min_exponent, max_exponent + 1)
+        for step in steps
+    ]
+
+
+DEFAULT_BUCKETS = log_linear_buckets()
+
+
+@dataclass
+class MetricSample:
+    """单个标签组合的当前值。"""
+
+    labels: Dict[str, str]
+    value: float = 0.0  # 计数器/仪表的值
+    # 直方图: 每个桶的计数 (非累计)，最后一项为 +Inf 桶
+    bucket_counts: List[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+
+@dataclass
+class MetricFamilySnapshot:
+    """一个指标在某一时刻的所有样本。"""
+
+    name: str
+    help: str
+    type: str
+    samples: List[MetricSample]
+    bucket_bounds: List[float] = field(default_factory=list)  # 仅直方图
+
+
+class _Metric:
+    """指标基类: 按标签值元组保存子项。"""
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, "
+                f"got {tuple(labels)}"
+            )
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"Metric {self.name} is missing label {e}") from None
+
+    def _labels_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """单调递增计数器。"""
+
+    type = COUNTER
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._children.get(self._key(labels), 0.0)
+
+    def collect(self) -> MetricFamilySnapshot:
+        with self._lock:
+            samples = [
+                MetricSample(labels=self._labels_dict(key), value=value)
+                for key, value in self._children.items()
+            ]
+        return MetricFamilySnapshot(self.name, self.help, self.type, samples)
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值。"""
+
+    type = GAUGE
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = float(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bucket_counts", "sum", "count")
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """固定桶边界的直方图 (默认对数-线性桶)，记录一次观测为 O(log 桶数)。"""
+
+    type = HISTOGRAM
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = list(buckets if buckets is not None else DEFAULT_BUCKETS)
+        if self.buckets != sorted(self.buckets):
+            raise ValueError("Histogram buckets must be sorted.")
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = _HistogramChild(len(self.buckets) + 1)
+            child.bucket_counts[index] += 1
+            child.sum += value
+            child.count += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """记录 with 代码块的耗时 (秒)，代码块抛出异常时同样记录。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self) -> MetricFamilySnapshot:
+        with self._lock:
+            samples = [
+                MetricSample(
+                    labels=self._labels_dict(key),
+                    bucket_counts=list(child.bucket_counts),
+                    sum=child.sum,
+                    count=child.count,
+                )
+                for key, child in self._children.items()
+            ]
+        return MetricFamilySnapshot(
+            self.name, self.help, self.type, samples, bucket_bounds=list(self.buckets)
+        )
+
+
+class MetricsRegistry:
+    """进程内的指标注册表。重复注册同名同类型的指标返回已有实例。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            existing = self._metrics.get(name)
+            if existing is not None:
+                if type(existing) is not metric_class:
+                    raise ValueError(
+                        f"Metric {name} is already registered as {existing.type}."
+                    )
+                return existing
+            metric = metric_class(name, *args, **kwargs)
+            self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def collect(self, name_prefixes: Sequence[str] = ()) -> List[MetricFamilySnapshot]:
+        """返回所有 (或名称匹配任一前缀的) 指标的快照，按名称排序。"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        if name_prefixes:
+            metrics = [
+                m for m in metrics if any(m.name.startswith(p) for p in name_prefixes)
+            ]
+        return [metric.collect() for metric in metrics]
+
+    def render_prometheus(self, name_prefixes: Sequence[str] = ()) -> str:
+        """以 Prometheus 文本格式 (0.0.4) 导出指标。"""
+        lines: List[str] = []
+        for family in self.collect(name_prefixes):
+            lines.append(f"# HELP {family.name} {_escape_help(family.help)}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            for sample in family.samples:
+                if family.type == HISTOGRAM:
+                    cumulative = 0
+                    bounds = [_format_value(b) for b in family.bucket_bounds] + ["+Inf"]
+                    for bound, bucket_count in zip(bounds, sample.bucket_counts):
+                        cumulative += bucket_count
+                        labels = _format_labels(sample.labels, ("le", bound))
+                        lines.append(f"{family.name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(sample.labels)
+                    lines.append(
+                        f"{family.name}_sum{labels} {_format_value(sample.sum)}"
+                    )
+                    lines.append(f"{family.name}_count{labels} {sample.count}")
+                else:
+                    lines.append(
+                        f"{family.name}{_format_labels(sample.labels)} "
+                        f"{_format_value(sample.value)}"
+                    )
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple] = None) -> str:
+    items = list(labels.items())
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in items)
+        + "}"
+    )
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+# 进程默认注册表，各模块在导入时在其中定义自己的指标
+default_registry = MetricsRegistry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = default_registry
+
+    def do_GET(self):  # noqa: N802 (BaseHTTPRequestHandler 约定的方法名)
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Metrics HTTP: " + format, *args)
+
+
+def start_metrics_http_server(
+    host: str = "127.0.0.1", port: int = 0, registry: Optional[MetricsRegistry] = None
+) -> ThreadingHTTPServer:
+    """在后台线程中启动 Prometheus 文本格式的 HTTP 端点 (GET /metrics)。
+
+    Args:
+        host: 监听地址，默认只监听本机。
+        port: 监听端口，0 表示由系统分配 (实际端口见 server.server_address)。
+        registry: 导出的注册表，None 表示 default_registry。
+
+    Returns:
+        已启动的服务器，调用 shutdown() 停止。
+    """
+    handler = type(
+        "MetricsRequestHandler",
+        (_MetricsRequestHandler,),
+        {"registry": registry or default_registry},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="MetricsHTTPServer", daemon=True
+    ).start()
+    logger.info(
+        "Metrics endpoint listening on http://%s:%d/metrics", *server.server_address[:2]
+    )
+    return server
@@ -1,14 +1,118 @@
 # utils/proto_utils.py
 
 import logging
+from typing import Any, Iterable, MutableMapping
 
-from google.protobuf.json_format import MessageToDict, ParseDict
-
-# from google.protobuf.struct_pb2 import ListValue, Value # F401 Unused import
-from google.protobuf.struct_pb2 import Struct
+from google.protobuf.struct_pb2 import ListValue, Struct, Value
 
 logger = logging.getLogger(__name__)
 
+# 超过该绝对值的浮点数不能精确表示所有整数，preserve_integers 时仍保持 float
+_MAX_SAFE_INTEGER = 2**53
+
+
+def _set_proto_value(target: Value, value: Any) -> None:
+    """把 Python 值写入 Value (就地修改)。按常见程度排列类型判断。"""
+    if isinstance(value, str):
+        target.string_value = value
+    elif value is None:
+        target.null_value = 0  # NULL_VALUE
+    elif isinstance(value, bool):  # bool 是 int 的子类，必须先于数字判断
+        target.bool_value = value
+    elif isinstance(value, (int, float)):
+        target.number_value = value
+    elif isinstance(value, dict):
+        target.struct_value.SetInParent()
+        _fill_struct(target.struct_value, value)
+    elif isinstance(value, (list, tuple)):
+        target.list_value.SetInParent()
+        _fill_list_value(target.list_value, value)
+    else:
+        raise TypeError(f"Unsupported type for protobuf Value: {type(value).__name__}")
+
+
+def _fill_struct(target: Struct, py_dict: dict) -> None:
+    _fill_value_map(target.fields, py_dict)
+
+
+def _fill_value_map(value_map: MutableMapping[str, Value], py_dict: dict) -> None:
+    for key, value in py_dict.items():
+        if not isinstance(key, str):
+            raise TypeError(f"Struct keys must be strings, got {type(key).__name__}")
+        _set_proto_value(value_map[key], value)
+
+
+def _fill_list_value(target: ListValue, items: Iterable[Any]) -> None:
+    values = target.values
+    for item in items:
+        _set_proto_value(values.add(), item)
+
+
+def _proto_value_to_python(value: Value, preserve_integers: bool) -> Any:
+    kind = value.WhichOneof("kind")
+    if kind == "string_value":
+        return value.string_value
+    if kind == "number_value":
+        number = value.number_value
+        if (
+            preserve_integers
+            and number.is_integer()
+            and -_MAX_SAFE_INTEGER <= number <= _MAX_SAFE_INTEGER
+        ):
+            return int(number)
+        return number
+    if kind == "bool_value":
+        return value.bool_value
+    if kind == "struct_value":
+        return _value_map_to_python(value.struct_value.fields, preserve_integers)
+    if kind == "list_value":
+        return [
+            _proto_value_to_python(item, preserve_integers)
+            for item in value.list_value.values
+        ]
+    # null_value 或未设置
+    return None
+
+
+def _value_map_to_python(
+    value_map: MutableMapping[str, Value], preserve_integers: bool
+) -> dict:
+    # upb 实现中按键索引比 items() 快
+    return {
+        key: _proto_value_to_python(value_map[key], preserve_integers)
+        for key in value_map
+    }
+
+
+def python_value_to_proto_value(value: Any) -> Value:
+    """将 Python 值 (None/bool/数字/str/dict/list/tuple) 转换为 Protobuf Value。
+
+    Args:
+        value: 要转换的值，dict 的键必须是字符串。
+
+    Returns:
+        转换后的 Protobuf Value。
+
+    Raises:
+        TypeError: 值 (或嵌套的值) 的类型不受支持。
+    """
+    proto_value = Value()
+    _set_proto_value(proto_value, value)
+    return proto_value
+
+
+def proto_value_to_python_value(value: Value, preserve_integers: bool = False) -> Any:
+    """将 Protobuf Value 转换为 Python 值。
+
+    Args:
+        value: 要转换的 Protobuf Value。
+        preserve_integers: 为 True 时整数值的数字还原为 int (默认与 JSON 一样为 float)。
+
+    Returns:
+        转换后的 Python 值，未设置的 Value 视为 None。
+    """
+    return _proto_value_to_python(value, preserve_integers)
+
 
 def python_dict_to_proto_struct(py_dict: dict) -> Struct:
     """将 Python 字典递归转换为 Protobuf Struct。
@@ -17,41 +121,77 @@ def python_dict_to_proto_struct(py_dict: dict) -> Struct:
         py_dict: 要转换的 Python 字典。
 
     Returns:
-        转换后的 Protobuf Struct。
+        转换后的 Protobuf Struct；包含不支持的类型时记录错误并返回空 Struct。
     """
     proto_struct = Struct()
+    if not py_dict:
+        return proto_struct
     try:
-        # google.protobuf.json_format.ParseDict handles nested structures and types
-        ParseDict(py_dict, proto_struct)
-    except Exception as e:
+        _fill_struct(proto_struct, py_dict)
+    except (TypeError, ValueError, AttributeError) as e:
         logger.error(
             "Error converting Python dict to Protobuf Struct: %s", e, exc_info=True
         )
-        # Return an empty struct or raise an error depending on desired behavior
         return Struct()
     return proto_struct
 
 
-def proto_struct_to_python_dict(proto_struct: Struct) -> dict:
+def proto_struct_to_python_dict(
+    proto_struct: Struct, preserve_integers: bool = False
+) -> dict:
     """将 Protobuf Struct 递归转换为 Python 字典。
 
     Args:
         proto_struct: 要转换的 Protobuf Struct。
+        preserve_integers: 为 True 时整数值的数字还原为 int (默认与 JSON 一样为 float)。
 
     Returns:
         转换后的 Python 字典。
     """
+    fields = proto_struct.fields
+    if not fields:
+        return {}
+    return _value_map_to_python(fields, preserve_integers)
+
+
+def python_dict_to_proto_value_map(
+    py_dict: dict, value_map: MutableMapping[str, Value]
+) -> None:
+    """将 Python 字典直接写入 map<string, Value> 字段 (如 UIElement.state)。
+
+    Protobuf 的 map 字段不能整体赋值，因此就地填充，无需经过中间 Struct。
+    包含不支持的类型时记录错误并清空该字段。
+
+    Args:
+        py_dict: 要转换的 Python 字典。
+        value_map: 目标 map 字段，例如 element.state。
+    """
+    if not py_dict:
+        return
     try:
-        # google.protobuf.json_format.MessageToDict handles nested structures and types
-        # Use `preserving_proto_field_name=True` to keep original field names
-        py_dict = MessageToDict(proto_struct, preserving_proto_field_name=True)
-        return py_dict
-    except Exception as e:
+        _fill_value_map(value_map, py_dict)
+    except (TypeError, ValueError, AttributeError) as e:
         logger.error(
-            "Error converting Protobuf Struct to Python dict: %s", e, exc_info=True
+            "Error converting Python dict to Protobuf Value map: %s", e, exc_info=True
         )
-        # Return an empty dict or raise an error
+        value_map.clear()
+
+
+def proto_value_map_to_python_dict(
+    value_map: MutableMapping[str, Value], preserve_integers: bool = False
+) -> dict:
+    """将 map<string, Value> 字段 (如 UIElement.state) 转换为 Python 字典。
+
+    Args:
+        value_map: 源 map 字段。
+        preserve_integers: 为 True 时整数值的数字还原为 int。
+
+    Returns:
+        转换后的 Python 字典。
+    """
+    if not value_map:
         return {}
+    return _value_map_to_python(value_map, preserve_integers)
 
 
 # --- 示例用法和简单测试 ---
@@ -77,8 +217,8 @@ if __name__ == "__main__":
 
     logger.info("--- Testing python_dict_to_proto_struct ---")
     struct_result = python_dict_to_proto_struct(test_dict)
-    logger.info(f"Original Dict: {test_dict}")
-    logger.info(f"Converted Struct:\n{struct_result}")
+    logger.info("Original Dict: %s", test_dict)
+    logger.info("Converted Struct:\n%s", struct_result)
     # Basic check
     assert struct_result.fields["string_key"].string_value == "hello_world"
     assert struct_result.fields["int_key"].number_value == 123
@@ -93,7 +233,7 @@ if __name__ == "__main__":
 
     logger.info("\n--- Testing proto_struct_to_python_dict ---")
     dict_result = proto_struct_to_python_dict(struct_result)
-    logger.info(f"Converted back to Dict: {dict_result}")
+    logger.info("Converted back to Dict: %s", dict_result)
     # Basic check (might have float precision differences)
     assert dict_result["string_key"] == "hello_world"
     assert dict_result["int_key"] == 123
@@ -0,0 +1,371 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_METADATA_KEY = "x-request-id"
+# W3C Trace Context: 00-<trace_id>-<parent_span_id>-<flags>，flags 01 表示已采样
+TRACEPARENT_METADATA_KEY = "traceparent"
+
+# OTLP SpanKind / StatusCode 取值
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def new_trace_id() -> str:
+    """生成 32 位十六进制的 trace ID (同时用作请求 ID)。"""
+    return f"{random.getrandbits(128) or 1:032x}"
+
+
+def new_span_id() -> str:
+    return f"{random.getrandbits(64) or 1:016x}"
+
+
+def _is_hex_id(value: str, length: int) -> bool:
+    return len(value) == length and set(value) <= _HEX_DIGITS and value != "0" * length
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """解析 traceparent 头，格式无效时返回 None。
+
+    Returns:
+        (trace_id, parent_span_id, sampled)。
+    """
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) != 4 or parts[0] != "00":
+        return None
+    _, trace_id, span_id, flags = parts
+    if not (_is_hex_id(trace_id, 32) and _is_hex_id(span_id, 16)):
+        return None
+    try:
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    return trace_id, span_id, sampled
+
+
+class Span:
+    """一个已采样的 span；时间为 Unix 纪元纳秒。"""
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+        "name",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        trace_id: str,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent_span_id: str = "",
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if not self.end_ns:
+            self.end_ns = time.time_ns()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """转换为 OTLP-JSON 的 Span 对象 (64 位整数按 proto3 JSON 规则写成字符串)。"""
+        status = (
+            {"code": STATUS_CODE_ERROR, "message": self.error}
+            if self.error is not None
+            else {"code": STATUS_CODE_OK}
+        )
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_any_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": status,
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_any_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Trace:
+    """一次请求的追踪: 请求 ID、采样决定以及已结束的 span。"""
+
+    def __init__(self, tracer: "Tracer", trace_id: str, request_id: str, sampled: bool):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.sampled = sampled
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def drain(self) -> List[Span]:
+        with self._lock:
+            spans, self._spans = self._spans, []
+        return spans
+
+
+class _ActiveSpan:
+    __slots__ = ("trace", "span")
+
+    def __init__(self, trace: Trace, span: Optional[Span]):
+        self.trace = trace
+        self.span = span
+
+
+# 当前线程 (或协程) 正在执行的 span；未在追踪中时为 None
+_current: contextvars.ContextVar[Optional[_ActiveSpan]] = contextvars.ContextVar(
+    "argus_current_span", default=None
+)
+_NO_SPAN = contextlib.nullcontext()
+
+
+def current_request_id() -> Optional[str]:
+    """返回当前请求的 ID (例如用于日志关联)，不在请求上下文中时返回 None。"""
+    active = _current.get()
+    return active.trace.request_id if active is not None else None
+
+
+def current_trace() -> Optional[Trace]:
+    active = _current.get()
+    return active.trace if active is not None else None
+
+
+def current_span() -> Optional[Span]:
+    active = _current.get()
+    return active.span if active is not None else None
+
+
+@contextlib.contextmanager
+def activate(trace: Trace, span: Optional[Span]) -> Iterator[None]:
+    """在 with 代码块内把 span 设为当前 span (用于在生成器或其他线程中恢复上下文)。"""
+    token = _current.set(_ActiveSpan(trace, span))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def _child_span(
+    active: _ActiveSpan, name: str, attributes: Dict[str, Any]
+) -> Iterator[Span]:
+    child = Span(
+        active.trace.trace_id,
+        name,
+        parent_span_id=active.span.span_id if active.span is not None else "",
+        attributes=attributes,
+    )
+    token = _current.set(_ActiveSpan(active.trace, child))
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+        active.trace.add(child)
+
+
+def span(name: str, **attributes):
+    """在当前追踪中记录一个子 span。
+
+    当前请求未被采样 (或不在请求上下文中) 时返回空上下文管理器，开销只有一次
+    ContextVar 读取。
+
+    Args:
+        name: span 名称，例如 "conversion"、"adapter"、"serialize"。
+        **attributes: span 属性。
+
+    Returns:
+        上下文管理器；已采样时 as 子句得到 Span，否则为 None。
+    """
+    active = _current.get()
+    if active is None or not active.trace.sampled:
+        return _NO_SPAN
+    return _child_span(active, name, attributes)
+
+
+class SpanFileExporter:
+    """
+    把追踪以 OTLP-JSON (每行一个 ExportTraceServiceRequest) 追加写入本地文件。
+    写入在后台线程中进行，队列已满时丢弃追踪而不是阻塞请求。
+    """
+
+    def __init__(self, path: str, service_name: str, max_queue: int = 10000):
+        self.path = path
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._write_loop, name="SpanFileExporter", daemon=True
+                )
+                self._thread.start()
+
+    def _write_loop(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                spans = self._queue.get()
+                if spans is None:
+                    return
+                f.write(json.dumps(self._to_otlp(spans), separators=(",", ":")))
+                f.write("\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def _to_otlp(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "argus.tracing"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """写完队列中的追踪后停止后台线程。"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+class Tracer:
+    """按采样率决定是否记录追踪，并把已结束的追踪交给导出器。"""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        span_file: Optional[str] = None,
+        service_name: str = "argus",
+    ):
+        """
+        Args:
+            sample_rate: 由本进程发起的追踪的采样率 (0 到 1)；远端传入的采样决定优先。
+            span_file: OTLP-JSON span 文件路径，None 表示不导出 (仍然分配请求 ID)。
+            service_name: 写入 resource 的 service.name。
+        """
+        self.sample_rate = sample_rate
+        self.exporter = SpanFileExporter(span_file, service_name) if span_file else None
+
+    def should_sample(self) -> bool:
+        return self.exporter is not None and random.random() < self.sample_rate
+
+    def new_trace(
+        self,
+        request_id: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        sampled: Optional[bool] = None,
+    ) -> Trace:
+        """创建追踪。未提供 trace_id 时，32 位十六进制的请求 ID 直接用作 trace ID。"""
+        if trace_id is None:
+            trace_id = (
+                request_id
+                if request_id and _is_hex_id(request_id, 32)
+                else new_trace_id()
+            )
+        if sampled is None:
+            sampled = self.should_sample()
+        return Trace(
+            self,
+            trace_id,
+            request_id or trace_id,
+            sampled and self.exporter is not None,
+        )
+
+    def export(self, trace: Trace) -> None:
+        if trace.sampled and self.exporter is not None:
+            self.exporter.export(trace.drain())
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self.exporter is not None:
+            self.exporter.close(timeout)